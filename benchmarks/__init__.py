@@ -0,0 +1,5 @@
+"""
+设备层与记录层的基准测试
+inventory 生成合成的设备/记录数据，run 计时读取器、查找、状态更新和工具处理函数，
+compare 对比两次结果并标出退化的项目
+"""
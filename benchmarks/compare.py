@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对比两次基准测试结果
+以每个项目的中位数耗时比较，比基线慢超过阈值的项目记为退化
+
+用法:
+    python -m benchmarks.compare baseline.json current.json --threshold 0.15
+    （存在退化时退出码为1，可直接用于CI）
+"""
+
+import argparse
+import json
+import sys
+
+
+def load_results(path):
+    """读取 benchmarks.run 输出的JSON"""
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def compare_results(baseline, current, threshold=0.1):
+    """
+    对比两次结果
+
+    Args:
+        baseline (dict): 基线结果
+        current (dict): 本次结果
+        threshold (float): 允许的变慢比例，0.1 表示慢10%以内不算退化
+
+    Returns:
+        list: [{"name", "baseline", "current", "ratio", "status"}, ...]，
+              status 为 regression / improvement / ok / new / missing
+    """
+    base_results = baseline.get("results", {})
+    current_results = current.get("results", {})
+    rows = []
+    for name in sorted(base_results.keys() | current_results.keys()):
+        before = base_results.get(name, {}).get("median")
+        after = current_results.get(name, {}).get("median")
+        if before is None or after is None:
+            rows.append({"name": name, "baseline": before, "current": after, "ratio": None,
+                         "status": "new" if before is None else "missing"})
+            continue
+        ratio = after / before if before else float("inf")
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 / (1 + threshold):
+            status = "improvement"
+        else:
+            status = "ok"
+        rows.append({"name": name, "baseline": before, "current": after, "ratio": ratio, "status": status})
+    return rows
+
+
+def _format_seconds(value):
+    if value is None:
+        return "-"
+    if value >= 1:
+        return f"{value:.3f}s"
+    if value >= 1e-3:
+        return f"{value * 1e3:.3f}ms"
+    return f"{value * 1e6:.1f}µs"
+
+
+def format_comparison(rows, threshold):
+    """生成对比表格文本"""
+    marks = {"regression": "❌ 退化", "improvement": "✅ 提升", "ok": "  持平", "new": "  新增", "missing": "  缺失"}
+    width = max((len(row["name"]) for row in rows), default=10)
+    lines = [f"{'项目':<{width}}  {'基线':>12}  {'本次':>12}  {'比值':>7}  结果 (阈值 ±{threshold:.0%})"]
+    for row in rows:
+        ratio = f"{row['ratio']:.2f}x" if row["ratio"] is not None else "-"
+        lines.append(
+            f"{row['name']:<{width}}  {_format_seconds(row['baseline']):>12}  "
+            f"{_format_seconds(row['current']):>12}  {ratio:>7}  {marks[row['status']]}"
+        )
+    return "\n".join(lines)
+
+
+def _describe_setup(results):
+    meta = results.get("meta", {})
+    return (f"{meta.get('devices', '?')} 台设备 / {meta.get('records', '?')} 条记录, "
+            f"store={meta.get('store', '?')}, state_mode={meta.get('state_mode', '?')}")
+
+
+def report(baseline, current, threshold):
+    """
+    打印对比结果
+
+    Returns:
+        int: 退化的项目数
+    """
+    if baseline.get("meta", {}).get("devices") != current.get("meta", {}).get("devices"):
+        print("⚠️ 两次测试的数据规模不同，对比结果仅供参考")
+    print(f"基线: {_describe_setup(baseline)}")
+    print(f"本次: {_describe_setup(current)}")
+    rows = compare_results(baseline, current, threshold)
+    print(format_comparison(rows, threshold))
+    regressions = [row["name"] for row in rows if row["status"] == "regression"]
+    if regressions:
+        print(f"\n❌ {len(regressions)} 个项目退化: {', '.join(regressions)}")
+    else:
+        print("\n✅ 没有退化")
+    return len(regressions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比两次基准测试结果")
+    parser.add_argument("baseline", help="基线结果JSON")
+    parser.add_argument("current", help="本次结果JSON")
+    parser.add_argument("--threshold", type=float, default=0.1, help="允许的变慢比例 (默认0.1，即10%%)")
+    args = parser.parse_args()
+
+    regressions = report(load_results(args.baseline), load_results(args.current), args.threshold)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
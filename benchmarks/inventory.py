@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成设备清单生成器
+按真实CSV的中文列名生成四类设备表和 records.csv，同样的参数和种子总是生成同样的数据
+
+用法:
+    python -m benchmarks.inventory /tmp/bench-devices --devices 100000 --records 1000000
+"""
+
+import argparse
+import csv
+import random
+from datetime import date, timedelta
+from pathlib import Path
+
+# 设备类型 -> (CSV文件名, 列名)，与 Devices/ 下的真实文件一致
+DEVICE_SCHEMAS = {
+    'android': ('android_devices.csv', ['创建日期', '设备名称', '设备OS', 'SKU', '类型', '品牌', '借用者',
+                                        '所属manager', '设备序列号', '资产编号', '是否盘点', '设备状态', '列1']),
+    'ios': ('ios_devices.csv', ['创建日期', '设备名称', '设备OS', '设备序列号', '借用者', '所属manager',
+                                '资产编号', '是否盘点', '设备状态', '列1']),
+    'windows': ('windows_devices.csv', ['创建日期', '设备OS', '设备名称', 'SKU', '芯片架构', '借用者',
+                                        '所属manager', '设备序列号', '资产编号', '是否盘点', '设备状态', '列1']),
+    'other': ('other_devices.csv', ['创建日期', '设备名称', 'SKU', '设备OS', '设备序列号', '借用者',
+                                    '所属manager', '资产编号', '是否盘点', '设备状态', '列1']),
+}
+
+RECORD_COLUMNS = ['创建日期', '借用者', '设备', '资产编号', '状态', '原因']
+
+# 各类设备在清单中的占比
+DEVICE_MIX = (('android', 0.4), ('ios', 0.25), ('windows', 0.25), ('other', 0.1))
+
+# 第一台设备的资产编号，后续设备依次递增
+FIRST_ASSET_NUMBER = 18000000
+
+MODELS = {
+    'android': [('Samsung', 'SAMSUNG Galaxy Tab S8'), ('Samsung', 'SAMSUNG Galaxy S23'), ('Google', 'Pixel 7'),
+                ('Google', 'Pixel 8 Pro'), ('Xiaomi', '小米 13'), ('Huawei', '华为 Mate 50'), ('OPPO', 'OPPO Find X6')],
+    'ios': [(None, 'iPhone 14'), (None, 'iPhone 15 Pro'), (None, 'iPad Pro 12.9'), (None, 'iPad mini 6')],
+    'windows': [(None, 'Surface Pro 9'), (None, 'Surface Laptop 5'), (None, 'Surface Go 3'), (None, 'Dell XPS 13')],
+    'other': [(None, 'HoloLens 2'), (None, 'Xbox Series X'), (None, 'Meta Quest 3'), (None, 'Apple Watch')],
+}
+OS_VERSIONS = {
+    'android': ['Android 12', 'Android 13', 'Android 14'],
+    'ios': ['iOS 16.5', 'iOS 17.2', 'iPadOS 17.1'],
+    'windows': ['Windows 10', 'Windows 11', 'Windows 11 24H2'],
+    'other': ['Windows Holographic', 'Xbox OS', 'watchOS 10'],
+}
+ARCHITECTURES = ['x64', 'x64', 'arm64', 'x86']
+ANDROID_TYPES = ['手机', '手机', '平板']
+MANAGERS = ['张伟', '王芳', '李娜', 'alice', 'bob']
+BORROWERS = ['刘洋', '陈静', '杨磊', '赵敏', '黄勇', 'carol', 'dave', 'erin']
+REASONS = ['功能测试', '兼容性测试', '性能测试', '回归测试', '演示', '']
+# 设备状态及其权重
+STATUSES = (('可用', 0.6), ('正在使用', 0.3), ('设备异常', 0.1))
+
+
+def asset_number(index):
+    """第 index 台设备（从0开始）的资产编号"""
+    return str(FIRST_ASSET_NUMBER + index)
+
+
+def device_counts(total):
+    """
+    按 DEVICE_MIX 把设备总数分配到各类型
+
+    Returns:
+        dict: 设备类型 -> 数量（合计等于 total）
+    """
+    counts = {device_type: int(total * share) for device_type, share in DEVICE_MIX}
+    counts['android'] += total - sum(counts.values())
+    return counts
+
+
+def inventory_summary(devices, records):
+    """
+    生成参数对应的数据概况（各类设备数和每类第一台设备的资产编号）
+
+    Returns:
+        dict: {"devices": {设备类型: 数量}, "records": 数量, "assets": {设备类型: 资产编号}}
+    """
+    counts = device_counts(devices)
+    first_assets = {}
+    index = 0
+    for device_type in DEVICE_SCHEMAS:
+        first_assets[device_type] = asset_number(index)
+        index += counts[device_type]
+    return {"devices": counts, "records": records, "assets": first_assets}
+
+
+def _format_date(day):
+    return day.strftime("%d/%m/%Y")
+
+
+def _device_row(rng, device_type, columns, index, start_day):
+    brand, name = rng.choice(MODELS[device_type])
+    status = rng.choices([s for s, _ in STATUSES], weights=[w for _, w in STATUSES])[0]
+    row = dict.fromkeys(columns, '')
+    row.update({
+        '创建日期': _format_date(start_day + timedelta(days=rng.randrange(1000))),
+        '设备名称': f"{name} #{index}",
+        '设备OS': rng.choice(OS_VERSIONS[device_type]),
+        '设备序列号': f"SN{device_type[:2].upper()}{index:08d}",
+        '资产编号': asset_number(index),
+        '所属manager': rng.choice(MANAGERS),
+        '是否盘点': rng.choice(['是', '是', '否']),
+        '设备状态': status,
+        '借用者': rng.choice(BORROWERS) if status == '正在使用' else '',
+    })
+    if 'SKU' in row:
+        row['SKU'] = f"SKU-{rng.randrange(1000):04d}"
+    if '品牌' in row:
+        row['品牌'] = brand
+    if '类型' in row:
+        row['类型'] = rng.choice(ANDROID_TYPES)
+    if '芯片架构' in row:
+        row['芯片架构'] = rng.choice(ARCHITECTURES)
+    return row
+
+
+def generate_inventory(directory, devices=10000, records=100000, seed=42, reserved=0):
+    """
+    生成合成设备清单
+
+    Args:
+        directory (Path): 输出目录（作为 DEVICE_DATA_DIR 使用）
+        devices (int): 设备总数，按 DEVICE_MIX 分配到四类设备表
+        records (int): records.csv 中的借用/归还记录数
+        seed (int): 随机种子
+        reserved (int): 每类设备的前 reserved 台固定为可用、没有借用者（供借用/归还测试使用）
+
+    Returns:
+        dict: 数据概况，见 inventory_summary
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    start_day = date(2022, 1, 1)
+    summary = inventory_summary(devices, records)
+    counts = summary["devices"]
+
+    # 资产编号全局唯一，按类型连续分配
+    names = []
+    index = 0
+    for device_type, (filename, columns) in DEVICE_SCHEMAS.items():
+        with open(directory / filename, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=columns)
+            writer.writeheader()
+            for position in range(counts[device_type]):
+                row = _device_row(rng, device_type, columns, index, start_day)
+                if position < reserved:
+                    row.update({'设备状态': '可用', '借用者': ''})
+                writer.writerow(row)
+                names.append(row['设备名称'])
+                index += 1
+
+    with open(directory / 'records.csv', 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(RECORD_COLUMNS)
+        for i in range(records):
+            device = rng.randrange(devices) if devices else 0
+            writer.writerow([
+                _format_date(start_day + timedelta(days=i * 1000 // max(records, 1))),
+                rng.choice(BORROWERS),
+                names[device] if names else '',
+                asset_number(device),
+                '借用' if i % 2 == 0 else '归还',
+                rng.choice(REASONS),
+            ])
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成设备清单（设备CSV + records.csv）")
+    parser.add_argument("directory", help="输出目录")
+    parser.add_argument("--devices", type=int, default=10000, help="设备总数 (默认10000)")
+    parser.add_argument("--records", type=int, default=100000, help="借用/归还记录数 (默认100000)")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子 (默认42)")
+    args = parser.parse_args()
+
+    summary = generate_inventory(args.directory, args.devices, args.records, args.seed)
+    print(f"✅ 已生成到 {args.directory}")
+    for device_type, count in summary["devices"].items():
+        print(f"   {device_type}: {count} 台")
+    print(f"   records: {summary['records']} 条")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MCP StreamableHTTP 端到端压测
+
+在临时目录中生成合成设备清单，以 --no-devops 启动MCP服务器（借用/归还不写入DevOps评论），
+同时打开 N 个MCP会话，每个会话按配置的比例不断调用 list_devices、find_device_by_asset 和借用/归还，
+最后报告吞吐量、p50/p95/p99延迟、错误率和服务器进程的内存（RSS）
+
+用法:
+    python -m benchmarks.load --sessions 50 --duration 30
+    python -m benchmarks.load --sessions 20 --mix list_devices=2,find_device_by_asset=6,borrow_return=2
+    python -m benchmarks.load --sessions 20 --server-arg=--event-store --server-arg=file --output load.json
+
+客户端和服务器运行在同一台机器上，CPU核数较少时客户端本身也会占用相当一部分CPU
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import anyio
+import httpx
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+
+from .inventory import FIRST_ASSET_NUMBER, asset_number, device_counts, generate_inventory
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# 操作 -> 默认权重
+DEFAULT_MIX = {"list_devices": 3, "find_device_by_asset": 6, "borrow_return": 1}
+
+# 服务器启动的最长等待时间（秒）
+STARTUP_TIMEOUT = 60
+
+
+def parse_mix(text):
+    """
+    解析操作比例，例如 "list_devices=3,find_device_by_asset=6,borrow_return=1"
+
+    Raises:
+        ValueError: 操作名未知或权重无效时抛出
+    """
+    mix = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        name, _, weight = item.partition("=")
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"未知操作: {name} (可选: {', '.join(DEFAULT_MIX)})")
+        mix[name] = float(weight) if weight else 1.0
+        if mix[name] < 0:
+            raise ValueError(f"权重不能为负数: {item}")
+    if not any(mix.values()):
+        raise ValueError("至少需要一个权重大于0的操作")
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    """最近秩法百分位数（sorted_values 已排序）"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_rss(pid):
+    """
+    读取进程的常驻内存（字节）；优先使用 psutil，否则读取 /proc，都不可用时返回None
+    """
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        with open(f"/proc/{pid}/status", "r") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class Stats:
+    """按操作汇总的延迟和错误"""
+
+    def __init__(self):
+        # 操作 -> [延迟（秒）]
+        self.latencies = {}
+        # 操作 -> 错误数
+        self.errors = {}
+        # 错误信息 -> 次数（只保留前几种，便于排查）
+        self.error_samples = {}
+
+    def record(self, operation, latency, error=None):
+        self.latencies.setdefault(operation, []).append(latency)
+        if error is not None:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+            message = str(error).splitlines()[0][:200] if str(error) else type(error).__name__
+            if message in self.error_samples or len(self.error_samples) < 10:
+                self.error_samples[message] = self.error_samples.get(message, 0) + 1
+
+    def summary(self, elapsed):
+        """
+        Returns:
+            dict: 每个操作以及所有工具调用合计（不含 initialize）的请求数、错误率、吞吐量和延迟百分位数（毫秒）
+        """
+        def describe(latencies, errors):
+            ordered = sorted(latencies)
+            return {
+                "requests": len(ordered),
+                "errors": errors,
+                "error_rate": errors / len(ordered) if ordered else 0.0,
+                "throughput": len(ordered) / elapsed if elapsed else 0.0,
+                "p50_ms": _ms(percentile(ordered, 0.50)),
+                "p95_ms": _ms(percentile(ordered, 0.95)),
+                "p99_ms": _ms(percentile(ordered, 0.99)),
+                "max_ms": _ms(ordered[-1] if ordered else None),
+            }
+
+        operations = {
+            name: describe(values, self.errors.get(name, 0))
+            for name, values in sorted(self.latencies.items())
+        }
+        calls = [name for name in self.latencies if name != "initialize"]
+        return {
+            "total": describe(
+                [value for name in calls for value in self.latencies[name]],
+                sum(self.errors.get(name, 0) for name in calls),
+            ),
+            "operations": operations,
+            "error_samples": self.error_samples,
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+class ServerProcess:
+    """在子进程中运行MCP服务器（python -m src.mcp_server2，默认 --no-devops）"""
+
+    def __init__(self, data_dir, port, server_args, log_path, no_devops=True):
+        self.data_dir = data_dir
+        self.port = port
+        self.server_args = server_args
+        self.log_path = log_path
+        self.no_devops = no_devops
+        self.process = None
+        self._log = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/mcp/"
+
+    def start(self):
+        env = dict(os.environ, DEVICE_DATA_DIR=str(self.data_dir), PYTHONUNBUFFERED="1")
+        command = [sys.executable, "-m", "src.mcp_server2", "--port", str(self.port), "--log-level", "WARNING",
+                   *(["--no-devops"] if self.no_devops else []), *self.server_args]
+        self._log = open(self.log_path, "wb")
+        self.process = subprocess.Popen(command, cwd=PROJECT_ROOT, env=env,
+                                        stdout=self._log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self, timeout=STARTUP_TIMEOUT, path="/ready"):
+        """
+        等待服务器就绪：默认等待 /ready 返回200（预热完成），
+        path="/metrics" 时只等待服务器开始接受HTTP请求
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"服务器进程已退出 (退出码 {self.process.returncode})\n{self.log_tail()}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{self.port}{path}", timeout=1.0).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.05)
+        raise RuntimeError(f"服务器在 {timeout} 秒内没有就绪\n{self.log_tail()}")
+
+    def rss(self):
+        return read_rss(self.process.pid) if self.process is not None else None
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        if self._log is not None:
+            self._log.close()
+
+    def log_tail(self, lines=20):
+        try:
+            return "\n".join(Path(self.log_path).read_text(encoding="utf-8", errors="replace").splitlines()[-lines:])
+        except OSError:
+            return ""
+
+
+def _tool_error(operation, result):
+    """工具调用结果是否表示失败（协议错误，或借用/归还处理函数返回的失败信息）"""
+    text = "".join(getattr(block, "text", "") for block in result.content)
+    if result.isError:
+        return text or "isError"
+    if operation in ("borrow_device", "return_device") and text.startswith("❌"):
+        return text
+    return None
+
+
+async def run_session(index, args, url, deadline, stats, assets, own_asset):
+    """
+    一个会话：初始化后在截止时间前不断按比例执行操作
+
+    每个会话只借用/归还自己专用的一台设备（初始为可用），会话之间不会互相冲突
+    """
+    rng = random.Random(args.seed + index)
+    operations = list(args.mix)
+    weights = [args.mix[name] for name in operations]
+    borrowed = False
+
+    started = time.perf_counter()
+    try:
+        async with streamablehttp_client(url, timeout=args.timeout) as (read, write, _):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                stats.record("initialize", time.perf_counter() - started)
+
+                while time.monotonic() < deadline:
+                    operation = rng.choices(operations, weights)[0]
+                    if operation == "list_devices":
+                        tool, arguments = "list_devices", {}
+                    elif operation == "find_device_by_asset":
+                        tool, arguments = "find_device_by_asset", {"asset_number": rng.choice(assets)}
+                    else:
+                        tool = "return_device" if borrowed else "borrow_device"
+                        arguments = {"asset_number": own_asset, "borrower": "loadtest", "reason": "压测"}
+
+                    call_started = time.perf_counter()
+                    try:
+                        result = await session.call_tool(tool, arguments)
+                        error = _tool_error(tool, result)
+                    except Exception as e:
+                        error = e
+                    stats.record(tool, time.perf_counter() - call_started, error)
+                    if operation == "borrow_return" and error is None:
+                        borrowed = not borrowed
+    except Exception as e:
+        stats.record("initialize", time.perf_counter() - started, e)
+
+
+async def sample_rss(server, samples, interval=0.5):
+    """定期记录服务器进程的RSS"""
+    while True:
+        rss = server.rss()
+        if rss is not None:
+            samples.append(rss)
+        await anyio.sleep(interval)
+
+
+async def run_load(args, server, summary):
+    """
+    打开所有会话并运行到截止时间
+
+    Returns:
+        tuple: (Stats, 实际运行秒数, RSS采样列表)
+    """
+    stats = Stats()
+    rss_samples = []
+    # 查询的资产编号分布在所有设备表中；借用/归还使用每个会话专用的Android设备
+    total_devices = sum(summary["devices"].values())
+    assets = [asset_number(index) for index in range(0, total_devices, max(1, total_devices // 1000))]
+    first_android = int(summary["assets"]["android"]) - FIRST_ASSET_NUMBER
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(sample_rss, server, rss_samples)
+        started = time.monotonic()
+        deadline = started + args.ramp_up + args.duration
+        async with anyio.create_task_group() as sessions:
+            for index in range(args.sessions):
+                sessions.start_soon(run_session, index, args, server.url, deadline, stats, assets,
+                                    asset_number(first_android + index))
+                if args.ramp_up:
+                    await anyio.sleep(args.ramp_up / args.sessions)
+        elapsed = time.monotonic() - started
+        tg.cancel_scope.cancel()
+    return stats, elapsed, rss_samples
+
+
+def _mb(value):
+    return round(value / (1024 * 1024), 1) if value is not None else None
+
+
+def format_report(report):
+    """生成可读的压测报告"""
+    meta = report["meta"]
+    memory = report["server_rss_mb"]
+    lines = [
+        f"会话数: {meta['sessions']}  时长: {report['elapsed_s']:.1f}s  设备: {meta['devices']}  "
+        f"操作比例: {meta['mix']}",
+        f"服务器RSS: 启动 {memory['start']} MB, 峰值 {memory['peak']} MB, 结束 {memory['end']} MB",
+        "",
+        f"{'操作':<24}{'请求数':>9}{'错误率':>9}{'吞吐(次/秒)':>13}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}",
+    ]
+    rows = dict(report["operations"])
+    rows["总计(不含initialize)"] = report["total"]
+    for name, row in rows.items():
+        lines.append(
+            f"{name:<24}{row['requests']:>9}{row['error_rate']:>9.2%}{row['throughput']:>13.1f}"
+            f"{row['p50_ms'] or 0:>10.1f}{row['p95_ms'] or 0:>10.1f}{row['p99_ms'] or 0:>10.1f}{row['max_ms'] or 0:>10.1f}"
+        )
+    if report["error_samples"]:
+        lines.append("")
+        lines.append("错误示例:")
+        for message, count in report["error_samples"].items():
+            lines.append(f"  {count}× {message}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCP StreamableHTTP 端到端压测")
+    parser.add_argument("--sessions", type=int, default=20, help="并发MCP会话数 (默认20)")
+    parser.add_argument("--duration", type=float, default=30, help="压测时长 (秒，默认30，不含爬坡时间)")
+    parser.add_argument("--ramp-up", type=float, default=2, help="逐个打开会话所用的时间 (秒，默认2)")
+    parser.add_argument("--mix", type=parse_mix, default=dict(DEFAULT_MIX),
+                        help="操作比例 (默认 list_devices=3,find_device_by_asset=6,borrow_return=1)")
+    parser.add_argument("--devices", type=int, default=2000, help="合成设备总数 (默认2000)")
+    parser.add_argument("--records", type=int, default=20000, help="合成借用/归还记录数 (默认20000)")
+    parser.add_argument("--seed", type=int, default=42, help="数据生成和操作选择的随机种子")
+    parser.add_argument("--timeout", type=float, default=30, help="单个HTTP请求的超时 (秒)")
+    parser.add_argument("--port", type=int, default=0, help="服务器端口 (默认自动选择空闲端口)")
+    parser.add_argument("--server-arg", action="append", default=[],
+                        help="传给服务器的额外参数，可多次指定 (如 --server-arg=--json-response)")
+    parser.add_argument("--keep", action="store_true", help="保留临时数据目录和服务器日志")
+    parser.add_argument("--output", default=None, help="把报告以JSON写入该文件")
+    args = parser.parse_args()
+
+    if args.sessions > device_counts(args.devices)["android"]:
+        parser.error("每个会话需要一台专用的Android设备，--devices 太少")
+
+    work_dir = Path(tempfile.mkdtemp(prefix="mcp-load-"))
+    data_dir = work_dir / "Devices"
+    summary = generate_inventory(data_dir, args.devices, args.records, args.seed, reserved=args.sessions)
+    server = ServerProcess(data_dir, args.port or free_port(), args.server_arg, work_dir / "server.log")
+    print(f"📦 合成数据: {args.devices} 台设备, {args.records} 条记录 -> {data_dir}", file=sys.stderr)
+
+    try:
+        server.start()
+        server.wait_ready()
+        print(f"🚀 服务器已启动: {server.url} (pid {server.process.pid})", file=sys.stderr)
+        rss_start = server.rss()
+        print(f"⏱️ {args.sessions} 个会话, 爬坡 {args.ramp_up}s + 压测 {args.duration}s ...", file=sys.stderr)
+        stats, elapsed, rss_samples = anyio.run(run_load, args, server, summary)
+        rss_end = server.rss()
+    finally:
+        server.stop()
+        if args.keep:
+            print(f"📁 数据目录和服务器日志: {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    # 吞吐量按全部时长计算（包含爬坡），initialize 单独统计
+    result = stats.summary(elapsed)
+    initialize = result["operations"].pop("initialize", None)
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "sessions": args.sessions,
+            "duration_s": args.duration,
+            "ramp_up_s": args.ramp_up,
+            "mix": args.mix,
+            "devices": args.devices,
+            "records": args.records,
+            "server_args": args.server_arg,
+            "cpu_count": os.cpu_count(),
+        },
+        "elapsed_s": elapsed,
+        "total": result["total"],
+        "operations": result["operations"],
+        "initialize": initialize,
+        "error_samples": result["error_samples"],
+        "server_rss_mb": {
+            "start": _mb(rss_start),
+            "peak": _mb(max(rss_samples, default=None)),
+            "end": _mb(rss_end),
+        },
+    }
+    print(format_report(report))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"✅ 报告已写入 {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
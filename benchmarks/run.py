@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+设备层与记录层基准测试
+
+在临时目录中生成合成设备清单（或使用 --data-dir 指定的目录），依次计时:
+- read_*_devices 读取器（cold: 文件变化后重新解析；warm: 命中进程内缓存）
+- read_records / query_records
+- find_device_by_asset_number、update_device_status_in_csv
+- MCP服务器的 _handle_* 工具处理函数（与 --no-devops 相同，不写入DevOps评论）
+
+结果以JSON输出，--baseline 指定上一次的结果时对比并在退化超过阈值时返回退出码1
+
+用法:
+    python -m benchmarks.run --devices 100000 --records 1000000 --output results.json
+    python -m benchmarks.run --baseline results.json --threshold 0.15
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from .compare import report
+from .inventory import DEVICE_SCHEMAS, FIRST_ASSET_NUMBER, asset_number, generate_inventory, inventory_summary
+
+# 同一测试重新计时的最多调用次数（自动确定每次采样的调用次数时的上限）
+MAX_NUMBER = 1 << 16
+
+
+class Case:
+    """一个计时项目"""
+
+    def __init__(self, name, group, func, setup=None, is_async=False):
+        """
+        Args:
+            name (str): 项目名（结果JSON中的键）
+            group (str): 分组（reader / records / lookup / update / handler）
+            func (callable): 被计时的无参数函数（is_async 时为协程函数）
+            setup (callable): 每次调用前执行且不计时的准备函数；指定时每个采样只调用一次 func
+            is_async (bool): func 是否为协程函数
+        """
+        self.name = name
+        self.group = group
+        self.func = func
+        self.setup = setup
+        self.is_async = is_async
+
+
+def _summarize(case, samples, number):
+    return {
+        "group": case.group,
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "max": max(samples),
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "number": number,
+        "repeat": len(samples),
+    }
+
+
+def measure(case, repeat, min_time):
+    """
+    计时同步项目：预热后按 timeit.autorange 的方式确定每次采样的调用次数，
+    再采样 repeat 次，返回每次调用的耗时统计（秒）
+    """
+    if case.setup is not None:
+        case.setup()
+        case.func()
+        samples = []
+        for _ in range(repeat):
+            case.setup()
+            started = time.perf_counter()
+            case.func()
+            samples.append(time.perf_counter() - started)
+        return _summarize(case, samples, 1)
+
+    def timed(number):
+        started = time.perf_counter()
+        for _ in range(number):
+            case.func()
+        return time.perf_counter() - started
+
+    # 首次调用可能包含加载和建索引，不参与确定调用次数
+    case.func()
+    number = 1
+    while timed(number) < min_time and number < MAX_NUMBER:
+        number *= 2
+    return _summarize(case, [timed(number) / number for _ in range(repeat)], number)
+
+
+async def measure_async(case, repeat, min_time):
+    """计时协程项目（与 measure 相同，在事件循环中执行）"""
+    if case.setup is not None:
+        case.setup()
+        await case.func()
+        samples = []
+        for _ in range(repeat):
+            case.setup()
+            started = time.perf_counter()
+            await case.func()
+            samples.append(time.perf_counter() - started)
+        return _summarize(case, samples, 1)
+
+    async def timed(number):
+        started = time.perf_counter()
+        for _ in range(number):
+            await case.func()
+        return time.perf_counter() - started
+
+    await case.func()
+    number = 1
+    while await timed(number) < min_time and number < MAX_NUMBER:
+        number *= 2
+    return _summarize(case, [await timed(number) / number for _ in range(repeat)], number)
+
+
+def _touch(path):
+    """修改文件的mtime，使进程内缓存认为文件已变化并在下次读取时重新解析"""
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+
+
+def _expect(result, description):
+    """读取器和状态更新在失败时只返回False，出现失败时终止基准测试，避免计时的是错误路径"""
+    if result is False:
+        raise RuntimeError(f"{description} 失败")
+    return result
+
+
+def device_cases(data_dir, summary, store_backend):
+    """设备层和记录层的计时项目"""
+    from src.device.android_reader import read_android_devices
+    from src.device.ios_reader import read_ios_devices
+    from src.device.other_reader import read_other_devices
+    from src.device.records_reader import (
+        find_device_by_asset_number,
+        query_records,
+        read_records,
+        update_device_status_in_csv,
+    )
+    from src.device.windows_reader import read_windows_devices
+
+    readers = {
+        'android': read_android_devices,
+        'ios': read_ios_devices,
+        'windows': read_windows_devices,
+        'other': read_other_devices,
+    }
+    cases = []
+    for device_type, reader in readers.items():
+        name = reader.__name__
+        # SQLite 存储不读取CSV，只测缓存命中的读取
+        if store_backend == 'csv':
+            path = data_dir / DEVICE_SCHEMAS[device_type][0]
+            cases.append(Case(f"{name}.cold", "reader", reader, setup=lambda path=path: _touch(path)))
+        cases.append(Case(f"{name}.warm", "reader", reader))
+
+    if store_backend == 'csv':
+        records_path = data_dir / "records.csv"
+        cases.append(Case("read_records.cold", "records", read_records, setup=lambda: _touch(records_path)))
+    cases.append(Case("read_records.warm", "records", read_records))
+
+    total = sum(summary["devices"].values())
+    # 资产编号分散在四类设备表中，依次查找
+    probe_assets = [asset_number(index) for index in range(0, total, max(1, total // 997))]
+    probe = iter(())
+
+    def find_hit():
+        nonlocal probe
+        asset = next(probe, None)
+        if asset is None:
+            probe = iter(probe_assets)
+            asset = next(probe)
+        return find_device_by_asset_number(asset)
+
+    cases.append(Case("find_device_by_asset_number.hit", "lookup", find_hit))
+    cases.append(Case("find_device_by_asset_number.miss", "lookup",
+                      lambda: find_device_by_asset_number("99999999")))
+    busy_asset = probe_assets[len(probe_assets) // 2]
+    cases.append(Case("query_records.asset", "records", lambda: query_records(asset_number=busy_asset)))
+    cases.append(Case("query_records.recent", "records", lambda: query_records(limit=50)))
+
+    # 状态在两个值之间交替，每次调用都是一次真正的写入（csv 模式下重写整个设备CSV）
+    update_asset = summary["assets"]["android"]
+    states = [("设备异常", ""), ("可用", "")]
+    flip = [0]
+
+    def update_status():
+        flip[0] ^= 1
+        status, borrower = states[flip[0]]
+        _expect(update_device_status_in_csv(update_asset, status, borrower), "update_device_status_in_csv")
+
+    cases.append(Case("update_device_status_in_csv", "update", update_status))
+    return cases
+
+
+class _BenchSession:
+    """处理函数发送日志通知的会话（丢弃所有通知）"""
+
+    async def send_log_message(self, **kwargs):
+        pass
+
+
+class _BenchContext:
+    """处理函数使用的请求上下文（只用到 session 和 request_id）"""
+
+    def __init__(self):
+        self.session = _BenchSession()
+        self.request_id = "benchmark"
+
+
+def handler_cases(summary, bulk_size):
+    """MCP工具处理函数的计时项目"""
+    from src.device.device_store import get_device_store
+    from src.mcp_server2 import server
+    from src.mcp_server2.devops import configure_devops
+    from src.mcp_server2.metrics import track_request
+
+    # 与 --no-devops 相同：借用/归还不写入DevOps评论，不访问Azure DevOps
+    configure_devops(False)
+
+    ctx = _BenchContext()
+    # 第一台Android设备留给 update_device_status_in_csv，借用/归还使用后面的设备
+    first_android = int(summary["assets"]["android"]) - FIRST_ASSET_NUMBER
+    borrow_asset = asset_number(first_android + 1)
+    bulk_assets = [asset_number(first_android + 2 + i) for i in range(bulk_size)]
+    windows = summary["assets"]["windows"]
+    store = get_device_store()
+
+    def set_all(assets, status, borrower):
+        store.set_statuses([('android', asset, status, borrower) for asset in assets])
+
+    def handler(name, arguments, setup=None):
+        function = getattr(server, f"_handle_{name}")
+
+        async def call():
+            # 处理函数捕获异常后返回错误文本，通过请求记录判断调用是否失败
+            with track_request("tool", name) as request:
+                result = await function(arguments, ctx)
+            if request.error:
+                raise RuntimeError(f"_handle_{name} 失败: {result}")
+
+        return Case(f"handler.{name}", "handler", call, setup=setup, is_async=True)
+
+    return [
+        handler("get_device_info", {"device_id": "Pixel 7", "device_type": "android"}),
+        handler("list_devices", {}),
+        handler("query_devices", {"filter": {"and": [{"brand": ["Samsung", "Google"]}, {"status": "可用"}]}}),
+        handler("get_windows_architectures", {}),
+        handler("query_devices_by_architecture", {"architecture": "arm64"}),
+        handler("get_device_records", {"limit": 50}),
+        handler("find_device_by_asset", {"asset_number": windows}),
+        handler("borrow_device", {"asset_number": borrow_asset, "borrower": "bench"},
+                setup=lambda: set_all([borrow_asset], "可用", "")),
+        handler("return_device", {"asset_number": borrow_asset, "borrower": "bench"},
+                setup=lambda: set_all([borrow_asset], "正在使用", "bench")),
+        handler("borrow_devices", {"asset_numbers": bulk_assets, "borrower": "bench"},
+                setup=lambda: set_all(bulk_assets, "可用", "")),
+        handler("return_devices", {"asset_numbers": bulk_assets, "borrower": "bench"},
+                setup=lambda: set_all(bulk_assets, "正在使用", "bench")),
+    ]
+
+
+def _format_seconds(value):
+    if value >= 1:
+        return f"{value:.3f}s"
+    if value >= 1e-3:
+        return f"{value * 1e3:.3f}ms"
+    return f"{value * 1e6:.1f}µs"
+
+
+def run_benchmarks(data_dir, summary, args):
+    """
+    执行所有计时项目
+
+    Returns:
+        dict: {名称: 统计}
+    """
+    import anyio
+
+    device = device_cases(data_dir, summary, args.store)
+    handlers = handler_cases(summary, args.bulk_size) if not args.skip_handlers else []
+    patterns = args.only or ["*"]
+    selected = [case for case in device + handlers
+                if any(fnmatch.fnmatch(case.name, pattern) for pattern in patterns)]
+
+    results = {}
+
+    def show(case):
+        stats = results[case.name]
+        print(f"  {case.name:<40} {_format_seconds(stats['median']):>12}  "
+              f"(min {_format_seconds(stats['min'])}, {stats['repeat']}×{stats['number']})", flush=True)
+
+    for case in selected:
+        if not case.is_async:
+            results[case.name] = measure(case, args.repeat, args.min_time)
+            show(case)
+
+    async def run_async():
+        for case in selected:
+            if case.is_async:
+                results[case.name] = await measure_async(case, args.repeat, args.min_time)
+                show(case)
+
+    if any(case.is_async for case in selected):
+        anyio.run(run_async)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="设备层与记录层基准测试")
+    parser.add_argument("--devices", type=int, default=10000, help="合成设备总数 (默认10000)")
+    parser.add_argument("--records", type=int, default=100000, help="合成借用/归还记录数 (默认100000)")
+    parser.add_argument("--seed", type=int, default=42, help="数据生成的随机种子")
+    parser.add_argument("--data-dir", default=None,
+                        help="数据目录；目录中没有设备CSV时在其中生成数据，默认使用临时目录")
+    parser.add_argument("--keep", action="store_true", help="保留生成的临时数据目录")
+    parser.add_argument("--store", choices=["csv", "sqlite"], default="csv", help="设备存储后端 (DEVICE_STORE)")
+    parser.add_argument("--state-mode", choices=["csv", "overlay"], default="csv",
+                        help="设备状态存储模式 (DEVICE_STATE_MODE)")
+    parser.add_argument("--repeat", type=int, default=5, help="每个项目的采样次数 (默认5)")
+    parser.add_argument("--min-time", type=float, default=0.05, help="每次采样的最短时间 (秒，默认0.05)")
+    parser.add_argument("--bulk-size", type=int, default=20, help="批量借用/归还的设备数 (默认20)")
+    parser.add_argument("--only", action="append", help="只运行名称匹配的项目 (fnmatch，可多次指定)")
+    parser.add_argument("--skip-handlers", action="store_true", help="不测试MCP工具处理函数")
+    parser.add_argument("--output", default=None, help="结果JSON的输出路径 (默认输出到标准输出)")
+    parser.add_argument("--baseline", default=None, help="与该结果JSON对比")
+    parser.add_argument("--threshold", type=float, default=0.1, help="对比时允许的变慢比例 (默认0.1)")
+    args = parser.parse_args()
+
+    # 存储模式在首次使用设备模块时读取，必须在导入之前设置
+    temporary = args.data_dir is None
+    data_dir = Path(args.data_dir or tempfile.mkdtemp(prefix="device-bench-"))
+    os.environ["DEVICE_DATA_DIR"] = str(data_dir)
+    os.environ["DEVICE_STORE"] = args.store
+    os.environ["DEVICE_STATE_MODE"] = args.state_mode
+
+    try:
+        print(f"📦 合成数据: {args.devices} 台设备, {args.records} 条记录 -> {data_dir}", file=sys.stderr)
+        started = time.perf_counter()
+        if (data_dir / DEVICE_SCHEMAS['android'][0]).exists():
+            # 复用之前生成的数据（--devices/--records 需与生成时一致）
+            print("   目录中已有数据，直接使用", file=sys.stderr)
+            summary = inventory_summary(args.devices, args.records)
+        else:
+            summary = generate_inventory(data_dir, args.devices, args.records, args.seed)
+        if args.store == "sqlite":
+            from src.device.device_store import CsvDeviceStore, SqliteDeviceStore
+            SqliteDeviceStore().import_from(CsvDeviceStore())
+        print(f"   用时 {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        # 计时输出到stderr，标准输出只保留结果JSON
+        stdout, sys.stdout = sys.stdout, sys.stderr
+        try:
+            results = run_benchmarks(data_dir, summary, args)
+        finally:
+            sys.stdout = stdout
+    finally:
+        if temporary and not args.keep:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    output = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "devices": args.devices,
+            "records": args.records,
+            "seed": args.seed,
+            "store": args.store,
+            "state_mode": args.state_mode,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    text = json.dumps(output, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        print(f"✅ 结果已写入 {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        stdout, sys.stdout = sys.stdout, sys.stderr
+        try:
+            regressions = report(baseline, output, args.threshold)
+        finally:
+            sys.stdout = stdout
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
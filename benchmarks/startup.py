@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MCP服务器冷启动报告
+
+- 导入耗时: 在新进程中以 python -X importtime 导入 src.mcp_server2.server，按包汇总各模块自身的导入耗时，
+  并检查 Azure DevOps SDK（azure / msrest）是否被导入
+- 启动耗时: 启动服务器进程，分别计时到 /metrics 第一次响应（开始接受请求）和 /ready 返回200（预热完成），
+  测试默认模式和 --no-devops 模式
+
+用法:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeat 5 --top 20 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .inventory import generate_inventory
+from .load import PROJECT_ROOT, ServerProcess, free_port
+
+SERVER_MODULE = "src.mcp_server2.server"
+
+# Azure DevOps 集成导入的SDK包
+DEVOPS_PACKAGES = ("azure", "msrest")
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_profile(module=SERVER_MODULE):
+    """
+    在新进程中导入模块并解析 -X importtime 的输出
+
+    Returns:
+        list: [(模块名, 自身耗时秒, 累计耗时秒), ...]，按导入完成的顺序
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, name = match.groups()
+            modules.append((name, int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return modules
+
+
+def package_of(name):
+    """模块所属的包（src 下的模块按 src.<子包> 汇总）"""
+    parts = name.split(".")
+    return ".".join(parts[:2]) if parts[0] == "src" and len(parts) > 1 else parts[0]
+
+
+def summarize_imports(modules, module=SERVER_MODULE, top=15):
+    """
+    Returns:
+        dict: 总耗时、按包汇总的耗时（前 top 个）、是否导入了DevOps SDK
+    """
+    total = next((cumulative for name, _, cumulative in modules if name == module), None)
+    packages = {}
+    for name, self_time, _ in modules:
+        package = package_of(name)
+        packages[package] = packages.get(package, 0.0) + self_time
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    devops_modules = [name for name, _, _ in modules if name.split(".")[0] in DEVOPS_PACKAGES]
+    return {
+        "total_ms": round(total * 1000, 1) if total is not None else None,
+        "modules": len(modules),
+        "packages_ms": {package: round(seconds * 1000, 1) for package, seconds in ranked},
+        "devops_sdk_imported": bool(devops_modules),
+        "devops_sdk_ms": round(sum(self_time for name, self_time, _ in modules
+                                   if name.split(".")[0] in DEVOPS_PACKAGES) * 1000, 1),
+    }
+
+
+def time_to_ready(data_dir, work_dir, no_devops, server_args):
+    """
+    启动服务器并计时
+
+    Returns:
+        tuple: (到 /metrics 第一次响应的秒数, 到 /ready 返回200的秒数)
+    """
+    server = ServerProcess(data_dir, free_port(), server_args, work_dir / "server.log", no_devops=no_devops)
+    started = time.perf_counter()
+    try:
+        server.start()
+        server.wait_ready(path="/metrics")
+        listening = time.perf_counter() - started
+        server.wait_ready()
+        return listening, time.perf_counter() - started
+    finally:
+        server.stop()
+
+
+def _summarize_samples(samples):
+    return {"median_ms": round(statistics.median(samples) * 1000, 1), "min_ms": round(min(samples) * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCP服务器冷启动报告")
+    parser.add_argument("--repeat", type=int, default=3, help="每种模式的启动次数 (取中位数，默认3)")
+    parser.add_argument("--top", type=int, default=15, help="列出导入耗时最多的前N个包 (默认15)")
+    parser.add_argument("--devices", type=int, default=2000, help="启动测试使用的合成设备数 (默认2000)")
+    parser.add_argument("--records", type=int, default=20000, help="启动测试使用的借用/归还记录数 (默认20000)")
+    parser.add_argument("--server-arg", action="append", default=[], help="传给服务器的额外参数，可多次指定")
+    parser.add_argument("--output", default=None, help="把报告以JSON写入该文件")
+    args = parser.parse_args()
+
+    profile = summarize_imports(import_profile(), top=args.top)
+    print(f"📦 导入 {SERVER_MODULE}: {profile['total_ms']} ms ({profile['modules']} 个模块)")
+    for package, milliseconds in profile["packages_ms"].items():
+        print(f"   {package:<32}{milliseconds:>9.1f} ms")
+    if profile["devops_sdk_imported"]:
+        print(f"⚠️ 启动时导入了Azure DevOps SDK ({profile['devops_sdk_ms']} ms)")
+    else:
+        print("✅ 启动时没有导入Azure DevOps SDK")
+
+    work_dir = Path(tempfile.mkdtemp(prefix="mcp-startup-"))
+    data_dir = work_dir / "Devices"
+    generate_inventory(data_dir, args.devices, args.records)
+    ready = {}
+    try:
+        for mode, no_devops in (("default", False), ("no_devops", True)):
+            samples = [time_to_ready(data_dir, work_dir, no_devops, args.server_arg) for _ in range(args.repeat)]
+            listening = _summarize_samples([listening for listening, _ in samples])
+            warmed = _summarize_samples([warmed for _, warmed in samples])
+            ready[mode] = {"listening": listening, "ready": warmed}
+            print(f"🚀 启动 ({mode}): 可响应 中位数 {listening['median_ms']} ms, "
+                  f"就绪 中位数 {warmed['median_ms']} ms (最快 {warmed['min_ms']} ms)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        report = {"imports": profile, "time_to_ready": ready, "cpu_count": os.cpu_count()}
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"✅ 报告已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,9 +19,15 @@ def get_az_command():
     
     return "az"  # Fallback to default
 
-def az_login():
+def az_login(az_cmd=None):
+    """
+    Run an interactive az login
+
+    Args:
+        az_cmd (str): Azure CLI command already resolved by the caller; resolved here if omitted
+    """
     try:
-        az_cmd = get_az_command()
+        az_cmd = az_cmd or get_az_command()
         subprocess.run([az_cmd, "login"], check=True)
         print("Login successful.")
         return True  # Return True on success
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Azure DevOps credential manager
+
+Keeps the Azure CLI path, access token, user email and AzureDevOpsClient
+alive for the whole process instead of logging in and out on every call.
+The token is refreshed in the background shortly before it expires.
+"""
+
+import json
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# 确保可以导入同目录下的模块
+current_dir = Path(__file__).parent
+sys.path.insert(0, str(current_dir))
+
+from az_util import az_login, get_az_command
+from deliverable_handler import AzureDevOpsClient
+
+# Azure DevOps resource id used when requesting access tokens
+AZURE_DEVOPS_RESOURCE = "499b84ac-1321-427f-aa17-267ca6975798"
+
+
+class AzureCredentialManager:
+    """
+    Long-lived Azure DevOps credential cache
+
+    - resolves the az binary once
+    - caches the access token and user email until shortly before expiry
+    - refreshes the token on a background timer
+    - reuses a single AzureDevOpsClient while the token is unchanged
+    """
+
+    def __init__(self, refresh_margin=300, client_factory=AzureDevOpsClient):
+        """
+        Args:
+            refresh_margin (int): Seconds before expiry at which the token is refreshed
+            client_factory (callable): Creates a client from a token (replaceable for tests)
+        """
+        self.refresh_margin = refresh_margin
+        self.client_factory = client_factory
+        self._lock = threading.RLock()
+        self._az_cmd = None
+        self._token = None
+        self._expires_at = 0.0
+        self._user_email = None
+        self._email_expires_at = 0.0
+        self._client = None
+        self._client_token = None
+        self._refresh_timer = None
+
+    def get_az_command(self):
+        """
+        Resolve the Azure CLI command once per process
+        """
+        with self._lock:
+            if self._az_cmd is None:
+                self._az_cmd = get_az_command()
+            return self._az_cmd
+
+    def get_token(self):
+        """
+        Get a valid access token, refreshing it only when close to expiry
+
+        Returns:
+            str: Access token, or None if it could not be obtained
+        """
+        with self._lock:
+            if self._token and time.time() < self._expires_at - self.refresh_margin:
+                return self._token
+            return self._refresh_token()
+
+    def get_user_email(self):
+        """
+        Get the signed-in user's email address
+
+        The result is cached until shortly before the current token expires
+        (or for refresh_margin seconds when no token is cached). A failed
+        lookup is cached the same way so a missing az session does not
+        spawn az account show on every call.
+        """
+        with self._lock:
+            now = time.time()
+            if now < self._email_expires_at:
+                return self._user_email
+            self._user_email = self._query_user_email()
+            self._email_expires_at = max(self._expires_at - self.refresh_margin, now + self.refresh_margin)
+            return self._user_email
+
+    def get_client(self):
+        """
+        Get the shared AzureDevOpsClient, recreating it only when the token changes
+
+        Returns:
+            AzureDevOpsClient: Client instance, or None if no token is available
+        """
+        with self._lock:
+            token = self.get_token()
+            if not token:
+                return None
+            if self._client is None or self._client_token != token:
+                self._client = self.client_factory(personal_access_token=token)
+                self._client_token = token
+            return self._client
+
+    def invalidate(self):
+        """
+        Drop the cached token and client (e.g. after an authentication error)
+        """
+        with self._lock:
+            self._token = None
+            self._expires_at = 0.0
+            self._user_email = None
+            self._email_expires_at = 0.0
+            self._client = None
+            self._client_token = None
+            self._cancel_refresh()
+
+    def close(self):
+        """
+        Stop the background refresh timer
+        """
+        with self._lock:
+            self._cancel_refresh()
+
+    def _refresh_token(self):
+        """
+        Fetch a new token from the Azure CLI, logging in only if required
+        """
+        result = self._fetch_token()
+        if result is None:
+            print("[INFO] No cached Azure session, running az login...")
+            try:
+                if az_login(self.get_az_command()) is None:
+                    return None
+            except FileNotFoundError as e:
+                print(f"[ERROR] Azure CLI not found: {e}")
+                return None
+            result = self._fetch_token()
+            if result is None:
+                return None
+
+        self._token, self._expires_at = result
+        if self._user_email is None:
+            # A lookup that failed before this login is no longer valid
+            self._email_expires_at = 0.0
+        self._schedule_refresh()
+        print(f"[INFO] Azure token cached until {datetime.fromtimestamp(self._expires_at)}")
+        return self._token
+
+    def _fetch_token(self):
+        """
+        Run az account get-access-token
+
+        Returns:
+            tuple: (token, expires_at_epoch), or None on failure
+        """
+        try:
+            result = subprocess.run(
+                [self.get_az_command(), "account", "get-access-token",
+                 f"--resource={AZURE_DEVOPS_RESOURCE}", "--output", "json"],
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            data = json.loads(result.stdout)
+            return data["accessToken"], _parse_expiry(data)
+        except (subprocess.CalledProcessError, FileNotFoundError) as e:
+            print(f"[WARNING] Failed to get Azure token: {e}")
+            return None
+        except (json.JSONDecodeError, KeyError, ValueError) as e:
+            print(f"[ERROR] Unexpected az get-access-token output: {e}")
+            return None
+
+    def _query_user_email(self):
+        """
+        Run az account show to get the current user's email
+        """
+        try:
+            result = subprocess.run(
+                [self.get_az_command(), "account", "show", "--query", "user.name", "--output", "tsv"],
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            return result.stdout.strip() or None
+        except (subprocess.CalledProcessError, FileNotFoundError) as e:
+            print(f"[WARNING] Failed to get user email: {e}")
+            return None
+
+    def _schedule_refresh(self):
+        """
+        Refresh the token in the background before it expires
+        """
+        self._cancel_refresh()
+        delay = max(self._expires_at - self.refresh_margin - time.time(), 1.0)
+        self._refresh_timer = threading.Timer(delay, self._background_refresh)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _background_refresh(self):
+        # The current token is still valid for refresh_margin seconds, so fetch
+        # without holding the lock; never run an interactive login from here
+        result = self._fetch_token()
+        with self._lock:
+            self._refresh_timer = None
+            if result is None:
+                print("[WARNING] Background token refresh failed, will retry on next use")
+                return
+            self._token, self._expires_at = result
+            self._schedule_refresh()
+
+    def _cancel_refresh(self):
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+            self._refresh_timer = None
+
+
+def _parse_expiry(data):
+    """
+    Parse the token expiry from az get-access-token output
+
+    Newer Azure CLI versions return expires_on (epoch seconds); older ones only
+    return expiresOn as a local time string.
+    """
+    if data.get("expires_on"):
+        return float(data["expires_on"])
+    expires_on = data["expiresOn"]
+    for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(expires_on, fmt).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"Unknown expiresOn format: {expires_on}")
+
+
+_credential_manager = None
+_credential_manager_lock = threading.Lock()
+
+
+def get_credential_manager():
+    """
+    Get the process-wide credential manager
+    """
+    global _credential_manager
+    if _credential_manager is None:
+        with _credential_manager_lock:
+            if _credential_manager is None:
+                _credential_manager = AzureCredentialManager()
+    return _credential_manager
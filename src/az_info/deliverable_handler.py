@@ -1,12 +1,15 @@
-from azure.devops.connection import Connection
-from msrest.authentication import BasicAuthentication
 import pprint
 # pip show azure-devops to check your version,
 # TODO improve with virtual env of python
-from azure.devops.v7_1.work_item_tracking.models import JsonPatchOperation
+# The azure-devops/msrest SDK takes ~150ms to import, so it is imported on first use
+# rather than at module load (importing this module stays cheap for read-only servers)
+
 
 class AzureDevOpsClient:
     def __init__(self, personal_access_token):
+        from azure.devops.connection import Connection
+        from msrest.authentication import BasicAuthentication
+
         self.organization_url = 'https://microsoft.visualstudio.com/'
         self.credentials = BasicAuthentication('', personal_access_token)
         self.connection = Connection(base_url=self.organization_url, creds=self.credentials)
@@ -15,6 +18,8 @@ class AzureDevOpsClient:
         self.core_client = self.connection.clients.get_core_client()
 
     def create_deliverable_with_parent(self, title, description, parent_url):
+        from azure.devops.v7_1.work_item_tracking.models import JsonPatchOperation
+
         patch_document = [
             JsonPatchOperation(
                 op='add',
@@ -178,6 +183,8 @@ class AzureDevOpsClient:
         Returns:
             Boolean indicating success/failure
         """
+        from azure.devops.v7_1.work_item_tracking.models import JsonPatchOperation
+
         try:
             # Create patch document to add comment
             patch_document = [
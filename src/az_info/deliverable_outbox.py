@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Durable outbox for Azure DevOps deliverable comments
+
+Comments are appended to a local append-only file and acknowledged
+immediately. A background worker drains the file to Azure DevOps with
+retries, coalescing all pending comments for the same deliverable into a
+single System.History patch.
+
+Several server processes may share one outbox file. Every read-modify-write
+of the file holds an exclusive lock on <outbox>.lock, and each entry has an
+owner so that exactly one worker delivers it:
+
+- entry ids are random uuids, so processes never collide
+- each outbox instance has an owner id and only drains entries it owns
+- an owner with pending entries keeps a lease in the file, renewed before
+  it runs out; entries whose owner holds no live lease (its process exited
+  or crashed) are claimed by the next worker that syncs with the file
+- before every drain the worker re-reads the file and drops entries that
+  were acknowledged or claimed by another process in the meantime
+
+File format (one JSON object per line):
+    {"id": "3f2b...", "owner": "1234-a1b2c3d4", "deliverable_id": 59278704, "comment": "borrow 123", "ts": 1700000000.0}
+    {"lease": "1234-a1b2c3d4", "expires": 1700000120.0}
+    {"claim": ["3f2b..."], "owner": "5678-e5f6a7b8"}
+    {"ack": ["3f2b...", "9c41..."]}
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def get_outbox_path():
+    """
+    Default outbox location: Devices/devops_outbox.log (honours DEVICE_DATA_DIR)
+    """
+    data_dir = os.environ.get('DEVICE_DATA_DIR')
+    if data_dir:
+        return Path(data_dir) / "devops_outbox.log"
+    return Path(__file__).parent.parent.parent / "Devices" / "devops_outbox.log"
+
+
+class DeliverableOutbox:
+    """
+    Append-only outbox drained by a background worker
+
+    The client only needs an add_comment_to_deliverable(deliverable_id, comment_text)
+    method returning True/False, so a local stub can be used in tests.
+    """
+
+    def __init__(self, path, client_provider, flush_interval=2.0,
+                 retry_base=2.0, retry_max=300.0, lease_seconds=120.0, on_failure=None):
+        """
+        Args:
+            path (Path): Outbox file path
+            client_provider (callable): Returns a client (or None if unavailable)
+            flush_interval (float): Seconds to wait for more comments before draining
+            retry_base (float): Initial retry delay after a failed drain
+            retry_max (float): Maximum retry delay
+            lease_seconds (float): How long other processes leave this instance's
+                entries alone after the last lease renewal
+            on_failure (callable): Called once per drain that failed to create the
+                client or deliver a batch (e.g. to drop cached credentials)
+        """
+        self.path = Path(path)
+        self.client_provider = client_provider
+        self.on_failure = on_failure
+        self.flush_interval = flush_interval
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lease_seconds = lease_seconds
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lease_expires = 0.0
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending = OrderedDict()  # id -> entry
+        self._worker = None
+        self._stopping = False
+        self._stop_event = threading.Event()
+        self._retry_delay = 0.0
+
+        # Delivery statistics (patch calls to Azure DevOps)
+        self.deliveries = 0
+        self.delivery_failures = 0
+        self.delivery_seconds = 0.0
+
+        self._load()
+
+    def enqueue(self, comment_text, deliverable_id):
+        """
+        Durably record a comment and return immediately
+
+        Args:
+            comment_text (str): Comment text
+            deliverable_id (int): Target deliverable
+
+        Returns:
+            str: Outbox entry id
+        """
+        with self._lock:
+            entry = {
+                "id": uuid.uuid4().hex,
+                "owner": self.owner,
+                "deliverable_id": deliverable_id,
+                "comment": comment_text,
+                "ts": time.time(),
+            }
+            # The lease goes out in the same locked write, so no other process
+            # can see the entry without a live owner and claim it
+            with self._file_lock():
+                self._write_lines([entry] + self._lease_lines(time.time()))
+            self._pending[entry["id"]] = entry
+            self._wakeup.notify()
+        self._ensure_worker()
+        return entry["id"]
+
+    def pending_count(self):
+        """
+        Number of comments not yet delivered
+        """
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self):
+        """
+        Delivery statistics
+
+        Returns:
+            dict: pending/deliveries/delivery_failures/delivery_seconds
+        """
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "deliveries": self.deliveries,
+                "delivery_failures": self.delivery_failures,
+                "delivery_seconds": self.delivery_seconds,
+            }
+
+    def drain_once(self):
+        """
+        Deliver all pending comments, one patch per deliverable
+
+        Returns:
+            bool: True if nothing is left pending
+        """
+        with self._lock:
+            self._sync()
+            batches = OrderedDict()
+            for entry in self._pending.values():
+                batches.setdefault(entry["deliverable_id"], []).append(entry)
+
+        if not batches:
+            return True
+
+        try:
+            client = self.client_provider()
+        except Exception as e:
+            print(f"[ERROR] Outbox: failed to create Azure DevOps client: {e}")
+            self._failed()
+            return False
+        if client is None:
+            print("[WARNING] Outbox: Azure DevOps client unavailable, will retry")
+            return False
+
+        all_delivered = True
+        for deliverable_id, entries in batches.items():
+            # System.History is HTML, so coalesce comments with line breaks
+            combined = "<br>".join(entry["comment"] for entry in entries)
+            started = time.perf_counter()
+            try:
+                success = client.add_comment_to_deliverable(deliverable_id, combined)
+            except Exception as e:
+                print(f"[ERROR] Outbox: failed to deliver to {deliverable_id}: {e}")
+                success = False
+            with self._lock:
+                self.delivery_seconds += time.perf_counter() - started
+                if success:
+                    self.deliveries += 1
+                else:
+                    self.delivery_failures += 1
+
+            if not success:
+                all_delivered = False
+                continue
+
+            ids = [entry["id"] for entry in entries]
+            with self._lock:
+                with self._file_lock():
+                    self._write_lines([{"ack": ids}])
+                for entry_id in ids:
+                    self._pending.pop(entry_id, None)
+            print(f"[SUCCESS] Outbox: delivered {len(ids)} comment(s) to deliverable {deliverable_id}")
+
+        if not all_delivered:
+            self._failed()
+        with self._lock:
+            if all_delivered and not self._pending:
+                self._compact()
+        return all_delivered
+
+    def _failed(self):
+        if self.on_failure is None:
+            return
+        try:
+            self.on_failure()
+        except Exception as e:
+            print(f"[ERROR] Outbox: failure callback raised: {e}")
+
+    def close(self, timeout=5.0):
+        """
+        Stop the worker after a final drain attempt
+        """
+        with self._lock:
+            self._stopping = True
+            self._stop_event.set()
+            self._wakeup.notify()
+            worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None and not self._stopping:
+                self._worker = threading.Thread(
+                    target=self._run, name="deliverable-outbox", daemon=True
+                )
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._stopping:
+                    # While idle, periodically claim entries left behind by
+                    # processes that exited before delivering them
+                    if not self._wakeup.wait(self.lease_seconds) and not self._stopping:
+                        self._sync()
+                if self._stopping and not self._pending:
+                    return
+                stopping = self._stopping
+
+            # Wait briefly so bursts of comments end up in one patch
+            # (close() interrupts the wait for a final drain)
+            if not stopping:
+                self._stop_event.wait(max(self.flush_interval, self._retry_delay))
+
+            if self.drain_once():
+                self._retry_delay = 0.0
+            else:
+                self._retry_delay = min(
+                    max(self._retry_delay * 2, self.retry_base), self.retry_max
+                )
+                print(f"[WARNING] Outbox: {self.pending_count()} comment(s) pending, "
+                      f"retrying in {self._retry_delay:.0f}s")
+                if stopping:
+                    return
+
+    def _load(self):
+        """
+        Rebuild the pending set from the outbox file after a restart
+        """
+        with self._lock:
+            self._sync()
+            if self._pending:
+                print(f"[INFO] Outbox: {len(self._pending)} undelivered comment(s) found")
+
+    def _sync(self):
+        """
+        Reconcile the pending set with the shared file (caller holds the lock)
+
+        Drops entries that another process acknowledged or claimed, claims
+        entries whose owner holds no live lease, and renews this instance's
+        lease while it has pending entries.
+
+        Returns:
+            int: Number of entries claimed from other owners
+        """
+        with self._file_lock():
+            entries, leases = self._read_state()
+            now = time.time()
+            for entry_id in list(self._pending):
+                entry = entries.get(entry_id)
+                if entry is None or entry.get("owner") != self.owner:
+                    self._pending.pop(entry_id)
+            orphans = [entry for entry in entries.values()
+                       if entry.get("owner") != self.owner and leases.get(entry.get("owner"), 0.0) <= now]
+            lines = []
+            if orphans:
+                lines.append({"claim": [entry["id"] for entry in orphans], "owner": self.owner})
+                for entry in orphans:
+                    entry["owner"] = self.owner
+                    self._pending[entry["id"]] = entry
+                # A claim always comes with a fresh lease
+                self._lease_expires = 0.0
+            lines.extend(self._lease_lines(now, bool(self._pending)))
+            if lines:
+                self._write_lines(lines)
+        if orphans:
+            print(f"[INFO] Outbox: claimed {len(orphans)} undelivered comment(s) from exited processes")
+        return len(orphans)
+
+    def _lease_lines(self, now, needed=True):
+        """
+        Lease renewal line once a third of the lease is used up (caller holds the file lock)
+
+        Args:
+            now (float): Current time
+            needed (bool): Whether this instance owns entries that need a lease
+        """
+        if not needed or self._lease_expires - now > self.lease_seconds * 2 / 3:
+            return []
+        self._lease_expires = now + self.lease_seconds
+        return [{"lease": self.owner, "expires": self._lease_expires}]
+
+    def _read_state(self):
+        """
+        Unacknowledged entries and live leases in the outbox file (caller holds the file lock)
+
+        Returns:
+            tuple: (OrderedDict id -> entry with its current owner, dict owner -> lease expiry)
+        """
+        entries = OrderedDict()
+        leases = {}
+        if not self.path.exists():
+            return entries, leases
+        with open(self.path, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn last line from a crash mid-write
+                    continue
+                if "ack" in item:
+                    for entry_id in item["ack"]:
+                        entries.pop(entry_id, None)
+                elif "lease" in item:
+                    leases[item["lease"]] = max(leases.get(item["lease"], 0.0), item["expires"])
+                elif "claim" in item:
+                    for entry_id in item["claim"]:
+                        if entry_id in entries:
+                            entries[entry_id]["owner"] = item["owner"]
+                else:
+                    # Entries written before owners existed have no owner and are claimable
+                    entries[item["id"]] = item
+        return entries, leases
+
+    def _write_lines(self, items):
+        """
+        Append lines and fsync them (caller holds the file lock)
+        """
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write("".join(json.dumps(item, ensure_ascii=False) + "\n" for item in items))
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _compact(self):
+        """
+        Rewrite the file without acknowledged entries (caller holds the lock)
+
+        Entries appended by other processes and not yet acknowledged are kept
+        together with their owners' live leases, so the file is only emptied
+        once every process has delivered its comments.
+        """
+        with self._file_lock():
+            remaining, leases = self._read_state()
+            now = time.time()
+            owners = {entry.get("owner") for entry in remaining.values()}
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                for owner, expires in leases.items():
+                    if owner in owners and expires > now:
+                        file.write(json.dumps({"lease": owner, "expires": expires}) + "\n")
+                for entry in remaining.values():
+                    file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+            self._lease_expires = 0.0
+
+    @contextmanager
+    def _file_lock(self):
+        """
+        Exclusive lock on <outbox>.lock shared by every process using this outbox
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path.with_name(self.path.name + ".lock"),
+                     os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+        try:
+            if fcntl is not None:
+                # Closing the descriptor releases the lock
+                fcntl.lockf(fd, fcntl.LOCK_EX)
+                yield
+                return
+            # msvcrt.locking raises OSError after retrying for ~10s
+            while True:
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+            try:
+                yield
+            finally:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
@@ -15,7 +15,12 @@ current_dir = Path(__file__).parent
 sys.path.insert(0, str(current_dir))
 
 from az_util import az_login, get_azure_token, get_user_info, get_user_email
+from credential_manager import get_credential_manager
 from deliverable_handler import AzureDevOpsClient
+from deliverable_outbox import DeliverableOutbox, get_outbox_path
+
+# 记录借用/归还评论的deliverable
+DELIVERABLE_ID = 59278704
 
 
 def az_logout():
@@ -66,58 +71,34 @@ def record_in_deliverable(comment_text):
     """
     在deliverable中记录comment
     
+    凭据（az路径、token、用户邮箱、AzureDevOpsClient）由进程级的
+    AzureCredentialManager缓存，不再每次调用都登录/登出
+    
     Args:
         comment_text (str): 要添加到deliverable discussion中的评论内容
     
     Returns:
         tuple: 成功返回(True, user_email)，失败返回(False, None)
     """
-    azure_devops_client = None
-    login_successful = False
-    user_email = None
+    credential_manager = get_credential_manager()
     
     try:
-        print("[INFO] Initializing Azure connection...")
-        
-        # Step 1: Check Azure CLI
-        az_path = check_azure_cli()
-        if not az_path:
-            print("[ERROR] Azure CLI not found!")
-            return False, None
-        
-        # Step 2: Login
-        login_result = az_login()
-        if login_result is None:
-            print("[ERROR] Azure login failed!")
-            return False, None
-        
-        login_successful = True  # 标记登录成功
-        
-        # Step 3: Get user email
-        user_email = get_user_email()
-        if user_email:
-            print(f"[INFO] Current user email: {user_email}")
-        else:
-            print("[WARNING] Failed to get user email, but continuing...")
-        
-        # Step 4: Get token
-        token = get_azure_token()
-        if not token:
+        # Step 1: Get cached client (token is refreshed only when close to expiry)
+        azure_devops_client = credential_manager.get_client()
+        if azure_devops_client is None:
             print("[ERROR] Failed to get Azure token!")
             return False, None
         
-        # Step 5: Create client
-        azure_devops_client = AzureDevOpsClient(personal_access_token=token)
-        print("[SUCCESS] Azure connection initialized!")
-        
-        # 使用固定的deliverable ID
-        deliverable_id = 59278704
+        # Step 2: Get cached user email
+        user_email = credential_manager.get_user_email()
+        if not user_email:
+            print("[WARNING] Failed to get user email, but continuing...")
         
-        print(f"[INFO] Recording comment in deliverable {deliverable_id}: {comment_text}")
+        print(f"[INFO] Recording comment in deliverable {DELIVERABLE_ID}: {comment_text}")
         
-        # 添加comment到deliverable
-        success = azure_devops_client.update_deliverable_with_comment(
-            deliverable_id, 
+        # 直接添加comment（一次HTTP请求；deliverable不存在时更新本身会失败）
+        success = azure_devops_client.add_comment_to_deliverable(
+            DELIVERABLE_ID, 
             comment_text
         )
         
@@ -125,18 +106,88 @@ def record_in_deliverable(comment_text):
             print(f"[SUCCESS] Comment recorded successfully: {comment_text}")
             return True, user_email
         else:
+            # 可能是token失效，丢弃缓存以便下次重新获取
+            credential_manager.invalidate()
             print(f"[ERROR] Failed to record comment: {comment_text}")
             return False, None
             
     except Exception as e:
+        credential_manager.invalidate()
         print(f"[ERROR] Exception while recording comment: {e}")
         return False, None
-        
-    finally:
-        # 清理：如果登录成功，执行登出
-        if login_successful:
-            print("[INFO] Cleaning up: performing Azure logout...")
-            az_logout()
+
+
+_outbox = None
+
+
+def get_deliverable_outbox():
+    """
+    获取进程级的deliverable评论发件箱（首次调用时创建）
+    """
+    global _outbox
+    if _outbox is None:
+        _outbox = DeliverableOutbox(
+            get_outbox_path(),
+            client_provider=_outbox_client,
+            on_failure=_outbox_failed,
+        )
+    return _outbox
+
+
+def _outbox_client():
+    """
+    发件箱后台线程使用的client
+    """
+    return get_credential_manager().get_client()
+
+
+def _outbox_failed():
+    """
+    发件箱投递失败：可能是token失效（客户端不区分401），与同步路径一样丢弃缓存以便下次重新获取
+    """
+    get_credential_manager().invalidate()
+
+
+def queue_in_deliverable(comment_text):
+    """
+    将comment写入本地发件箱后立即返回，由后台线程批量发送到deliverable
+    
+    Args:
+        comment_text (str): 要添加到deliverable discussion中的评论内容
+    
+    Returns:
+        tuple: 成功返回(True, user_email)，失败返回(False, None)
+               user_email 通过凭据缓存同步解析（每个token有效期内最多执行一次az命令），
+               同一个人的借用和归还使用相同的借用者；获取失败时为None，不影响结果
+    """
+    try:
+        get_deliverable_outbox().enqueue(comment_text, DELIVERABLE_ID)
+    except OSError as e:
+        print(f"[ERROR] Failed to write outbox: {e}")
+        return False, None
+    
+    print(f"[INFO] Comment queued for deliverable {DELIVERABLE_ID}: {comment_text}")
+    credential_manager = get_credential_manager()
+    # 先获取client（必要时登录）再查询邮箱：未登录时查询失败的None会被缓存refresh_margin秒
+    credential_manager.get_client()
+    return True, credential_manager.get_user_email()
+
+
+def get_outbox_stats():
+    """
+    发件箱的投递统计（发件箱尚未创建时返回None）
+    """
+    if _outbox is None:
+        return None
+    return _outbox.stats()
+
+
+def close_deliverable_outbox(timeout=5.0):
+    """
+    停止发件箱后台线程（退出前尝试发送剩余评论）
+    """
+    if _outbox is not None:
+        _outbox.close(timeout)
 
 
 def main():
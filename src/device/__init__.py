@@ -0,0 +1,9 @@
+"""
+设备数据读取与管理
+"""
+
+import logging
+
+# 作为库导入时（如被MCP服务器导入）默认只输出警告和错误，
+# __main__ 演示通过 src.utils.logging_utils.enable_console_logging() 打开详细输出
+logging.getLogger(__name__).setLevel(logging.WARNING)
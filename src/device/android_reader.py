@@ -4,10 +4,18 @@
 Android设备CSV文件读取器
 """
 
-import csv
-import os
+import logging
+import sys
 from pathlib import Path
 
+try:
+    from .device_store import get_device_store
+except ImportError:  # 作为脚本直接运行时
+    sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+    from src.device.device_store import get_device_store
+
+logger = logging.getLogger(__name__)
+
 
 def read_android_devices():
     """
@@ -22,64 +30,50 @@ def read_android_devices():
         Exception: 其他读取错误时抛出
     """
     try:
-        # 获取项目根目录
-        current_dir = Path(__file__).parent.parent.parent
-        csv_file_path = current_dir / "Devices" / "android_devices.csv"
-        
-        # 检查文件是否存在
-        if not csv_file_path.exists():
-            raise FileNotFoundError(f"Android设备CSV文件未找到: {csv_file_path}")
-        
-        devices = []
+        # 从设备存储获取（CSV文件未变化时不会重新解析）
+        store = get_device_store()
+        devices = store.get_devices('android')
+        csv_file_path = store.location('android')
+        fieldnames = store.fieldnames('android')
         
-        # 读取CSV文件
-        with open(csv_file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            
-            # 验证是否有数据
-            fieldnames = reader.fieldnames
-            if not fieldnames:
-                raise Exception("CSV文件格式错误：未找到列标题")
-            
-            # 读取所有行
-            for row_num, row in enumerate(reader, start=2):  # 从第2行开始计数（考虑标题行）
-                if any(row.values()):  # 跳过空行
-                    devices.append(row)
-        
-        print(f"✅ Android设备CSV文件读取成功！")
-        print(f"📁 文件路径: {csv_file_path}")
-        print(f"📊 共读取到 {len(devices)} 条设备记录")
-        print(f"📋 字段列表: {', '.join(fieldnames)}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("✅ Android设备CSV文件读取成功！")
+            logger.info("📁 文件路径: %s", csv_file_path)
+            logger.info("📊 共读取到 %d 条设备记录", len(devices))
+            logger.info("📋 字段列表: %s", ', '.join(fieldnames))
         
         return devices
         
     except FileNotFoundError as e:
-        print(f"❌ 文件未找到错误: {e}")
+        logger.error("❌ 文件未找到错误: %s", e)
         raise
     except UnicodeDecodeError as e:
-        print(f"❌ 文件编码错误: {e}")
-        print("💡 建议：请确保CSV文件使用UTF-8编码保存")
+        logger.error("❌ 文件编码错误: %s", e)
+        logger.error("💡 建议：请确保CSV文件使用UTF-8编码保存")
         raise
     except Exception as e:
-        print(f"❌ 读取Android设备CSV文件失败: {e}")
+        logger.error("❌ 读取Android设备CSV文件失败: %s", e)
         raise
 
 
 if __name__ == "__main__":
+    from src.utils.logging_utils import enable_console_logging
+    enable_console_logging()
+    
     try:
         devices = read_android_devices()
         
         # 显示前3条记录作为示例
         if devices:
-            print(f"\n📱 前3条设备记录示例:")
+            logger.info(f"\n📱 前3条设备记录示例:")
             for i, device in enumerate(devices[:3], 1):
-                print(f"\n设备 {i}:")
+                logger.info(f"\n设备 {i}:")
                 for key, value in device.items():
                     if value.strip():  # 只显示非空字段
-                        print(f"  {key}: {value}")
+                        logger.info(f"  {key}: {value}")
         else:
-            print("⚠️  未读取到任何设备记录")
+            logger.warning("⚠️  未读取到任何设备记录")
             
     except Exception as e:
-        print(f"❌ 程序执行失败: {e}")
+        logger.error(f"❌ 程序执行失败: {e}")
         exit(1)
\ No newline at end of file
@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+设备目录（DeviceCatalog）
+进程内共享的设备CSV缓存：每个CSV文件只解析一次，
+仅当文件的 mtime/size/inode 发生变化时才重新加载；
+overlay 模式下设备状态来自 device_state.log，CSV只在压缩时重写；
+分面计数（FacetIndex）和组合查询的倒排索引（DeviceIndex）随表的加载和状态变化增量维护，
+名称搜索索引（NameSearchIndex）随表的加载失效
+"""
+
+import csv
+import logging
+import os
+import threading
+from pathlib import Path
+
+from .facets import FacetIndex, facet_key
+from .locks import get_file_locks
+from .name_search import NameSearchIndex
+from .query import DeviceIndex
+from .state_store import DeviceStateStore, get_state_mode
+from ..utils.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+# 设备类型 -> CSV文件名
+DEVICE_FILES = {
+    'android': 'android_devices.csv',
+    'ios': 'ios_devices.csv',
+    'windows': 'windows_devices.csv',
+    'other': 'other_devices.csv',
+}
+
+# 设备类型 -> 错误信息中使用的显示名称
+DEVICE_LABELS = {
+    'android': 'Android',
+    'ios': 'iOS',
+    'windows': 'Windows',
+    'other': '其他',
+}
+
+
+def get_devices_dir():
+    """
+    获取设备数据目录
+
+    默认为项目根目录下的 Devices/，可通过环境变量 DEVICE_DATA_DIR 覆盖
+
+    Returns:
+        Path: 设备数据目录
+    """
+    env_dir = os.environ.get('DEVICE_DATA_DIR')
+    if env_dir:
+        return Path(env_dir)
+    return Path(__file__).parent.parent.parent / "Devices"
+
+
+def file_signature(path):
+    """
+    获取文件签名，用于判断文件是否被修改
+
+    Args:
+        path (Path): 文件路径
+
+    Returns:
+        tuple: (mtime_ns, size, inode)
+    """
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+# 每个表保留的行修改记录数上限，超出时丢弃较早的一半（落后太多的上层缓存整表重建）
+MAX_ROW_CHANGES = 4096
+
+
+class DeviceTable:
+    """单个设备CSV文件的解析结果"""
+
+    def __init__(self, device_type, path, fieldnames, rows, signature):
+        self.device_type = device_type
+        self.path = path
+        self.fieldnames = fieldnames
+        self.rows = rows
+        self.signature = signature
+        # 加载后被修改过的行位置，按修改顺序；changes_start 为 changes[0] 的序号
+        self.changes = []
+        self.changes_start = 0
+
+    @property
+    def version(self):
+        """行修改的序号：加载后每修改一行加一"""
+        return self.changes_start + len(self.changes)
+
+    def copy_rows(self):
+        """返回行的浅拷贝，调用方可以自由修改而不影响缓存"""
+        return [dict(row) for row in self.rows]
+
+
+class DeviceCatalog:
+    """
+    进程内共享的设备目录
+
+    所有 read_*_devices 读取器都通过同一个实例获取数据，
+    每次访问只做一次 stat 检查，文件未变化时直接返回内存中的行
+    """
+
+    def __init__(self, devices_dir=None, state_store=None):
+        """
+        Args:
+            devices_dir (Path): 设备数据目录，默认使用 get_devices_dir()
+            state_store (DeviceStateStore): 设备状态覆盖层，为None时状态直接写在CSV中
+        """
+        self.devices_dir = Path(devices_dir) if devices_dir else get_devices_dir()
+        self.state_store = state_store
+        self._tables = {}
+        self._lock = threading.RLock()
+        # 资产编号索引：每个表内 资产编号 -> 行号，以及全局 资产编号 -> (设备类型, 行号)
+        self._table_assets = {}
+        self._asset_index = {}
+        # 设备类型 × 状态 × 架构 × 品牌 × manager 的计数
+        self.facets = FacetIndex()
+        # 按列的倒排索引，供 DeviceQuery 组合查询
+        self.query_index = DeviceIndex()
+        # 设备名称/序列号/SKU/品牌的 n-gram 索引，供模糊搜索
+        self.name_index = NameSearchIndex()
+        # 任意表重新加载时递增，供上层缓存判断数据是否变化
+        self.generation = 0
+        # 设备类型 -> 上次警告时的 (文件签名, 错误信息)，同一个错误只警告一次
+        self._table_errors = {}
+
+    def get_path(self, device_type):
+        """获取设备类型对应的CSV文件路径"""
+        if device_type not in DEVICE_FILES:
+            raise ValueError(f"不支持的设备类型: {device_type}")
+        return self.devices_dir / DEVICE_FILES[device_type]
+
+    def skip_table(self, device_type, error):
+        """
+        记录跳过某个设备表的原因
+
+        每次查询都会检查所有表，缺失或损坏的表在文件变化之前只警告一次，之后的重复错误记为DEBUG
+
+        Args:
+            device_type (str): 设备类型
+            error (Exception): get_table 抛出的异常
+        """
+        try:
+            signature = file_signature(self.get_path(device_type))
+        except OSError:
+            signature = None
+        key = (signature, str(error))
+        with self._lock:
+            repeated = self._table_errors.get(device_type) == key
+            self._table_errors[device_type] = key
+        if repeated:
+            logger.debug("跳过%s设备表: %s", device_type, error)
+        else:
+            logger.warning("跳过%s设备表: %s", device_type, error)
+
+    def get_table(self, device_type):
+        """
+        获取设备表，文件变化时自动重新加载
+
+        Args:
+            device_type (str): 设备类型 (android/ios/windows/other)
+
+        Returns:
+            DeviceTable: 设备表
+
+        Raises:
+            FileNotFoundError: 文件不存在时抛出
+            UnicodeDecodeError: 编码错误时抛出
+            Exception: CSV格式错误时抛出
+        """
+        csv_file_path = self.get_path(device_type)
+        with self._lock:
+            # 先同步覆盖层：重新加载的表要覆盖最新的状态，而不是上一代日志的状态
+            self._sync_states()
+            try:
+                signature = file_signature(csv_file_path)
+            except FileNotFoundError:
+                if device_type in self._tables:
+                    self._drop_table(device_type)
+                raise FileNotFoundError(
+                    f"{DEVICE_LABELS[device_type]}设备CSV文件未找到: {csv_file_path}"
+                )
+
+            table = self._tables.get(device_type)
+            if table is None or table.signature != signature:
+                table = self._load_table(device_type, csv_file_path, signature)
+                self._apply_states(table, self.state_store.all_states() if self.state_store else {})
+                self._set_table(table)
+                # 表恢复后再次出错时重新警告
+                self._table_errors.pop(device_type, None)
+            return table
+
+    def get_devices(self, device_type):
+        """获取设备列表（拷贝）"""
+        return self.get_table(device_type).copy_rows()
+
+    def query(self, device_type, query):
+        """
+        在一个设备表中执行组合查询（倒排索引求值，不扫描设备行）
+
+        Args:
+            device_type (str): 设备类型
+            query (DeviceQuery): 查询条件
+
+        Returns:
+            list: 命中行的拷贝，按文件中的顺序排列
+
+        Raises:
+            FileNotFoundError: 文件不存在时抛出
+        """
+        with self._lock:
+            table = self.get_table(device_type)
+            return [dict(table.rows[position]) for position in self.query_index.search(device_type, query)]
+
+    def search(self, device_types, text, limit=5, min_score=0.3):
+        """
+        按设备名称、序列号、SKU或品牌模糊搜索（n-gram 索引，返回排序后的前 limit 个候选）
+
+        Args:
+            device_types (list): 设备类型，文件不存在的类型被跳过
+            text (str): 搜索文本
+            limit (int): 最多返回的候选数
+            min_score (float): 最低分数
+
+        Returns:
+            list: [(device_type, device, score), ...]，device 为行的拷贝，按分数从高到低
+        """
+        with self._lock:
+            for device_type in device_types:
+                try:
+                    self.get_table(device_type)
+                except FileNotFoundError as e:
+                    self.skip_table(device_type, e)
+            return [(device_type, dict(self._tables[device_type].rows[position]), score)
+                    for score, device_type, position
+                    in self.name_index.search(text, device_types, limit, min_score)]
+
+    def invalidate(self, device_type=None):
+        """
+        丢弃缓存，下次访问时重新加载
+
+        Args:
+            device_type (str): 设备类型，为None时丢弃所有表
+        """
+        with self._lock:
+            for dtype in ([device_type] if device_type else list(self._tables)):
+                if dtype in self._tables:
+                    self._drop_table(dtype)
+            self.generation += 1
+
+    def changed_rows(self, device_type, token=None):
+        """
+        自上次调用以来修改过的行，供上层缓存按行更新
+
+        Args:
+            device_type (str): 设备类型
+            token: 上次调用返回的标识，首次为None
+
+        Returns:
+            tuple: (token, reset, changes)，changes 为 [(行位置, 行的拷贝), ...]；
+                   reset 为True时表已重新加载（或修改记录已丢弃），changes 包含所有行
+
+        Raises:
+            FileNotFoundError: 文件不存在时抛出
+        """
+        with self._lock:
+            table = self.get_table(device_type)
+            new_token = (table, table.version)
+            if token is not None and token[0] is table and token[1] >= table.changes_start:
+                positions = dict.fromkeys(table.changes[token[1] - table.changes_start:])
+                return new_token, False, [(position, dict(table.rows[position])) for position in positions]
+            return new_token, True, [(position, dict(row)) for position, row in enumerate(table.rows)]
+
+    def find_asset(self, asset_number):
+        """
+        根据资产编号查找设备（哈希索引，不扫描设备表）
+
+        Args:
+            asset_number (str): 资产编号
+
+        Returns:
+            tuple: (device_info, device_type)，device_info为行的拷贝；未找到返回 (None, None)
+        """
+        asset_number = asset_number.strip()
+        with self._lock:
+            # 只做stat检查，文件变化的表会被重新加载并增量更新索引
+            for device_type in DEVICE_FILES:
+                try:
+                    self.get_table(device_type)
+                except Exception as e:
+                    self.skip_table(device_type, e)
+
+            entry = self._asset_index.get(asset_number)
+            if entry is None:
+                return None, None
+            device_type, position = entry
+            return dict(self._tables[device_type].rows[position]), device_type
+
+    def apply_update(self, device_type, asset_number, changes, signature=None):
+        """
+        将已写入磁盘的单行修改同步到缓存，避免重新解析整个文件
+
+        Args:
+            device_type (str): 设备类型
+            asset_number (str): 资产编号
+            changes (dict): 需要更新的字段
+            signature (tuple): 写入后的文件签名，为None时不更新签名（下次访问会重新加载）
+
+        Returns:
+            bool: 缓存中是否存在该设备
+        """
+        with self._lock:
+            table = self._tables.get(device_type)
+            position = self._table_assets.get(device_type, {}).get(asset_number.strip())
+            if table is None or position is None:
+                return False
+            row = table.rows[position]
+            old_row = dict(row)
+            row.update(changes)
+            self._row_changed(device_type, position, old_row, row)
+            if signature is not None:
+                table.signature = signature
+            self.generation += 1
+            return True
+
+    def set_state(self, device_type, asset_number, status, borrower):
+        """
+        overlay 模式下更新设备状态：只向 device_state.log 追加一条，不重写CSV
+
+        Args:
+            device_type (str): 设备类型
+            asset_number (str): 资产编号
+            status (str): 设备状态
+            borrower (str): 借用者（归还时为空）
+
+        Returns:
+            bool: 缓存中是否存在该设备
+        """
+        if self.state_store is None:
+            raise RuntimeError("设备目录未启用状态覆盖层 (DEVICE_STATE_MODE=overlay)")
+        asset_number = asset_number.strip()
+        with self._lock:
+            self._sync_states()
+            self._apply_changed_states(
+                self.state_store.set_states({asset_number: {'设备状态': status, '借用者': borrower}})
+            )
+            found = self.apply_update(device_type, asset_number, {'设备状态': status, '借用者': borrower})
+            if self.state_store.entry_count >= self.state_store.compact_threshold:
+                self.compact_states()
+            return found
+
+    def set_states(self, changes):
+        """
+        overlay 模式下批量更新设备状态：所有状态在 device_state.log 中追加一次
+
+        Args:
+            changes (list): [(device_type, asset_number, status, borrower), ...]
+
+        Returns:
+            int: 缓存中存在的设备数
+        """
+        if self.state_store is None:
+            raise RuntimeError("设备目录未启用状态覆盖层 (DEVICE_STATE_MODE=overlay)")
+        states = {
+            asset_number.strip(): {'设备状态': status, '借用者': borrower}
+            for _, asset_number, status, borrower in changes
+        }
+        with self._lock:
+            self._sync_states()
+            self._apply_changed_states(self.state_store.set_states(states))
+            found = sum(
+                self.apply_update(device_type, asset_number, states[asset_number.strip()])
+                for device_type, asset_number, _, _ in changes
+            )
+            if self.state_store.entry_count >= self.state_store.compact_threshold:
+                self.compact_states()
+            return found
+
+    def compact_states(self):
+        """把覆盖层中的状态写回各设备CSV（临时文件 + 替换），然后清空 device_state.log"""
+        if self.state_store is None:
+            return
+        # 持有 state 锁：压缩期间其他进程不能追加状态，否则截断时会丢失
+        with self._lock, get_file_locks(self.devices_dir).named('state'):
+            for device_type in DEVICE_FILES:
+                try:
+                    self.get_table(device_type)
+                except FileNotFoundError:
+                    continue
+            entries = self.state_store.entry_count
+            for table in self._tables.values():
+                tmp_path = table.path.with_name(table.path.name + '.tmp')
+                with open(tmp_path, 'w', encoding='utf-8', newline='') as file:
+                    writer = csv.DictWriter(file, fieldnames=table.fieldnames)
+                    writer.writeheader()
+                    writer.writerows(table.rows)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(tmp_path, table.path)
+                table.signature = file_signature(table.path)
+            # 在截断之前崩溃时，重放日志只会把相同的状态再覆盖一次
+            self.state_store.truncate()
+            logger.info("设备状态日志已压缩: %s 条写回设备CSV", entries)
+
+    def _sync_states(self):
+        """读取覆盖层新增的条目并应用到已加载的设备表"""
+        if self.state_store is None:
+            return
+        self._apply_changed_states(self.state_store.refresh())
+
+    def _apply_changed_states(self, changed):
+        """
+        应用覆盖层读到的新条目
+
+        Args:
+            changed (dict): refresh() 的返回值；为None时日志已被其他进程压缩，
+                已加载的表丢弃，下次访问时从压缩后的CSV和新日志重新加载
+        """
+        if changed is None:
+            for device_type in list(self._tables):
+                self._drop_table(device_type)
+            return
+        if not changed:
+            return
+        for table in self._tables.values():
+            self._apply_states(table, changed)
+        self.generation += 1
+
+    def _apply_states(self, table, states):
+        """把覆盖状态写入设备表的行"""
+        if not states:
+            return
+        # 新加载的表还未登记，计数和索引在 _set_table 中整体重建；已登记的表逐行更新
+        registered = self._tables.get(table.device_type) is table
+        assets = self._table_assets.get(table.device_type) if registered else None
+        if assets is None:
+            assets = {}
+            for position, row in enumerate(table.rows):
+                asset_number = (row.get('资产编号') or '').strip()
+                if asset_number:
+                    assets.setdefault(asset_number, position)
+        for asset_number, state in states.items():
+            position = assets.get(asset_number)
+            if position is not None:
+                row = table.rows[position]
+                if registered:
+                    old_row = dict(row)
+                    row.update(state)
+                    self._row_changed(table.device_type, position, old_row, row)
+                else:
+                    row.update(state)
+
+    def _set_table(self, table):
+        """替换设备表并增量更新资产编号索引"""
+        device_type = table.device_type
+        old_assets = self._table_assets.get(device_type, {})
+
+        new_assets = {}
+        for position, row in enumerate(table.rows):
+            asset_number = (row.get('资产编号') or '').strip()
+            if asset_number:
+                new_assets.setdefault(asset_number, position)  # 同一表内以第一条为准
+
+        self._tables[device_type] = table
+        self._table_assets[device_type] = new_assets
+        self._reindex_assets(old_assets.keys() | new_assets.keys())
+        self.facets.replace(device_type, table.rows)
+        self.query_index.replace(device_type, table.rows)
+        self.name_index.replace(device_type, table.rows)
+        self.generation += 1
+
+    def _drop_table(self, device_type):
+        """移除设备表及其索引条目"""
+        self._tables.pop(device_type, None)
+        old_assets = self._table_assets.pop(device_type, {})
+        self._reindex_assets(old_assets.keys())
+        self.facets.remove(device_type)
+        self.query_index.remove(device_type)
+        self.name_index.remove(device_type)
+        self.generation += 1
+
+    def _row_changed(self, device_type, position, old_row, new_row):
+        """已登记的表中一行被修改：更新分面计数和倒排索引，记录修改的行位置"""
+        self.facets.move(device_type, facet_key(device_type, old_row), facet_key(device_type, new_row))
+        self.query_index.update(device_type, position, old_row, new_row)
+        table = self._tables[device_type]
+        table.changes.append(position)
+        if len(table.changes) > MAX_ROW_CHANGES:
+            dropped = len(table.changes) // 2
+            del table.changes[:dropped]
+            table.changes_start += dropped
+
+    def _reindex_assets(self, asset_numbers):
+        """重新计算指定资产编号的全局索引条目，按设备类型顺序取第一个匹配"""
+        for asset_number in asset_numbers:
+            for device_type in DEVICE_FILES:
+                position = self._table_assets.get(device_type, {}).get(asset_number)
+                if position is not None:
+                    self._asset_index[asset_number] = (device_type, position)
+                    break
+            else:
+                self._asset_index.pop(asset_number, None)
+
+    def _load_table(self, device_type, csv_file_path, signature):
+        """解析CSV文件"""
+        rows = []
+        with observe_stage('csv_parse'), open(csv_file_path, 'r', encoding='utf-8') as file:
+            reader = csv.DictReader(file)
+
+            # 验证是否有数据
+            fieldnames = reader.fieldnames
+            if not fieldnames:
+                raise Exception("CSV文件格式错误：未找到列标题")
+
+            for row in reader:
+                if any(row.values()):  # 跳过空行
+                    rows.append(row)
+
+        logger.debug("加载设备表 %s: %s 行 (%s)", device_type, len(rows), csv_file_path)
+        return DeviceTable(device_type, csv_file_path, fieldnames, rows, signature)
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """获取进程内共享的设备目录实例"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                state_store = None
+                if get_state_mode() == 'overlay':
+                    state_store = DeviceStateStore(get_devices_dir())
+                _catalog = DeviceCatalog(state_store=state_store)
+    return _catalog
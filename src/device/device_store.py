@@ -0,0 +1,836 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+设备数据存储（DeviceStore）
+设备表和借用/归还记录的统一访问接口，读取器、事务层和MCP服务器都通过它访问数据：
+- CsvDeviceStore: 现有的CSV文件（DeviceCatalog + RecordStore），默认实现
+- SqliteDeviceStore: SQLite 数据库（WAL模式，按资产编号/状态/类型/架构/借用者建索引）
+
+通过环境变量 DEVICE_STORE=csv|sqlite 选择，SQLite 数据库默认为 Devices/devices.db，
+可用 `python src/device/device_store.py import` 从现有CSV一次性导入
+"""
+
+import csv
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    from .catalog import DEVICE_FILES, DEVICE_LABELS, file_signature, get_catalog, get_devices_dir
+    from .facets import FacetIndex
+    from .name_search import NameSearchIndex
+    from .query import DeviceIndex
+    from .locks import get_file_locks
+    from .record_store import RECORD_FIELDNAMES, get_record_store
+except ImportError:  # 作为脚本直接运行时
+    sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+    from src.device.catalog import DEVICE_FILES, DEVICE_LABELS, file_signature, get_catalog, get_devices_dir
+    from src.device.facets import FacetIndex
+    from src.device.name_search import NameSearchIndex
+    from src.device.query import DeviceIndex
+    from src.device.locks import get_file_locks
+    from src.device.record_store import RECORD_FIELDNAMES, get_record_store
+
+logger = logging.getLogger(__name__)
+
+STORE_BACKENDS = ('csv', 'sqlite')
+
+
+class DeviceStore:
+    """
+    设备数据存储接口
+
+    设备以 dict 表示（键为CSV列名），查询结果中的设备类型单独返回，不写入行中
+    """
+
+    backend = None
+
+    def data_version(self):
+        """
+        设备数据的版本标识：数据变化（包括其他进程的写入）后返回不同的值，
+        供上层缓存判断是否需要重建
+        """
+        raise NotImplementedError
+
+    def records_version(self):
+        """
+        借用/归还记录的版本标识，含义同 data_version()；没有任何记录时返回None
+        """
+        raise NotImplementedError
+
+    def get_devices(self, device_type):
+        """
+        获取某一类型的所有设备（拷贝）
+
+        Raises:
+            FileNotFoundError: 该类型的数据不存在时抛出
+        """
+        raise NotImplementedError
+
+    def fieldnames(self, device_type):
+        """设备表的列名"""
+        raise NotImplementedError
+
+    def location(self, device_type=None):
+        """数据来源（文件路径），用于日志输出"""
+        raise NotImplementedError
+
+    def find_devices(self, device_type=None, status=None, exclude_status=None,
+                     architecture=None, borrower=None):
+        """
+        按条件查询设备
+
+        Args:
+            device_type (str): 设备类型，None表示所有类型
+            status (str): 设备状态等于该值
+            exclude_status (str): 设备状态不等于该值
+            architecture (str): 芯片架构（不区分大小写）
+            borrower (str): 借用者
+
+        Returns:
+            list: [(device_type, device), ...]，按设备类型、文件中的顺序排列
+        """
+        raise NotImplementedError
+
+    def changed_rows(self, device_type, token=None):
+        """
+        自上次调用以来修改过的设备，供上层缓存按行更新而不是整表重建
+
+        默认实现只能判断数据是否变化：任何变化都返回整个表
+
+        Args:
+            device_type (str): 设备类型
+            token: 上次调用返回的标识，首次为None
+
+        Returns:
+            tuple: (token, reset, changes)，changes 为 [(行位置, device), ...]，行位置与 get_devices 的顺序一致；
+                   reset 为True时 changes 包含所有设备，上层应丢弃该类型的缓存
+
+        Raises:
+            FileNotFoundError: 该类型的数据不存在时抛出
+        """
+        version = self.data_version()
+        if token is not None and token == version:
+            return token, False, []
+        return version, True, list(enumerate(self.get_devices(device_type)))
+
+    def query_devices(self, query, device_type=None):
+        """
+        按组合条件查询设备（按列倒排索引求交/并/补，不逐行比较）
+
+        Args:
+            query (DeviceQuery): 查询条件
+            device_type (str): 设备类型，None表示所有类型
+
+        Returns:
+            list: [(device_type, device), ...]，按设备类型、文件中的顺序排列
+        """
+        raise NotImplementedError
+
+    def search_devices(self, text, device_type=None, limit=5, min_score=0.3):
+        """
+        按设备名称、序列号、SKU或品牌模糊搜索（字符 n-gram 索引，支持中英文混排）
+
+        Args:
+            text (str): 搜索文本（可以是名称的一部分或有拼写差异）
+            device_type (str): 设备类型，None表示所有类型
+            limit (int): 最多返回的候选数
+            min_score (float): 最低分数（0~1，完全相同为1）
+
+        Returns:
+            list: [(device_type, device, score), ...]，按分数从高到低
+        """
+        raise NotImplementedError
+
+    def find_asset(self, asset_number):
+        """
+        根据资产编号查找设备
+
+        Returns:
+            tuple: (device_info, device_type)，未找到返回 (None, None)
+        """
+        raise NotImplementedError
+
+    def facets(self):
+        """
+        当前数据的分面计数（FacetIndex），按 设备类型 × 状态 × 架构 × 品牌 × manager 统计，
+        用于计数和统计查询，不扫描设备行；返回的对象由存储维护，调用方不应修改
+        """
+        raise NotImplementedError
+
+    def architectures(self):
+        """Windows设备的芯片架构列表（去重、排序）"""
+        raise NotImplementedError
+
+    def set_status(self, device_type, asset_number, status, borrower):
+        """
+        更新设备状态和借用者（调用方持有资产锁）
+
+        Raises:
+            ValueError: 设备不存在时抛出
+        """
+        raise NotImplementedError
+
+    def set_statuses(self, changes):
+        """
+        在一次提交中更新多台设备的状态和借用者（调用方持有这些资产的锁）
+
+        Args:
+            changes (list): [(device_type, asset_number, status, borrower), ...]，资产编号不重复
+
+        Raises:
+            ValueError: 任意一台设备不存在时抛出，此时不更新任何设备
+        """
+        raise NotImplementedError
+
+    def all_records(self):
+        """所有借用/归还记录（按写入顺序）"""
+        raise NotImplementedError
+
+    def query_records(self, asset_number=None, borrower=None, status=None, limit=None):
+        """
+        按条件查询记录
+
+        Args:
+            limit (int): 只返回最近的N条，None表示不限制
+
+        Returns:
+            list: 匹配的记录，按写入顺序排列
+        """
+        raise NotImplementedError
+
+    def append_records(self, records):
+        """追加借用/归还记录"""
+        raise NotImplementedError
+
+    def records_location(self):
+        """记录数据来源（文件路径），用于日志输出"""
+        raise NotImplementedError
+
+    def warm_up(self):
+        """
+        预先加载并索引所有设备表和借用/归还记录（服务器启动时调用），之后的首次请求不再承担解析开销
+
+        Returns:
+            dict: {"devices": {设备类型: 设备数}, "records": 记录数}，数据不存在的类型不出现在结果中
+        """
+        raise NotImplementedError
+
+
+class CsvDeviceStore(DeviceStore):
+    """
+    基于CSV文件的存储：设备表由 DeviceCatalog 缓存，记录由 RecordStore 管理
+    """
+
+    backend = 'csv'
+
+    def __init__(self, catalog=None, record_store=None):
+        self.catalog = catalog or get_catalog()
+        self.record_store = record_store or get_record_store()
+
+    def data_version(self):
+        # 只做stat检查，变化的表会被重新加载并递增 generation
+        for device_type in DEVICE_FILES:
+            try:
+                self.catalog.get_table(device_type)
+            except FileNotFoundError:
+                continue
+        return self.catalog.generation
+
+    def records_version(self):
+        # 只做stat检查，日志新增的部分被增量读取并递增 generation
+        try:
+            self.record_store.refresh()
+        except FileNotFoundError:
+            return None
+        return self.record_store.generation
+
+    def get_devices(self, device_type):
+        return self.catalog.get_table(device_type).copy_rows()
+
+    def changed_rows(self, device_type, token=None):
+        # 状态更新只修改少数几行，按行返回
+        return self.catalog.changed_rows(device_type, token)
+
+    def fieldnames(self, device_type):
+        return list(self.catalog.get_table(device_type).fieldnames)
+
+    def location(self, device_type=None):
+        return self.catalog.get_path(device_type) if device_type else self.catalog.devices_dir
+
+    def find_devices(self, device_type=None, status=None, exclude_status=None,
+                     architecture=None, borrower=None):
+        device_types = [device_type] if device_type else list(DEVICE_FILES)
+        architecture = architecture.strip().lower() if architecture else None
+        results = []
+        for dtype in device_types:
+            try:
+                table = self.catalog.get_table(dtype)
+            except FileNotFoundError as e:
+                if device_type:
+                    raise
+                self.catalog.skip_table(dtype, e)
+                continue
+            for row in table.rows:
+                if status is not None and row.get('设备状态') != status:
+                    continue
+                if exclude_status is not None and row.get('设备状态') == exclude_status:
+                    continue
+                if architecture and (row.get('芯片架构') or '').strip().lower() != architecture:
+                    continue
+                if borrower and (row.get('借用者') or '').strip() != borrower:
+                    continue
+                results.append((dtype, dict(row)))
+        return results
+
+    def query_devices(self, query, device_type=None):
+        results = []
+        for dtype in ([device_type] if device_type else list(DEVICE_FILES)):
+            try:
+                rows = self.catalog.query(dtype, query)
+            except FileNotFoundError as e:
+                if device_type:
+                    raise
+                self.catalog.skip_table(dtype, e)
+                continue
+            results.extend((dtype, row) for row in rows)
+        return results
+
+    def search_devices(self, text, device_type=None, limit=5, min_score=0.3):
+        if device_type:
+            self.catalog.get_table(device_type)
+        return self.catalog.search([device_type] if device_type else list(DEVICE_FILES),
+                                   text, limit, min_score)
+
+    def find_asset(self, asset_number):
+        return self.catalog.find_asset(asset_number)
+
+    def facets(self):
+        # stat检查：变化的表重新加载时整体替换计数，状态更新时增量移动计数
+        self.data_version()
+        return self.catalog.facets
+
+    def architectures(self):
+        self.catalog.get_table('windows')
+        return self.catalog.facets.values('architecture', 'windows')
+
+    def set_status(self, device_type, asset_number, status, borrower):
+        if self.catalog.state_store is not None:
+            # overlay 模式：只追加一条状态日志，设备CSV保持不变
+            self.catalog.set_state(device_type, asset_number, status, borrower)
+            return
+        with get_file_locks(self.catalog.devices_dir).named(device_type):
+            self._rewrite_status(device_type, {asset_number.strip(): (status, borrower)})
+
+    def set_statuses(self, changes):
+        if self.catalog.state_store is not None:
+            # overlay 模式：所有状态在状态日志中追加一次
+            self.catalog.set_states(changes)
+            return
+        # csv 模式：每个设备表只重写一次
+        by_type = {}
+        for device_type, asset_number, status, borrower in changes:
+            by_type.setdefault(device_type, {})[asset_number.strip()] = (status, borrower)
+        for device_type, updates in by_type.items():
+            with get_file_locks(self.catalog.devices_dir).named(device_type):
+                self._rewrite_status(device_type, updates)
+
+    def all_records(self):
+        return self.record_store.all_records()
+
+    def query_records(self, asset_number=None, borrower=None, status=None, limit=None):
+        return self.record_store.query(
+            asset_number=asset_number,
+            borrower=borrower,
+            status=status,
+            limit=-limit if limit else None,
+        )
+
+    def append_records(self, records):
+        self.record_store.append_many(records)
+
+    def records_location(self):
+        return self.record_store.snapshot_path
+
+    def warm_up(self):
+        # 加载设备表时同时建立资产编号、计数和倒排索引
+        devices = {}
+        for device_type in DEVICE_FILES:
+            try:
+                devices[device_type] = len(self.catalog.get_table(device_type).rows)
+            except FileNotFoundError as e:
+                logger.warning("跳过%s设备表: %s", device_type, e)
+        # 名称索引默认在第一次搜索时才建立
+        self.catalog.name_index.build()
+        try:
+            records = self.record_store.count()
+        except FileNotFoundError as e:
+            logger.warning("跳过借用/归还记录: %s", e)
+            records = 0
+        return {"devices": devices, "records": records}
+
+    def _rewrite_status(self, device_type, updates):
+        """
+        csv 模式：原子地重写设备CSV中的状态和借用者（临时文件 + 替换）
+
+        Args:
+            updates (dict): 资产编号 -> (新状态, 新借用者)；任意一台不存在时不写入
+        """
+        csv_file_path = self.catalog.get_path(device_type)
+        if not csv_file_path.exists():
+            raise ValueError(f"设备类型 {device_type} 对应的CSV文件不存在")
+
+        rows = []
+        found = set()
+        with open(csv_file_path, 'r', encoding='utf-8') as file:
+            reader = csv.DictReader(file)
+            fieldnames = reader.fieldnames
+            for row in reader:
+                asset_number = (row.get('资产编号') or '').strip()
+                if asset_number in updates:
+                    new_status, new_borrower = updates[asset_number]
+                    row['设备状态'] = new_status
+                    row['借用者'] = new_borrower or ""
+                    found.add(asset_number)
+                rows.append(row)
+        missing = [asset_number for asset_number in updates if asset_number not in found]
+        if missing:
+            raise ValueError(f"未找到资产编号为 {', '.join(missing)} 的设备")
+
+        tmp_path = csv_file_path.with_name(csv_file_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, csv_file_path)
+
+        # 同步更新共享设备目录中的这些行，避免下次访问时重新解析整个文件
+        signature = file_signature(csv_file_path)
+        for asset_number, (new_status, new_borrower) in updates.items():
+            self.catalog.apply_update(
+                device_type,
+                asset_number,
+                {'设备状态': new_status, '借用者': new_borrower or ""},
+                signature=signature,
+            )
+
+
+# 记录列 -> SQLite 列
+RECORD_COLUMNS = {
+    '创建日期': 'created',
+    '借用者': 'borrower',
+    '设备': 'device',
+    '资产编号': 'asset_number',
+    '状态': 'status',
+    '原因': 'reason',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS device_tables (
+    device_type TEXT PRIMARY KEY,
+    fieldnames  TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS devices (
+    device_type  TEXT    NOT NULL,
+    type_order   INTEGER NOT NULL,
+    position     INTEGER NOT NULL,
+    asset_number TEXT    NOT NULL DEFAULT '',
+    status       TEXT    NOT NULL DEFAULT '',
+    borrower     TEXT    NOT NULL DEFAULT '',
+    architecture TEXT    NOT NULL DEFAULT '',
+    data         TEXT    NOT NULL,
+    PRIMARY KEY (device_type, position)
+);
+CREATE INDEX IF NOT EXISTS idx_devices_asset ON devices (asset_number, type_order, position);
+CREATE INDEX IF NOT EXISTS idx_devices_status ON devices (status, type_order, position);
+CREATE INDEX IF NOT EXISTS idx_devices_type ON devices (type_order, position);
+CREATE INDEX IF NOT EXISTS idx_devices_architecture ON devices (architecture COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_devices_borrower ON devices (borrower);
+CREATE TABLE IF NOT EXISTS records (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    created      TEXT NOT NULL DEFAULT '',
+    borrower     TEXT NOT NULL DEFAULT '',
+    device       TEXT NOT NULL DEFAULT '',
+    asset_number TEXT NOT NULL DEFAULT '',
+    status       TEXT NOT NULL DEFAULT '',
+    reason       TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_records_asset ON records (asset_number, id);
+CREATE INDEX IF NOT EXISTS idx_records_borrower ON records (borrower, id);
+CREATE INDEX IF NOT EXISTS idx_records_status ON records (status, id);
+CREATE TABLE IF NOT EXISTS versions (
+    name    TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO versions (name, version) VALUES ('devices', 0), ('records', 0);
+"""
+
+# 固定的SQL文本：sqlite3 按文本缓存已编译的语句（cached_statements），参数通过占位符绑定
+SELECT_DEVICE_COLUMNS = "SELECT device_type, status, borrower, data FROM devices"
+SELECT_RECORD_COLUMNS = "SELECT created, borrower, device, asset_number, status, reason FROM records"
+INSERT_DEVICE = (
+    "INSERT INTO devices (device_type, type_order, position, asset_number, status, borrower, architecture, data)"
+    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+INSERT_RECORD = (
+    "INSERT INTO records (created, borrower, device, asset_number, status, reason)"
+    " VALUES (?, ?, ?, ?, ?, ?)"
+)
+UPDATE_STATUS = "UPDATE devices SET status = ?, borrower = ? WHERE device_type = ? AND asset_number = ?"
+SELECT_VERSION = "SELECT version FROM versions WHERE name = ?"
+BUMP_VERSION = "UPDATE versions SET version = version + 1 WHERE name = ?"
+# 品牌、manager 只保存在 data 中，聚合时从JSON中取出
+SELECT_FACET_COUNTS = (
+    "SELECT device_type, status, architecture,"
+    " trim(coalesce(json_extract(data, '$.\"品牌\"'), '')),"
+    " trim(coalesce(json_extract(data, '$.\"所属manager\"'), '')),"
+    " COUNT(*) FROM devices GROUP BY 1, 2, 3, 4, 5"
+)
+
+
+class SqliteDeviceStore(DeviceStore):
+    """
+    基于SQLite的存储
+
+    - WAL模式：读写互不阻塞，多个服务进程可以同时读取
+    - 设备的全部列以JSON保存在 data 中，资产编号/状态/借用者/架构单独成列并建索引，
+      过滤在SQL中完成，只有匹配的行会被反序列化
+    - 每个线程一个连接
+    - 写入在同一个事务中递增 versions 表中的计数，数据版本对所有进程和连接一致
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, db_path=None):
+        """
+        Args:
+            db_path (Path): 数据库路径，默认为 get_devices_dir()/devices.db
+        """
+        self.db_path = Path(db_path) if db_path else get_devices_dir() / "devices.db"
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        self._facets = FacetIndex()
+        self._facets_version = None
+        self._facets_lock = threading.Lock()
+        # 设备行的快照及在其上建立的倒排索引、名称索引，数据版本变化时重建
+        self._query_index = DeviceIndex()
+        self._name_index = NameSearchIndex()
+        self._query_rows = {}
+        self._query_version = None
+        self._query_lock = threading.Lock()
+
+    def connect(self):
+        """获取当前线程的连接（首次调用时创建表和索引）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            # isolation_level=None: 自动提交，写入时显式 BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                                   cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def data_version(self):
+        # 文件的mtime和大小不可靠（分辨率、检查点），使用写入时递增的计数
+        return self.connect().execute(SELECT_VERSION, ('devices',)).fetchone()[0]
+
+    def records_version(self):
+        return self.connect().execute(SELECT_VERSION, ('records',)).fetchone()[0]
+
+    @contextmanager
+    def _write(self, *versions):
+        """写事务：提交前递增 versions 中的计数，出错时回滚"""
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            for name in versions:
+                conn.execute(BUMP_VERSION, (name,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_devices(self, device_type):
+        self._check_type(device_type)
+        return [row for _, row in self.find_devices(device_type=device_type)]
+
+    def fieldnames(self, device_type):
+        return self._check_type(device_type)
+
+    def location(self, device_type=None):
+        return self.db_path
+
+    def find_devices(self, device_type=None, status=None, exclude_status=None,
+                     architecture=None, borrower=None):
+        if device_type:
+            self._check_type(device_type)
+        clauses = []
+        params = []
+        for clause, value in (("device_type = ?", device_type),
+                              ("status = ?", status),
+                              ("status != ?", exclude_status),
+                              ("architecture = ? COLLATE NOCASE", architecture.strip() if architecture else None),
+                              ("borrower = ?", borrower)):
+            if value is not None and value != '':
+                clauses.append(clause)
+                params.append(value)
+        sql = SELECT_DEVICE_COLUMNS
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY type_order, position"
+        return [(dtype, self._to_row(status_, borrower_, data))
+                for dtype, status_, borrower_, data in self.connect().execute(sql, params)]
+
+    def query_devices(self, query, device_type=None):
+        if device_type:
+            self._check_type(device_type)
+        with self._query_lock:
+            self._refresh_snapshot()
+            results = []
+            for dtype in ([device_type] if device_type else list(DEVICE_FILES)):
+                type_rows = self._query_rows.get(dtype, [])
+                results.extend((dtype, dict(type_rows[position]))
+                               for position in self._query_index.search(dtype, query))
+            return results
+
+    def search_devices(self, text, device_type=None, limit=5, min_score=0.3):
+        if device_type:
+            self._check_type(device_type)
+        with self._query_lock:
+            self._refresh_snapshot()
+            return [(dtype, dict(self._query_rows[dtype][position]), score)
+                    for score, dtype, position in self._name_index.search(
+                        text, [device_type] if device_type else list(DEVICE_FILES), limit, min_score)]
+
+    def _refresh_snapshot(self):
+        """数据版本变化时重新读取设备行并重建索引（调用方持有 _query_lock）"""
+        version = self.data_version()
+        if version == self._query_version:
+            return
+        rows = {dtype: [] for dtype in DEVICE_FILES}
+        for dtype, row in self.find_devices():
+            rows[dtype].append(row)
+        for dtype, type_rows in rows.items():
+            self._query_index.replace(dtype, type_rows)
+            self._name_index.replace(dtype, type_rows)
+        self._query_rows = rows
+        self._query_version = version
+
+    def find_asset(self, asset_number):
+        result = self.connect().execute(
+            SELECT_DEVICE_COLUMNS + " WHERE asset_number = ? ORDER BY type_order, position LIMIT 1",
+            (asset_number.strip(),),
+        ).fetchone()
+        if result is None:
+            return None, None
+        dtype, status, borrower, data = result
+        return self._to_row(status, borrower, data), dtype
+
+    def facets(self):
+        # 其他进程也可能写入，无法逐条跟踪状态变化：数据版本变化时用一次 GROUP BY 聚合重建
+        version = self.data_version()
+        with self._facets_lock:
+            if version != self._facets_version:
+                counts = {device_type: {} for device_type in DEVICE_FILES}
+                for device_type, status, architecture, brand, manager, count in \
+                        self.connect().execute(SELECT_FACET_COUNTS):
+                    key = (device_type, status.strip(), architecture, brand, manager)
+                    counts[device_type][key] = counts[device_type].get(key, 0) + count
+                for device_type, type_counts in counts.items():
+                    self._facets.replace_counts(device_type, type_counts)
+                self._facets_version = version
+            return self._facets
+
+    def architectures(self):
+        self._check_type('windows')
+        return self.facets().values('architecture', 'windows')
+
+    def set_status(self, device_type, asset_number, status, borrower):
+        with self._write('devices') as conn:
+            cursor = conn.execute(UPDATE_STATUS, (status, borrower or "", device_type, asset_number.strip()))
+            if cursor.rowcount == 0:
+                raise ValueError(f"未找到资产编号为 {asset_number} 的设备")
+
+    def set_statuses(self, changes):
+        with self._write('devices') as conn:
+            missing = []
+            for device_type, asset_number, status, borrower in changes:
+                cursor = conn.execute(UPDATE_STATUS, (status, borrower or "", device_type, asset_number.strip()))
+                if cursor.rowcount == 0:
+                    missing.append(asset_number)
+            if missing:
+                raise ValueError(f"未找到资产编号为 {', '.join(missing)} 的设备")
+
+    def all_records(self):
+        return [self._to_record(row) for row in
+                self.connect().execute(SELECT_RECORD_COLUMNS + " ORDER BY id")]
+
+    def query_records(self, asset_number=None, borrower=None, status=None, limit=None):
+        clauses = []
+        params = []
+        for clause, value in (("asset_number = ?", asset_number),
+                              ("borrower = ?", borrower),
+                              ("status = ?", status)):
+            if value:
+                clauses.append(clause)
+                params.append(value)
+        sql = SELECT_RECORD_COLUMNS
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if limit:
+            sql += " ORDER BY id DESC LIMIT ?"
+            params.append(limit)
+            rows = self.connect().execute(sql, params).fetchall()
+            rows.reverse()
+        else:
+            rows = self.connect().execute(sql + " ORDER BY id", params).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    def append_records(self, records):
+        if not records:
+            return
+        with self._write('records') as conn:
+            conn.executemany(INSERT_RECORD, [
+                tuple((record.get(name) or '') for name in RECORD_COLUMNS) for record in records
+            ])
+
+    def records_location(self):
+        return self.db_path
+
+    def warm_up(self):
+        # 数据在数据库中，预热的是内存中的计数索引和设备行快照上的倒排、名称索引
+        self.facets()
+        with self._query_lock:
+            self._refresh_snapshot()
+            self._name_index.build()
+            devices = {dtype: len(rows) for dtype, rows in self._query_rows.items() if rows}
+        records = self.connect().execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        return {"devices": devices, "records": records}
+
+    def import_from(self, source):
+        """
+        从另一个存储（通常是 CsvDeviceStore）一次性导入全部设备和记录，替换现有数据
+
+        Args:
+            source (DeviceStore): 数据来源
+
+        Returns:
+            dict: 每种设备类型导入的行数，以及 'records' 记录数
+        """
+        counts = {}
+        with self._write('devices', 'records') as conn:
+            conn.execute("DELETE FROM devices")
+            conn.execute("DELETE FROM device_tables")
+            conn.execute("DELETE FROM records")
+            for type_order, device_type in enumerate(DEVICE_FILES):
+                try:
+                    rows = source.get_devices(device_type)
+                    fieldnames = source.fieldnames(device_type)
+                except FileNotFoundError as e:
+                    logger.warning("跳过%s设备表: %s", device_type, e)
+                    continue
+                conn.execute("INSERT INTO device_tables (device_type, fieldnames) VALUES (?, ?)",
+                             (device_type, json.dumps(fieldnames, ensure_ascii=False)))
+                conn.executemany(INSERT_DEVICE, [
+                    (device_type, type_order, position,
+                     (row.get('资产编号') or '').strip(),
+                     row.get('设备状态') or '',
+                     row.get('借用者') or '',
+                     (row.get('芯片架构') or '').strip(),
+                     json.dumps(row, ensure_ascii=False))
+                    for position, row in enumerate(rows)
+                ])
+                counts[device_type] = len(rows)
+            try:
+                records = source.all_records()
+            except FileNotFoundError:
+                records = []
+            conn.executemany(INSERT_RECORD, [
+                tuple((record.get(name) or '') for name in RECORD_COLUMNS) for record in records
+            ])
+            counts['records'] = len(records)
+        return counts
+
+    def _check_type(self, device_type):
+        """返回设备表的列名；未导入的类型与CSV文件缺失时一样抛出 FileNotFoundError"""
+        if device_type not in DEVICE_FILES:
+            raise ValueError(f"不支持的设备类型: {device_type}")
+        result = self.connect().execute(
+            "SELECT fieldnames FROM device_tables WHERE device_type = ?", (device_type,)
+        ).fetchone()
+        if result is None:
+            raise FileNotFoundError(f"{DEVICE_LABELS[device_type]}设备数据未导入: {self.db_path}")
+        return json.loads(result[0])
+
+    @staticmethod
+    def _to_row(status, borrower, data):
+        row = json.loads(data)
+        row['设备状态'] = status
+        row['借用者'] = borrower
+        return row
+
+    @staticmethod
+    def _to_record(values):
+        return dict(zip(RECORD_FIELDNAMES, values))
+
+
+def get_store_backend():
+    """
+    获取存储后端（环境变量 DEVICE_STORE，默认 csv）
+    """
+    backend = os.environ.get('DEVICE_STORE', 'csv').strip().lower()
+    if backend not in STORE_BACKENDS:
+        raise ValueError(f"无效的设备存储后端: {backend} (可选: {', '.join(STORE_BACKENDS)})")
+    return backend
+
+
+_device_store = None
+_device_store_lock = threading.Lock()
+
+
+def get_device_store():
+    """获取进程内共享的设备存储实例"""
+    global _device_store
+    if _device_store is None:
+        with _device_store_lock:
+            if _device_store is None:
+                if get_store_backend() == 'sqlite':
+                    _device_store = SqliteDeviceStore()
+                else:
+                    _device_store = CsvDeviceStore()
+    return _device_store
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "import":
+        # 从CSV一次性导入到SQLite
+        db_path = Path(sys.argv[2]) if len(sys.argv) > 2 else None
+        target = SqliteDeviceStore(db_path)
+        print(f"📥 正在从 {get_devices_dir()} 导入到 {target.db_path} ...")
+        try:
+            counts = target.import_from(CsvDeviceStore())
+        except Exception as e:
+            print(f"❌ 导入失败: {e}")
+            exit(1)
+        for name, count in counts.items():
+            print(f"   {name}: {count} 条")
+        print(f"✅ 导入完成！设置环境变量 DEVICE_STORE=sqlite 以使用SQLite存储")
+    else:
+        print("📋 用法示例:")
+        print("  python src/device/device_store.py import              # 导入到 Devices/devices.db")
+        print("  python src/device/device_store.py import path/to.db   # 导入到指定数据库")
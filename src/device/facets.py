@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+设备分面计数（FacetIndex）
+按 设备类型 × 设备状态 × 芯片架构 × 品牌 × 所属manager 维护设备数量，
+设备表加载和状态变化时增量更新；计数、统计和"有哪些架构"之类的查询只查字典，不扫描设备行
+"""
+
+import itertools
+import threading
+from collections import Counter
+
+# 分面维度 -> CSV列名（device_type 不是列，由设备表决定）
+FACET_COLUMNS = {
+    'status': '设备状态',
+    'architecture': '芯片架构',
+    'brand': '品牌',
+    'manager': '所属manager',
+}
+FACET_DIMENSIONS = ('device_type',) + tuple(FACET_COLUMNS)
+
+# 每个分面组合会同时计入 2^5 个汇总格子（被汇总的维度记为None），任意维度组合的计数都是一次字典查找
+_ROLLUP_MASKS = list(itertools.product((True, False), repeat=len(FACET_DIMENSIONS)))
+
+
+def facet_key(device_type, row):
+    """
+    设备行对应的分面组合
+
+    Returns:
+        tuple: (device_type, status, architecture, brand, manager)，缺失的列为空字符串
+    """
+    return (device_type,) + tuple((row.get(column) or '').strip() for column in FACET_COLUMNS.values())
+
+
+class FacetIndex:
+    """
+    设备分面计数
+
+    计数以"分面组合 -> 设备数"的形式按设备类型保存，
+    重新加载某个设备表时先减去旧的组合再加上新的组合，单台设备状态变化时只移动一个组合
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 设备类型 -> Counter(分面组合 -> 设备数)
+        self._keys = {}
+        # 汇总格子 -> 设备数，被汇总的维度为None
+        self._cells = {}
+        # (设备类型或None, 维度) -> {取值: 设备数}
+        self._values = {}
+
+    def replace(self, device_type, rows):
+        """设备表（重新）加载后替换该类型的全部计数"""
+        self.replace_counts(device_type, Counter(facet_key(device_type, row) for row in rows))
+
+    def replace_counts(self, device_type, counts):
+        """
+        用已聚合的计数替换某一设备类型的全部计数
+
+        Args:
+            device_type (str): 设备类型
+            counts (dict): 分面组合 -> 设备数
+        """
+        counts = Counter({key: count for key, count in counts.items() if count > 0})
+        with self._lock:
+            for key, count in self._keys.pop(device_type, {}).items():
+                self._add(key, -count)
+            for key, count in counts.items():
+                self._add(key, count)
+            if counts:
+                self._keys[device_type] = counts
+
+    def remove(self, device_type):
+        """移除某一设备类型的全部计数（设备表被删除时）"""
+        self.replace_counts(device_type, {})
+
+    def move(self, device_type, old_key, new_key):
+        """单台设备的分面组合发生变化（例如设备状态更新）"""
+        if old_key == new_key:
+            return
+        with self._lock:
+            counts = self._keys.setdefault(device_type, Counter())
+            if counts[old_key] > 0:
+                counts[old_key] -= 1
+                if not counts[old_key]:
+                    del counts[old_key]
+                self._add(old_key, -1)
+            counts[new_key] += 1
+            self._add(new_key, 1)
+
+    def count(self, device_type=None, **filters):
+        """
+        满足条件的设备数
+
+        Args:
+            device_type (str): 设备类型，None表示所有类型
+            **filters: status/architecture/brand/manager 的取值（不区分大小写）
+
+        Returns:
+            int: 设备数
+        """
+        with self._lock:
+            choices = [[device_type]]
+            for dimension in FACET_DIMENSIONS[1:]:
+                value = filters.pop(dimension, None)
+                if value is None:
+                    choices.append([None])
+                    continue
+                matched = self._resolve(device_type, dimension, value)
+                if not matched:
+                    return 0
+                choices.append(matched)
+            if filters:
+                raise ValueError(f"不支持的分面维度: {', '.join(filters)}")
+            # 通常每个维度只匹配一个取值，只查一个格子
+            return sum(self._cells.get(cell, 0) for cell in itertools.product(*choices))
+
+    def stats(self, device_type=None, **filters):
+        """
+        满足条件的设备的状态统计
+
+        Returns:
+            dict: total/available/in_use/other
+        """
+        if 'status' in filters:
+            raise ValueError("stats 按设备状态分组统计，不能再按 status 过滤")
+        total = self.count(device_type, **filters)
+        available = self.count(device_type, status='可用', **filters)
+        in_use = self.count(device_type, status='正在使用', **filters)
+        return {
+            'total': total,
+            'available': available,
+            'in_use': in_use,
+            'other': total - available - in_use,
+        }
+
+    def values(self, dimension, device_type=None):
+        """
+        某一维度出现过的取值（去重、排序，不含空值）
+
+        Args:
+            dimension (str): status/architecture/brand/manager
+            device_type (str): 设备类型，None表示所有类型
+        """
+        if dimension not in FACET_COLUMNS:
+            raise ValueError(f"不支持的分面维度: {dimension}")
+        with self._lock:
+            return sorted(value for value in self._values.get((device_type, dimension), {}) if value)
+
+    def value_counts(self, dimension, device_type=None):
+        """
+        某一维度每个取值的设备数
+
+        Returns:
+            dict: 取值 -> 设备数（按取值排序，空值记为''）
+        """
+        if dimension not in FACET_COLUMNS:
+            raise ValueError(f"不支持的分面维度: {dimension}")
+        with self._lock:
+            return dict(sorted(self._values.get((device_type, dimension), {}).items()))
+
+    def _resolve(self, device_type, dimension, value):
+        """把过滤值解析成实际出现过的取值（去掉首尾空白、不区分大小写）"""
+        values = self._values.get((device_type, dimension), {})
+        value = value.strip()
+        if value in values:
+            return [value]
+        folded = value.casefold()
+        return [candidate for candidate in values if candidate.casefold() == folded]
+
+    def _add(self, key, delta):
+        """把一个分面组合的计数变化计入所有汇总格子和取值表"""
+        for mask in _ROLLUP_MASKS:
+            cell = tuple(part if keep else None for part, keep in zip(key, mask))
+            self._bump(self._cells, cell, delta)
+        for position, dimension in enumerate(FACET_DIMENSIONS[1:], 1):
+            for scope in (key[0], None):
+                values = self._values.setdefault((scope, dimension), {})
+                self._bump(values, key[position], delta)
+
+    @staticmethod
+    def _bump(counts, key, delta):
+        count = counts.get(key, 0) + delta
+        if count > 0:
+            counts[key] = count
+        else:
+            counts.pop(key, None)
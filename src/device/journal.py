@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+追加日志的帧格式
+records.journal 与 device_state.log 共用：
+[payload长度 uint32][crc32 uint32][payload]，payload 为以 \\x1f 分隔的 UTF-8 字段
+"""
+
+import os
+import struct
+import zlib
+
+FRAME_HEADER = struct.Struct('<II')
+FIELD_SEPARATOR = '\x1f'
+
+
+def encode_frame(record, fieldnames):
+    """
+    将记录编码为日志帧
+
+    Args:
+        record (dict): 记录
+        fieldnames (list): 字段顺序
+
+    Returns:
+        bytes: 日志帧
+    """
+    payload = FIELD_SEPARATOR.join(
+        str(record.get(name) or '').replace(FIELD_SEPARATOR, ' ')
+        for name in fieldnames
+    ).encode('utf-8')
+    return FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_frames(data, fieldnames):
+    """
+    解析日志帧
+
+    Args:
+        data (bytes): 日志内容
+        fieldnames (list): 字段顺序
+
+    Returns:
+        tuple: (records, consumed) 解析出的记录和有效字节数；
+               末尾不完整或校验失败的帧（崩溃时写了一半）不计入
+    """
+    records = []
+    offset = 0
+    while offset + FRAME_HEADER.size <= len(data):
+        length, crc = FRAME_HEADER.unpack_from(data, offset)
+        start = offset + FRAME_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        records.append(dict(zip(fieldnames, payload.decode('utf-8').split(FIELD_SEPARATOR))))
+        offset = start + length
+    return records, offset
+
+
+def append_frames(path, data, expected_size):
+    """
+    以 O_APPEND 方式写入帧并 fsync
+
+    Args:
+        path (Path): 日志路径
+        data (bytes): 已编码的帧
+        expected_size (int): 调用方已读取的有效字节数；文件比它长说明末尾有
+            崩溃遗留的不完整帧，先截掉再写入
+
+    Returns:
+        int: 写入后的有效字节数
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, 'O_BINARY', 0))
+    try:
+        if os.fstat(fd).st_size != expected_size:
+            os.ftruncate(fd, expected_size)
+        os.write(fd, data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    return expected_size + len(data)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程间文件锁（FileLocks）
+在 Devices/.device.lock 上按字节区间加锁（POSIX: fcntl.lockf，Windows: msvcrt.locking），
+每个区间同时对应一个进程内的线程锁：
+- 命名区间: 保护某个共享文件的写入（记录日志、状态日志、设备CSV等）
+- 资产区间: 资产编号哈希到固定数量的条带上，不同资产的借用/归还互不阻塞
+"""
+
+import os
+import threading
+import time
+import zlib
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 命名区间 -> 字节偏移；资产条带从 ASSET_STRIPE_BASE 开始
+NAMED_SLOTS = {
+    'records': 0,
+    'state': 1,
+    'transactions': 2,
+    'android': 3,
+    'ios': 4,
+    'windows': 5,
+    'other': 6,
+}
+ASSET_STRIPE_BASE = 64
+DEFAULT_ASSET_STRIPES = 1024
+
+
+class _Slot:
+    """单个字节区间：进程内可重入，只在最外层加/解进程间锁"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.depth = 0
+
+
+class FileLocks:
+    """
+    基于单个锁文件的条带化进程间锁
+    """
+
+    def __init__(self, path, asset_stripes=DEFAULT_ASSET_STRIPES):
+        """
+        Args:
+            path (Path): 锁文件路径
+            asset_stripes (int): 资产编号条带数
+        """
+        self.path = Path(path)
+        self.asset_stripes = asset_stripes
+        self._slots = {}
+        self._slots_lock = threading.Lock()
+        # Windows: 所有线程共用一个 fd，lseek 和 msvcrt.locking 必须作为整体执行
+        self._seek_lock = threading.Lock()
+        self._fd = None
+
+    @contextmanager
+    def named(self, name):
+        """
+        锁定命名区间（见 NAMED_SLOTS）
+        """
+        if name not in NAMED_SLOTS:
+            raise ValueError(f"未知的锁名称: {name}")
+        with self._hold(NAMED_SLOTS[name]):
+            yield
+
+    @contextmanager
+    def asset(self, asset_number):
+        """
+        锁定资产编号所在的条带
+        """
+        with self._hold(ASSET_STRIPE_BASE + self._stripe(asset_number)):
+            yield
+
+    @contextmanager
+    def assets(self, asset_numbers):
+        """
+        同时锁定多个资产编号所在的条带（批量借用/归还）
+
+        条带按偏移量从小到大依次加锁，多个批量操作之间不会死锁
+        """
+        stripes = sorted({self._stripe(asset_number) for asset_number in asset_numbers})
+        with ExitStack() as stack:
+            for stripe in stripes:
+                stack.enter_context(self._hold(ASSET_STRIPE_BASE + stripe))
+            yield
+
+    def _stripe(self, asset_number):
+        return zlib.crc32(asset_number.strip().encode('utf-8')) % self.asset_stripes
+
+    @contextmanager
+    def _hold(self, offset):
+        slot = self._get_slot(offset)
+        with slot.lock:
+            if slot.depth == 0:
+                self._lock_range(offset)
+            slot.depth += 1
+            try:
+                yield
+            finally:
+                slot.depth -= 1
+                if slot.depth == 0:
+                    self._unlock_range(offset)
+
+    def _get_slot(self, offset):
+        with self._slots_lock:
+            slot = self._slots.get(offset)
+            if slot is None:
+                slot = self._slots[offset] = _Slot()
+            return slot
+
+    def _get_fd(self):
+        with self._slots_lock:
+            if self._fd is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+            return self._fd
+
+    def _lock_range(self, offset):
+        fd = self._get_fd()
+        if fcntl is not None:
+            fcntl.lockf(fd, fcntl.LOCK_EX, 1, offset, os.SEEK_SET)
+            return
+        # msvcrt.locking 从 fd 的当前位置加锁：定位和加锁在 _seek_lock 内完成，
+        # 使用不阻塞的 LK_NBLCK，等待其他进程释放时不持有 _seek_lock
+        while True:
+            with self._seek_lock:
+                os.lseek(fd, offset, os.SEEK_SET)
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                    return
+                except OSError:
+                    pass
+            time.sleep(0.05)
+
+    def _unlock_range(self, offset):
+        fd = self._get_fd()
+        if fcntl is not None:
+            fcntl.lockf(fd, fcntl.LOCK_UN, 1, offset, os.SEEK_SET)
+        else:
+            with self._seek_lock:
+                os.lseek(fd, offset, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+_file_locks = {}
+_file_locks_lock = threading.Lock()
+
+
+def get_file_locks(devices_dir):
+    """
+    获取数据目录对应的进程内共享锁实例
+
+    Args:
+        devices_dir (Path): 数据目录
+
+    Returns:
+        FileLocks: 锁实例（锁文件为 devices_dir/.device.lock）
+    """
+    key = os.path.abspath(devices_dir)
+    with _file_locks_lock:
+        locks = _file_locks.get(key)
+        if locks is None:
+            locks = _file_locks[key] = FileLocks(Path(devices_dir) / ".device.lock")
+        return locks
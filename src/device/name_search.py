@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+设备名称模糊搜索（NameSearchIndex）
+对 设备名称、设备序列号、SKU、品牌 建立字符 n-gram 倒排索引，中英文混排的名称同样适用：
+- 文本先做 NFKC 规范化（全角转半角）并忽略大小写，按字母/数字/汉字连续段切分
+- 每段取相邻两个字符作为二元组；汉字还单独作为一元组，单个汉字也能命中
+- 每个 n-gram 对应一个行位图，查询时把各位图按位相加成计数器，从命中 n-gram 最多的行开始
+  取有限数量的候选计算相似度，返回前 k 个；与某列完全相同的行总会被计入候选
+"""
+
+import heapq
+import re
+import threading
+import unicodedata
+
+from .query import bit_positions, positions_to_bits
+
+# 搜索的列 -> 权重（品牌重复度高，权重较低）
+SEARCH_COLUMNS = {
+    '设备名称': 1.0,
+    '设备序列号': 1.0,
+    'SKU': 0.9,
+    '品牌': 0.6,
+}
+
+# 候选行至少要包含查询中这个比例的 n-gram
+MIN_GRAM_OVERLAP = 0.5
+# 每次搜索最多计算相似度的行数：max(MIN_CANDIDATES, limit * CANDIDATES_PER_RESULT)
+MIN_CANDIDATES = 64
+CANDIDATES_PER_RESULT = 8
+
+_SEGMENT = re.compile(r'[^\W_]+')
+
+
+def normalize_text(text):
+    """NFKC 规范化、忽略大小写并去掉首尾空白"""
+    return unicodedata.normalize('NFKC', text or '').casefold().strip()
+
+
+def text_grams(text):
+    """
+    规范化文本的 n-gram 集合
+
+    Args:
+        text (str): normalize_text 处理后的文本
+
+    Returns:
+        set: 二元组，以及非ASCII字符（汉字等）的一元组；只有一个字符的段保留该字符
+    """
+    grams = set()
+    for segment in _SEGMENT.findall(text):
+        if len(segment) == 1:
+            grams.add(segment)
+            continue
+        grams.update(segment[i:i + 2] for i in range(len(segment) - 1))
+        if not segment.isascii():
+            grams.update(char for char in segment if not char.isascii())
+    return grams
+
+
+def similarity(query, query_grams, value, value_gram_count):
+    """
+    查询与单个字段值的相似度（0~1）
+
+    完全相同为1；包含查询时按长度比例在0.7~1之间；否则为 n-gram 的 Dice 系数（最高0.7）
+
+    Args:
+        value_gram_count (int): len(text_grams(value))，建索引时预先计算
+    """
+    if not value:
+        return 0.0
+    if value == query:
+        return 1.0
+    if query in value:
+        return 0.7 + 0.3 * len(query) / len(value)
+    if not value_gram_count:
+        return 0.0
+    # n-gram 由连续的字母/数字/汉字组成，出现在取值中即等价于属于取值的 n-gram 集合
+    common = sum(1 for gram in query_grams if gram in value)
+    return 0.7 * 2 * common / (len(query_grams) + value_gram_count)
+
+
+def _bit_planes(bitsets):
+    """
+    把各位图按位相加到一组二进制计数器（位平面）中：第i个平面是每行命中数的第i位
+
+    全部是整数的位运算，不需要逐行计数
+    """
+    planes = []
+    for bits in bitsets:
+        carry = bits
+        for i, plane in enumerate(planes):
+            planes[i] = plane ^ carry
+            carry &= plane
+            if not carry:
+                break
+        if carry:
+            planes.append(carry)
+    return planes
+
+
+def _at_least(planes, threshold):
+    """命中数不少于 threshold 的行（threshold >= 1）"""
+    if threshold > (1 << len(planes)) - 1:
+        return 0
+    # 从最高位开始比较：greater 已确定大于阈值，equal 到目前为止与阈值相等
+    greater = 0
+    equal = -1
+    for i in range(len(planes) - 1, -1, -1):
+        if threshold >> i & 1:
+            equal &= planes[i]
+        else:
+            greater |= equal & planes[i]
+            equal &= ~planes[i]
+    # 阈值的最高位一定在位平面范围内，equal 此时已是有限的非负整数
+    return greater | equal
+
+
+class NameTable:
+    """单个设备表的名称索引"""
+
+    def __init__(self, device_type, rows):
+        self.device_type = device_type
+        # 每行各搜索列的 (规范化取值, n-gram数)
+        self.values = []
+        # 规范化取值 -> 行号，完全相同的取值不经过 n-gram 直接命中
+        self.exact = {}
+        positions = {}
+        grams_cache = {}
+        for position, row in enumerate(rows):
+            entries = []
+            grams = set()
+            for column in SEARCH_COLUMNS:
+                value = normalize_text(row.get(column))
+                if not value:
+                    entries.append((value, 0))
+                    continue
+                self.exact.setdefault(value, []).append(position)
+                value_grams = grams_cache.get(value)
+                if value_grams is None:
+                    # 品牌、SKU等重复的取值只切分一次
+                    value_grams = grams_cache[value] = text_grams(value)
+                entries.append((value, len(value_grams)))
+                grams |= value_grams
+            self.values.append(tuple(entries))
+            for gram in grams:
+                positions.setdefault(gram, []).append(position)
+        # n-gram -> 行位图
+        self.postings = {gram: positions_to_bits(values) for gram, values in positions.items()}
+
+    def search(self, query, query_grams, limit, min_score):
+        """
+        Returns:
+            list: [(score, position), ...]，按分数从高到低
+        """
+        bitsets = [self.postings.get(gram, 0) for gram in query_grams]
+        # 查询很短时要求全部命中，否则至少命中一半
+        threshold = len(bitsets) if len(bitsets) <= 2 else max(1, int(len(bitsets) * MIN_GRAM_OVERLAP + 0.5))
+        planes = _bit_planes(bitsets)
+
+        # 从命中最多的层级往下取候选，只对有限数量的行计算相似度；
+        # 查询很宽泛（大量行命中全部 n-gram）时在同一层级内按文件顺序截取
+        budget = max(MIN_CANDIDATES, limit * CANDIDATES_PER_RESULT)
+        candidates = list(self.exact.get(query, ()))
+        seen = 0
+        for level in range(len(bitsets), threshold - 1, -1):
+            level_bits = _at_least(planes, level)
+            if not level_bits:
+                continue
+            new_bits = level_bits & ~seen
+            seen = level_bits
+            candidates.extend(bit_positions(new_bits, budget - len(candidates)))
+            if len(candidates) >= budget:
+                break
+
+        scored = {}
+        for position in candidates:
+            if position in scored:
+                continue
+            scored[position] = max(weight * similarity(query, query_grams, value, gram_count)
+                                   for weight, (value, gram_count)
+                                   in zip(SEARCH_COLUMNS.values(), self.values[position]))
+        return heapq.nlargest(limit, ((score, position) for position, score in scored.items() if score >= min_score),
+                              key=lambda item: (item[0], -item[1]))
+
+
+class NameSearchIndex:
+    """
+    所有设备表的名称索引
+
+    名称类字段不随借用/归还变化，只在设备表（重新）加载时失效；
+    索引在第一次搜索时才建立，不搜索的进程不承担建索引的开销（服务器预热时调用 build() 提前建立）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = {}
+        # 设备类型 -> 尚未建立索引的行
+        self._pending = {}
+
+    def replace(self, device_type, rows):
+        """设备表（重新）加载后丢弃该表的索引，下次搜索时重建"""
+        with self._lock:
+            self._tables.pop(device_type, None)
+            self._pending[device_type] = rows
+
+    def remove(self, device_type):
+        """移除设备表的索引"""
+        with self._lock:
+            self._tables.pop(device_type, None)
+            self._pending.pop(device_type, None)
+
+    def build(self):
+        """
+        为所有尚未建立索引的设备表建立索引
+
+        Returns:
+            int: 新建立索引的表数
+        """
+        with self._lock:
+            device_types = list(self._pending)
+            for device_type in device_types:
+                self._table(device_type)
+        return len(device_types)
+
+    def _table(self, device_type):
+        """设备表的索引，必要时建立（调用方持有 _lock）"""
+        table = self._tables.get(device_type)
+        if table is None:
+            rows = self._pending.pop(device_type, None)
+            if rows is None:
+                return None
+            table = self._tables[device_type] = NameTable(device_type, rows)
+        return table
+
+    def search(self, text, device_types, limit=5, min_score=0.3):
+        """
+        在指定的设备表中搜索
+
+        Args:
+            text (str): 设备名称、序列号、SKU或品牌（可以只是一部分）
+            device_types (list): 设备类型
+            limit (int): 最多返回的候选数
+            min_score (float): 最低分数
+
+        Returns:
+            list: [(score, device_type, position), ...]，按分数从高到低
+        """
+        query = normalize_text(text)
+        query_grams = text_grams(query)
+        if not query_grams:
+            return []
+        results = []
+        with self._lock:
+            for order, device_type in enumerate(device_types):
+                table = self._table(device_type)
+                if table is None:
+                    continue
+                for score, position in table.search(query, query_grams, limit, min_score):
+                    results.append((score, -order, -position, device_type))
+        return [(score, device_type, -neg_position)
+                for score, _, neg_position, device_type in heapq.nlargest(limit, results)]
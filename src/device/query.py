@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+设备组合查询（DeviceQuery）
+每个设备表按列维护倒排索引：取值 -> 位图（Python 整数，第N位表示表中第N行），
+查询条件的 与/或/非 直接在位图上求交、并、补，只有命中的行才会被读取
+
+查询可以用Python构造：
+    DeviceQuery.where(brand='Samsung', status='可用') | ~DeviceQuery.where(manager='alice')
+也可以从JSON结构解析（MCP工具 query_devices 使用）：
+    {"and": [{"brand": ["Samsung", "Google"]}, {"not": {"borrower": ""}}]}
+"""
+
+import re
+import threading
+
+# 查询字段 -> CSV列名
+QUERY_FIELDS = {
+    'brand': '品牌',
+    'os': '设备OS',
+    'sku': 'SKU',
+    'manager': '所属manager',
+    'borrower': '借用者',
+    'status': '设备状态',
+    'architecture': '芯片架构',
+    'type': '类型',
+    'inventoried': '是否盘点',
+}
+
+# 设备类型也可以作为查询条件，与其他字段自由组合
+DEVICE_TYPE_FIELD = 'device_type'
+
+_NONZERO_BYTE = re.compile(b'[^\x00]')
+
+
+def normalize_value(value):
+    """索引和查询使用的取值形式：去掉首尾空白，不区分大小写"""
+    return (value or '').strip().casefold()
+
+
+def positions_to_bits(positions):
+    """把行号列表转换成位图（一次性构造，避免逐位 | 产生大量中间整数）"""
+    if not positions:
+        return 0
+    data = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(data, 'little')
+
+
+def bit_positions(bits, limit=None):
+    """
+    位图中为1的位置（升序）
+
+    Args:
+        bits (int): 位图
+        limit (int): 最多返回的位置数，None表示全部
+    """
+    positions = []
+    if limit is not None:
+        # 只取前几个位置时按字节查找非零字节，找够就停止，不必展开整个位图
+        data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+        for match in _NONZERO_BYTE.finditer(data):
+            byte, base = match.group()[0], match.start() * 8
+            while byte and len(positions) < limit:
+                low = byte & -byte
+                positions.append(base + low.bit_length() - 1)
+                byte ^= low
+            if len(positions) >= limit:
+                break
+        return positions
+    text = bin(bits)[:1:-1]  # 去掉 '0b' 并反转，第i个字符对应第i位
+    position = text.find('1')
+    while position != -1 and (limit is None or len(positions) < limit):
+        positions.append(position)
+        position = text.find('1', position + 1)
+    return positions
+
+
+class TableIndex:
+    """单个设备表的倒排索引"""
+
+    def __init__(self, device_type, rows):
+        self.device_type = device_type
+        self.size = len(rows)
+        self.universe = (1 << self.size) - 1
+        # 字段 -> {取值: 位图}；表中没有的列所有行都按空值索引
+        self.postings = {}
+        for field, column in QUERY_FIELDS.items():
+            positions = {}
+            for position, row in enumerate(rows):
+                positions.setdefault(normalize_value(row.get(column)), []).append(position)
+            self.postings[field] = {key: positions_to_bits(values) for key, values in positions.items()}
+
+    def match(self, field, values):
+        """
+        字段取值属于 values 中任意一个的行
+
+        Returns:
+            int: 位图
+        """
+        if field == DEVICE_TYPE_FIELD:
+            return self.universe if self.device_type in {normalize_value(v) for v in values} else 0
+        postings = self.postings[field]
+        bits = 0
+        for value in values:
+            bits |= postings.get(normalize_value(value), 0)
+        return bits
+
+    def update(self, position, old_row, new_row):
+        """单行被修改后更新受影响字段的位图"""
+        bit = 1 << position
+        for field, column in QUERY_FIELDS.items():
+            old_key = normalize_value(old_row.get(column))
+            new_key = normalize_value(new_row.get(column))
+            if old_key == new_key:
+                continue
+            postings = self.postings[field]
+            remaining = postings.get(old_key, 0) & ~bit
+            if remaining:
+                postings[old_key] = remaining
+            else:
+                postings.pop(old_key, None)
+            postings[new_key] = postings.get(new_key, 0) | bit
+
+
+class DeviceIndex:
+    """所有设备表的倒排索引，由拥有设备行的一方（DeviceCatalog 等）在数据变化时维护"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = {}
+
+    def replace(self, device_type, rows):
+        """设备表（重新）加载后重建该表的索引"""
+        table_index = TableIndex(device_type, rows)
+        with self._lock:
+            self._tables[device_type] = table_index
+
+    def remove(self, device_type):
+        """移除设备表的索引"""
+        with self._lock:
+            self._tables.pop(device_type, None)
+
+    def update(self, device_type, position, old_row, new_row):
+        """单行被修改"""
+        with self._lock:
+            table_index = self._tables.get(device_type)
+            if table_index is not None:
+                table_index.update(position, old_row, new_row)
+
+    def search(self, device_type, query):
+        """
+        在一个设备表中执行查询
+
+        Returns:
+            list: 命中的行号（升序）；该表没有索引时返回空列表
+        """
+        with self._lock:
+            table_index = self._tables.get(device_type)
+            if table_index is None:
+                return []
+            return bit_positions(query.evaluate(table_index))
+
+
+class DeviceQuery:
+    """
+    可组合的设备查询条件
+
+    - DeviceQuery.where(field=value, ...): 各字段条件同时满足；value 为列表时匹配其中任意一个
+    - q1 & q2 / q1 | q2 / ~q: 与、或、非
+    - DeviceQuery.parse(expression): 从JSON结构解析
+    """
+
+    __slots__ = ('op', 'args')
+
+    def __init__(self, op, args):
+        self.op = op
+        self.args = args
+
+    @classmethod
+    def match(cls, field, values):
+        """字段取值属于 values 中任意一个（取值去掉首尾空白、不区分大小写，空字符串匹配空值）"""
+        if field not in QUERY_FIELDS and field != DEVICE_TYPE_FIELD:
+            raise ValueError(
+                f"不支持的查询字段: {field} (可选: {', '.join([DEVICE_TYPE_FIELD, *QUERY_FIELDS])})"
+            )
+        if isinstance(values, str):
+            values = [values]
+        if not isinstance(values, (list, tuple)) or not values \
+                or not all(isinstance(value, str) for value in values):
+            raise ValueError(f"查询字段 {field} 的取值必须是字符串或非空的字符串列表")
+        return cls('match', (field, tuple(values)))
+
+    @classmethod
+    def where(cls, **conditions):
+        """各字段条件同时满足"""
+        if not conditions:
+            return cls('all', ())
+        return cls.all_of([cls.match(field, values) for field, values in conditions.items()])
+
+    @classmethod
+    def all_of(cls, queries):
+        queries = list(queries)
+        return queries[0] if len(queries) == 1 else cls('and', tuple(queries))
+
+    @classmethod
+    def any_of(cls, queries):
+        queries = list(queries)
+        return queries[0] if len(queries) == 1 else cls('or', tuple(queries))
+
+    @classmethod
+    def parse(cls, expression):
+        """
+        从JSON结构解析查询
+
+        - {"and": [表达式, ...]} / {"or": [表达式, ...]} / {"not": 表达式}
+        - {"字段": 取值或取值列表, ...}: 多个字段时同时满足
+        - {}: 匹配所有设备
+
+        Raises:
+            ValueError: 表达式格式错误
+        """
+        if not isinstance(expression, dict):
+            raise ValueError(f"查询表达式必须是对象: {expression!r}")
+        parts = []
+        for key, value in expression.items():
+            if key in ('and', 'or'):
+                if not isinstance(value, list) or not value:
+                    raise ValueError(f"'{key}' 的值必须是非空的表达式列表")
+                children = [cls.parse(child) for child in value]
+                parts.append(cls.all_of(children) if key == 'and' else cls.any_of(children))
+            elif key == 'not':
+                parts.append(~cls.parse(value))
+            else:
+                parts.append(cls.match(key, value))
+        if not parts:
+            return cls('all', ())
+        return cls.all_of(parts)
+
+    def evaluate(self, table_index):
+        """
+        在一个设备表的索引上求值
+
+        Returns:
+            int: 命中行的位图
+        """
+        if self.op == 'match':
+            return table_index.match(*self.args)
+        if self.op == 'all':
+            return table_index.universe
+        if self.op == 'not':
+            return table_index.universe & ~self.args[0].evaluate(table_index)
+        if self.op == 'and':
+            bits = table_index.universe
+            for child in self.args:
+                bits &= child.evaluate(table_index)
+                if not bits:
+                    break
+            return bits
+        bits = 0
+        for child in self.args:
+            bits |= child.evaluate(table_index)
+        return bits
+
+    def to_dict(self):
+        """转换回JSON结构"""
+        if self.op == 'match':
+            field, values = self.args
+            return {field: values[0] if len(values) == 1 else list(values)}
+        if self.op == 'all':
+            return {}
+        if self.op == 'not':
+            return {'not': self.args[0].to_dict()}
+        return {self.op: [child.to_dict() for child in self.args]}
+
+    def __and__(self, other):
+        return DeviceQuery('and', (self, other))
+
+    def __or__(self, other):
+        return DeviceQuery('or', (self, other))
+
+    def __invert__(self):
+        return DeviceQuery('not', (self,))
+
+    def __repr__(self):
+        return f"DeviceQuery({self.to_dict()!r})"
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+借用/归还记录存储（RecordStore）
+records.csv 作为快照，新记录追加到二进制日志 records.journal，
+内存中维护按资产编号、借用者、状态的索引，定期把日志压缩回快照
+"""
+
+import csv
+import logging
+import os
+import threading
+
+from .catalog import file_signature, get_devices_dir
+from .journal import append_frames, decode_frames, encode_frame
+from .locks import get_file_locks
+from ..utils.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+# records.csv 的列
+RECORD_FIELDNAMES = ['创建日期', '借用者', '设备', '资产编号', '状态', '原因']
+
+# 压缩时日志改名为 records.journal.compacting.<快照原有行数>，
+# 恢复时据此判断快照是否已经包含这些记录
+COMPACTING_SUFFIX = '.compacting.'
+
+
+class RecordStore:
+    """
+    追加式记录存储
+
+    - 追加: 写一个日志帧，O(1)，不重新读取或重写 records.csv
+    - 读取: 快照只解析一次，之后只增量读取日志新增的部分
+    - 查询: 通过资产编号/借用者/状态索引定位，代价与结果数量成正比
+    """
+
+    def __init__(self, devices_dir=None, compact_threshold=1000):
+        """
+        Args:
+            devices_dir (Path): 数据目录，默认使用 get_devices_dir()
+            compact_threshold (int): 日志中记录数超过该值时压缩回 records.csv
+        """
+        self.devices_dir = devices_dir or get_devices_dir()
+        self.snapshot_path = self.devices_dir / "records.csv"
+        self.journal_path = self.devices_dir / "records.journal"
+        self.compact_threshold = compact_threshold
+
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._snapshot_signature = None
+        self._journal_offset = 0
+        self._journal_start = 0  # 日志中第一条记录在 _records 中的位置
+        self._journal_epoch = 0  # 日志重新开始（压缩、快照重载）时递增，旧的偏移量随之失效
+        self._records = []
+        self._by_asset = {}
+        self._by_borrower = {}
+        self._by_status = {}
+        # 记录变化时递增，供上层缓存判断数据是否变化
+        self.generation = 0
+
+    @property
+    def fieldnames(self):
+        return list(RECORD_FIELDNAMES)
+
+    def refresh(self):
+        """
+        同步磁盘上的变化：快照变化时完整重载，日志只读取新增部分
+
+        磁盘没有变化时只做stat检查；有变化时持有 records 锁再读取，
+        不会与其他进程的追加或压缩（日志改名 -> 写快照 -> 删除改名后的日志）交错
+
+        Raises:
+            FileNotFoundError: records.csv 和 records.journal 都不存在时抛出
+        """
+        with self._lock:
+            if self._loaded and self._disk_state() == (self._snapshot_signature, self._journal_offset):
+                return
+            with get_file_locks(self.devices_dir).named('records'):
+                if not self._loaded:
+                    self._recover_compaction()
+                snapshot_signature, journal_size = self._disk_state()
+                if snapshot_signature is None and not self.journal_path.exists():
+                    raise FileNotFoundError(f"记录CSV文件未找到: {self.snapshot_path}")
+
+                if (not self._loaded or snapshot_signature != self._snapshot_signature
+                        or journal_size < self._journal_offset):
+                    self._load_snapshot(snapshot_signature)
+                if journal_size > self._journal_offset:
+                    self._read_journal_tail()
+
+    def _disk_state(self):
+        """
+        Returns:
+            tuple: (快照签名，不存在时为None, 日志大小，不存在时为0)
+        """
+        try:
+            snapshot_signature = file_signature(self.snapshot_path)
+        except FileNotFoundError:
+            snapshot_signature = None
+        try:
+            journal_size = os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            journal_size = 0
+        return snapshot_signature, journal_size
+
+    def all_records(self):
+        """获取所有记录（拷贝）"""
+        with self._lock:
+            self.refresh()
+            return [dict(record) for record in self._records]
+
+    def count(self):
+        """记录总数"""
+        with self._lock:
+            self.refresh()
+            return len(self._records)
+
+    def query(self, asset_number=None, borrower=None, status=None, start=0, limit=None):
+        """
+        按条件查询记录
+
+        Args:
+            asset_number (str): 资产编号
+            borrower (str): 借用者
+            status (str): 状态（借用/归还）
+            start (int): 跳过前 start 条匹配结果
+            limit (int): 最多返回条数，None表示不限制；为负数时返回最后 -limit 条
+
+        Returns:
+            list: 匹配的记录（拷贝），按写入顺序排列
+        """
+        asset_number, borrower, status = (
+            (value or '').strip() for value in (asset_number, borrower, status)
+        )
+        with self._lock:
+            self.refresh()
+            candidates = [
+                index.get(value, [])
+                for index, value in ((self._by_asset, asset_number),
+                                     (self._by_borrower, borrower),
+                                     (self._by_status, status))
+                if value
+            ]
+            if candidates:
+                # 从最短的索引列表出发，逐条检查其余条件
+                positions = min(candidates, key=len)
+                matched = [
+                    position for position in positions
+                    if self._matches(self._records[position], asset_number, borrower, status)
+                ]
+            else:
+                matched = range(len(self._records))
+
+            if limit is not None and limit < 0:
+                selected = matched[limit:]
+            elif limit is not None:
+                selected = matched[start:start + limit]
+            else:
+                selected = matched[start:]
+            return [dict(self._records[position]) for position in selected]
+
+    def read_since(self, offset, epoch=None):
+        """
+        增量读取：返回日志中指定字节偏移之后追加的记录
+
+        日志被压缩后旧的偏移量失效（新日志可能已经增长到超过旧偏移量），
+        轮次与上次读取不同时从新日志的开头读取；压缩前未读取的记录已合并进快照
+
+        Args:
+            offset (int): 上次读取返回的偏移量（首次传0）
+            epoch (int): 上次读取返回的日志轮次（首次传None）
+
+        Returns:
+            tuple: (records, new_offset, epoch)
+        """
+        with self._lock:
+            self.refresh()
+            if epoch != self._journal_epoch or offset > self._journal_offset:
+                offset = 0
+            if offset == self._journal_offset:
+                return [], offset, self._journal_epoch
+            with open(self.journal_path, 'rb') as file:
+                file.seek(offset)
+                data = file.read(self._journal_offset - offset)
+            records, consumed = decode_frames(data, RECORD_FIELDNAMES)
+            return records, offset + consumed, self._journal_epoch
+
+    def append(self, record):
+        """追加一条记录"""
+        self.append_many([record])
+
+    def append_many(self, records):
+        """
+        追加多条记录（一次写入）
+
+        Args:
+            records (list): 记录列表，字段见 RECORD_FIELDNAMES
+        """
+        records = [{name: record.get(name, '') for name in RECORD_FIELDNAMES} for record in records]
+        if not records:
+            return
+        # 进程间锁保证其他进程不会在 读取末尾 -> 截断 -> 写入 之间追加
+        with self._lock, get_file_locks(self.devices_dir).named('records'):
+            try:
+                self.refresh()
+            except FileNotFoundError:
+                # 首次写入：创建带标题行的 records.csv
+                self._write_snapshot(self.snapshot_path, [])
+                self.refresh()
+
+            data = b''.join(encode_frame(record, RECORD_FIELDNAMES) for record in records)
+            # refresh 已读入其他进程追加的完整帧，剩下的只可能是崩溃遗留的不完整帧
+            self._journal_offset = append_frames(self.journal_path, data, self._journal_offset)
+
+            for record in records:
+                self._add_to_memory(record)
+            self.generation += 1
+
+            if len(self._records) - self._journal_start >= self.compact_threshold:
+                self.compact()
+
+    def compact(self):
+        """把日志中的记录合并进 records.csv 并清空日志"""
+        with self._lock, get_file_locks(self.devices_dir).named('records'):
+            self.refresh()
+            if not self.journal_path.exists():
+                return
+            base_rows = self._journal_start
+            compacting_path = self.journal_path.with_name(
+                f"{self.journal_path.name}{COMPACTING_SUFFIX}{base_rows}"
+            )
+            os.replace(self.journal_path, compacting_path)
+            self._write_snapshot(self.snapshot_path, self._records)
+            os.remove(compacting_path)
+
+            self._snapshot_signature = file_signature(self.snapshot_path)
+            self._journal_offset = 0
+            self._journal_start = len(self._records)
+            self._journal_epoch += 1
+            logger.info("记录日志已压缩: %s 条合并到 %s", len(self._records) - base_rows, self.snapshot_path)
+
+    def _recover_compaction(self):
+        """处理上次压缩中途崩溃遗留的文件（调用方持有 records 锁，正在进行的压缩不会被当成崩溃）"""
+        for path in self.devices_dir.glob(f"{self.journal_path.name}{COMPACTING_SUFFIX}*"):
+            base_rows = int(path.name.rsplit('.', 1)[1])
+            with open(path, 'rb') as file:
+                pending, _ = decode_frames(file.read(), RECORD_FIELDNAMES)
+            snapshot_rows = self._read_snapshot() if self.snapshot_path.exists() else []
+            if len(snapshot_rows) == base_rows:
+                # 快照尚未写入，用旧快照 + 压缩中的日志 + 新日志重建
+                journal_records = []
+                if self.journal_path.exists():
+                    with open(self.journal_path, 'rb') as file:
+                        journal_records, _ = decode_frames(file.read(), RECORD_FIELDNAMES)
+                self._write_snapshot(self.snapshot_path, snapshot_rows + pending + journal_records)
+                if self.journal_path.exists():
+                    os.remove(self.journal_path)
+            os.remove(path)
+            self._loaded = False
+            logger.warning("已恢复未完成的记录压缩: %s", path.name)
+
+    def _load_snapshot(self, snapshot_signature):
+        """完整加载快照并重建索引"""
+        rows = self._read_snapshot() if snapshot_signature is not None else []
+        self._records = []
+        self._by_asset = {}
+        self._by_borrower = {}
+        self._by_status = {}
+        for row in rows:
+            self._add_to_memory(row)
+        self._snapshot_signature = snapshot_signature
+        self._journal_start = len(self._records)
+        self._journal_offset = 0
+        self._journal_epoch += 1
+        self._loaded = True
+        self.generation += 1
+        logger.debug("加载记录快照: %s 条 (%s)", len(rows), self.snapshot_path)
+
+    def _read_journal_tail(self):
+        """只读取日志中尚未加载的部分"""
+        with observe_stage('journal_read'):
+            with open(self.journal_path, 'rb') as file:
+                file.seek(self._journal_offset)
+                data = file.read()
+            records, consumed = decode_frames(data, RECORD_FIELDNAMES)
+        for record in records:
+            self._add_to_memory(record)
+        self._journal_offset += consumed
+        if records:
+            self.generation += 1
+
+    def _read_snapshot(self):
+        """解析 records.csv"""
+        rows = []
+        with observe_stage('csv_parse'), open(self.snapshot_path, 'r', encoding='utf-8') as file:
+            reader = csv.DictReader(file)
+            if not reader.fieldnames:
+                raise Exception("CSV文件格式错误：未找到列标题")
+            for row in reader:
+                if any(row.values()):  # 跳过空行
+                    rows.append(row)
+        return rows
+
+    def _write_snapshot(self, path, records):
+        """原子地写入快照（临时文件 + 替换）"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=RECORD_FIELDNAMES, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(records)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+
+    def _add_to_memory(self, record):
+        position = len(self._records)
+        self._records.append(record)
+        for index, name in ((self._by_asset, '资产编号'),
+                            (self._by_borrower, '借用者'),
+                            (self._by_status, '状态')):
+            value = (record.get(name) or '').strip()
+            if value:
+                index.setdefault(value, []).append(position)
+
+    @staticmethod
+    def _matches(record, asset_number, borrower, status):
+        return ((not asset_number or (record.get('资产编号') or '').strip() == asset_number)
+                and (not borrower or (record.get('借用者') or '').strip() == borrower)
+                and (not status or (record.get('状态') or '').strip() == status))
+
+
+_record_store = None
+_record_store_lock = threading.Lock()
+
+
+def get_record_store():
+    """获取进程内共享的记录存储实例"""
+    global _record_store
+    if _record_store is None:
+        with _record_store_lock:
+            if _record_store is None:
+                _record_store = RecordStore()
+    return _record_store
@@ -4,16 +4,14 @@
 记录CSV文件读取器和记录管理器
 """
 
-import csv
-import os
-from pathlib import Path
+import logging
 from datetime import datetime
 
-# 导入其他设备读取器
-from .android_reader import read_android_devices
-from .ios_reader import read_ios_devices  
-from .windows_reader import read_windows_devices
-from .other_reader import read_other_devices
+from .device_store import get_device_store
+from .record_store import RECORD_FIELDNAMES
+from .transactions import StatusConflictError, get_transactions
+
+logger = logging.getLogger(__name__)
 
 
 def read_records():
@@ -29,49 +27,55 @@ def read_records():
         Exception: 其他读取错误时抛出
     """
     try:
-        # 获取项目根目录
-        current_dir = Path(__file__).parent.parent.parent
-        csv_file_path = current_dir / "Devices" / "records.csv"
-        
-        # 检查文件是否存在
-        if not csv_file_path.exists():
-            raise FileNotFoundError(f"记录CSV文件未找到: {csv_file_path}")
-        
-        records = []
-        
-        # 读取CSV文件
-        with open(csv_file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            
-            # 验证是否有数据
-            fieldnames = reader.fieldnames
-            if not fieldnames:
-                raise Exception("CSV文件格式错误：未找到列标题")
-            
-            # 读取所有行
-            for row_num, row in enumerate(reader, start=2):  # 从第2行开始计数（考虑标题行）
-                if any(row.values()):  # 跳过空行
-                    records.append(row)
-        
-        print(f"✅ 记录CSV文件读取成功！")
-        print(f"📁 文件路径: {csv_file_path}")
-        print(f"📊 共读取到 {len(records)} 条记录")
-        print(f"📋 字段列表: {', '.join(fieldnames)}")
+        # 从设备存储获取（CSV: records.csv 快照 + records.journal 追加日志，只增量读取新增部分）
+        store = get_device_store()
+        records = store.all_records()
+        csv_file_path = store.records_location()
+        fieldnames = RECORD_FIELDNAMES
+        
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("✅ 记录CSV文件读取成功！")
+            logger.info("📁 文件路径: %s", csv_file_path)
+            logger.info("📊 共读取到 %d 条记录", len(records))
+            logger.info("📋 字段列表: %s", ', '.join(fieldnames))
         
         return records
         
     except FileNotFoundError as e:
-        print(f"❌ 文件未找到错误: {e}")
+        logger.error("❌ 文件未找到错误: %s", e)
         raise
     except UnicodeDecodeError as e:
-        print(f"❌ 文件编码错误: {e}")
-        print("💡 建议：请确保CSV文件使用UTF-8编码保存")
+        logger.error("❌ 文件编码错误: %s", e)
+        logger.error("💡 建议：请确保CSV文件使用UTF-8编码保存")
         raise
     except Exception as e:
-        print(f"❌ 读取记录CSV文件失败: {e}")
+        logger.error("❌ 读取记录CSV文件失败: %s", e)
         raise
 
 
+def query_records(asset_number=None, borrower=None, status=None, limit=None):
+    """
+    按条件查询借用/归还记录（使用记录存储的内存索引或SQLite索引，不扫描全部历史）
+    
+    Args:
+        asset_number (str): 资产编号（可选）
+        borrower (str): 借用者（可选）
+        status (str): 状态，借用/归还（可选）
+        limit (int): 只返回最近的N条（可选）
+        
+    Returns:
+        list: 匹配的记录列表，按时间顺序排列
+    """
+    records = get_device_store().query_records(
+        asset_number=asset_number.strip() if asset_number else None,
+        borrower=borrower.strip() if borrower else None,
+        status=status or None,
+        limit=limit,
+    )
+    logger.info("✅ 记录查询完成，共 %d 条", len(records))
+    return records
+
+
 def find_device_by_asset_number(asset_number):
     """
     根据资产编号在所有设备表中查找设备信息
@@ -87,28 +91,13 @@ def find_device_by_asset_number(asset_number):
         
     asset_number = asset_number.strip()
     
-    # 定义设备类型和对应的读取器
-    device_readers = {
-        'android': read_android_devices,
-        'ios': read_ios_devices,
-        'windows': read_windows_devices,
-        'other': read_other_devices
-    }
+    # 通过资产编号索引查找（CSV: 共享设备目录的哈希索引；SQLite: asset_number索引）
+    device_info, device_type = get_device_store().find_asset(asset_number)
+    if device_info:
+        logger.info("✅ 在%s设备表中找到资产编号 %s", device_type, asset_number)
+        return device_info, device_type
     
-    # 在每个设备表中查找
-    for device_type, reader in device_readers.items():
-        try:
-            devices = reader()
-            for device in devices:
-                # 检查资产编号字段
-                if device.get('资产编号', '').strip() == asset_number:
-                    print(f"✅ 在{device_type}设备表中找到资产编号 {asset_number}")
-                    return device, device_type
-        except Exception as e:
-            print(f"⚠️ 读取{device_type}设备表时出错: {e}")
-            continue
-    
-    print(f"❌ 未在任何设备表中找到资产编号: {asset_number}")
+    logger.info("❌ 未在任何设备表中找到资产编号: %s", asset_number)
     return None, None
 
 
@@ -144,7 +133,7 @@ def add_return_record(asset_number, borrower, reason=""):
 
 def _add_record(asset_number, borrower, status, reason=""):
     """
-    内部函数：添加记录到records.csv
+    内部函数：添加记录到记录日志（定期压缩回records.csv）
     
     Args:
         asset_number (str): 资产编号
@@ -187,42 +176,22 @@ def _add_record(asset_number, borrower, status, reason=""):
             '原因': reason
         }
         
-        # 获取records.csv文件路径
-        current_dir = Path(__file__).parent.parent.parent
-        csv_file_path = current_dir / "Devices" / "records.csv"
-        
-        # 确保目录存在
-        csv_file_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        # 检查文件是否存在，如果不存在则创建带标题行的文件
-        if not csv_file_path.exists():
-            with open(csv_file_path, 'w', encoding='utf-8', newline='') as file:
-                fieldnames = ['创建日期', '借用者', '设备', '资产编号', '状态', '原因']
-                writer = csv.DictWriter(file, fieldnames=fieldnames)
-                writer.writeheader()
-                
-        # 追加新记录到文件
-        with open(csv_file_path, 'a', encoding='utf-8', newline='') as file:
-            fieldnames = ['创建日期', '借用者', '设备', '资产编号', '状态', '原因']
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writerow(new_record)
-        
-        print(f"✅ 成功添加{status}记录:")
-        print(f"   📅 日期: {current_date}")
-        print(f"   👤 借用者: {borrower}")
-        print(f"   📱 设备: {device_name}")
-        print(f"   🏷️ 资产编号: {asset_number}")
-        print(f"   📋 状态: {status}")
-        if reason:
-            print(f"   💬 原因: {reason}")
+        # 追加到记录存储（CSV: 写一个日志帧，不重新读取或重写records.csv）
+        get_device_store().append_records([new_record])
         
-        # TODO: 这里可以添加更新设备状态的逻辑
-        # 现在先只添加记录，设备状态更新需要修改原始CSV文件
+        logger.info("✅ 成功添加%s记录:", status)
+        logger.info("   📅 日期: %s", current_date)
+        logger.info("   👤 借用者: %s", borrower)
+        logger.info("   📱 设备: %s", device_name)
+        logger.info("   🏷️ 资产编号: %s", asset_number)
+        logger.info("   📋 状态: %s", status)
+        if reason:
+            logger.info("   💬 原因: %s", reason)
         
         return True
         
     except Exception as e:
-        print(f"❌ 添加{status}记录失败: {e}")
+        logger.error("❌ 添加%s记录失败: %s", status, e)
         return False
 
 
@@ -244,55 +213,22 @@ def update_device_status_in_csv(asset_number, new_status, new_borrower=""):
         if not device_info:
             raise ValueError(f"未找到资产编号为 {asset_number} 的设备")
         
-        # 根据设备类型确定CSV文件路径
-        current_dir = Path(__file__).parent.parent.parent
-        csv_files = {
-            'android': current_dir / "Devices" / "android_devices.csv",
-            'ios': current_dir / "Devices" / "ios_devices.csv", 
-            'windows': current_dir / "Devices" / "windows_devices.csv",
-            'other': current_dir / "Devices" / "other_devices.csv"
-        }
-        
-        csv_file_path = csv_files.get(device_type)
-        if not csv_file_path or not csv_file_path.exists():
-            raise ValueError(f"设备类型 {device_type} 对应的CSV文件不存在")
+        # 持有资产锁写入；overlay 模式下只追加一条状态日志，csv 模式下原子地重写设备CSV
+        get_transactions().set_status(device_type, asset_number.strip(), new_status, new_borrower or "")
+        logger.info("✅ 找到并更新设备记录: %s", asset_number)
         
-        # 读取原有数据
-        rows = []
-        with open(csv_file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            fieldnames = reader.fieldnames
-            
-            for row in reader:
-                if row.get('资产编号', '').strip() == asset_number.strip():
-                    # 更新找到的设备记录
-                    row['设备状态'] = new_status
-                    if new_borrower:
-                        row['借用者'] = new_borrower
-                    else:
-                        row['借用者'] = ""  # 归还时清空借用者
-                    print(f"✅ 找到并更新设备记录: {asset_number}")
-                
-                rows.append(row)
-        
-        # 写回更新后的数据
-        with open(csv_file_path, 'w', encoding='utf-8', newline='') as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
-        
-        print(f"✅ 成功更新设备状态:")
-        print(f"   🏷️ 资产编号: {asset_number}")
-        print(f"   📋 新状态: {new_status}")
+        logger.info("✅ 成功更新设备状态:")
+        logger.info("   🏷️ 资产编号: %s", asset_number)
+        logger.info("   📋 新状态: %s", new_status)
         if new_borrower:
-            print(f"   👤 新借用者: {new_borrower}")
+            logger.info("   👤 新借用者: %s", new_borrower)
         else:
-            print(f"   👤 借用者: 已清空")
+            logger.info("   👤 借用者: 已清空")
             
         return True
         
     except Exception as e:
-        print(f"❌ 更新设备状态失败: {e}")
+        logger.error("❌ 更新设备状态失败: %s", e)
         return False
 
 
@@ -300,6 +236,9 @@ def borrow_device(asset_number, borrower, reason=""):
     """
     借用设备（完整流程：添加借用记录 + 更新设备状态）
     
+    两次写入在同一个事务中完成：持有该资产的锁，只有状态为"可用"的设备可以借用，
+    中途崩溃时下次启动会根据意图日志补全
+    
     Args:
         asset_number (str): 资产编号
         borrower (str): 借用者
@@ -308,28 +247,15 @@ def borrow_device(asset_number, borrower, reason=""):
     Returns:
         bool: 是否成功
     """
-    try:
-        # 1. 添加借用记录
-        if not add_borrow_record(asset_number, borrower, reason):
-            return False
-            
-        # 2. 更新设备状态为"正在使用"
-        if not update_device_status_in_csv(asset_number, "正在使用", borrower):
-            print("⚠️ 记录已添加，但设备状态更新失败")
-            return False
-            
-        print(f"🎉 设备借用成功完成！")
-        return True
-        
-    except Exception as e:
-        print(f"❌ 设备借用失败: {e}")
-        return False
+    return _run_transaction('借用', asset_number, borrower, reason)
 
 
 def return_device(asset_number, borrower, reason=""):
     """
     归还设备（完整流程：添加归还记录 + 更新设备状态）
     
+    与借用相同的事务保证，只有状态为"正在使用"的设备可以归还
+    
     Args:
         asset_number (str): 资产编号  
         borrower (str): 归还者
@@ -338,75 +264,189 @@ def return_device(asset_number, borrower, reason=""):
     Returns:
         bool: 是否成功
     """
+    return _run_transaction('归还', asset_number, borrower, reason)
+
+
+def borrow_devices(asset_numbers, borrower, reason=""):
+    """
+    批量借用设备（例如一次借出一整个机架）
+
+    所有通过校验的设备在一个批次中完成：记录一次追加，设备状态一次提交；
+    不存在或状态不是"可用"的设备单独报告，不影响其他设备
+
+    Args:
+        asset_numbers (list): 资产编号列表
+        borrower (str): 借用者
+        reason (str): 借用原因
+
+    Returns:
+        list: 每个资产编号的结果 {'资产编号', 'success', 'record' 或 'error'}，与输入顺序一致
+    """
+    return _run_bulk_transaction('借用', asset_numbers, borrower, reason)
+
+
+def return_devices(asset_numbers, borrower, reason=""):
+    """
+    批量归还设备，与 borrow_devices 相同的批次保证，只有状态为"正在使用"的设备可以归还
+
+    Args:
+        asset_numbers (list): 资产编号列表
+        borrower (str): 归还者
+        reason (str): 归还原因
+
+    Returns:
+        list: 每个资产编号的结果 {'资产编号', 'success', 'record' 或 'error'}，与输入顺序一致
+    """
+    return _run_bulk_transaction('归还', asset_numbers, borrower, reason)
+
+
+def check_devices(status, asset_numbers):
+    """
+    预先校验批量借用/归还（不加锁、不写入）
+
+    Args:
+        status (str): 借用/归还
+        asset_numbers (list): 资产编号列表
+
+    Returns:
+        dict: 资产编号 -> 错误信息，只包含不能借用/归还的设备
+    """
+    return get_transactions().check_many(status, _clean_asset_numbers(asset_numbers))
+
+
+def _clean_asset_numbers(asset_numbers):
+    """去掉首尾空白、空值和重复的资产编号，保持顺序"""
+    return list(dict.fromkeys(
+        asset_number.strip() for asset_number in asset_numbers or [] if asset_number and asset_number.strip()
+    ))
+
+
+def _run_bulk_transaction(status, asset_numbers, borrower, reason=""):
+    """
+    内部函数：以批量事务方式执行借用/归还
+
+    Returns:
+        list: 每个资产编号的结果
+    """
+    asset_numbers = _clean_asset_numbers(asset_numbers)
     try:
-        # 1. 添加归还记录
-        if not add_return_record(asset_number, borrower, reason):
-            return False
-            
-        # 2. 更新设备状态为"可用"
-        if not update_device_status_in_csv(asset_number, "可用", ""):
-            print("⚠️ 记录已添加，但设备状态更新失败")
-            return False
-            
-        print(f"🎉 设备归还成功完成！")
+        if not asset_numbers:
+            raise ValueError("资产编号不能为空")
+        if not borrower or not borrower.strip():
+            raise ValueError("借用者不能为空")
+
+        results = get_transactions().execute_many(
+            status, asset_numbers, borrower.strip(), (reason or "").strip()
+        )
+    except Exception as e:
+        logger.error("❌ 批量%s失败: %s", status, e)
+        return [{'资产编号': asset_number, 'success': False, 'error': str(e)} for asset_number in asset_numbers]
+
+    succeeded = sum(1 for result in results if result['success'])
+    logger.info("🎉 批量%s完成: 成功 %d 台, 失败 %d 台", status, succeeded, len(results) - succeeded)
+    for result in results:
+        if not result['success']:
+            logger.warning("⚠️ 设备%s被拒绝: %s", status, result['error'])
+    return results
+
+
+def _run_transaction(status, asset_number, borrower, reason=""):
+    """
+    内部函数：以事务方式执行借用/归还
+    
+    Args:
+        status (str): 借用/归还
+        asset_number (str): 资产编号
+        borrower (str): 借用者/归还者
+        reason (str): 原因
+        
+    Returns:
+        bool: 是否成功
+    """
+    try:
+        # 参数验证
+        if not asset_number or not asset_number.strip():
+            raise ValueError("资产编号不能为空")
+        if not borrower or not borrower.strip():
+            raise ValueError("借用者不能为空")
+        
+        record = get_transactions().execute(
+            status, asset_number.strip(), borrower.strip(), (reason or "").strip()
+        )
+        
+        logger.info("✅ 成功添加%s记录:", status)
+        logger.info("   📅 日期: %s", record['创建日期'])
+        logger.info("   👤 借用者: %s", record['借用者'])
+        logger.info("   📱 设备: %s", record['设备'])
+        logger.info("   🏷️ 资产编号: %s", record['资产编号'])
+        logger.info("   📋 状态: %s", status)
+        if record['原因']:
+            logger.info("   💬 原因: %s", record['原因'])
+        logger.info("🎉 设备%s成功完成！", status)
         return True
         
+    except StatusConflictError as e:
+        logger.warning("⚠️ 设备%s被拒绝: %s", status, e)
+        return False
     except Exception as e:
-        print(f"❌ 设备归还失败: {e}")
+        logger.error("❌ 设备%s失败: %s", status, e)
         return False
 
 
 if __name__ == "__main__":
+    from src.utils.logging_utils import enable_console_logging
+    enable_console_logging()
+    
     try:
         # 测试读取记录
-        print("=" * 60)
-        print("🔧 测试记录读取功能")
-        print("=" * 60)
+        logger.info("=" * 60)
+        logger.info("🔧 测试记录读取功能")
+        logger.info("=" * 60)
         
         records = read_records()
         
         # 显示前3条记录作为示例
         if records:
-            print(f"\n📝 前3条记录示例:")
+            logger.info(f"\n📝 前3条记录示例:")
             for i, record in enumerate(records[:3], 1):
-                print(f"\n记录 {i}:")
+                logger.info(f"\n记录 {i}:")
                 for key, value in record.items():
                     if value.strip():  # 只显示非空字段
-                        print(f"  {key}: {value}")
+                        logger.info(f"  {key}: {value}")
         else:
-            print("⚠️  未读取到任何记录")
+            logger.warning("⚠️  未读取到任何记录")
         
         # 测试设备查找功能
-        print("\n\n" + "=" * 60)
-        print("🔍 测试设备查找功能")
-        print("=" * 60)
+        logger.info("\n\n" + "=" * 60)
+        logger.info("🔍 测试设备查找功能")
+        logger.info("=" * 60)
         
         # 测试查找一个存在的资产编号
         test_asset = "18294886"  # SAMSUNG Tab S8的资产编号
-        print(f"\n🔍 查找资产编号: {test_asset}")
+        logger.info(f"\n🔍 查找资产编号: {test_asset}")
         device_info, device_type = find_device_by_asset_number(test_asset)
         
         if device_info:
-            print(f"✅ 找到设备:")
-            print(f"   设备类型: {device_type}")
-            print(f"   设备名称: {device_info.get('设备名称', 'N/A')}")
-            print(f"   设备状态: {device_info.get('设备状态', 'N/A')}")
-            print(f"   当前借用者: {device_info.get('借用者', 'N/A')}")
+            logger.info(f"✅ 找到设备:")
+            logger.info(f"   设备类型: {device_type}")
+            logger.info(f"   设备名称: {device_info.get('设备名称', 'N/A')}")
+            logger.info(f"   设备状态: {device_info.get('设备状态', 'N/A')}")
+            logger.info(f"   当前借用者: {device_info.get('借用者', 'N/A')}")
         
         # 测试新接口的使用示例
-        print("\n\n" + "=" * 60)
-        print("📚 新接口使用示例")
-        print("=" * 60)
-        print("\n💡 借用设备示例代码:")
-        print("   borrow_device('18294886', 'test_user', '测试借用')")
-        print("\n💡 归还设备示例代码:")
-        print("   return_device('18294886', 'test_user', '测试归还')")
-        print("\n💡 单独添加记录示例代码:")
-        print("   add_borrow_record('18294886', 'test_user', '测试原因')")
-        print("   add_return_record('18294886', 'test_user', '测试原因')")
-        
-        print(f"\n🎉 所有测试完成！")
+        logger.info("\n\n" + "=" * 60)
+        logger.info("📚 新接口使用示例")
+        logger.info("=" * 60)
+        logger.info("\n💡 借用设备示例代码:")
+        logger.info("   borrow_device('18294886', 'test_user', '测试借用')")
+        logger.info("\n💡 归还设备示例代码:")
+        logger.info("   return_device('18294886', 'test_user', '测试归还')")
+        logger.info("\n💡 单独添加记录示例代码:")
+        logger.info("   add_borrow_record('18294886', 'test_user', '测试原因')")
+        logger.info("   add_return_record('18294886', 'test_user', '测试原因')")
+        
+        logger.info(f"\n🎉 所有测试完成！")
             
     except Exception as e:
-        print(f"❌ 程序执行失败: {e}")
+        logger.error(f"❌ 程序执行失败: {e}")
         exit(1)
\ No newline at end of file
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+设备状态覆盖层（DeviceStateStore）
+overlay 模式下，设备状态和借用者不再写回设备CSV，而是以几十字节的日志帧
+追加到 Devices/device_state.log；设备CSV只在压缩时才被重写
+
+日志以代次头开始（魔数 + 随机代次号），压缩时整体替换为新代次的空日志，
+其他进程据此发现压缩，而不是靠文件变短来猜测
+"""
+
+import logging
+import os
+import threading
+import uuid
+
+from .journal import append_frames, decode_frames, encode_frame
+from .locks import get_file_locks
+
+logger = logging.getLogger(__name__)
+
+STATE_FIELDNAMES = ['资产编号', '设备状态', '借用者']
+
+# 日志头：魔数 + 16字节代次号；没有日志头的旧日志代次记为 b''
+LOG_MAGIC = b'DSTATE01'
+LOG_HEADER_SIZE = len(LOG_MAGIC) + 16
+
+# 设备状态存储模式：
+#   csv     - 每次状态变化重写设备CSV（默认，CSV始终反映最新状态）
+#   overlay - 状态变化只追加到 device_state.log，读取时覆盖到CSV行上
+STATE_MODES = ('csv', 'overlay')
+
+
+def get_state_mode():
+    """
+    获取设备状态存储模式（环境变量 DEVICE_STATE_MODE，默认 csv）
+    """
+    mode = os.environ.get('DEVICE_STATE_MODE', 'csv').strip().lower()
+    if mode not in STATE_MODES:
+        raise ValueError(f"无效的设备状态存储模式: {mode} (可选: {', '.join(STATE_MODES)})")
+    return mode
+
+
+class DeviceStateStore:
+    """
+    按资产编号保存设备状态的追加日志
+
+    同一资产的后写入条目覆盖先写入的条目；日志只增量读取，
+    代次号变化（其他进程压缩了日志）时丢弃内存中的状态，从新日志的开头重新读取
+    """
+
+    def __init__(self, devices_dir, compact_threshold=5000):
+        """
+        Args:
+            devices_dir (Path): 数据目录
+            compact_threshold (int): 日志条目超过该值时建议压缩回设备CSV
+        """
+        self.path = devices_dir / "device_state.log"
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        self._states = {}
+        self._offset = 0
+        self._entries = 0
+        # 已读取的日志的代次号和inode，None表示日志不存在
+        self._generation = None
+        self._inode = None
+
+    @property
+    def entry_count(self):
+        """日志中的条目数"""
+        return self._entries
+
+    def refresh(self):
+        """
+        读取其他进程追加的条目
+
+        Returns:
+            dict: 本次新读到的 资产编号 -> 状态；日志已被压缩（代次变化或被删除）时返回None，
+                  此时内存中的状态已替换为新日志的内容，调用方应重新加载设备CSV
+        """
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                if self._generation is None:
+                    return {}
+                self._reset(None, None, 0)
+                return None
+            if st.st_ino == self._inode and st.st_size == self._offset:
+                return {}
+
+            with open(self.path, 'rb') as file:
+                generation, start = self._read_header(file)
+                compacted = generation != self._generation or os.fstat(file.fileno()).st_size < self._offset
+                if compacted:
+                    reset = self._generation is not None
+                    self._reset(generation, os.fstat(file.fileno()).st_ino, start)
+                file.seek(self._offset)
+                entries, consumed = decode_frames(file.read(), STATE_FIELDNAMES)
+            self._offset += consumed
+            changed = self._apply(entries)
+            return None if compacted and reset else changed
+
+    def get(self, asset_number):
+        """
+        获取资产的覆盖状态
+
+        Returns:
+            dict: {'设备状态': ..., '借用者': ...}，没有覆盖时返回None
+        """
+        with self._lock:
+            return self._states.get(asset_number)
+
+    def all_states(self):
+        """所有覆盖状态（资产编号 -> 状态）"""
+        with self._lock:
+            return dict(self._states)
+
+    def set_states(self, changes):
+        """
+        追加状态变化（一次写入）
+
+        Args:
+            changes (dict): 资产编号 -> {'设备状态': ..., '借用者': ...}
+
+        Returns:
+            dict: 写入前读到的其他进程的新条目，含义同 refresh()
+        """
+        entries = [
+            {'资产编号': asset_number, **state} for asset_number, state in changes.items()
+        ]
+        if not entries:
+            # 没有写入也没有读到新条目；返回 None 表示日志被压缩，调用方会丢弃所有缓存
+            return {}
+        with self._lock, get_file_locks(self.path.parent).named('state'):
+            others = self.refresh()
+            if self._generation is None or (not self._generation and self._offset == 0):
+                # 日志不存在，或是没有日志头的空旧日志
+                self._create_log()
+            data = b''.join(encode_frame(entry, STATE_FIELDNAMES) for entry in entries)
+            self._offset = append_frames(self.path, data, self._offset)
+            self._apply(entries)
+            return others
+
+    def truncate(self):
+        """清空日志（状态已经写回设备CSV之后调用）：替换为新代次的空日志"""
+        with self._lock, get_file_locks(self.path.parent).named('state'):
+            self._create_log()
+
+    def _create_log(self):
+        """写入只有日志头的新日志（临时文件 + 替换），调用方持有 state 文件锁"""
+        generation = uuid.uuid4().bytes
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'wb') as file:
+            file.write(LOG_MAGIC + generation)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+        self._reset(generation, os.stat(self.path).st_ino, LOG_HEADER_SIZE)
+
+    @staticmethod
+    def _read_header(file):
+        """
+        Returns:
+            tuple: (代次号, 第一帧的偏移)；旧日志返回 (b'', 0)
+        """
+        header = file.read(LOG_HEADER_SIZE)
+        if len(header) == LOG_HEADER_SIZE and header.startswith(LOG_MAGIC):
+            return header[len(LOG_MAGIC):], LOG_HEADER_SIZE
+        return b'', 0
+
+    def _reset(self, generation, inode, offset):
+        self._states = {}
+        self._entries = 0
+        self._generation = generation
+        self._inode = inode
+        self._offset = offset
+
+    def _apply(self, entries):
+        changed = {}
+        for entry in entries:
+            state = {'设备状态': entry['设备状态'], '借用者': entry['借用者']}
+            self._states[entry['资产编号']] = state
+            changed[entry['资产编号']] = state
+        self._entries += len(entries)
+        return changed
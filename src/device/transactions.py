@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+借用/归还事务（DeviceTransactions）
+一次借用/归还包含两次写入（追加记录 + 更新设备状态），事务层保证：
+- 串行化只发生在同一资产上：进程内线程锁 + 进程间文件锁（按资产编号条带化）
+- 比较并设置：只有设备当前状态符合预期时才写入（借用要求"可用"，归还要求"正在使用"）
+- 预写意图日志 Devices/transactions.log：写入前先记录 begin，完成后记录 commit；
+  写入出错时恢复设备原来的状态并记录 abort，调用方收到的失败不会在之后生效；
+  启动时只重放既没有 commit 也没有 abort 的事务，把中途崩溃的借用/归还补全
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from .catalog import get_devices_dir
+from .device_store import get_device_store
+from .journal import append_frames, decode_frames, encode_frame
+from .locks import get_file_locks
+
+logger = logging.getLogger(__name__)
+
+# 新字段只能追加在末尾：旧日志中的帧缺少的字段解码后不存在
+INTENT_FIELDNAMES = ['事务编号', '阶段', '资产编号', '设备类型', '创建日期', '借用者',
+                     '设备', '状态', '原因', '设备状态', '新借用者', '原设备状态', '原借用者']
+
+# 记录状态 -> (要求的当前设备状态, 写入后的设备状态)
+TRANSITIONS = {
+    '借用': ('可用', '正在使用'),
+    '归还': ('正在使用', '可用'),
+}
+
+
+class StatusConflictError(ValueError):
+    """设备当前状态与预期不符（比较并设置失败）"""
+
+
+class IntentLog:
+    """
+    预写意图日志：每个事务写 begin 帧，结束时写 commit 或 abort 帧
+
+    所有事务都已提交时日志会被清空，因此文件通常只有几百字节
+    """
+
+    def __init__(self, path, truncate_threshold=64 * 1024):
+        """
+        Args:
+            path (Path): 日志路径
+            truncate_threshold (int): 日志超过该字节数且没有未完成事务时清空
+        """
+        self.path = path
+        self.truncate_threshold = truncate_threshold
+        self._locks = get_file_locks(path.parent)
+
+    def begin(self, intent):
+        """写入 begin 帧"""
+        self.begin_many([intent])
+
+    def begin_many(self, intents):
+        """一次追加写入多个事务的 begin 帧（批量借用/归还）"""
+        self._append([{**intent, '阶段': 'begin'} for intent in intents])
+
+    def commit(self, transaction_id):
+        """写入 commit 帧，必要时清空日志"""
+        self.commit_many([transaction_id])
+
+    def commit_many(self, transaction_ids):
+        """一次追加写入多个事务的 commit 帧，必要时清空日志"""
+        self._finish(transaction_ids, 'commit')
+
+    def abort_many(self, transaction_ids):
+        """写入 abort 帧：事务已回滚，启动时不再重放"""
+        self._finish(transaction_ids, 'abort')
+
+    def _finish(self, transaction_ids, phase):
+        with self._locks.named('transactions'):
+            size = self._append([{'事务编号': transaction_id, '阶段': phase}
+                                 for transaction_id in transaction_ids])
+            if size >= self.truncate_threshold and not self._read_pending():
+                with open(self.path, 'wb'):
+                    pass
+
+    def pending(self):
+        """
+        未结束（既没有 commit 也没有 abort）的事务
+
+        Returns:
+            list: begin 帧（dict），按写入顺序
+        """
+        with self._locks.named('transactions'):
+            return self._read_pending()
+
+    def is_pending(self, transaction_id):
+        """事务是否仍未提交"""
+        return any(intent['事务编号'] == transaction_id for intent in self.pending())
+
+    def _append(self, entries):
+        with self._locks.named('transactions'):
+            try:
+                size = os.path.getsize(self.path)
+            except FileNotFoundError:
+                size = 0
+            # 只保留完整的帧，末尾崩溃遗留的不完整帧在追加前截掉
+            if size:
+                with open(self.path, 'rb') as file:
+                    _, size = decode_frames(file.read(), INTENT_FIELDNAMES)
+            data = b''.join(encode_frame(entry, INTENT_FIELDNAMES) for entry in entries)
+            return append_frames(self.path, data, size)
+
+    def _read_pending(self):
+        if not self.path.exists():
+            return []
+        with open(self.path, 'rb') as file:
+            entries, _ = decode_frames(file.read(), INTENT_FIELDNAMES)
+        pending = {}
+        for entry in entries:
+            if entry['阶段'] == 'begin':
+                pending[entry['事务编号']] = entry
+            else:
+                pending.pop(entry['事务编号'], None)
+        return list(pending.values())
+
+
+class DeviceTransactions:
+    """
+    借用/归还事务管理器
+    """
+
+    def __init__(self, store=None, devices_dir=None):
+        """
+        Args:
+            store (DeviceStore): 设备存储，默认使用 get_device_store()
+            devices_dir (Path): 锁文件和意图日志所在目录，默认使用 get_devices_dir()
+        """
+        self.store = store or get_device_store()
+        devices_dir = devices_dir or get_devices_dir()
+        self.locks = get_file_locks(devices_dir)
+        self.intents = IntentLog(devices_dir / "transactions.log")
+        self._counter = 0
+        self._counter_lock = threading.Lock()
+
+    def execute(self, status, asset_number, borrower, reason=""):
+        """
+        执行一次借用/归还
+
+        Args:
+            status (str): 借用/归还
+            asset_number (str): 资产编号
+            borrower (str): 借用者/归还者
+            reason (str): 原因
+
+        Returns:
+            dict: 写入的记录
+
+        Raises:
+            ValueError: 参数错误或设备不存在
+            StatusConflictError: 设备当前状态不允许该操作
+        """
+        if status not in TRANSITIONS:
+            raise ValueError("状态必须是'借用'或'归还'")
+
+        with self.locks.asset(asset_number):
+            intent = self._prepare(status, asset_number, borrower, reason)
+            self.intents.begin(intent)
+            try:
+                record = self._apply(intent)
+            except Exception:
+                self._abort([intent])
+                raise
+            self.intents.commit(intent['事务编号'])
+            return record
+
+    def execute_many(self, status, asset_numbers, borrower, reason=""):
+        """
+        批量借用/归还
+
+        先持有所有资产的锁并逐台校验，通过校验的设备：
+        begin 帧一次追加、设备状态一次提交、记录一次追加、commit 帧一次追加；
+        未通过校验的设备不影响其他设备；写入出错时整批回滚并抛出异常
+
+        Args:
+            status (str): 借用/归还
+            asset_numbers (list): 资产编号（重复的只处理一次）
+            borrower (str): 借用者/归还者
+            reason (str): 原因
+
+        Returns:
+            list: 每个资产编号的结果 {'资产编号', 'success', 'record' 或 'error'}，与输入顺序一致
+        """
+        if status not in TRANSITIONS:
+            raise ValueError("状态必须是'借用'或'归还'")
+        asset_numbers = list(dict.fromkeys(asset_numbers))
+
+        results = {}
+        with self.locks.assets(asset_numbers):
+            intents = []
+            for asset_number in asset_numbers:
+                try:
+                    intents.append(self._prepare(status, asset_number, borrower, reason))
+                except ValueError as e:
+                    results[asset_number] = {'资产编号': asset_number, 'success': False, 'error': str(e)}
+            if intents:
+                self.intents.begin_many(intents)
+                try:
+                    records = self._apply_many(intents)
+                except Exception:
+                    self._abort(intents)
+                    raise
+                for intent, record in zip(intents, records):
+                    results[intent['资产编号']] = {
+                        '资产编号': intent['资产编号'], 'success': True, 'record': record,
+                    }
+                self.intents.commit_many([intent['事务编号'] for intent in intents])
+        return [results[asset_number] for asset_number in asset_numbers]
+
+    def set_status(self, device_type, asset_number, status, borrower):
+        """
+        不经过借用/归还记录，直接更新设备状态（持有资产锁）
+        """
+        with self.locks.asset(asset_number):
+            self.store.set_status(device_type, asset_number, status, borrower)
+
+    def check_many(self, status, asset_numbers):
+        """
+        不加锁地预先校验批量借用/归还（用于在写入DevOps评论之前剔除明显无效的设备）
+
+        Returns:
+            dict: 资产编号 -> 错误信息，只包含未通过校验的设备
+        """
+        if status not in TRANSITIONS:
+            raise ValueError("状态必须是'借用'或'归还'")
+        errors = {}
+        for asset_number in dict.fromkeys(asset_numbers):
+            try:
+                self._check(status, asset_number)
+            except ValueError as e:
+                errors[asset_number] = str(e)
+        return errors
+
+    def _check(self, status, asset_number):
+        """
+        校验设备当前状态是否允许该操作
+
+        Returns:
+            tuple: (device_info, device_type)
+
+        Raises:
+            ValueError: 设备不存在
+            StatusConflictError: 设备当前状态不允许该操作
+        """
+        expected_status = TRANSITIONS[status][0]
+        # find_asset 先同步其他进程的写入（CSV签名、状态日志的新条目和压缩后的新代次），
+        # 调用方持有资产锁时读到的就是该资产的最新状态
+        device_info, device_type = self.store.find_asset(asset_number)
+        if not device_info:
+            raise ValueError(f"未找到资产编号为 {asset_number} 的设备")
+        current_status = (device_info.get('设备状态') or '').strip()
+        if current_status != expected_status:
+            raise StatusConflictError(
+                f"设备 {asset_number} 当前状态为'{current_status or '空'}'，"
+                f"只有'{expected_status}'的设备可以{status}"
+            )
+        return device_info, device_type
+
+    def _prepare(self, status, asset_number, borrower, reason):
+        """
+        校验设备当前状态并生成意图（调用方持有资产锁）
+
+        Raises:
+            ValueError: 设备不存在
+            StatusConflictError: 设备当前状态不允许该操作
+        """
+        device_info, device_type = self._check(status, asset_number)
+        old_status, new_status = TRANSITIONS[status]
+        return {
+            '事务编号': self._next_transaction_id(),
+            '资产编号': asset_number,
+            '设备类型': device_type,
+            '创建日期': datetime.now().strftime("%d/%m/%Y"),
+            '借用者': borrower,
+            '设备': device_info.get('设备名称', ''),
+            '状态': status,
+            '原因': reason,
+            '设备状态': new_status,
+            '新借用者': borrower if status == '借用' else '',
+            '原设备状态': old_status,
+            '原借用者': device_info.get('借用者') or '',
+        }
+
+    def recover(self):
+        """
+        重放未提交的事务（启动时调用）
+
+        仍在其他进程中进行的事务持有资产锁，这里会等它完成后再检查，
+        因此只有真正中断的事务会被重放
+
+        Returns:
+            int: 重放的事务数
+        """
+        recovered = 0
+        for intent in self.intents.pending():
+            with self.locks.asset(intent['资产编号']):
+                if not self.intents.is_pending(intent['事务编号']):
+                    continue
+                self._apply(intent)
+                self.intents.commit(intent['事务编号'])
+                recovered += 1
+                logger.warning(
+                    "已重放未完成的%s事务: %s (%s)", intent['状态'], intent['资产编号'], intent['事务编号']
+                )
+        return recovered
+
+    def _apply(self, intent):
+        """
+        执行事务的两次写入；两步都是幂等的，可以安全重放
+
+        先更新设备状态、最后追加记录：出错时（见 _abort）只需要恢复设备状态
+        """
+        record = self._record(intent)
+        self.store.set_status(intent['设备类型'], intent['资产编号'],
+                              intent['设备状态'], intent['新借用者'])
+        if not self._is_recorded(record):
+            self.store.append_records([record])
+        return record
+
+    def _apply_many(self, intents):
+        """批量执行多个事务的写入：设备状态一次提交，记录一次追加"""
+        records = [self._record(intent) for intent in intents]
+        self.store.set_statuses([
+            (intent['设备类型'], intent['资产编号'], intent['设备状态'], intent['新借用者'])
+            for intent in intents
+        ])
+        self.store.append_records([record for record in records if not self._is_recorded(record)])
+        return records
+
+    def _abort(self, intents):
+        """
+        回滚写入出错的事务并写入 abort 帧（调用方持有资产锁）
+
+        记录是最后一步写入，出错时还没有追加，只需要把已经更新的设备状态恢复成事务前的值；
+        恢复本身也失败时事务保持未完成，启动时由 recover() 补全（并记录错误日志）
+        """
+        try:
+            restore = []
+            for intent in intents:
+                device_info, _ = self.store.find_asset(intent['资产编号'])
+                current = ((device_info or {}).get('设备状态'), (device_info or {}).get('借用者') or '')
+                if current == (intent['设备状态'], intent['新借用者']):
+                    restore.append((intent['设备类型'], intent['资产编号'],
+                                    intent.get('原设备状态', ''), intent.get('原借用者', '')))
+            if restore:
+                self.store.set_statuses(restore)
+            self.intents.abort_many([intent['事务编号'] for intent in intents])
+        except Exception as e:
+            logger.error("回滚事务失败，将在下次启动时补全: %s: %s",
+                         [intent['事务编号'] for intent in intents], e)
+
+    @staticmethod
+    def _record(intent):
+        return {
+            '创建日期': intent['创建日期'],
+            '借用者': intent['借用者'],
+            '设备': intent['设备'],
+            '资产编号': intent['资产编号'],
+            '状态': intent['状态'],
+            '原因': intent['原因'],
+        }
+
+    def _is_recorded(self, record):
+        """该资产的最后一条记录是否就是本事务的记录（资产锁保证只可能来自本事务）"""
+        try:
+            last = self.store.query_records(asset_number=record['资产编号'], limit=1)
+        except FileNotFoundError:
+            return False  # 首次写入，记录文件尚不存在
+        return bool(last) and all((last[0].get(name) or '') == value for name, value in record.items())
+
+    def _next_transaction_id(self):
+        with self._counter_lock:
+            self._counter += 1
+            return f"{os.getpid()}-{time.time_ns()}-{self._counter}"
+
+
+_transactions = None
+_transactions_lock = threading.Lock()
+
+
+def get_transactions():
+    """
+    获取进程内共享的事务管理器（首次创建时重放未完成的事务）
+    """
+    global _transactions
+    if _transactions is None:
+        with _transactions_lock:
+            if _transactions is None:
+                transactions = DeviceTransactions()
+                transactions.recover()
+                _transactions = transactions
+    return _transactions
@@ -4,10 +4,18 @@
 Windows设备CSV文件读取器
 """
 
-import csv
-import os
+import logging
+import sys
 from pathlib import Path
 
+try:
+    from .device_store import get_device_store
+except ImportError:  # 作为脚本直接运行时
+    sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+    from src.device.device_store import get_device_store
+
+logger = logging.getLogger(__name__)
+
 
 def read_windows_devices():
     """
@@ -22,46 +30,29 @@ def read_windows_devices():
         Exception: 其他读取错误时抛出
     """
     try:
-        # 获取项目根目录
-        current_dir = Path(__file__).parent.parent.parent
-        csv_file_path = current_dir / "Devices" / "windows_devices.csv"
-        
-        # 检查文件是否存在
-        if not csv_file_path.exists():
-            raise FileNotFoundError(f"Windows设备CSV文件未找到: {csv_file_path}")
-        
-        devices = []
-        
-        # 读取CSV文件
-        with open(csv_file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            
-            # 验证是否有数据
-            fieldnames = reader.fieldnames
-            if not fieldnames:
-                raise Exception("CSV文件格式错误：未找到列标题")
-            
-            # 读取所有行
-            for row_num, row in enumerate(reader, start=2):  # 从第2行开始计数（考虑标题行）
-                if any(row.values()):  # 跳过空行
-                    devices.append(row)
-        
-        print(f"✅ Windows设备CSV文件读取成功！")
-        print(f"📁 文件路径: {csv_file_path}")
-        print(f"📊 共读取到 {len(devices)} 条设备记录")
-        print(f"📋 字段列表: {', '.join(fieldnames)}")
+        # 从设备存储获取（CSV文件未变化时不会重新解析）
+        store = get_device_store()
+        devices = store.get_devices('windows')
+        csv_file_path = store.location('windows')
+        fieldnames = store.fieldnames('windows')
+        
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("✅ Windows设备CSV文件读取成功！")
+            logger.info("📁 文件路径: %s", csv_file_path)
+            logger.info("📊 共读取到 %d 条设备记录", len(devices))
+            logger.info("📋 字段列表: %s", ', '.join(fieldnames))
         
         return devices
         
     except FileNotFoundError as e:
-        print(f"❌ 文件未找到错误: {e}")
+        logger.error("❌ 文件未找到错误: %s", e)
         raise
     except UnicodeDecodeError as e:
-        print(f"❌ 文件编码错误: {e}")
-        print("💡 建议：请确保CSV文件使用UTF-8编码保存")
+        logger.error("❌ 文件编码错误: %s", e)
+        logger.error("💡 建议：请确保CSV文件使用UTF-8编码保存")
         raise
     except Exception as e:
-        print(f"❌ 读取Windows设备CSV文件失败: {e}")
+        logger.error("❌ 读取Windows设备CSV文件失败: %s", e)
         raise
 
 
@@ -76,25 +67,18 @@ def get_all_architectures():
         Exception: 读取文件或处理数据时的错误
     """
     try:
-        devices = read_windows_devices()
+        # 去重、过滤空值并排序（SQLite存储下由 SELECT DISTINCT 完成）
+        arch_list = get_device_store().architectures()
         
-        # 提取所有芯片架构，去重并过滤空值
-        architectures = set()
-        for device in devices:
-            arch = device.get('芯片架构', '').strip()
-            if arch:  # 只添加非空的架构
-                architectures.add(arch)
-        
-        arch_list = sorted(list(architectures))  # 排序便于查看
-        
-        print(f"✅ 芯片架构列表获取成功！")
-        print(f"📊 共发现 {len(arch_list)} 种不同的芯片架构")
-        print(f"🔧 架构列表: {', '.join(arch_list)}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("✅ 芯片架构列表获取成功！")
+            logger.info("📊 共发现 %d 种不同的芯片架构", len(arch_list))
+            logger.info("🔧 架构列表: %s", ', '.join(arch_list))
         
         return arch_list
         
     except Exception as e:
-        print(f"❌ 获取芯片架构列表失败: {e}")
+        logger.error("❌ 获取芯片架构列表失败: %s", e)
         raise
 
 
@@ -117,22 +101,20 @@ def query_devices_by_architecture(architecture):
             raise ValueError("芯片架构参数不能为空")
         
         architecture = architecture.strip()
-        devices = read_windows_devices()
-        
-        # 筛选匹配的设备
-        matching_devices = []
-        for device in devices:
-            device_arch = device.get('芯片架构', '').strip()
-            if device_arch.lower() == architecture.lower():  # 不区分大小写匹配
-                matching_devices.append(device)
-        
-        print(f"✅ 芯片架构查询完成！")
-        print(f"🔍 查询架构: {architecture}")
-        print(f"📊 找到 {len(matching_devices)} 台匹配的设备")
-        
-        # 显示匹配设备的基本信息
-        if matching_devices:
-            print(f"\n💻 匹配设备列表:")
+        
+        # 筛选匹配的设备（不区分大小写匹配）
+        matching_devices = [
+            device for _, device in
+            get_device_store().find_devices(device_type='windows', architecture=architecture)
+        ]
+        
+        logger.info("✅ 芯片架构查询完成！")
+        logger.info("🔍 查询架构: %s", architecture)
+        logger.info("📊 找到 %d 台匹配的设备", len(matching_devices))
+        
+        # 显示匹配设备的基本信息（只在需要详细输出时逐台格式化）
+        if matching_devices and logger.isEnabledFor(logging.INFO):
+            logger.info("\n💻 匹配设备列表:")
             for i, device in enumerate(matching_devices, 1):
                 device_name = device.get('设备名称', '未知设备')
                 sku = device.get('SKU', '')
@@ -140,28 +122,31 @@ def query_devices_by_architecture(architecture):
                 borrower = device.get('借用者', '无')
                 asset_no = device.get('资产编号', '')
                 
-                print(f"\n设备 {i}:")
-                print(f"  设备名称: {device_name}")
+                logger.info("\n设备 %s:", i)
+                logger.info("  设备名称: %s", device_name)
                 if sku:
-                    print(f"  SKU: {sku}")
-                print(f"  设备状态: {status}")
-                print(f"  借用者: {borrower}")
+                    logger.info("  SKU: %s", sku)
+                logger.info("  设备状态: %s", status)
+                logger.info("  借用者: %s", borrower)
                 if asset_no:
-                    print(f"  资产编号: {asset_no}")
-        else:
-            print(f"⚠️  未找到使用 '{architecture}' 架构的设备")
+                    logger.info("  资产编号: %s", asset_no)
+        elif not matching_devices:
+            logger.warning("⚠️  未找到使用 '%s' 架构的设备", architecture)
         
         return matching_devices
         
     except ValueError as e:
-        print(f"❌ 参数错误: {e}")
+        logger.error("❌ 参数错误: %s", e)
         raise
     except Exception as e:
-        print(f"❌ 芯片架构查询失败: {e}")
+        logger.error("❌ 芯片架构查询失败: %s", e)
         raise
 
 
 if __name__ == "__main__":
+    from src.utils.logging_utils import enable_console_logging
+    enable_console_logging()
+    
     try:
         # 检查命令行参数
         import sys
@@ -172,22 +157,22 @@ if __name__ == "__main__":
             
             if command == "arch" or command == "architectures":
                 # 显示所有芯片架构
-                print("🔧 获取所有芯片架构...")
+                logger.info("🔧 获取所有芯片架构...")
                 architectures = get_all_architectures()
                 
             elif command == "query" and len(sys.argv) > 2:
                 # 根据芯片架构查询设备
                 architecture = sys.argv[2]
-                print(f"🔍 查询芯片架构为 '{architecture}' 的设备...")
+                logger.info(f"🔍 查询芯片架构为 '{architecture}' 的设备...")
                 devices = query_devices_by_architecture(architecture)
                 
             else:
-                print("❌ 无效的命令参数")
-                print("📋 用法示例:")
-                print("  python windows_reader.py                    # 显示所有Windows设备")
-                print("  python windows_reader.py arch               # 显示所有芯片架构")
-                print("  python windows_reader.py query x64          # 查询x64架构的设备")
-                print("  python windows_reader.py query ARM64        # 查询ARM64架构的设备")
+                logger.error("❌ 无效的命令参数")
+                logger.info("📋 用法示例:")
+                logger.info("  python windows_reader.py                    # 显示所有Windows设备")
+                logger.info("  python windows_reader.py arch               # 显示所有芯片架构")
+                logger.info("  python windows_reader.py query x64          # 查询x64架构的设备")
+                logger.info("  python windows_reader.py query ARM64        # 查询ARM64架构的设备")
                 exit(1)
         else:
             # 默认行为：显示所有设备
@@ -195,22 +180,22 @@ if __name__ == "__main__":
             
             # 显示前3条记录作为示例
             if devices:
-                print(f"\n💻 前3条设备记录示例:")
+                logger.info(f"\n💻 前3条设备记录示例:")
                 for i, device in enumerate(devices[:3], 1):
-                    print(f"\n设备 {i}:")
+                    logger.info(f"\n设备 {i}:")
                     for key, value in device.items():
                         if value.strip():  # 只显示非空字段
-                            print(f"  {key}: {value}")
+                            logger.info(f"  {key}: {value}")
             else:
-                print("⚠️  未读取到任何设备记录")
+                logger.warning("⚠️  未读取到任何设备记录")
             
             # 额外显示芯片架构统计
-            print(f"\n🔧 芯片架构统计:")
+            logger.info(f"\n🔧 芯片架构统计:")
             try:
                 architectures = get_all_architectures()
             except:
                 pass  # 如果获取架构失败，不影响主流程
             
     except Exception as e:
-        print(f"❌ 程序执行失败: {e}")
+        logger.error(f"❌ 程序执行失败: {e}")
         exit(1)
\ No newline at end of file
@@ -0,0 +1,214 @@
+"""
+list_devices 的分页与预序列化缓存
+
+每台设备只在该行变化后序列化一次（整行JSON和逐字段的JSON片段），
+按 (设备类型, 状态) 缓存过滤后的列表，因此读取任意一页的代价与页大小成正比；
+借用/归还之后只重新序列化被修改的设备
+"""
+
+import base64
+import binascii
+import json
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from src.device.catalog import DEVICE_FILES
+from src.device.device_store import get_device_store
+
+# 未指定 limit 时 JSON 模式每页的设备数
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class DeviceEntry:
+    """单台设备的缓存：原始字段和预先序列化的JSON"""
+
+    __slots__ = ("device", "json", "fragments")
+
+    def __init__(self, device: Dict[str, Any]):
+        self.device = device
+        self.json = json.dumps(device, ensure_ascii=False)
+        # 字段名 -> '"字段名": 值'，按字段投影时直接拼接
+        self.fragments = {
+            key: f"{json.dumps(key, ensure_ascii=False)}: {json.dumps(value, ensure_ascii=False)}"
+            for key, value in device.items()
+        }
+
+    def project(self, fields: Optional[List[str]]) -> Dict[str, Any]:
+        if not fields:
+            return self.device
+        return {key: self.device[key] for key in fields if key in self.device}
+
+    def project_json(self, fields: Optional[List[str]]) -> str:
+        if not fields:
+            return self.json
+        return "{" + ", ".join(self.fragments[key] for key in fields if key in self.fragments) + "}"
+
+
+class DeviceListing:
+    """某个 (设备类型, 状态) 过滤条件下的设备列表及统计"""
+
+    __slots__ = ("entries", "stats")
+
+    def __init__(self, entries: List[DeviceEntry], stats: Dict[str, int]):
+        self.entries = entries
+        self.stats = stats
+
+
+def listing_stats(facets, device_type: str, status: str) -> Dict[str, int]:
+    """
+    根据分面计数得到过滤条件下的统计信息（不扫描设备行）
+
+    Args:
+        facets (FacetIndex): 设备分面计数
+        device_type: android/ios/windows/other/all
+        status: online/offline/all
+    """
+    stats = facets.stats(None if device_type == "all" else device_type)
+    if status == "online":
+        return {"total": stats["available"], "available": stats["available"], "in_use": 0, "other": 0}
+    if status == "offline":
+        return {
+            "total": stats["total"] - stats["available"],
+            "available": 0,
+            "in_use": stats["in_use"],
+            "other": stats["other"],
+        }
+    return stats
+
+
+class DeviceListingCache:
+    """
+    按设备表增量更新的列表缓存
+
+    每个设备类型记住存储返回的变化标识（DeviceStore.changed_rows），借用/归还只修改少数几行时
+    只重新序列化这几台设备，再用已序列化的条目重新过滤受影响的列表；
+    其他进程的写入同样通过 changed_rows 发现
+    """
+
+    def __init__(self, store_provider: Callable = get_device_store):
+        self.store_provider = store_provider
+        self._lock = threading.Lock()
+        self._tokens: Dict[str, Any] = {}
+        self._entries: Dict[str, List[DeviceEntry]] = {}
+        self._listings: Dict[tuple, DeviceListing] = {}
+
+    def get_listing(self, device_type: str, status: str) -> DeviceListing:
+        """
+        获取过滤后的设备列表（阻塞调用，应在线程池中执行）
+
+        Args:
+            device_type: android/ios/windows/other/all
+            status: online/offline/all
+        """
+        store = self.store_provider()
+        device_types = list(DEVICE_FILES) if device_type == "all" else [device_type]
+        with self._lock:
+            for dtype in device_types:
+                if self._sync_entries(store, dtype):
+                    # 该类型的设备有变化：丢弃包含它的列表（条目已经更新，重新过滤不需要序列化）
+                    for key in [key for key in self._listings if key[0] in (dtype, "all")]:
+                        del self._listings[key]
+
+            key = (device_type, status)
+            listing = self._listings.get(key)
+            if listing is None:
+                entries = []
+                for dtype in device_types:
+                    for entry in self._entries[dtype]:
+                        state = entry.device.get("设备状态")
+                        if status == "online" and state != "可用":
+                            continue
+                        if status == "offline" and state == "可用":
+                            continue
+                        entries.append(entry)
+                stats = listing_stats(store.facets(), device_type, status)
+                listing = self._listings[key] = DeviceListing(entries, stats)
+            return listing
+
+    def _sync_entries(self, store, device_type: str) -> bool:
+        """
+        按存储的变化更新该类型的条目
+
+        Returns:
+            bool: 条目是否有变化
+        """
+        token, reset, changes = store.changed_rows(device_type, self._tokens.get(device_type))
+        self._tokens[device_type] = token
+        if reset:
+            self._entries[device_type] = [DeviceEntry(self._tag(device, device_type)) for _, device in changes]
+            return True
+        entries = self._entries[device_type]
+        for position, device in changes:
+            entries[position] = DeviceEntry(self._tag(device, device_type))
+        return bool(changes)
+
+    @staticmethod
+    def _tag(device: Dict[str, Any], device_type: str) -> Dict[str, Any]:
+        device["device_type"] = device_type
+        return device
+
+
+def encode_cursor(device_type: str, status: str, offset: int) -> str:
+    """生成下一页的游标（不透明字符串）"""
+    payload = json.dumps({"t": device_type, "s": status, "o": offset}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, device_type: str, status: str) -> int:
+    """
+    解析游标，返回起始偏移量
+
+    Raises:
+        ValueError: 游标无效或与当前过滤条件不一致
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        offset = int(data["o"])
+    except (ValueError, KeyError, TypeError, binascii.Error) as e:
+        raise ValueError(f"无效的cursor: {cursor}") from e
+    if data.get("t") != device_type or data.get("s") != status or offset < 0:
+        raise ValueError("cursor与当前的 device_type/status 过滤条件不一致")
+    return offset
+
+
+def build_page(listing: DeviceListing, device_type: str, status: str, offset: int,
+               limit: int, fields: Optional[List[str]]) -> tuple:
+    """
+    取出一页并生成结构化结果及其JSON文本
+
+    Returns:
+        tuple: (page_entries, structured, json_text)
+    """
+    page = listing.entries[offset:offset + limit]
+    next_offset = offset + len(page)
+    next_cursor = encode_cursor(device_type, status, next_offset) if next_offset < len(listing.entries) else None
+    if fields:
+        # device_type 总是返回，便于客户端区分设备来源
+        fields = ["device_type"] + [field for field in fields if field != "device_type"]
+
+    meta = {
+        "device_type": device_type,
+        "status": status,
+        "offset": offset,
+        "count": len(page),
+        "next_cursor": next_cursor,
+        "stats": listing.stats,
+    }
+    structured = dict(meta, items=[entry.project(fields) for entry in page])
+    # 文本内容直接拼接预序列化的设备JSON，不再逐台 json.dumps
+    json_text = (
+        json.dumps(meta, ensure_ascii=False)[:-1]
+        + ', "items": ['
+        + ", ".join(entry.project_json(fields) for entry in page)
+        + "]}"
+    )
+    return page, structured, json_text
+
+
+_listing_cache = DeviceListingCache()
+
+
+def get_listing_cache() -> DeviceListingCache:
+    """获取进程内共享的列表缓存"""
+    return _listing_cache
@@ -0,0 +1,55 @@
+"""
+Azure DevOps 集成的延迟加载
+src.az_info 会导入 azure-devops/msrest SDK，只在第一次写入DevOps评论时才导入（在线程池中执行，不阻塞事件循环）；
+--no-devops 模式下借用/归还跳过DevOps记录，整个进程都不会导入 src.az_info
+"""
+
+import importlib
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+_MODULE = "src.az_info.record_in_deliverable"
+
+_enabled = True
+
+
+def configure_devops(enabled: bool) -> None:
+    """启用或禁用DevOps记录（需在服务器启动前调用）"""
+    global _enabled
+    _enabled = enabled
+
+
+def devops_enabled() -> bool:
+    """借用/归还是否需要写入DevOps评论"""
+    return _enabled
+
+
+def _load():
+    """导入 record_in_deliverable（阻塞调用，首次导入约需150ms；并发的首次导入由导入系统串行化）"""
+    return importlib.import_module(_MODULE)
+
+
+def queue_comment(comment_text: str) -> Tuple[bool, Optional[str]]:
+    """
+    把评论写入DevOps发件箱（阻塞调用，应在线程池中执行）
+
+    Returns:
+        tuple: 与 queue_in_deliverable 相同，(是否成功, 用户邮箱)
+    """
+    if not _enabled:
+        return True, None
+    return _load().queue_in_deliverable(comment_text)
+
+
+def outbox_stats() -> Optional[Dict[str, Any]]:
+    """发件箱的投递统计；集成模块尚未加载时返回None（不会为此导入SDK）"""
+    # 其他线程正在首次导入时模块可能还没有初始化完
+    get_stats = getattr(sys.modules.get(_MODULE), "get_outbox_stats", None)
+    return get_stats() if get_stats is not None else None
+
+
+def close_outbox() -> None:
+    """退出前发送发件箱中剩余的评论；集成模块尚未加载时什么也不做"""
+    module = sys.modules.get(_MODULE)
+    if module is not None:
+        module.close_deliverable_outbox()
@@ -3,61 +3,185 @@
 参考官方SDK示例实现
 """
 
+import itertools
 import logging
-from collections import deque
-from dataclasses import dataclass
-from uuid import uuid4
+import secrets
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Optional
 
+import anyio
 from mcp.server.streamable_http import EventCallback, EventId, EventMessage, EventStore, StreamId
 from mcp.types import JSONRPCMessage
 
+from ..utils.metrics import observe_stage
+
 logger = logging.getLogger(__name__)
 
 
-@dataclass
 class EventEntry:
-    """事件条目"""
-    event_id: EventId
-    stream_id: StreamId
-    message: JSONRPCMessage
+    """
+    事件条目：序号和序列化后的消息（priming 事件为None）
+
+    不保存 pydantic 对象，每个事件只占用一个带 __slots__ 的对象和一段 bytes
+    """
+
+    __slots__ = ("seq", "data")
+
+    def __init__(self, seq: int, data: Optional[bytes]):
+        self.seq = seq
+        self.data = data
+
+    @property
+    def size(self) -> int:
+        return len(self.data) if self.data is not None else 0
+
+
+def serialize_message(message: JSONRPCMessage) -> bytes:
+    """按传输层发送时的格式序列化消息"""
+    return message.model_dump_json(by_alias=True, exclude_none=True).encode("utf-8")
+
+
+class SerializedMessage:
+    """
+    已序列化的消息，重放时代替 JSONRPCMessage 交给传输层
+
+    传输层只调用 model_dump_json 生成SSE数据，直接返回保存的JSON，不再解析和重新序列化；
+    访问 root 时才解析成 JSONRPCMessage
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def model_dump_json(self, **kwargs: Any) -> str:
+        return self.data.decode("utf-8")
+
+    @property
+    def root(self):
+        return JSONRPCMessage.model_validate_json(self.data).root
+
+
+class StreamEvents:
+    """
+    单个流最近的事件
+
+    事件ID为 "<流令牌>-<序号>"，流令牌是随机的十六进制串（事件存储由所有会话共享，
+    传输层不检查被重放的流是否属于请求的会话，令牌不可猜测才能防止重放其他会话的通知），
+    序号在流内单调递增，
+    队列中第一个事件的序号为 first_seq，事件在队列中的位置可以直接由序号算出
+    """
+
+    __slots__ = ("token", "stream_id", "events", "first_seq", "next_seq", "bytes", "last_used")
+
+    def __init__(self, token: str, stream_id: StreamId):
+        self.token = token
+        self.stream_id = stream_id
+        self.events: deque[EventEntry] = deque()
+        self.first_seq = 1
+        self.next_seq = 1
+        self.bytes = 0
+        self.last_used = time.monotonic()
+
+    def append(self, data: Optional[bytes]) -> EventEntry:
+        entry = EventEntry(self.next_seq, data)
+        self.events.append(entry)
+        self.next_seq += 1
+        self.bytes += entry.size
+        return entry
+
+    def pop_oldest(self) -> EventEntry:
+        entry = self.events.popleft()
+        self.first_seq = entry.seq + 1
+        self.bytes -= entry.size
+        return entry
+
+    def events_after(self, seq: int) -> Optional[list[EventEntry]]:
+        """
+        序号 seq 之后的事件，从队尾往前只取这些事件，耗时与重放的事件数成正比
+
+        Returns:
+            list: 事件列表，seq 已被淘汰时返回None
+        """
+        if not self.first_seq <= seq < self.next_seq:
+            return None
+        count = self.next_seq - 1 - seq
+        return list(itertools.islice(reversed(self.events), count))[::-1]
 
 
 class InMemoryEventStore(EventStore):
     """
     内存事件存储，用于支持断点续传功能
     生产环境建议使用持久化存储
+
+    内存占用有上限：
+    - 每个流最多保存 max_events_per_stream 个事件
+    - 所有流合计超过 max_total_events 个事件或 max_total_bytes 字节时，
+      整个淘汰最久没有使用的流；只剩当前写入的流时淘汰它最旧的事件
+    - 超过 ttl_seconds 没有写入或重放的流由 run_sweeper 定期删除
+
+    流ID是JSON-RPC请求ID，不同会话会重复：传输层在每个SSE流开始时（以及续传后）存入 priming 事件，
+    priming 事件为该流ID开始一个新的流，之后该流ID的事件写入这个流，不同会话的同号请求互不可见
     """
 
-    def __init__(self, max_events_per_stream: int = 100):
+    def __init__(
+        self,
+        max_events_per_stream: int = 100,
+        max_total_events: int = 10000,
+        max_total_bytes: int = 16 * 1024 * 1024,
+        ttl_seconds: float = 3600,
+    ):
         """初始化事件存储
-        
+
         Args:
             max_events_per_stream: 每个流保存的最大事件数
+            max_total_events: 所有流保存的最大事件数
+            max_total_bytes: 所有流保存的事件的最大字节数（序列化后的JSON）
+            ttl_seconds: 流在最后一次使用后保留的秒数，0表示不过期
         """
         self.max_events_per_stream = max_events_per_stream
-        # 每个流维护最后N个事件
-        self.streams: dict[StreamId, deque[EventEntry]] = {}
-        # event_id -> EventEntry 快速查找
-        self.event_index: dict[EventId, EventEntry] = {}
+        self.max_total_events = max_total_events
+        self.max_total_bytes = max_total_bytes
+        self.ttl_seconds = ttl_seconds
+        # 流令牌 -> StreamEvents，按最近使用排序；流被淘汰后重新创建会得到新令牌，旧的事件ID不会误匹配
+        self.streams: "OrderedDict[str, StreamEvents]" = OrderedDict()
+        # stream_id -> 当前写入的流的令牌
+        self.current: dict[StreamId, str] = {}
+        self.total_events = 0
+        self.total_bytes = 0
+        self.evicted_streams = 0
+        self.evicted_events = 0
 
-    async def store_event(self, stream_id: StreamId, message: JSONRPCMessage) -> EventId:
+    async def store_event(self, stream_id: StreamId, message: JSONRPCMessage | None) -> EventId:
         """存储事件并生成事件ID"""
-        event_id = str(uuid4())
-        event_entry = EventEntry(event_id=event_id, stream_id=stream_id, message=message)
+        with observe_stage("event_store_append"):
+            return self._store(stream_id, message)
 
-        # 获取或创建流的事件队列
-        if stream_id not in self.streams:
-            self.streams[stream_id] = deque(maxlen=self.max_events_per_stream)
+    def _store(self, stream_id: StreamId, message: JSONRPCMessage | None) -> EventId:
+        data = serialize_message(message) if message is not None else None
 
-        # 如果队列已满，移除最旧的事件
-        if len(self.streams[stream_id]) == self.max_events_per_stream:
-            oldest_event = self.streams[stream_id][0]
-            self.event_index.pop(oldest_event.event_id, None)
+        # 获取当前的流，priming 事件开始新的流
+        token = self.current.get(stream_id) if message is not None else None
+        stream = self.streams.get(token) if token is not None else None
+        if stream is None:
+            stream = StreamEvents(secrets.token_hex(8), stream_id)
+            self.streams[stream.token] = stream
+            self.current[stream_id] = stream.token
+        else:
+            self.streams.move_to_end(stream.token)
+        stream.last_used = time.monotonic()
+
+        entry = stream.append(data)
+        self.total_events += 1
+        self.total_bytes += entry.size
 
-        # 添加新事件
-        self.streams[stream_id].append(event_entry)
-        self.event_index[event_id] = event_entry
+        # 如果队列已满，移除最旧的事件
+        if len(stream.events) > self.max_events_per_stream:
+            self._drop_oldest(stream)
+        self._enforce_budget(stream)
 
+        event_id = f"{stream.token}-{entry.seq}"
         logger.debug(f"存储事件 {event_id} 到流 {stream_id}")
         return event_id
 
@@ -67,24 +191,89 @@ class InMemoryEventStore(EventStore):
         send_callback: EventCallback,
     ) -> StreamId | None:
         """重放指定事件ID之后的事件"""
-        if last_event_id not in self.event_index:
+        with observe_stage("event_store_replay"):
+            token, _, seq = last_event_id.partition("-")
+            stream = self.streams.get(token)
+            events = stream.events_after(int(seq)) if stream is not None and seq.isdigit() else None
+        if events is None:
             logger.warning(f"事件ID {last_event_id} 未找到")
             return None
 
-        # 获取流并找到指定事件之后的事件
-        last_event = self.event_index[last_event_id]
-        stream_id = last_event.stream_id
-        stream_events = self.streams.get(last_event.stream_id, deque())
-
-        # 事件按时间顺序排列，找到指定事件后的所有事件
-        found_last = False
+        stream.last_used = time.monotonic()
+        self.streams.move_to_end(stream.token)
         replayed_count = 0
-        for event in stream_events:
-            if found_last:
-                await send_callback(EventMessage(event.message, event.event_id))
-                replayed_count += 1
-            elif event.event_id == last_event_id:
-                found_last = True
-
-        logger.info(f"重放了 {replayed_count} 个事件到流 {stream_id}")
-        return stream_id
+        for event in events:
+            # priming 事件没有消息，只占用事件ID
+            if event.data is None:
+                continue
+            await send_callback(EventMessage(SerializedMessage(event.data), f"{stream.token}-{event.seq}"))
+            replayed_count += 1
+
+        logger.info(f"重放了 {replayed_count} 个事件到流 {stream.stream_id}")
+        return stream.stream_id
+
+    def sweep(self) -> int:
+        """
+        删除超过 ttl_seconds 没有使用的流
+
+        Returns:
+            int: 删除的流数
+        """
+        if not self.ttl_seconds:
+            return 0
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = 0
+        # 流按最近使用排序，遇到第一个未过期的流即可停止
+        while self.streams:
+            stream = next(iter(self.streams.values()))
+            if stream.last_used >= cutoff:
+                break
+            self._remove_stream(stream)
+            expired += 1
+        if expired:
+            logger.info(f"已删除 {expired} 个过期的事件流")
+        return expired
+
+    async def run_sweeper(self, interval: float = 60) -> None:
+        """定期删除过期的流（作为后台任务运行）"""
+        while True:
+            await anyio.sleep(interval)
+            self.sweep()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回当前的流数、事件数、字节数和淘汰次数"""
+        return {
+            "streams": len(self.streams),
+            "events": self.total_events,
+            "bytes": self.total_bytes,
+            "evicted_streams": self.evicted_streams,
+            "evicted_events": self.evicted_events,
+        }
+
+    def _over_budget(self) -> bool:
+        return self.total_events > self.max_total_events or self.total_bytes > self.max_total_bytes
+
+    def _enforce_budget(self, current: StreamEvents) -> None:
+        """超出全局上限时先淘汰最久没有使用的其他流，再淘汰当前流最旧的事件"""
+        while self._over_budget():
+            oldest = next(iter(self.streams.values()))
+            if oldest is not current:
+                self._remove_stream(oldest)
+                self.evicted_streams += 1
+            elif len(current.events) > 1:
+                self._drop_oldest(current)
+                self.evicted_events += 1
+            else:
+                break
+
+    def _drop_oldest(self, stream: StreamEvents) -> None:
+        entry = stream.pop_oldest()
+        self.total_events -= 1
+        self.total_bytes -= entry.size
+
+    def _remove_stream(self, stream: StreamEvents) -> None:
+        del self.streams[stream.token]
+        if self.current.get(stream.stream_id) == stream.token:
+            del self.current[stream.stream_id]
+        self.total_events -= len(stream.events)
+        self.total_bytes -= stream.bytes
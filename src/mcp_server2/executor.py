@@ -0,0 +1,195 @@
+"""
+阻塞操作执行器
+将CSV文件读写和Azure CLI等外部进程调用从事件循环移到独立的有界线程池，
+并提供按工具的并发限制和事件循环延迟监控
+"""
+
+import contextlib
+import logging
+from collections.abc import AsyncIterator
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+import anyio
+import anyio.to_thread
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class BlockingExecutor:
+    """
+    阻塞调用执行器
+
+    - 磁盘I/O（CSV读写）与外部进程（az命令）使用各自的线程容量限制，
+      慢的外部进程不会占满磁盘I/O的线程
+    - 每个工具可以配置最大并发数，超出的调用排队等待
+    """
+
+    def __init__(
+        self,
+        io_workers: int = 8,
+        process_workers: int = 4,
+        tool_limits: Optional[Dict[str, int]] = None,
+        default_tool_limit: Optional[int] = None,
+    ):
+        """初始化执行器
+
+        Args:
+            io_workers: 磁盘I/O线程数上限
+            process_workers: 外部进程调用线程数上限
+            tool_limits: 工具名 -> 最大并发数
+            default_tool_limit: 未单独配置的工具的最大并发数，None表示不限制
+        """
+        self.io_workers = io_workers
+        self.process_workers = process_workers
+        self.tool_limits = dict(tool_limits or {})
+        self.default_tool_limit = default_tool_limit
+        # CapacityLimiter需要在事件循环中创建，首次使用时再初始化
+        self._io_limiter: Optional[anyio.CapacityLimiter] = None
+        self._process_limiter: Optional[anyio.CapacityLimiter] = None
+        self._tool_limiters: Dict[str, anyio.CapacityLimiter] = {}
+
+    async def run_io(self, func: Callable[..., T], *args: Any) -> T:
+        """在磁盘I/O线程池中执行阻塞函数"""
+        if self._io_limiter is None:
+            self._io_limiter = anyio.CapacityLimiter(self.io_workers)
+        return await anyio.to_thread.run_sync(func, *args, limiter=self._io_limiter)
+
+    async def run_process(self, func: Callable[..., T], *args: Any) -> T:
+        """在外部进程线程池中执行阻塞函数（如调用az命令）"""
+        if self._process_limiter is None:
+            self._process_limiter = anyio.CapacityLimiter(self.process_workers)
+        return await anyio.to_thread.run_sync(func, *args, limiter=self._process_limiter)
+
+    @contextlib.asynccontextmanager
+    async def tool_slot(self, tool_name: str) -> AsyncIterator[None]:
+        """获取工具的并发槽位，未配置限制时直接放行"""
+        limit = self.tool_limits.get(tool_name, self.default_tool_limit)
+        if not limit:
+            yield
+            return
+
+        limiter = self._tool_limiters.get(tool_name)
+        if limiter is None:
+            limiter = anyio.CapacityLimiter(limit)
+            self._tool_limiters[tool_name] = limiter
+
+        if limiter.available_tokens == 0:
+            logger.debug(f"工具 {tool_name} 已达到并发上限 {limit}，排队等待")
+        async with limiter:
+            yield
+
+    def stats(self) -> Dict[str, Any]:
+        """返回线程池和工具并发的当前使用情况"""
+        def _usage(limiter: Optional[anyio.CapacityLimiter]) -> Dict[str, Any]:
+            if limiter is None:
+                return {"borrowed": 0, "waiting": 0}
+            statistics = limiter.statistics()
+            return {
+                "borrowed": statistics.borrowed_tokens,
+                "waiting": statistics.tasks_waiting,
+            }
+
+        return {
+            "io": {"limit": self.io_workers, **_usage(self._io_limiter)},
+            "process": {"limit": self.process_workers, **_usage(self._process_limiter)},
+            "tools": {
+                name: {"limit": limiter.total_tokens, **_usage(limiter)}
+                for name, limiter in self._tool_limiters.items()
+            },
+        }
+
+
+class LoopLagMonitor:
+    """
+    事件循环延迟监控
+
+    周期性地sleep固定时间，实际唤醒时间与预期的差值即为事件循环被阻塞的时长
+    """
+
+    def __init__(self, interval: float = 0.5, warn_threshold: float = 0.1):
+        """
+        Args:
+            interval: 采样间隔（秒）
+            warn_threshold: 超过该延迟（秒）时输出警告日志
+        """
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.samples = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+
+    async def run(self) -> None:
+        """持续采样，直到所在任务被取消"""
+        while True:
+            started = anyio.current_time()
+            await anyio.sleep(self.interval)
+            lag = max(0.0, anyio.current_time() - started - self.interval)
+            self.record(lag)
+
+    def record(self, lag: float) -> None:
+        """记录一次采样"""
+        self.samples += 1
+        self.last_lag = lag
+        self.total_lag += lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+        if lag > self.warn_threshold:
+            logger.warning(f"事件循环延迟 {lag * 1000:.1f}ms，可能存在阻塞调用")
+
+    def stats(self) -> Dict[str, float]:
+        """返回延迟统计（毫秒）"""
+        avg_lag = self.total_lag / self.samples if self.samples else 0.0
+        return {
+            "samples": self.samples,
+            "last_ms": self.last_lag * 1000,
+            "max_ms": self.max_lag * 1000,
+            "avg_ms": avg_lag * 1000,
+        }
+
+
+_executor = BlockingExecutor()
+loop_lag_monitor = LoopLagMonitor()
+
+
+def configure_executor(**kwargs: Any) -> BlockingExecutor:
+    """按启动参数重新创建全局执行器（需在服务器启动前调用）"""
+    global _executor
+    _executor = BlockingExecutor(**kwargs)
+    return _executor
+
+
+def get_executor() -> BlockingExecutor:
+    """获取全局执行器"""
+    return _executor
+
+
+async def run_io(func: Callable[..., T], *args: Any) -> T:
+    """在磁盘I/O线程池中执行阻塞函数"""
+    return await _executor.run_io(func, *args)
+
+
+async def run_process(func: Callable[..., T], *args: Any) -> T:
+    """在外部进程线程池中执行阻塞函数"""
+    return await _executor.run_process(func, *args)
+
+
+def parse_tool_limits(values: tuple) -> Dict[str, int]:
+    """
+    解析命令行的工具并发限制
+
+    Args:
+        values: 形如 ("borrow_device=2", "list_devices=8") 的参数
+
+    Returns:
+        dict: 工具名 -> 最大并发数
+    """
+    limits = {}
+    for value in values:
+        name, sep, limit = value.partition("=")
+        if not sep or not name.strip() or not limit.strip().isdigit():
+            raise ValueError(f"无效的工具并发限制: {value} (格式: 工具名=数量)")
+        limits[name.strip()] = int(limit)
+    return limits
@@ -0,0 +1,501 @@
+"""
+磁盘事件存储，用于跨服务器重启的断点续传
+
+每个流一个目录，事件按顺序追加到分段日志中：
+- <序号>.log: 事件帧（序号、长度、标志 + 序列化后的JSON-RPC消息）
+- <序号>.idx: 预分配的偏移量索引，第i个槽位是该段第i个事件在日志中的偏移量+1，通过mmap读写
+事件ID为 "<流目录>-<序号>"，重放时直接定位到所在的段和偏移量，不扫描之前的事件；
+
+流ID是JSON-RPC请求ID，不同会话、重启前后都会重复，因此流目录名是随机令牌：
+传输层在每个SSE流开始时（以及续传后）存入 priming 事件，priming 事件为该流ID开始一个新目录，
+之后该流ID的事件写入这个目录；重启后第一次写入同样开始新目录。
+事件ID不可猜测，一个会话不能用其他会话的请求ID重放它们的通知；
+内存中只保留最近使用的流的元数据，旧的段按数量上限删除，长期不活动的流在启动时和运行中定期清理
+"""
+
+import bisect
+import json
+import logging
+import mmap
+import os
+import secrets
+import shutil
+import struct
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import anyio
+from mcp.server.streamable_http import EventCallback, EventId, EventMessage, EventStore, StreamId
+from mcp.types import JSONRPCMessage
+
+from .event_store import SerializedMessage, serialize_message
+from .executor import run_io
+from ..utils.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+# 事件帧头：序号、消息长度、标志
+FRAME_HEADER = struct.Struct("<QIB")
+# 索引槽位：事件在日志中的偏移量+1（0表示空槽位）
+INDEX_ENTRY = struct.Struct("<Q")
+# 标志：priming 事件（没有消息，只占用一个事件ID）
+FLAG_PRIMING = 1
+
+STREAM_META = "stream.json"
+
+
+STREAM_KEY_LENGTH = 16
+
+
+def new_stream_key() -> str:
+    """新的流目录名（随机，不可猜测）"""
+    return secrets.token_hex(STREAM_KEY_LENGTH // 2)
+
+
+def parse_event_id(event_id: EventId) -> Optional[tuple]:
+    """
+    解析事件ID
+
+    Returns:
+        tuple: (流目录名, 序号)，格式错误时返回None
+    """
+    key, sep, seq = event_id.rpartition("-")
+    # 流目录名只能是 new_stream_key 生成的十六进制串，客户端传入的事件ID不能指向其他路径
+    if not sep or len(key) != STREAM_KEY_LENGTH or not seq.isdigit():
+        return None
+    try:
+        bytes.fromhex(key)
+    except ValueError:
+        return None
+    return key, int(seq)
+
+
+class _Segment:
+    """日志中的一段：起始序号和文件路径"""
+
+    __slots__ = ("base_seq", "log_path", "index_path")
+
+    def __init__(self, directory: Path, base_seq: int):
+        self.base_seq = base_seq
+        self.log_path = directory / f"{base_seq:020d}.log"
+        self.index_path = directory / f"{base_seq:020d}.idx"
+
+
+def _index_count(index_map) -> int:
+    """索引中已使用的槽位数（槽位按顺序填充，二分查找第一个空槽位）"""
+    low, high = 0, len(index_map) // INDEX_ENTRY.size
+    while low < high:
+        middle = (low + high) // 2
+        if INDEX_ENTRY.unpack_from(index_map, middle * INDEX_ENTRY.size)[0]:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def read_frames(log_path: Path, offset: int, end: Optional[int] = None) -> list:
+    """
+    从日志的指定偏移量读取事件帧（在线程池中执行）
+
+    Returns:
+        list: [(序号, 标志, 消息字节), ...]，遇到不完整的帧时停止
+    """
+    frames = []
+    try:
+        with open(log_path, "rb") as file:
+            file.seek(offset)
+            data = file.read() if end is None else file.read(max(0, end - offset))
+    except FileNotFoundError:
+        return frames
+    position = 0
+    while position + FRAME_HEADER.size <= len(data):
+        seq, length, flags = FRAME_HEADER.unpack_from(data, position)
+        start = position + FRAME_HEADER.size
+        if start + length > len(data):
+            break
+        frames.append((seq, flags, data[start:start + length]))
+        position = start + length
+    return frames
+
+
+class StreamLog:
+    """单个流的分段日志"""
+
+    def __init__(self, directory: Path, stream_id: StreamId, segment_bytes: int,
+                 segment_events: int, max_segments: int):
+        self.directory = directory
+        self.stream_id = stream_id
+        self.segment_bytes = segment_bytes
+        self.segment_events = segment_events
+        self.max_segments = max_segments
+        self.segments: list[_Segment] = []
+        self.next_seq = 1
+        self._fd: Optional[int] = None
+        self._index_file = None
+        self._index_map: Optional[mmap.mmap] = None
+        self._count = 0
+        self._size = 0
+        self._open()
+
+    @classmethod
+    def load_stream_id(cls, directory: Path):
+        """读取目录中保存的原始流ID（保留类型：请求ID可能是整数）"""
+        with open(directory / STREAM_META, "r", encoding="utf-8") as file:
+            return json.load(file)["stream_id"]
+
+    def append(self, payload: Optional[bytes]) -> int:
+        """
+        追加一个事件
+
+        Args:
+            payload: 序列化后的消息，None表示 priming 事件
+
+        Returns:
+            int: 事件序号
+        """
+        if self.needs_roll():
+            self._roll()
+        seq = self.next_seq
+        data = payload or b""
+        frame = FRAME_HEADER.pack(seq, len(data), FLAG_PRIMING if payload is None else 0) + data
+        offset = self._size
+        os.write(self._fd, frame)
+        INDEX_ENTRY.pack_into(self._index_map, self._count * INDEX_ENTRY.size, offset + 1)
+        self._count += 1
+        self._size += len(frame)
+        self.next_seq = seq + 1
+        return seq
+
+    def snapshot(self) -> tuple:
+        """
+        当前可读取的范围，供线程池中的 read_after 使用
+
+        Returns:
+            tuple: (段列表拷贝, 当前段已写入的字节数)
+        """
+        return list(self.segments), self._size
+
+    def needs_roll(self) -> bool:
+        """下一次追加是否要开始新的一段（需要创建文件和mmap）"""
+        return self._index_map is None or self._count >= self.segment_events or self._size >= self.segment_bytes
+
+    def contains(self, seq: int) -> bool:
+        """序号对应的事件是否仍然保留"""
+        return bool(self.segments) and self.segments[0].base_seq <= seq < self.next_seq
+
+    @staticmethod
+    def read_after(segments: list, current_size: int, seq: int) -> list:
+        """
+        读取序号 seq 之后的所有事件（在线程池中执行，只使用自己打开的文件句柄）
+
+        Returns:
+            list: [(序号, 标志, 消息字节), ...]
+        """
+        bases = [segment.base_seq for segment in segments]
+        position = max(0, bisect.bisect_right(bases, seq + 1) - 1)
+        frames = []
+        for i in range(position, len(segments)):
+            segment = segments[i]
+            end = current_size if i == len(segments) - 1 else None
+            offset = 0
+            if i == position and seq + 1 > segment.base_seq:
+                offset = StreamLog._lookup_offset(segment, seq + 1 - segment.base_seq)
+                if offset is None:
+                    continue  # seq 是该段的最后一个事件
+            frames.extend(frame for frame in read_frames(segment.log_path, offset, end) if frame[0] > seq)
+        return frames
+
+    @staticmethod
+    def _lookup_offset(segment: _Segment, slot: int) -> Optional[int]:
+        """通过mmap索引查找段内第 slot 个事件的偏移量"""
+        try:
+            with open(segment.index_path, "rb") as file, \
+                    mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as index_map:
+                if (slot + 1) * INDEX_ENTRY.size > len(index_map):
+                    return None
+                value = INDEX_ENTRY.unpack_from(index_map, slot * INDEX_ENTRY.size)[0]
+        except (FileNotFoundError, ValueError):
+            return None
+        return value - 1 if value else None
+
+    def close(self) -> None:
+        """关闭当前段的文件和mmap"""
+        if self._index_map is not None:
+            self._index_map.close()
+            self._index_map = None
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _open(self) -> None:
+        """打开已有的流：恢复段列表和下一个序号，补全崩溃时没写入索引的事件"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        meta_path = self.directory / STREAM_META
+        if not meta_path.exists():
+            with open(meta_path, "w", encoding="utf-8") as file:
+                json.dump({"stream_id": self.stream_id}, file)
+        bases = sorted(int(path.stem) for path in self.directory.glob("*.log") if path.stem.isdigit())
+        self.segments = [_Segment(self.directory, base) for base in bases]
+        if not self.segments:
+            return
+
+        segment = self.segments[-1]
+        self._open_segment(segment)
+        count = _index_count(self._index_map)
+        # 日志是权威数据：从最后一个已索引的事件开始读，之后完整的帧补写索引，不完整的帧截掉
+        position = 0
+        if count:
+            position = INDEX_ENTRY.unpack_from(self._index_map, (count - 1) * INDEX_ENTRY.size)[0] - 1
+        frames = read_frames(segment.log_path, position)
+        if count:
+            if frames:
+                position += FRAME_HEADER.size + len(frames[0][2])
+                frames = frames[1:]
+            else:
+                count -= 1
+                INDEX_ENTRY.pack_into(self._index_map, count * INDEX_ENTRY.size, 0)
+        for _, _, data in frames:
+            if count >= self.segment_events:
+                break
+            INDEX_ENTRY.pack_into(self._index_map, count * INDEX_ENTRY.size, position + 1)
+            count += 1
+            position += FRAME_HEADER.size + len(data)
+        os.ftruncate(self._fd, position)
+        self._count = count
+        self._size = position
+        self.next_seq = segment.base_seq + count
+
+    def _open_segment(self, segment: _Segment) -> None:
+        self.close()
+        self._fd = os.open(segment.log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        new_index = not segment.index_path.exists()
+        self._index_file = open(segment.index_path, "r+b" if not new_index else "w+b")
+        if new_index or os.path.getsize(segment.index_path) < self.segment_events * INDEX_ENTRY.size:
+            self._index_file.truncate(self.segment_events * INDEX_ENTRY.size)
+        self._index_map = mmap.mmap(self._index_file.fileno(), self.segment_events * INDEX_ENTRY.size)
+
+    def _roll(self) -> None:
+        """开始新的一段，超出段数上限时删除最旧的段"""
+        segment = _Segment(self.directory, self.next_seq)
+        self._open_segment(segment)
+        self.segments.append(segment)
+        self._count = 0
+        self._size = 0
+        while len(self.segments) > self.max_segments:
+            oldest = self.segments.pop(0)
+            for path in (oldest.log_path, oldest.index_path):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+
+class FileEventStore(EventStore):
+    """
+    磁盘事件存储，可直接替换 InMemoryEventStore
+
+    - 追加到已打开的流只写入页缓存（不fsync），单个事件几百字节，在事件循环中直接写入；
+      打开流、开始新的一段（创建文件、预分配索引、mmap）在线程池中执行
+    - 重放在线程池中查找流并读取文件
+    - run_sweeper 定期在线程池中删除长期不活动的流
+    - 内存中最多保留 max_open_streams 个流的文件句柄和索引mmap，其余的按需重新打开
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        segment_bytes: int = 4 * 1024 * 1024,
+        segment_events: int = 8192,
+        max_segments: int = 4,
+        max_open_streams: int = 64,
+        retention_seconds: float = 24 * 3600,
+        max_tracked_streams: int = 4096,
+    ):
+        """初始化事件存储
+
+        Args:
+            directory: 存储目录
+            segment_bytes: 单个段的日志大小上限
+            segment_events: 单个段的事件数上限（索引文件大小 = segment_events * 8 字节）
+            max_segments: 每个流保留的段数，更早的事件被删除
+            max_open_streams: 同时打开的流数
+            retention_seconds: 超过该时间没有写入的流被删除（启动时和 run_sweeper 中）
+            max_tracked_streams: 记住当前目录的流ID数，更早的流ID再次写入时开始新目录
+        """
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.segment_events = segment_events
+        self.max_segments = max_segments
+        self.max_open_streams = max_open_streams
+        self.retention_seconds = retention_seconds
+        self.max_tracked_streams = max_tracked_streams
+        self._streams: "OrderedDict[str, StreamLog]" = OrderedDict()
+        # 流ID（JSON）-> 当前写入的流目录名
+        self._current: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.purge_expired()
+
+    async def store_event(self, stream_id: StreamId, message: JSONRPCMessage | None) -> EventId:
+        """存储事件并生成事件ID"""
+        payload = serialize_message(message) if message is not None else None
+        with observe_stage("event_store_append"):
+            with self._lock:
+                key = self._current_key(stream_id, new_stream=message is None)
+                stream = self._streams.get(key)
+                seq = None
+                if stream is not None and not stream.needs_roll():
+                    self._streams.move_to_end(key)
+                    seq = stream.append(payload)
+            if seq is None:
+                # 同一个流的事件由SDK依次存储，打开流期间不会有该流的其他追加
+                seq = await run_io(self._append_blocking, key, stream_id, payload)
+        event_id = f"{key}-{seq}"
+        logger.debug(f"存储事件 {event_id} 到流 {stream_id}")
+        return event_id
+
+    async def replay_events_after(
+        self,
+        last_event_id: EventId,
+        send_callback: EventCallback,
+    ) -> StreamId | None:
+        """重放指定事件ID之后的事件"""
+        parsed = parse_event_id(last_event_id)
+        if parsed is None:
+            logger.warning(f"事件ID {last_event_id} 格式无效")
+            return None
+        key, seq = parsed
+        with observe_stage("event_store_replay"):
+            result = await run_io(self._read_after_blocking, key, seq)
+        if result is None:
+            logger.warning(f"事件ID {last_event_id} 未找到")
+            return None
+        stream_id, frames = result
+
+        replayed_count = 0
+        for event_seq, flags, data in frames:
+            if flags & FLAG_PRIMING:
+                continue
+            await send_callback(EventMessage(SerializedMessage(data), f"{key}-{event_seq}"))
+            replayed_count += 1
+
+        logger.info(f"重放了 {replayed_count} 个事件到流 {stream_id}")
+        return stream_id
+
+    def purge_expired(self) -> int:
+        """
+        删除超过保留时间没有写入的流（阻塞调用，运行中应在线程池中执行）
+
+        Returns:
+            int: 删除的流数
+        """
+        if not self.retention_seconds:
+            return 0
+        cutoff = time.time() - self.retention_seconds
+        removed = 0
+        for path in list(self.directory.iterdir()):
+            if not path.is_dir() or path.name.endswith(".deleting"):
+                continue
+            try:
+                latest = max((entry.stat().st_mtime for entry in path.iterdir()), default=0)
+            except FileNotFoundError:
+                continue
+            if latest >= cutoff:
+                continue
+            # 持有锁时只改名，该流ID之后的写入会开始新目录；耗时的删除在锁外进行
+            with self._lock:
+                if path.name in self._streams:
+                    continue
+                for stream_json in [s for s, key in self._current.items() if key == path.name]:
+                    del self._current[stream_json]
+                trash = path.with_name(f"{path.name}.{time.time_ns()}.deleting")
+                try:
+                    os.replace(path, trash)
+                except FileNotFoundError:
+                    continue
+            shutil.rmtree(trash, ignore_errors=True)
+            removed += 1
+        # 上次删除中途退出遗留的目录
+        for trash in self.directory.glob("*.deleting"):
+            shutil.rmtree(trash, ignore_errors=True)
+        if removed:
+            logger.info(f"已清理 {removed} 个过期的事件流")
+        return removed
+
+    async def run_sweeper(self, interval: float = 3600) -> None:
+        """定期删除过期的流（作为后台任务运行）"""
+        while True:
+            await anyio.sleep(interval)
+            try:
+                await run_io(self.purge_expired)
+            except OSError as e:
+                logger.error(f"清理过期的事件流失败: {e}")
+
+    def close(self) -> None:
+        """关闭所有打开的流"""
+        with self._lock:
+            for stream in self._streams.values():
+                stream.close()
+            self._streams.clear()
+
+    def _current_key(self, stream_id: StreamId, new_stream: bool) -> str:
+        """
+        流ID当前写入的目录名（调用方持有 _lock）
+
+        Args:
+            new_stream: 是否开始新的目录（priming 事件）
+        """
+        stream_json = json.dumps(stream_id)
+        key = None if new_stream else self._current.get(stream_json)
+        if key is None:
+            key = self._current[stream_json] = new_stream_key()
+        self._current.move_to_end(stream_json)
+        while len(self._current) > self.max_tracked_streams:
+            self._current.popitem(last=False)
+        return key
+
+    def _append_blocking(self, key: str, stream_id: StreamId, payload: Optional[bytes]) -> int:
+        """打开流或开始新的一段后追加事件（在线程池中执行）"""
+        with self._lock:
+            return self._get_stream(key, stream_id).append(payload)
+
+    def _read_after_blocking(self, key: str, seq: int) -> Optional[tuple]:
+        """
+        查找流并读取序号 seq 之后的事件（在线程池中执行）
+
+        Returns:
+            tuple: (流ID, [(序号, 标志, 消息字节), ...])；流或事件不存在时返回None
+        """
+        with self._lock:
+            stream = self._get_stream(key)
+            if stream is None or not stream.contains(seq):
+                return None
+            segments, current_size = stream.snapshot()
+            stream_id = stream.stream_id
+        return stream_id, StreamLog.read_after(segments, current_size, seq)
+
+    def _get_stream(self, key: str, stream_id: StreamId | None = None) -> Optional[StreamLog]:
+        """
+        获取流（调用方持有 _lock）；stream_id 为None时只打开已存在的流
+        """
+        stream = self._streams.get(key)
+        if stream is not None:
+            self._streams.move_to_end(key)
+            return stream
+        directory = self.directory / key
+        if stream_id is None:
+            if not (directory / STREAM_META).exists():
+                return None
+            stream_id = StreamLog.load_stream_id(directory)
+        stream = StreamLog(directory, stream_id, self.segment_bytes, self.segment_events, self.max_segments)
+        self._streams[key] = stream
+        while len(self._streams) > self.max_open_streams:
+            _, evicted = self._streams.popitem(last=False)
+            evicted.close()
+        return stream
@@ -0,0 +1,165 @@
+"""
+服务器指标：/metrics 路由（Prometheus 文本格式）
+工具和提示的请求数、错误数、耗时直方图在调用时记录；
+会话数、响应缓存、事件存储、执行器、DevOps发件箱的当前状态在抓取时读取
+"""
+
+import contextlib
+import contextvars
+import logging
+import time
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+
+from ..utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Prometheus 文本格式 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_metrics = get_metrics()
+for _kind, _label in (("tool", "工具"), ("prompt", "提示")):
+    _metrics.describe(f"mcp_{_kind}_requests_total", "counter", f"{_label}调用次数")
+    _metrics.describe(f"mcp_{_kind}_errors_total", "counter", f"{_label}调用失败次数")
+    _metrics.describe(f"mcp_{_kind}_duration_seconds", "histogram", f"{_label}调用耗时")
+
+
+# 未知的工具/提示名统一记为该标签值，避免客户端传入任意名称时标签无限增长
+UNKNOWN_NAME = "unknown"
+
+
+class RequestTracker:
+    """单次工具/提示调用的记录"""
+
+    __slots__ = ("name", "error")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.error = False
+
+    def failed(self) -> None:
+        self.error = True
+
+
+# 当前工具/提示调用的记录
+_current_request: contextvars.ContextVar[Optional[RequestTracker]] = contextvars.ContextVar(
+    "metrics_request", default=None
+)
+
+
+def mark_request_failed() -> None:
+    """标记当前调用失败（处理函数捕获异常后返回错误文本时调用，计入错误数）"""
+    tracker = _current_request.get()
+    if tracker is not None:
+        tracker.failed()
+
+
+def mark_unknown_request() -> None:
+    """标记当前调用的工具/提示名不存在（计入错误数，名称记为 unknown）"""
+    tracker = _current_request.get()
+    if tracker is not None:
+        tracker.name = UNKNOWN_NAME
+        tracker.failed()
+
+
+@contextlib.contextmanager
+def track_request(kind: str, name: str) -> Iterator[RequestTracker]:
+    """
+    记录一次工具或提示调用的次数、耗时和是否失败
+
+    Args:
+        kind: "tool" 或 "prompt"
+        name: 工具名或提示名
+    """
+    tracker = RequestTracker(name)
+    token = _current_request.set(tracker)
+    started = time.perf_counter()
+    try:
+        yield tracker
+    except BaseException:
+        tracker.failed()
+        raise
+    finally:
+        _current_request.reset(token)
+        labels = {kind: tracker.name}
+        _metrics.inc(f"mcp_{kind}_requests_total", **labels)
+        if tracker.error:
+            _metrics.inc(f"mcp_{kind}_errors_total", **labels)
+        _metrics.observe(f"mcp_{kind}_duration_seconds", time.perf_counter() - started, **labels)
+
+
+Sample = Tuple[str, str, str, dict, Any]
+
+
+def register_server_collectors(
+    session_manager: Any,
+    event_store: Any,
+    executor: Any,
+    response_cache: Any,
+    loop_lag_monitor: Any,
+    outbox_stats: Callable[[], Any],
+) -> None:
+    """注册抓取时读取的服务器状态指标"""
+
+    def collect() -> List[Sample]:
+        samples: List[Sample] = [
+            # SDK 没有公开会话数，读取会话管理器内部的会话表
+            ("mcp_active_sessions", "gauge", "当前活动的MCP会话数", {},
+             len(getattr(session_manager, "_server_instances", ()))),
+            ("mcp_event_loop_lag_max_seconds", "gauge", "事件循环的最大延迟", {},
+             loop_lag_monitor.max_lag),
+        ]
+
+        cache = response_cache.stats()
+        samples += [
+            ("mcp_response_cache_entries", "gauge", "响应缓存条目数", {}, cache["entries"]),
+            ("mcp_response_cache_bytes", "gauge", "响应缓存占用的字节数", {}, cache["bytes"]),
+        ]
+        for field in ("hits", "misses", "evictions", "invalidations"):
+            samples.append((f"mcp_response_cache_{field}_total", "counter", f"响应缓存 {field} 次数", {},
+                            cache[field]))
+
+        usage = executor.stats()
+        for pool in ("io", "process"):
+            samples.append(("mcp_executor_busy", "gauge", "执行器正在使用的工作线程数", {"pool": pool},
+                            usage[pool]["borrowed"]))
+            samples.append(("mcp_executor_waiting", "gauge", "等待执行器工作线程的任务数", {"pool": pool},
+                            usage[pool]["waiting"]))
+        for tool, tool_usage in usage["tools"].items():
+            samples.append(("mcp_tool_in_flight", "gauge", "受并发限制的工具正在执行的调用数", {"tool": tool},
+                            tool_usage["borrowed"]))
+            samples.append(("mcp_tool_waiting", "gauge", "等待工具并发槽位的调用数", {"tool": tool},
+                            tool_usage["waiting"]))
+
+        # 磁盘事件存储没有内存统计
+        if hasattr(event_store, "stats"):
+            store = event_store.stats()
+            samples += [
+                ("mcp_event_store_streams", "gauge", "内存事件存储中的流数", {}, store["streams"]),
+                ("mcp_event_store_events", "gauge", "内存事件存储中的事件数", {}, store["events"]),
+                ("mcp_event_store_bytes", "gauge", "内存事件存储占用的字节数", {}, store["bytes"]),
+                ("mcp_event_store_evicted_streams_total", "counter", "超出上限被淘汰的流数", {},
+                 store["evicted_streams"]),
+            ]
+
+        outbox = outbox_stats()
+        if outbox is not None:
+            samples += [
+                ("devops_outbox_pending", "gauge", "DevOps发件箱中等待发送的评论数", {}, outbox["pending"]),
+                ("devops_deliveries_total", "counter", "发送到Azure DevOps的批次数", {}, outbox["deliveries"]),
+                ("devops_delivery_failures_total", "counter", "发送失败的批次数", {},
+                 outbox["delivery_failures"]),
+                ("devops_delivery_seconds_total", "counter", "调用Azure DevOps的总耗时", {},
+                 outbox["delivery_seconds"]),
+            ]
+        return samples
+
+    _metrics.register_collector(collect)
+
+
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """GET /metrics"""
+    return PlainTextResponse(_metrics.render(), media_type=CONTENT_TYPE)
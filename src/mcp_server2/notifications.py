@@ -0,0 +1,176 @@
+"""
+工具调用中的日志通知合并
+处理函数在一次调用中会连续发送多条日志通知（写入DevOps前后、借用前后等），
+每条通知都是一个单独的SSE帧，开启事件存储时还会各存一个事件。
+这里为每次工具调用建立通知缓冲区：短时间窗口内的日志合并成一条通知发送，调用结束时发送剩余的日志；
+低于会话通过 logging/setLevel 设置的最低级别的日志直接丢弃，不会被序列化或存储
+"""
+
+import contextlib
+import contextvars
+import logging
+import weakref
+from typing import Any, AsyncIterator, Optional
+
+import anyio
+
+logger = logging.getLogger(__name__)
+
+# MCP 日志级别（RFC 5424），从低到高
+LOG_LEVELS = ("debug", "info", "notice", "warning", "error", "critical", "alert", "emergency")
+_LEVEL_RANK = {level: rank for rank, level in enumerate(LOG_LEVELS)}
+
+# 会话 -> 最低日志级别；会话结束后自动移除
+_session_levels: "weakref.WeakKeyDictionary[Any, str]" = weakref.WeakKeyDictionary()
+
+# 当前工具调用的通知缓冲区
+_current_buffer: contextvars.ContextVar[Optional["NotificationBuffer"]] = contextvars.ContextVar(
+    "notification_buffer", default=None
+)
+
+# 合并窗口（秒），0表示不合并
+_window = 0.05
+
+
+def configure_notifications(window: float) -> None:
+    """设置日志通知的合并窗口（需在服务器启动前调用）"""
+    global _window
+    _window = window
+
+
+def set_session_log_level(session: Any, level: str) -> None:
+    """记录会话通过 logging/setLevel 设置的最低日志级别"""
+    _session_levels[session] = level
+
+
+def is_enabled(session: Any, level: str) -> bool:
+    """该级别的日志是否需要发送给会话（会话未设置级别时全部发送）"""
+    minimum = _session_levels.get(session)
+    return minimum is None or _LEVEL_RANK.get(level, 0) >= _LEVEL_RANK[minimum]
+
+
+def _merge(messages: list) -> list:
+    """
+    把相邻的、级别和logger相同的日志合并成一条
+
+    Args:
+        messages: [(level, logger, data), ...]
+
+    Returns:
+        list: [(level, logger, data), ...]，多条文本以换行连接，其他数据合并成列表
+    """
+    merged = []
+    start = 0
+    for end in range(1, len(messages) + 1):
+        if end < len(messages) and messages[end][:2] == messages[start][:2]:
+            continue
+        level, logger_name, _ = messages[start]
+        run = [data for _, _, data in messages[start:end]]
+        if len(run) == 1:
+            data = run[0]
+        elif all(isinstance(item, str) for item in run):
+            data = "\n".join(run)
+        else:
+            data = run
+        merged.append((level, logger_name, data))
+        start = end
+    return merged
+
+
+class NotificationBuffer:
+    """单次工具调用的日志通知缓冲区"""
+
+    def __init__(self, session: Any, request_id: Any, window: float, task_group):
+        self.session = session
+        self.request_id = request_id
+        self.window = window
+        self._task_group = task_group
+        self._pending: list = []
+        # 保证定时发送和调用结束时的发送按顺序进行
+        self._send_lock = anyio.Lock()
+        self.received = 0
+        self.sent = 0
+
+    async def log(self, level: str, data: Any, logger_name: Optional[str] = None) -> None:
+        """缓冲一条日志，窗口结束时合并发送"""
+        if not is_enabled(self.session, level):
+            return
+        self.received += 1
+        self._pending.append((level, logger_name, data))
+        if len(self._pending) == 1:
+            self._task_group.start_soon(self._flush_after_window)
+
+    async def flush(self) -> None:
+        """立即发送缓冲中的日志"""
+        async with self._send_lock:
+            pending, self._pending = self._pending, []
+            for level, logger_name, data in _merge(pending):
+                await self.session.send_log_message(
+                    level=level,
+                    data=data,
+                    logger=logger_name,
+                    related_request_id=self.request_id,
+                )
+                self.sent += 1
+
+    async def _flush_after_window(self) -> None:
+        await anyio.sleep(self.window)
+        # 调用结束时只取消等待，已开始的发送不被打断
+        with anyio.CancelScope(shield=True):
+            try:
+                await self.flush()
+            except Exception as e:
+                # 定时发送失败（例如会话已断开）不影响工具调用的结果
+                logger.warning(f"发送日志通知失败: {e}")
+
+
+@contextlib.asynccontextmanager
+async def buffered_notifications(ctx) -> AsyncIterator[Optional[NotificationBuffer]]:
+    """
+    在工具调用期间缓冲日志通知，退出时发送剩余的日志
+
+    合并窗口为0时不缓冲，send_log 直接发送；
+    任务组只用于定时发送，处理函数抛出的异常在任务组之外原样抛出，不会被包装成 ExceptionGroup
+    """
+    if _window <= 0:
+        yield None
+        return
+    error: Optional[BaseException] = None
+    async with anyio.create_task_group() as tg:
+        buffer = NotificationBuffer(ctx.session, ctx.request_id, _window, tg)
+        token = _current_buffer.set(buffer)
+        try:
+            yield buffer
+        except BaseException as e:
+            error = e
+        finally:
+            _current_buffer.reset(token)
+            # 先取消尚未到期的定时发送，再发送剩余的日志
+            tg.cancel_scope.cancel()
+            with anyio.CancelScope(shield=True):
+                await buffer.flush()
+    if error is not None:
+        raise error
+    if buffer.received > buffer.sent:
+        logger.debug(f"合并日志通知: {buffer.received} 条 -> {buffer.sent} 条")
+
+
+async def send_log(ctx, level: str, data: Any, logger: Optional[str] = None) -> None:
+    """
+    发送与当前请求相关的日志通知（代替 ctx.session.send_log_message）
+
+    在 buffered_notifications 中调用时进入缓冲区合并发送，否则直接发送；
+    低于会话最低级别的日志都不发送
+    """
+    buffer = _current_buffer.get()
+    if buffer is not None and buffer.session is ctx.session:
+        await buffer.log(level, data, logger)
+        return
+    if not is_enabled(ctx.session, level):
+        return
+    await ctx.session.send_log_message(
+        level=level,
+        data=data,
+        logger=logger,
+        related_request_id=ctx.request_id,
+    )
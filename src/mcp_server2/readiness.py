@@ -0,0 +1,93 @@
+"""
+启动预热和就绪检查：/ready 路由
+服务器开始接受连接后在后台加载并索引所有设备表和借用/归还记录，
+预热完成前 /ready 返回503，滚动重启时负载均衡不会把请求转发到缓存还没有加载的进程
+"""
+
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from ..utils.metrics import get_metrics, observe_stage
+from .executor import run_io
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """服务器的预热状态"""
+
+    def __init__(self) -> None:
+        self.ready = False
+        self.warm_up_seconds: Optional[float] = None
+        self.summary: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+
+    def mark_ready(
+        self,
+        warm_up_seconds: Optional[float] = None,
+        summary: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """标记预热结束（未启用预热时直接调用）"""
+        self.warm_up_seconds = warm_up_seconds
+        self.summary = summary
+        self.error = error
+        self.ready = True
+
+    def status(self) -> Dict[str, Any]:
+        """/ready 返回的内容"""
+        status: Dict[str, Any] = {"status": "ready" if self.ready else "warming_up"}
+        if self.warm_up_seconds is not None:
+            status["warm_up_seconds"] = round(self.warm_up_seconds, 3)
+        if self.summary:
+            status.update(self.summary)
+        if self.error:
+            status["error"] = self.error
+        return status
+
+
+_readiness = Readiness()
+
+
+def get_readiness() -> Readiness:
+    """获取进程内共享的预热状态"""
+    return _readiness
+
+
+async def warm_up(load: Callable[[], Dict[str, Any]]) -> None:
+    """
+    在磁盘I/O线程池中执行预热，结束后标记就绪
+
+    预热失败（例如CSV格式错误）时记录错误后同样标记就绪：数据目录由所有进程共享，
+    保持503只会让滚动重启停住，出错的数据在请求时照常返回错误
+
+    Args:
+        load: 阻塞的预热函数，返回数据概况（设备数、记录数）
+    """
+    started = time.perf_counter()
+    try:
+        with observe_stage("warm_up"):
+            summary = await run_io(load)
+    except Exception as e:
+        logger.error(f"预热设备数据失败: {e}")
+        _readiness.mark_ready(time.perf_counter() - started, error=str(e))
+        return
+    seconds = time.perf_counter() - started
+    _readiness.mark_ready(seconds, summary)
+    logger.info(f"预热完成，用时 {seconds:.2f}s: {summary}")
+
+
+def _collect():
+    return [("mcp_ready", "gauge", "服务器是否已完成预热 (1为就绪)", {}, int(_readiness.ready))]
+
+
+get_metrics().register_collector(_collect)
+
+
+async def ready_endpoint(request: Request) -> JSONResponse:
+    """GET /ready：预热结束后返回200，之前返回503"""
+    return JSONResponse(_readiness.status(), status_code=200 if _readiness.ready else 503)
@@ -0,0 +1,191 @@
+"""
+只读工具的响应缓存
+list_devices、query_devices 等只读工具的结果只取决于参数和数据版本，
+以 (工具名, 规范化后的参数, 数据版本) 为键缓存完整响应；
+借用/归还或其他进程修改文件后数据版本变化，旧条目不再命中并按LRU淘汰
+
+缓存是进程级的、所有会话共享：响应不依赖会话状态（日志通知不属于缓存的响应），
+同一会话内的重复调用直接命中共享缓存，因此没有单独的按会话缓存层
+"""
+
+import contextvars
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 可缓存的只读工具 -> 参数默认值（省略参数与显式传入默认值视为同一请求）
+CACHEABLE_TOOLS: Dict[str, Dict[str, Any]] = {
+    "get_device_info": {"limit": 5},
+    "list_devices": {"device_type": "all", "status": "all", "format": "text"},
+    "query_devices": {"filter": {}, "device_type": "all", "format": "text", "offset": 0},
+    "get_windows_architectures": {},
+    "query_devices_by_architecture": {},
+    "get_device_records": {"record_type": "all"},
+    "find_device_by_asset": {},
+}
+
+# 会改变数据的工具：调用后立即清空缓存（释放内存；即使不清空，旧条目也不会再命中）
+MUTATING_TOOLS = frozenset({"borrow_device", "return_device", "borrow_devices", "return_devices"})
+
+# 处理函数在出错时标记本次响应不可缓存，避免暂时性的错误被缓存到数据下次变化
+_uncacheable = contextvars.ContextVar("response_uncacheable", default=False)
+
+
+def mark_uncacheable() -> None:
+    """标记当前工具调用的响应不应被缓存（在工具处理函数的异常分支中调用）"""
+    _uncacheable.set(True)
+
+
+def response_size(response: Any) -> int:
+    """估算响应占用的字节数（文本内容 + 结构化结果）"""
+    content, structured = response if isinstance(response, tuple) else (response, None)
+    size = 0
+    for block in content:
+        text = getattr(block, "text", None)
+        if text:
+            size += len(text.encode("utf-8"))
+    if structured is not None:
+        size += len(json.dumps(structured, ensure_ascii=False).encode("utf-8"))
+    return size
+
+
+class ResponseCache:
+    """
+    按条目数和总字节数限制的LRU响应缓存
+
+    只在事件循环线程中使用，不需要加锁
+    """
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 32 * 1024 * 1024):
+        """
+        Args:
+            max_entries: 最多缓存的响应数，0表示禁用缓存
+            max_bytes: 缓存响应的总字节数上限，单个超过上限的响应不缓存
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # 工具名 -> {"hits": n, "misses": n}
+        self.tool_stats: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(tool: str, arguments: Optional[Dict[str, Any]], version: Hashable) -> tuple:
+        """生成缓存键：补全默认参数、去掉值为None的参数，并按键排序序列化"""
+        normalized = dict(CACHEABLE_TOOLS.get(tool, {}))
+        normalized.update({key: value for key, value in (arguments or {}).items() if value is not None})
+        return (tool, json.dumps(normalized, sort_keys=True, ensure_ascii=False, separators=(",", ":")), version)
+
+    def get(self, key: tuple) -> Any:
+        """
+        查找缓存的响应
+
+        Returns:
+            缓存的响应，未命中时返回None
+        """
+        tool_stats = self.tool_stats.setdefault(key[0], {"hits": 0, "misses": 0})
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            tool_stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        tool_stats["hits"] += 1
+        return entry[0]
+
+    def put(self, key: tuple, response: Any) -> bool:
+        """
+        缓存响应，超出限制时淘汰最久未使用的条目
+
+        Returns:
+            bool: 是否已缓存
+        """
+        size = response_size(response)
+        if not self.enabled or size > self.max_bytes:
+            return False
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (response, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+        return True
+
+    def invalidate(self) -> None:
+        """清空缓存"""
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中、未命中、淘汰次数和当前占用"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "tools": {name: dict(counts) for name, counts in self.tool_stats.items()},
+        }
+
+
+_response_cache = ResponseCache()
+
+
+def configure_response_cache(**kwargs: Any) -> ResponseCache:
+    """按启动参数重新创建全局响应缓存（需在服务器启动前调用）"""
+    global _response_cache
+    _response_cache = ResponseCache(**kwargs)
+    return _response_cache
+
+
+def get_response_cache() -> ResponseCache:
+    """获取全局响应缓存"""
+    return _response_cache
+
+
+async def cached_call(tool: str, arguments: Optional[Dict[str, Any]], version: Hashable, call) -> Any:
+    """
+    通过缓存调用只读工具
+
+    Args:
+        tool: 工具名
+        arguments: 工具参数
+        version: 调用前读取的数据版本
+        call: 无参数的协程函数，未命中时执行
+    """
+    cache = _response_cache
+    key = cache.make_key(tool, arguments, version)
+    response = cache.get(key)
+    if response is not None:
+        logger.debug(f"响应缓存命中: {tool}")
+        return response
+    token = _uncacheable.set(False)
+    try:
+        response = await call()
+        if not _uncacheable.get():
+            cache.put(key, response)
+    finally:
+        _uncacheable.reset(token)
+    return response
@@ -4,6 +4,7 @@
 """
 
 import contextlib
+import json
 import logging
 import sys
 from collections.abc import AsyncIterator
@@ -18,35 +19,71 @@ from mcp.server.lowlevel import Server
 from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
 from starlette.applications import Starlette
 from starlette.middleware.cors import CORSMiddleware
-from starlette.routing import Mount
+from starlette.routing import Mount, Route
 from starlette.types import Receive, Scope, Send
 
 from .event_store import InMemoryEventStore
+from .file_event_store import FileEventStore
+from .notifications import buffered_notifications, configure_notifications, send_log, set_session_log_level
+from .device_listing import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, build_page, decode_cursor, get_listing_cache
+from .devops import close_outbox, configure_devops, devops_enabled, outbox_stats, queue_comment
+from .executor import configure_executor, loop_lag_monitor, parse_tool_limits, run_io, run_process
+from .readiness import get_readiness, ready_endpoint, warm_up
+from .metrics import (
+    mark_request_failed,
+    mark_unknown_request,
+    metrics_endpoint,
+    register_server_collectors,
+    track_request,
+)
+from .response_cache import (
+    CACHEABLE_TOOLS,
+    MUTATING_TOOLS,
+    cached_call,
+    configure_response_cache,
+    mark_uncacheable,
+)
 
 # 导入device模块
 current_dir = Path(__file__).parent
 project_root = current_dir.parent.parent
 sys.path.append(str(project_root))
 
-from src.device.android_reader import read_android_devices
-from src.device.ios_reader import read_ios_devices
-from src.device.windows_reader import read_windows_devices, get_all_architectures, query_devices_by_architecture
-from src.device.other_reader import read_other_devices
+from src.device.windows_reader import get_all_architectures, query_devices_by_architecture
 from src.device.records_reader import (
-    read_records, 
+    query_records,
     find_device_by_asset_number,
     borrow_device,
     return_device,
+    borrow_devices,
+    return_devices,
+    check_devices,
     add_borrow_record,
     add_return_record
 )
+from src.device.catalog import get_devices_dir
+from src.device.device_store import get_device_store
+from src.device.query import DEVICE_TYPE_FIELD, QUERY_FIELDS, DeviceQuery
+from src.device.transactions import get_transactions
+
+from src.utils.logging_utils import set_device_log_level, setup_queue_logging
+from src.utils.metrics import observe_stage
 
-# 导入Azure DevOps集成模块
-from src.az_info.record_in_deliverable import record_in_deliverable
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# 批量借用/归还一次最多处理的设备数
+MAX_BULK_ASSETS = 200
+
+
+def _parse_tool_concurrency(ctx: click.Context, param: click.Parameter, value: tuple) -> Dict[str, int]:
+    """--tool-concurrency 的回调：格式错误时由click报告用法错误，而不是抛出异常栈"""
+    try:
+        return parse_tool_limits(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e), ctx=ctx, param=param)
+
 
 @click.command()
 @click.option("--port", default=8002, help="HTTP服务器端口")
@@ -61,20 +98,96 @@ logger = logging.getLogger(__name__)
     default=False,
     help="启用JSON响应而不是SSE流",
 )
+@click.option("--io-workers", default=8, help="CSV文件读写线程池大小")
+@click.option("--process-workers", default=4, help="外部进程(az命令)线程池大小")
+@click.option(
+    "--tool-concurrency",
+    multiple=True,
+    callback=_parse_tool_concurrency,
+    help="单个工具的最大并发数，格式: 工具名=数量，可重复指定",
+)
+@click.option(
+    "--default-tool-concurrency",
+    default=0,
+    help="未单独配置的工具的最大并发数 (0表示不限制)",
+)
+@click.option("--response-cache-size", default=512, help="只读工具响应缓存的最大条目数 (0表示禁用)")
+@click.option("--response-cache-mb", default=32, help="只读工具响应缓存的内存上限 (MB)")
+@click.option(
+    "--event-store",
+    "event_store_kind",
+    type=click.Choice(["memory", "file"]),
+    default="memory",
+    help="断点续传事件存储: memory (进程内) 或 file (磁盘，重启后仍可续传)",
+)
+@click.option(
+    "--event-store-dir",
+    default=None,
+    help="磁盘事件存储目录 (默认为设备数据目录下的 events/)",
+)
+@click.option("--event-store-max-events", default=10000, help="内存事件存储的最大事件数 (所有流合计)")
+@click.option("--event-store-max-mb", default=16, help="内存事件存储的内存上限 (MB，所有流合计)")
+@click.option("--event-store-ttl", default=3600, help="内存事件存储中流的保留时间 (秒，0表示不过期)")
+@click.option("--notification-window-ms", default=50, help="日志通知合并窗口 (毫秒，0表示逐条发送)")
+@click.option(
+    "--no-devops",
+    is_flag=True,
+    default=False,
+    help="借用/归还不写入Azure DevOps评论 (不加载Azure SDK，适合只读部署和压测)",
+)
+@click.option(
+    "--no-warm-up",
+    is_flag=True,
+    default=False,
+    help="启动时不预先加载设备表和记录 (/ready 立即返回200)",
+)
 def main(
     port: int,
     log_level: str,
     json_response: bool,
+    io_workers: int,
+    process_workers: int,
+    tool_concurrency: Dict[str, int],
+    default_tool_concurrency: int,
+    response_cache_size: int,
+    response_cache_mb: int,
+    event_store_kind: str,
+    event_store_dir: Optional[str],
+    event_store_max_events: int,
+    event_store_max_mb: int,
+    event_store_ttl: int,
+    notification_window_ms: int,
+    no_devops: bool,
+    no_warm_up: bool,
 ) -> int:
     """启动设备管理MCP服务器"""
-    # 配置日志
-    logging.basicConfig(
-        level=getattr(logging, log_level.upper()),
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    )
+    # 配置日志：处理器运行在后台线程，请求处理中的日志调用不会阻塞在stderr写入上
+    level = getattr(logging, log_level.upper())
+    setup_queue_logging(level)
+    # 设备模块的逐行输出只在DEBUG级别打开
+    set_device_log_level(logging.DEBUG if level <= logging.DEBUG else logging.WARNING)
 
     logger.info("启动设备管理MCP服务器 (使用官方SDK)")
     
+    # 配置阻塞操作执行器
+    executor = configure_executor(
+        io_workers=io_workers,
+        process_workers=process_workers,
+        tool_limits=tool_concurrency,
+        default_tool_limit=default_tool_concurrency or None,
+    )
+    # 只读工具的响应缓存，按数据版本自动失效
+    response_cache = configure_response_cache(
+        max_entries=response_cache_size,
+        max_bytes=response_cache_mb * 1024 * 1024,
+    )
+    # 工具调用中的日志通知按时间窗口合并
+    configure_notifications(notification_window_ms / 1000)
+    # Azure DevOps集成在第一次借用/归还时才加载
+    configure_devops(not no_devops)
+    if no_devops:
+        logger.info("已禁用Azure DevOps记录 (--no-devops)")
+    
     # 创建MCP服务器实例 - 使用官方SDK
     app = Server("DeviceManagement-SDK")
 
@@ -84,11 +197,38 @@ def main(
         ctx = app.request_context
         logger.info(f"[SDK] 工具调用: {name}, 参数: {arguments}")
         
-        try:
+        with track_request("tool", name) as request:
+            try:
+                # 只读工具先查响应缓存，命中时不占用工具并发槽位
+                if response_cache.enabled and name in CACHEABLE_TOOLS:
+                    store = get_device_store()
+                    version = await run_io(_data_versions, store)
+                    return await cached_call(name, arguments, version, lambda: _dispatch_tool(name, arguments, ctx))
+                
+                result = await _dispatch_tool(name, arguments, ctx)
+                if name in MUTATING_TOOLS:
+                    response_cache.invalidate()
+                return result
+            except Exception as e:
+                logger.error(f"工具调用失败: {e}")
+                request.failed()
+                return [
+                    types.TextContent(
+                        type="text", 
+                        text=f"工具调用失败: {str(e)}",
+                    )
+                ]
+
+    async def _dispatch_tool(name: str, arguments: dict[str, Any], ctx):
+        """按工具名调用对应的处理函数"""
+        # 按工具限制并发，超出上限的调用排队等待；调用中的日志通知合并后发送
+        async with executor.tool_slot(name), buffered_notifications(ctx):
             if name == "get_device_info":
                 return await _handle_get_device_info(arguments, ctx)
             elif name == "list_devices":
                 return await _handle_list_devices(arguments, ctx)
+            elif name == "query_devices":
+                return await _handle_query_devices(arguments, ctx)
             elif name == "get_windows_architectures":
                 return await _handle_get_windows_architectures(arguments, ctx)
             elif name == "query_devices_by_architecture":
@@ -101,21 +241,24 @@ def main(
                 return await _handle_borrow_device(arguments, ctx)
             elif name == "return_device":
                 return await _handle_return_device(arguments, ctx)
+            elif name == "borrow_devices":
+                return await _handle_borrow_devices(arguments, ctx)
+            elif name == "return_devices":
+                return await _handle_return_devices(arguments, ctx)
             else:
+                mark_unknown_request()
                 return [
                     types.TextContent(
                         type="text",
                         text=f"未知工具: {name}",
                     )
                 ]
-        except Exception as e:
-            logger.error(f"工具调用失败: {e}")
-            return [
-                types.TextContent(
-                    type="text", 
-                    text=f"工具调用失败: {str(e)}",
-                )
-            ]
+
+    @app.set_logging_level()
+    async def set_logging_level(level: types.LoggingLevel) -> None:
+        """客户端设置本会话接收的最低日志级别"""
+        set_session_log_level(app.request_context.session, level)
+        logger.info(f"会话日志级别设置为: {level}")
 
     @app.list_tools()
     async def list_tools() -> list[types.Tool]:
@@ -131,12 +274,19 @@ def main(
                     "properties": {
                         "device_id": {
                             "type": "string",
-                            "description": "设备ID或设备名称"
+                            "description": "设备ID或设备名称（也可以是序列号、SKU或品牌，支持部分匹配和拼写差异）"
                         },
                         "device_type": {
                             "type": "string",
                             "enum": ["android", "ios", "windows"],
                             "description": "设备类型"
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "minimum": 1,
+                            "maximum": 50,
+                            "description": "最多列出的候选设备数（按匹配度排序）",
+                            "default": 5
                         }
                     },
                     "required": ["device_id", "device_type"]
@@ -159,6 +309,73 @@ def main(
                             "enum": ["online", "offline", "all"],
                             "description": "过滤设备状态 (online=可用, offline=其他状态)",
                             "default": "all"
+                        },
+                        "format": {
+                            "type": "string",
+                            "enum": ["text", "json"],
+                            "description": "输出格式：text=可读文本，json=结构化结果（默认每页100台）",
+                            "default": "text"
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "minimum": 1,
+                            "maximum": MAX_PAGE_SIZE,
+                            "description": "每页设备数"
+                        },
+                        "cursor": {
+                            "type": "string",
+                            "description": "上一页返回的 next_cursor"
+                        },
+                        "fields": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "只返回这些字段（如 设备名称、设备状态、资产编号），device_type 总是返回"
+                        }
+                    }
+                }
+            ),
+            types.Tool(
+                name="query_devices",
+                description=(
+                    "按组合条件查询设备（与/或/非）。filter 示例: "
+                    '{"and": [{"brand": ["Samsung", "Google"]}, {"status": "可用"}, {"not": {"manager": "alice"}}]}；'
+                    "同一对象中的多个字段同时满足，取值为列表时匹配任意一个，空字符串匹配空值（如未借出: {\"borrower\": \"\"}）"
+                ),
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "filter": {
+                            "type": "object",
+                            "description": (
+                                "查询表达式：{\"and\": [...]}、{\"or\": [...]}、{\"not\": {...}} 或 {字段: 取值}。"
+                                f"可用字段: {', '.join([DEVICE_TYPE_FIELD, *QUERY_FIELDS])} "
+                                "(os=设备OS, manager=所属manager, type=Android类型, inventoried=是否盘点)"
+                            ),
+                            "default": {}
+                        },
+                        "device_type": {
+                            "type": "string",
+                            "enum": ["android", "ios", "windows", "other", "all"],
+                            "description": "只查询某一类设备",
+                            "default": "all"
+                        },
+                        "format": {
+                            "type": "string",
+                            "enum": ["text", "json"],
+                            "description": "输出格式：text=可读文本，json=结构化结果",
+                            "default": "text"
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "minimum": 1,
+                            "maximum": MAX_PAGE_SIZE,
+                            "description": f"最多返回的设备数（默认{DEFAULT_PAGE_SIZE}）"
+                        },
+                        "offset": {
+                            "type": "integer",
+                            "minimum": 0,
+                            "description": "跳过前N台匹配的设备，用于翻页",
+                            "default": 0
                         }
                     }
                 }
@@ -196,6 +413,19 @@ def main(
                             "enum": ["all", "借用", "归还"],
                             "description": "记录类型过滤",
                             "default": "all"
+                        },
+                        "asset_number": {
+                            "type": "string",
+                            "description": "只返回该资产编号的记录（可选）"
+                        },
+                        "borrower": {
+                            "type": "string",
+                            "description": "只返回该借用者的记录（可选）"
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": "只返回最近的N条记录（可选）",
+                            "minimum": 1
                         }
                     }
                 }
@@ -259,6 +489,54 @@ def main(
                     },
                     "required": ["asset_number", "borrower"]
                 }
+            ),
+            types.Tool(
+                name="borrow_devices",
+                description="批量借用设备（一条合并的DevOps评论，记录和状态一次写入，返回每台设备的结果）",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "asset_numbers": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": f"设备资产编号列表（最多{MAX_BULK_ASSETS}个）"
+                        },
+                        "borrower": {
+                            "type": "string",
+                            "description": "借用者姓名"
+                        },
+                        "reason": {
+                            "type": "string",
+                            "description": "借用原因（可选）",
+                            "default": ""
+                        }
+                    },
+                    "required": ["asset_numbers", "borrower"]
+                }
+            ),
+            types.Tool(
+                name="return_devices",
+                description="批量归还设备（一条合并的DevOps评论，记录和状态一次写入，返回每台设备的结果）",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "asset_numbers": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": f"设备资产编号列表（最多{MAX_BULK_ASSETS}个）"
+                        },
+                        "borrower": {
+                            "type": "string",
+                            "description": "归还者姓名"
+                        },
+                        "reason": {
+                            "type": "string",
+                            "description": "归还原因（可选）",
+                            "default": ""
+                        }
+                    },
+                    "required": ["asset_numbers", "borrower"]
+                }
             )
         ]
 
@@ -358,51 +636,62 @@ def main(
         args = arguments or {}
         logger.info(f"[SDK] 获取提示: {name}, 参数: {args}")
         
-        try:
-            if name == "device_info_query":
-                return await _handle_device_info_query_prompt(args)
-            elif name == "device_list_guide":
-                return await _handle_device_list_guide_prompt(args)
-            elif name == "asset_lookup_guide":
-                return await _handle_asset_lookup_guide_prompt(args)
-            elif name == "device_borrow_workflow":
-                return await _handle_device_borrow_workflow_prompt(args)
-            elif name == "device_return_workflow":
-                return await _handle_device_return_workflow_prompt(args)
-            elif name == "windows_architecture_guide":
-                return await _handle_windows_architecture_guide_prompt(args)
-            elif name == "device_records_analysis":
-                return await _handle_device_records_analysis_prompt(args)
-            else:
+        with track_request("prompt", name) as request:
+            try:
+                if name == "device_info_query":
+                    return await _handle_device_info_query_prompt(args)
+                elif name == "device_list_guide":
+                    return await _handle_device_list_guide_prompt(args)
+                elif name == "asset_lookup_guide":
+                    return await _handle_asset_lookup_guide_prompt(args)
+                elif name == "device_borrow_workflow":
+                    return await _handle_device_borrow_workflow_prompt(args)
+                elif name == "device_return_workflow":
+                    return await _handle_device_return_workflow_prompt(args)
+                elif name == "windows_architecture_guide":
+                    return await _handle_windows_architecture_guide_prompt(args)
+                elif name == "device_records_analysis":
+                    return await _handle_device_records_analysis_prompt(args)
+                else:
+                    mark_unknown_request()
+                    return types.GetPromptResult(
+                        description=f"未知提示: {name}",
+                        messages=[
+                            types.PromptMessage(
+                                role="user",
+                                content=types.TextContent(
+                                    type="text",
+                                    text=f"错误：未找到名为 '{name}' 的提示模板"
+                                )
+                            )
+                        ]
+                    )
+            except Exception as e:
+                logger.error(f"提示处理失败: {e}")
+                request.failed()
                 return types.GetPromptResult(
-                    description=f"未知提示: {name}",
+                    description="提示处理失败",
                     messages=[
                         types.PromptMessage(
                             role="user",
                             content=types.TextContent(
                                 type="text",
-                                text=f"错误：未找到名为 '{name}' 的提示模板"
+                                text=f"处理提示时发生错误: {str(e)}"
                             )
                         )
                     ]
                 )
-        except Exception as e:
-            logger.error(f"提示处理失败: {e}")
-            return types.GetPromptResult(
-                description="提示处理失败",
-                messages=[
-                    types.PromptMessage(
-                        role="user",
-                        content=types.TextContent(
-                            type="text",
-                            text=f"处理提示时发生错误: {str(e)}"
-                        )
-                    )
-                ]
-            )
 
     # 创建事件存储（支持断点续传）
-    event_store = InMemoryEventStore()
+    if event_store_kind == "file":
+        event_store = FileEventStore(Path(event_store_dir) if event_store_dir else get_devices_dir() / "events")
+        logger.info(f"使用磁盘事件存储: {event_store.directory}")
+    else:
+        event_store = InMemoryEventStore(
+            max_total_events=event_store_max_events,
+            max_total_bytes=event_store_max_mb * 1024 * 1024,
+            ttl_seconds=event_store_ttl,
+        )
 
     # 创建会话管理器 - 这是关键！使用SDK的StreamableHTTPSessionManager
     session_manager = StreamableHTTPSessionManager(
@@ -410,6 +699,15 @@ def main(
         event_store=event_store,  # 启用断点续传
         json_response=json_response,
     )
+    # /metrics 抓取时读取的服务器状态
+    register_server_collectors(
+        session_manager,
+        event_store,
+        executor,
+        response_cache,
+        loop_lag_monitor,
+        outbox_stats,
+    )
 
     # ASGI处理器 - 这里才是真正使用SDK处理HTTP请求
     async def handle_streamable_http(scope: Scope, receive: Receive, send: Send) -> None:
@@ -418,18 +716,48 @@ def main(
     @contextlib.asynccontextmanager
     async def lifespan(app: Starlette) -> AsyncIterator[None]:
         """管理会话管理器生命周期"""
-        async with session_manager.run():
+        async with session_manager.run(), anyio.create_task_group() as tg:
             logger.info("SDK StreamableHTTP会话管理器已启动!")
+            # 重放上次崩溃时未完成的借用/归还事务
+            try:
+                transactions = await run_io(get_transactions)
+                logger.info(f"借用/归还事务管理器已就绪 (意图日志: {transactions.intents.path})")
+            except Exception as e:
+                logger.error(f"重放未完成的借用/归还事务失败: {e}")
+            # 在后台加载并索引设备表和记录（在事务重放之后），完成前 /ready 返回503
+            if no_warm_up:
+                get_readiness().mark_ready()
+            else:
+                tg.start_soon(warm_up, _warm_up_data)
+            # 监控事件循环延迟，验证阻塞调用已移出事件循环
+            tg.start_soon(loop_lag_monitor.run)
+            # 定期删除长时间不活动的事件流
+            if isinstance(event_store, InMemoryEventStore) and event_store.ttl_seconds:
+                tg.start_soon(event_store.run_sweeper)
+            elif isinstance(event_store, FileEventStore) and event_store.retention_seconds:
+                tg.start_soon(event_store.run_sweeper)
             try:
                 yield
             finally:
+                logger.info(f"事件循环延迟统计: {loop_lag_monitor.stats()}")
+                logger.info(f"执行器使用情况: {executor.stats()}")
+                logger.info(f"响应缓存统计: {response_cache.stats()}")
+                # 退出前尝试发送发件箱中剩余的DevOps评论
+                await run_process(close_outbox)
+                if isinstance(event_store, FileEventStore):
+                    event_store.close()
+                else:
+                    logger.info(f"事件存储统计: {event_store.stats()}")
                 logger.info("服务器正在关闭...")
+                tg.cancel_scope.cancel()
 
     # 创建ASGI应用 - 使用SDK的传输层
     starlette_app = Starlette(
         debug=True,
         routes=[
             Mount("/mcp", app=handle_streamable_http),  # 这里使用SDK处理
+            Route("/metrics", metrics_endpoint, methods=["GET"]),  # Prometheus 指标
+            Route("/ready", ready_endpoint, methods=["GET"]),  # 就绪检查，预热完成后返回200
         ],
         lifespan=lifespan,
     )
@@ -444,6 +772,8 @@ def main(
 
     logger.info(f"服务器启动在端口 {port}")
     logger.info(f"MCP端点: http://127.0.0.1:{port}/mcp")
+    logger.info(f"指标端点: http://127.0.0.1:{port}/metrics")
+    logger.info(f"就绪检查: http://127.0.0.1:{port}/ready")
     logger.info("使用官方SDK StreamableHTTP传输")
 
     import uvicorn
@@ -453,49 +783,57 @@ def main(
 
 
 # 工具实现函数
+def _data_versions(store) -> tuple:
+    """响应缓存使用的数据版本：设备数据和借用/归还记录（阻塞调用，应在线程池中执行）"""
+    return (store.data_version(), store.records_version())
+
+
+def _warm_up_data() -> Dict[str, Any]:
+    """预热设备表、借用/归还记录和默认的设备列表（阻塞调用，应在线程池中执行）"""
+    summary = get_device_store().warm_up()
+    # list_devices 不带参数时的列表
+    get_listing_cache().get_listing("all", "all")
+    return summary
+
+
+async def _queue_devops(comment_text: str):
+    """把DevOps评论写入发件箱（在外部进程线程池中执行并记录耗时）"""
+    with observe_stage("devops_queue"):
+        return await run_process(queue_comment, comment_text)
+
+
 async def _handle_get_device_info(arguments: dict[str, Any], ctx) -> list[types.ContentBlock]:
     """处理获取设备信息"""
     device_id = arguments.get("device_id")
     device_type = arguments.get("device_type")
+    limit = min(max(arguments.get("limit") or 5, 1), 50)
     
     if not device_id or not device_type:
         return [types.TextContent(type="text", text="缺少必需参数: device_id 或 device_type")]
     
     # 发送日志通知
-    await ctx.session.send_log_message(
+    await send_log(
+        ctx,
         level="info",
         data=f"正在获取设备 {device_id} 的信息...",
         logger="device_manager",
-        related_request_id=ctx.request_id,
     )
     
     try:
         # 根据设备类型读取真实设备数据
-        devices = []
-        if device_type == "android":
-            devices = read_android_devices()
-        elif device_type == "ios":
-            devices = read_ios_devices()
-        elif device_type == "windows":
-            devices = read_windows_devices()
-        else:
+        if device_type not in ("android", "ios", "windows"):
             return [types.TextContent(type="text", text=f"不支持的设备类型: {device_type}")]
+        # 名称/序列号/SKU/品牌的 n-gram 索引，返回按匹配度排序的候选
+        store = get_device_store()
+        candidates = await run_io(store.search_devices, device_id, device_type, limit)
         
-        # 查找指定设备
-        device_info = None
-        for device in devices:
-            # 根据设备名称或序列号匹配
-            if (device.get('设备名称') == device_id or 
-                device.get('设备序列号') == device_id or
-                device_id in str(device.get('设备名称', ''))):
-                device_info = device
-                break
-        
-        if not device_info:
+        if not candidates:
+            facets = await run_io(store.facets)
             return [types.TextContent(
                 type="text", 
-                text=f"未找到设备: {device_id} (类型: {device_type})\n可用设备数量: {len(devices)}"
+                text=f"未找到设备: {device_id} (类型: {device_type})\n可用设备数量: {facets.count(device_type)}"
             )]
+        _, device_info, best_score = candidates[0]
         
         # 格式化设备信息
         result_text = f"""设备信息获取成功:
@@ -520,6 +858,13 @@ SKU: {device_info.get('SKU', 'N/A')}
         if device_type == "android" and device_info.get('类型'):
             result_text += f"\n类型: {device_info.get('类型', 'N/A')}"
         
+        result_text += f"\n匹配度: {best_score:.2f}"
+        if len(candidates) > 1:
+            result_text += f"\n\n🔎 其他候选设备 (按匹配度排序):"
+            for i, (_, device, score) in enumerate(candidates[1:], 2):
+                result_text += (f"\n{i}. {device.get('设备名称', 'N/A')} | 序列号: {device.get('设备序列号') or 'N/A'}"
+                                f" | 资产编号: {device.get('资产编号') or 'N/A'} | 匹配度: {score:.2f}")
+        
         result_text += f"\n\n✨ 此结果来自真实设备数据 (CSV文件)"
         
         logger.info(f"[Real Data] 返回设备信息: {device_info.get('设备名称')}")
@@ -527,6 +872,8 @@ SKU: {device_info.get('SKU', 'N/A')}
         
     except Exception as e:
         logger.error(f"读取设备信息失败: {e}")
+        mark_request_failed()
+        mark_uncacheable()
         return [types.TextContent(
             type="text", 
             text=f"读取设备信息失败: {str(e)}\n请检查设备数据文件是否存在"
@@ -537,68 +884,47 @@ async def _handle_list_devices(arguments: dict[str, Any], ctx) -> list[types.Con
     """处理列出设备"""
     device_type = arguments.get("device_type", "all")
     status = arguments.get("status", "all")
+    output_format = arguments.get("format", "text")
+    limit = arguments.get("limit")
+    cursor = arguments.get("cursor")
+    fields = arguments.get("fields") or None
     
     # 发送进度通知
-    await ctx.session.send_log_message(
+    await send_log(
+        ctx,
         level="info",
         data=f"正在扫描设备 (类型: {device_type}, 状态: {status})...",
         logger="device_scanner",
-        related_request_id=ctx.request_id,
     )
     
     try:
-        all_devices = []
-        
-        # 读取各类型设备
-        if device_type == "all" or device_type == "android":
-            android_devices = read_android_devices()
-            for device in android_devices:
-                device['device_type'] = 'android'
-                all_devices.append(device)
-        
-        if device_type == "all" or device_type == "ios":
-            ios_devices = read_ios_devices()
-            for device in ios_devices:
-                device['device_type'] = 'ios'
-                all_devices.append(device)
-        
-        if device_type == "all" or device_type == "windows":
-            windows_devices = read_windows_devices()
-            for device in windows_devices:
-                device['device_type'] = 'windows'
-                all_devices.append(device)
-        
-        if device_type == "all" or device_type == "other":
-            other_devices = read_other_devices()
-            for device in other_devices:
-                device['device_type'] = 'other'
-                all_devices.append(device)
+        # 过滤后的列表按数据版本缓存，每台设备只在数据变化后序列化一次
+        listing = await run_io(get_listing_cache().get_listing, device_type, status)
+        offset = decode_cursor(cursor, device_type, status) if cursor else 0
+        if output_format == "json" or limit is not None or cursor:
+            limit = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        else:
+            # 文本模式未指定分页参数时保持原来的行为，返回全部设备
+            limit = len(listing.entries)
+        page, structured, json_text = build_page(listing, device_type, status, offset, limit, fields)
         
-        # 状态过滤
-        if status != "all":
-            if status == "online":
-                # 将"可用"状态映射为"online"
-                all_devices = [d for d in all_devices if d.get('设备状态') == '可用']
-            elif status == "offline":
-                # 将非"可用"状态映射为"offline"
-                all_devices = [d for d in all_devices if d.get('设备状态') != '可用']
+        if output_format == "json":
+            logger.info(f"[Real Data] 返回设备列表(JSON): {len(page)}/{listing.stats['total']}个设备")
+            return [types.TextContent(type="text", text=json_text)], structured
         
         # 格式化结果
-        result_text = f"设备列表 - 类型: {device_type}, 状态: {status}:\n\n"
+        lines = [f"设备列表 - 类型: {device_type}, 状态: {status}:", ""]
         
-        if not all_devices:
-            result_text += "未找到符合条件的设备。\n"
+        if not page:
+            lines.append("未找到符合条件的设备。")
         else:
             # 按设备类型分组显示
             device_groups = {}
-            for device in all_devices:
-                dtype = device.get('device_type', 'unknown')
-                if dtype not in device_groups:
-                    device_groups[dtype] = []
-                device_groups[dtype].append(device)
+            for entry in page:
+                device_groups.setdefault(entry.device.get('device_type', 'unknown'), []).append(entry.device)
             
             for dtype, devices in device_groups.items():
-                result_text += f"📱 {dtype.upper()} 设备 ({len(devices)}台):\n"
+                lines.append(f"📱 {dtype.upper()} 设备 ({len(devices)}台):")
                 for device in devices:
                     device_name = device.get('设备名称', 'N/A')
                     device_status = device.get('设备状态', 'N/A')
@@ -606,57 +932,131 @@ async def _handle_list_devices(arguments: dict[str, Any], ctx) -> list[types.Con
                     borrower = device.get('借用者', '无')
                     asset_number = device.get('资产编号', '')  # 获取资产编号，没有则为空字符串
                     
-                    result_text += f"  • {device_name}\n"
-                    result_text += f"    状态: {device_status} | 系统: {device_os}\n"
-                    result_text += f"    借用者: {borrower}\n"
+                    lines.append(f"  • {device_name}")
+                    lines.append(f"    状态: {device_status} | 系统: {device_os}")
+                    lines.append(f"    借用者: {borrower}")
                     
                     # 添加资产编号（如果存在）
                     if asset_number and asset_number.strip():
-                        result_text += f"    资产编号: {asset_number}\n"
+                        lines.append(f"    资产编号: {asset_number}")
                     
                     # 添加特殊字段
                     if dtype == "windows" and device.get('芯片架构'):
-                        result_text += f"    架构: {device.get('芯片架构')}\n"
+                        lines.append(f"    架构: {device.get('芯片架构')}")
                     elif dtype == "android" and device.get('类型'):
-                        result_text += f"    类型: {device.get('类型')}\n"
+                        lines.append(f"    类型: {device.get('类型')}")
                     
-                    result_text += "\n"
-                result_text += "\n"
-        
-        # 统计信息
-        total_count = len(all_devices)
-        available_count = sum(1 for d in all_devices if d.get('设备状态') == '可用')
-        in_use_count = sum(1 for d in all_devices if d.get('设备状态') == '正在使用')
+                    lines.append("")
+                lines.append("")
         
-        result_text += f"📊 统计信息:\n"
-        result_text += f"总设备数: {total_count}\n"
-        result_text += f"可用设备: {available_count}\n"
-        result_text += f"使用中设备: {in_use_count}\n"
-        result_text += f"其他状态: {total_count - available_count - in_use_count}\n"
-        result_text += f"\n✨ 此结果来自真实设备数据 (CSV文件)"
+        # 统计信息（基于全部匹配的设备，而不只是当前页）
+        stats = listing.stats
+        lines.append(f"📊 统计信息:")
+        lines.append(f"总设备数: {stats['total']}")
+        lines.append(f"可用设备: {stats['available']}")
+        lines.append(f"使用中设备: {stats['in_use']}")
+        lines.append(f"其他状态: {stats['other']}")
+        if structured["next_cursor"]:
+            lines.append(f"\n📄 本页显示第 {offset + 1}-{offset + len(page)} 台，"
+                         f"下一页请传入 cursor: {structured['next_cursor']}")
+        lines.append(f"\n✨ 此结果来自真实设备数据 (CSV文件)")
         
-        logger.info(f"[Real Data] 返回设备列表: {total_count}个设备")
-        return [types.TextContent(type="text", text=result_text)]
+        logger.info(f"[Real Data] 返回设备列表: {len(page)}/{stats['total']}个设备")
+        return [types.TextContent(type="text", text="\n".join(lines))]
         
     except Exception as e:
         logger.error(f"读取设备列表失败: {e}")
+        mark_request_failed()
+        mark_uncacheable()
         return [types.TextContent(
             type="text", 
             text=f"读取设备列表失败: {str(e)}\n请检查设备数据文件是否存在"
         )]
 
 
+async def _handle_query_devices(arguments: dict[str, Any], ctx) -> list[types.ContentBlock]:
+    """处理组合条件查询设备"""
+    device_type = arguments.get("device_type", "all")
+    output_format = arguments.get("format", "text")
+    limit = min(arguments.get("limit") or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    offset = max(arguments.get("offset") or 0, 0)
+    
+    try:
+        query = DeviceQuery.parse(arguments.get("filter") or {})
+    except ValueError as e:
+        return [types.TextContent(type="text", text=f"查询条件错误: {str(e)}")]
+    
+    await send_log(
+        ctx,
+        level="info",
+        data=f"正在查询设备 (类型: {device_type}, 条件: {query.to_dict()})...",
+        logger="device_query",
+    )
+    
+    try:
+        matches = await run_io(
+            get_device_store().query_devices, query, None if device_type == "all" else device_type
+        )
+        page = matches[offset:offset + limit]
+        next_offset = offset + len(page) if offset + len(page) < len(matches) else None
+        
+        if output_format == "json":
+            structured = {
+                "device_type": device_type,
+                "filter": query.to_dict(),
+                "total": len(matches),
+                "offset": offset,
+                "count": len(page),
+                "next_offset": next_offset,
+                "items": [dict(device, device_type=dtype) for dtype, device in page],
+            }
+            logger.info(f"[Real Data] 返回组合查询结果(JSON): {len(page)}/{len(matches)}个设备")
+            return [types.TextContent(type="text", text=json.dumps(structured, ensure_ascii=False))], structured
+        
+        lines = [f"设备查询 - 类型: {device_type}, 条件: {json.dumps(query.to_dict(), ensure_ascii=False)}", ""]
+        if not page:
+            lines.append("未找到符合条件的设备。")
+        for i, (dtype, device) in enumerate(page, offset + 1):
+            lines.append(f"{i}. [{dtype}] {device.get('设备名称', 'N/A')}")
+            lines.append(f"   状态: {device.get('设备状态', 'N/A')} | 系统: {device.get('设备OS', 'N/A')}")
+            lines.append(f"   借用者: {device.get('借用者') or '无'} | manager: {device.get('所属manager') or 'N/A'}")
+            asset_number = device.get('资产编号', '')
+            if asset_number and asset_number.strip():
+                lines.append(f"   资产编号: {asset_number}")
+            if device.get('芯片架构'):
+                lines.append(f"   架构: {device.get('芯片架构')}")
+            elif device.get('类型'):
+                lines.append(f"   类型: {device.get('类型')}")
+            lines.append("")
+        
+        lines.append(f"📊 共匹配 {len(matches)} 台设备")
+        if next_offset is not None:
+            lines.append(f"📄 本页显示第 {offset + 1}-{offset + len(page)} 台，下一页请传入 offset: {next_offset}")
+        
+        logger.info(f"[Real Data] 返回组合查询结果: {len(page)}/{len(matches)}个设备")
+        return [types.TextContent(type="text", text="\n".join(lines))]
+        
+    except Exception as e:
+        logger.error(f"组合查询设备失败: {e}")
+        mark_request_failed()
+        mark_uncacheable()
+        return [types.TextContent(
+            type="text", 
+            text=f"组合查询设备失败: {str(e)}\n请检查设备数据文件是否存在"
+        )]
+
+
 async def _handle_get_windows_architectures(arguments: dict[str, Any], ctx) -> list[types.ContentBlock]:
     """处理获取Windows架构列表"""
-    await ctx.session.send_log_message(
+    await send_log(
+        ctx,
         level="info",
         data="正在获取Windows设备架构列表...",
         logger="windows_architecture",
-        related_request_id=ctx.request_id,
     )
     
     try:
-        architectures = get_all_architectures()
+        architectures = await run_io(get_all_architectures)
         
         result_text = f"Windows设备芯片架构列表:\n\n"
         for i, arch in enumerate(architectures, 1):
@@ -670,6 +1070,8 @@ async def _handle_get_windows_architectures(arguments: dict[str, Any], ctx) -> l
         
     except Exception as e:
         logger.error(f"获取Windows架构失败: {e}")
+        mark_request_failed()
+        mark_uncacheable()
         return [types.TextContent(
             type="text", 
             text=f"获取Windows架构失败: {str(e)}\n请检查Windows设备数据文件是否存在"
@@ -683,22 +1085,23 @@ async def _handle_query_devices_by_architecture(arguments: dict[str, Any], ctx)
     if not architecture:
         return [types.TextContent(type="text", text="缺少必需参数: architecture")]
     
-    await ctx.session.send_log_message(
+    await send_log(
+        ctx,
         level="info",
         data=f"正在查询架构为 {architecture} 的Windows设备...",
         logger="architecture_query",
-        related_request_id=ctx.request_id,
     )
     
     try:
-        devices = query_devices_by_architecture(architecture)
+        devices = await run_io(query_devices_by_architecture, architecture)
+        facets = await run_io(get_device_store().facets)
         
         result_text = f"架构 '{architecture}' 的Windows设备:\n\n"
         
         if not devices:
             result_text += f"未找到架构为 '{architecture}' 的设备。\n"
             # 显示可用架构
-            all_archs = get_all_architectures()
+            all_archs = await run_io(get_all_architectures)
             result_text += f"\n可用架构: {', '.join(all_archs)}"
         else:
             for i, device in enumerate(devices, 1):
@@ -722,14 +1125,13 @@ async def _handle_query_devices_by_architecture(arguments: dict[str, Any], ctx)
                 
                 result_text += "\n"
             
-            # 统计信息
-            available_count = sum(1 for d in devices if d.get('设备状态') == '可用')
-            in_use_count = sum(1 for d in devices if d.get('设备状态') == '正在使用')
+            # 统计信息（来自分面计数）
+            stats = facets.stats('windows', architecture=architecture)
             
             result_text += f"📊 {architecture} 架构统计:\n"
-            result_text += f"总设备数: {len(devices)}\n"
-            result_text += f"可用设备: {available_count}\n"
-            result_text += f"使用中设备: {in_use_count}\n"
+            result_text += f"总设备数: {stats['total']}\n"
+            result_text += f"可用设备: {stats['available']}\n"
+            result_text += f"使用中设备: {stats['in_use']}\n"
         
         result_text += f"\n✨ 此结果来自真实Windows设备数据 (CSV文件)"
         
@@ -738,6 +1140,8 @@ async def _handle_query_devices_by_architecture(arguments: dict[str, Any], ctx)
         
     except Exception as e:
         logger.error(f"按架构查询设备失败: {e}")
+        mark_request_failed()
+        mark_uncacheable()
         return [types.TextContent(
             type="text", 
             text=f"按架构查询设备失败: {str(e)}\n请检查Windows设备数据文件是否存在"
@@ -747,20 +1151,21 @@ async def _handle_query_devices_by_architecture(arguments: dict[str, Any], ctx)
 async def _handle_get_device_records(arguments: dict[str, Any], ctx) -> list[types.ContentBlock]:
     """处理获取设备记录"""
     record_type = arguments.get("record_type", "all")
+    asset_number = arguments.get("asset_number")
+    borrower = arguments.get("borrower")
+    limit = arguments.get("limit")
     
-    await ctx.session.send_log_message(
+    await send_log(
+        ctx,
         level="info",
         data=f"正在获取设备记录 (类型: {record_type})...",
         logger="device_records",
-        related_request_id=ctx.request_id,
     )
     
     try:
-        records = read_records()
-        
-        # 过滤记录类型
-        if record_type != "all":
-            records = [r for r in records if r.get('状态') == record_type]
+        # 通过记录存储的索引过滤，只读取需要的记录
+        status = record_type if record_type != "all" else None
+        records = await run_io(query_records, asset_number, borrower, status, limit)
         
         result_text = f"设备借用/归还记录 (类型: {record_type}):\n\n"
         
@@ -803,6 +1208,8 @@ async def _handle_get_device_records(arguments: dict[str, Any], ctx) -> list[typ
         
     except Exception as e:
         logger.error(f"获取设备记录失败: {e}")
+        mark_request_failed()
+        mark_uncacheable()
         return [types.TextContent(
             type="text", 
             text=f"获取设备记录失败: {str(e)}\n请检查设备记录文件是否存在"
@@ -817,15 +1224,15 @@ async def _handle_find_device_by_asset(arguments: dict[str, Any], ctx) -> list[t
     if not asset_number:
         return [types.TextContent(type="text", text="缺少必需参数: asset_number")]
     
-    await ctx.session.send_log_message(
+    await send_log(
+        ctx,
         level="info",
         data=f"正在查找资产编号 {asset_number} 的设备...",
         logger="asset_finder",
-        related_request_id=ctx.request_id,
     )
     
     try:
-        device_info, device_type = find_device_by_asset_number(asset_number)
+        device_info, device_type = await run_io(find_device_by_asset_number, asset_number)
         
         if not device_info:
             result_text = f"❌ 未找到资产编号为 '{asset_number}' 的设备\n\n"
@@ -857,6 +1264,8 @@ async def _handle_find_device_by_asset(arguments: dict[str, Any], ctx) -> list[t
         
     except Exception as e:
         logger.error(f"查找设备失败: {e}")
+        mark_request_failed()
+        mark_uncacheable()
         return [types.TextContent(
             type="text", 
             text=f"查找设备失败: {str(e)}\n请检查资产编号格式或联系管理员"
@@ -872,59 +1281,61 @@ async def _handle_borrow_device(arguments: dict[str, Any], ctx) -> list[types.Co
     if not asset_number or not borrower:
         return [types.TextContent(type="text", text="缺少必需参数: asset_number 或 borrower")]
     
-    # 首先记录到Azure DevOps deliverable
-    await ctx.session.send_log_message(
-        level="info",
-        data=f"正在记录设备借用到Azure DevOps: 资产编号 {asset_number}...",
-        logger="azure_devops_record",
-        related_request_id=ctx.request_id,
-    )
+    # 首先记录到Azure DevOps deliverable（--no-devops 时跳过）
+    if devops_enabled():
+        await send_log(
+            ctx,
+            level="info",
+            data=f"正在将设备借用记录写入Azure DevOps发件箱: 资产编号 {asset_number}...",
+            logger="azure_devops_record",
+        )
     
-    try:
-        # 记录到Azure DevOps deliverable
-        comment_text = f"borrow {asset_number}"
-        devops_success, user_email = record_in_deliverable(comment_text)
+        try:
+            # 写入Azure DevOps发件箱（后台线程批量发送到deliverable）
+            comment_text = f"borrow {asset_number}"
+            devops_success, user_email = await _queue_devops(comment_text)
         
-        if not devops_success:
-            return [types.TextContent(
-                type="text", 
-                text=f"❌ Azure DevOps记录失败，无法继续借用操作\n资产编号: {asset_number}\n请检查Azure连接或联系管理员"
-            )]
+            if not devops_success:
+                return [types.TextContent(
+                    type="text", 
+                    text=f"❌ Azure DevOps发件箱写入失败，无法继续借用操作\n资产编号: {asset_number}\n请检查Devices目录是否可写或联系管理员"
+                )]
         
-        # 如果获取到用户邮箱，使用邮箱作为借用者
-        if user_email:
-            borrower = user_email
-            await ctx.session.send_log_message(
+            # 如果获取到用户邮箱，使用邮箱作为借用者
+            if user_email:
+                borrower = user_email
+                await send_log(
+                    ctx,
+                    level="info",
+                    data=f"使用Azure用户邮箱作为借用者: {borrower}",
+                    logger="azure_devops_record",
+                )
+        
+            await send_log(
+                ctx,
                 level="info",
-                data=f"使用Azure用户邮箱作为借用者: {borrower}",
+                data=f"Azure DevOps记录已入队，继续执行设备借用操作...",
                 logger="azure_devops_record",
-                related_request_id=ctx.request_id,
             )
         
-        await ctx.session.send_log_message(
-            level="info",
-            data=f"Azure DevOps记录成功，继续执行设备借用操作...",
-            logger="azure_devops_record",
-            related_request_id=ctx.request_id,
-        )
-        
-    except Exception as e:
-        logger.error(f"Azure DevOps记录失败: {e}")
-        return [types.TextContent(
-            type="text", 
-            text=f"❌ Azure DevOps记录异常，无法继续借用操作\n错误: {str(e)}\n资产编号: {asset_number}"
-        )]
+        except Exception as e:
+            logger.error(f"Azure DevOps记录失败: {e}")
+            mark_request_failed()
+            return [types.TextContent(
+                type="text", 
+                text=f"❌ Azure DevOps记录异常，无法继续借用操作\n错误: {str(e)}\n资产编号: {asset_number}"
+            )]
 
-    await ctx.session.send_log_message(
+    await send_log(
+        ctx,
         level="info",
         data=f"正在执行设备借用操作: 资产编号 {asset_number}, 借用者 {borrower}...",
         logger="device_borrow",
-        related_request_id=ctx.request_id,
     )
     
     try:
         # 执行借用操作
-        success = borrow_device(asset_number, borrower, reason)
+        success = await run_io(borrow_device, asset_number, borrower, reason)
         
         if success:
             result_text = f"🎉 设备借用成功！\n\n"
@@ -938,11 +1349,11 @@ async def _handle_borrow_device(arguments: dict[str, Any], ctx) -> list[types.Co
             result_text += f"\n✨ 完整借用流程已完成 (记录+状态更新)"
             
             # 发送成功通知
-            await ctx.session.send_log_message(
+            await send_log(
+                ctx,
                 level="info",
                 data=f"✅ 设备借用成功: {asset_number} -> {borrower}",
                 logger="device_borrow",
-                related_request_id=ctx.request_id,
             )
         else:
             result_text = f"❌ 设备借用失败\n\n"
@@ -960,6 +1371,7 @@ async def _handle_borrow_device(arguments: dict[str, Any], ctx) -> list[types.Co
         
     except Exception as e:
         logger.error(f"设备借用失败: {e}")
+        mark_request_failed()
         return [types.TextContent(
             type="text", 
             text=f"设备借用操作失败: {str(e)}\n请检查参数或联系管理员"
@@ -975,59 +1387,61 @@ async def _handle_return_device(arguments: dict[str, Any], ctx) -> list[types.Co
     if not asset_number or not borrower:
         return [types.TextContent(type="text", text="缺少必需参数: asset_number 或 borrower")]
     
-    # 首先记录到Azure DevOps deliverable
-    await ctx.session.send_log_message(
-        level="info",
-        data=f"正在记录设备归还到Azure DevOps: 资产编号 {asset_number}...",
-        logger="azure_devops_record",
-        related_request_id=ctx.request_id,
-    )
+    # 首先记录到Azure DevOps deliverable（--no-devops 时跳过）
+    if devops_enabled():
+        await send_log(
+            ctx,
+            level="info",
+            data=f"正在将设备归还记录写入Azure DevOps发件箱: 资产编号 {asset_number}...",
+            logger="azure_devops_record",
+        )
     
-    try:
-        # 记录到Azure DevOps deliverable
-        comment_text = f"return {asset_number}"
-        devops_success, user_email = record_in_deliverable(comment_text)
+        try:
+            # 写入Azure DevOps发件箱（后台线程批量发送到deliverable）
+            comment_text = f"return {asset_number}"
+            devops_success, user_email = await _queue_devops(comment_text)
         
-        if not devops_success:
-            return [types.TextContent(
-                type="text", 
-                text=f"❌ Azure DevOps记录失败，无法继续归还操作\n资产编号: {asset_number}\n请检查Azure连接或联系管理员"
-            )]
+            if not devops_success:
+                return [types.TextContent(
+                    type="text", 
+                    text=f"❌ Azure DevOps发件箱写入失败，无法继续归还操作\n资产编号: {asset_number}\n请检查Devices目录是否可写或联系管理员"
+                )]
         
-        # 如果获取到用户邮箱，使用邮箱作为归还者
-        if user_email:
-            borrower = user_email
-            await ctx.session.send_log_message(
+            # 如果获取到用户邮箱，使用邮箱作为归还者
+            if user_email:
+                borrower = user_email
+                await send_log(
+                    ctx,
+                    level="info",
+                    data=f"使用Azure用户邮箱作为归还者: {borrower}",
+                    logger="azure_devops_record",
+                )
+        
+            await send_log(
+                ctx,
                 level="info",
-                data=f"使用Azure用户邮箱作为归还者: {borrower}",
+                data=f"Azure DevOps记录已入队，继续执行设备归还操作...",
                 logger="azure_devops_record",
-                related_request_id=ctx.request_id,
             )
         
-        await ctx.session.send_log_message(
-            level="info",
-            data=f"Azure DevOps记录成功，继续执行设备归还操作...",
-            logger="azure_devops_record",
-            related_request_id=ctx.request_id,
-        )
-        
-    except Exception as e:
-        logger.error(f"Azure DevOps记录失败: {e}")
-        return [types.TextContent(
-            type="text", 
-            text=f"❌ Azure DevOps记录异常，无法继续归还操作\n错误: {str(e)}\n资产编号: {asset_number}"
-        )]
+        except Exception as e:
+            logger.error(f"Azure DevOps记录失败: {e}")
+            mark_request_failed()
+            return [types.TextContent(
+                type="text", 
+                text=f"❌ Azure DevOps记录异常，无法继续归还操作\n错误: {str(e)}\n资产编号: {asset_number}"
+            )]
 
-    await ctx.session.send_log_message(
+    await send_log(
+        ctx,
         level="info",
         data=f"正在执行设备归还操作: 资产编号 {asset_number}, 归还者 {borrower}...",
         logger="device_return",
-        related_request_id=ctx.request_id,
     )
     
     try:
         # 执行归还操作
-        success = return_device(asset_number, borrower, reason)
+        success = await run_io(return_device, asset_number, borrower, reason)
         
         if success:
             result_text = f"🎉 设备归还成功！\n\n"
@@ -1042,11 +1456,11 @@ async def _handle_return_device(arguments: dict[str, Any], ctx) -> list[types.Co
             result_text += f"\n✨ 完整归还流程已完成 (记录+状态更新)"
             
             # 发送成功通知
-            await ctx.session.send_log_message(
+            await send_log(
+                ctx,
                 level="info",
                 data=f"✅ 设备归还成功: {asset_number} <- {borrower}",
                 logger="device_return",
-                related_request_id=ctx.request_id,
             )
         else:
             result_text = f"❌ 设备归还失败\n\n"
@@ -1064,6 +1478,7 @@ async def _handle_return_device(arguments: dict[str, Any], ctx) -> list[types.Co
         
     except Exception as e:
         logger.error(f"设备归还失败: {e}")
+        mark_request_failed()
         return [types.TextContent(
             type="text", 
             text=f"设备归还操作失败: {str(e)}\n请检查参数或联系管理员"
@@ -1071,6 +1486,117 @@ async def _handle_return_device(arguments: dict[str, Any], ctx) -> list[types.Co
 
 
 
+async def _handle_borrow_devices(arguments: dict[str, Any], ctx):
+    """处理批量借用设备"""
+    return await _handle_bulk_transaction("借用", arguments, ctx)
+
+
+async def _handle_return_devices(arguments: dict[str, Any], ctx):
+    """处理批量归还设备"""
+    return await _handle_bulk_transaction("归还", arguments, ctx)
+
+
+async def _handle_bulk_transaction(operation: str, arguments: dict[str, Any], ctx):
+    """
+    批量借用/归还（完整流程）
+
+    先预检查剔除不存在或状态不符的设备，剩余设备只写一条合并的DevOps评论，
+    再在一个批次中完成记录追加和状态更新；返回每台设备的结果
+    """
+    asset_numbers = arguments.get("asset_numbers") or []
+    borrower = arguments.get("borrower")
+    reason = arguments.get("reason", "")
+    person = "借用者" if operation == "借用" else "归还者"
+    devops_action = "borrow" if operation == "借用" else "return"
+    log_name = "device_borrow" if operation == "借用" else "device_return"
+
+    if not isinstance(asset_numbers, list) or not asset_numbers or not borrower:
+        return [types.TextContent(type="text", text="缺少必需参数: asset_numbers 或 borrower")]
+    asset_numbers = list(dict.fromkeys(str(asset).strip() for asset in asset_numbers if str(asset).strip()))
+    if len(asset_numbers) > MAX_BULK_ASSETS:
+        return [types.TextContent(type="text", text=f"一次最多{operation} {MAX_BULK_ASSETS} 台设备")]
+
+    # 预检查：不存在或状态不符的设备不写入DevOps评论
+    errors = await run_io(check_devices, operation, asset_numbers)
+    candidates = [asset for asset in asset_numbers if asset not in errors]
+
+    results = {}
+    if candidates:
+        if devops_enabled():
+            await send_log(
+                ctx,
+                level="info",
+                data=f"正在将 {len(candidates)} 台设备的{operation}记录写入Azure DevOps发件箱...",
+                logger="azure_devops_record",
+            )
+            try:
+                # 所有设备合并成一条评论
+                devops_success, user_email = await _queue_devops(f"{devops_action} {' '.join(candidates)}")
+            except Exception as e:
+                logger.error(f"Azure DevOps记录失败: {e}")
+                mark_request_failed()
+                devops_success, user_email = False, None
+            if not devops_success:
+                return [types.TextContent(
+                    type="text",
+                    text=f"❌ Azure DevOps发件箱写入失败，无法继续批量{operation}操作\n"
+                         f"资产编号: {', '.join(candidates)}\n请检查Devices目录是否可写或联系管理员"
+                )]
+            if user_email:
+                borrower = user_email
+
+        await send_log(
+            ctx,
+            level="info",
+            data=f"正在批量{operation} {len(candidates)} 台设备, {person} {borrower}...",
+            logger=log_name,
+        )
+        bulk = borrow_devices if operation == "借用" else return_devices
+        for result in await run_io(bulk, candidates, borrower, reason):
+            results[result["资产编号"]] = result
+
+    items = []
+    for asset in asset_numbers:
+        result = results.get(asset) or {"资产编号": asset, "success": False, "error": errors.get(asset, "")}
+        items.append({
+            "asset_number": asset,
+            "success": result["success"],
+            "device": result["record"]["设备"] if result["success"] else "",
+            "error": "" if result["success"] else result["error"],
+        })
+    succeeded = [item for item in items if item["success"]]
+
+    await send_log(
+        ctx,
+        level="info",
+        data=f"批量{operation}完成: 成功 {len(succeeded)} 台, 失败 {len(items) - len(succeeded)} 台",
+        logger=log_name,
+    )
+    logger.info(f"[Bulk {devops_action}] 成功 {len(succeeded)}/{len(items)}")
+
+    result_text = f"{'🎉' if len(succeeded) == len(items) else '⚠️'} 批量{operation}: "
+    result_text += f"成功 {len(succeeded)} 台, 失败 {len(items) - len(succeeded)} 台\n\n"
+    result_text += f"👤 {person}: {borrower}\n"
+    if reason:
+        result_text += f"💬 {operation}原因: {reason}\n"
+    result_text += f"📅 {operation}时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+    for item in items:
+        if item["success"]:
+            result_text += f"✅ {item['asset_number']} {item['device']}\n"
+        else:
+            result_text += f"❌ {item['asset_number']}: {item['error']}\n"
+    if len(succeeded) < len(items):
+        result_text += f"\n💡 建议使用 find_device_by_asset 工具检查失败设备的状态"
+    structured = {
+        "operation": devops_action,
+        "borrower": borrower,
+        "succeeded": len(succeeded),
+        "failed": len(items) - len(succeeded),
+        "results": items,
+    }
+    return [types.TextContent(type="text", text=result_text)], structured
+
+
 async def _handle_device_info_query_prompt(arguments: dict[str, str]) -> types.GetPromptResult:
     """处理设备信息查询指导提示"""
     device_type = arguments.get("device_type", "通用")
@@ -0,0 +1,84 @@
+"""
+日志工具
+
+所有处理器都挂在 QueueListener 的后台线程上，业务代码里的日志调用只把记录放进队列，
+不会在请求处理过程中同步写 stdout/stderr
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+DEFAULT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+DEMO_FORMAT = "%(message)s"
+
+# 设备模块的日志器（src.device.*）；作为库导入时默认只输出警告和错误
+DEVICE_LOGGER = "src.device"
+
+_listener = None
+_queue_handler = None
+
+
+def setup_queue_logging(level=logging.INFO, fmt=DEFAULT_FORMAT, stream=None):
+    """
+    为根日志器配置非阻塞的 QueueHandler/QueueListener 管道（可重复调用，后一次覆盖前一次）
+
+    Args:
+        level (int): 根日志器级别
+        fmt (str): 输出格式
+        stream: 输出流，默认 stderr
+
+    Returns:
+        logging.handlers.QueueListener: 已启动的监听器（进程退出时自动停止并刷新）
+    """
+    global _listener, _queue_handler
+    root = logging.getLogger()
+
+    if _listener is not None:
+        _listener.stop()
+        root.removeHandler(_queue_handler)
+
+    # 移除 basicConfig 等之前安装的同步处理器，避免重复输出
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    log_queue = queue.SimpleQueue()
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(logging.Formatter(fmt))
+
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    _listener.start()
+    return _listener
+
+
+def set_device_log_level(level):
+    """
+    设置设备模块（src.device.*）的日志级别
+    """
+    logging.getLogger(DEVICE_LOGGER).setLevel(level)
+
+
+def enable_console_logging(level=logging.INFO):
+    """
+    __main__ 演示使用：把设备模块的详细日志输出到 stdout
+    """
+    setup_queue_logging(level, fmt=DEMO_FORMAT, stream=sys.stdout)
+    set_device_log_level(level)
+
+
+def stop_queue_logging():
+    """
+    停止监听器并输出队列中剩余的日志
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_queue_logging)
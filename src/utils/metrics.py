@@ -0,0 +1,162 @@
+"""
+进程内指标（Prometheus 文本格式）
+
+计数器和直方图保存在进程内的 MetricsRegistry 中，设备模块和MCP服务器都可以记录，
+服务器的 /metrics 路由调用 render() 输出；
+队列长度、会话数之类的当前值由注册的采集函数在输出时读取
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# 延迟直方图的桶上限（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 阶段耗时直方图：CSV解析、DevOps调用、事件存储等
+STAGE_METRIC = "mcp_stage_duration_seconds"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """累积直方图：每个桶的计数、总和与总数"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    进程内指标注册表（线程安全：CSV解析等在线程池中执行时也会记录）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 指标名 -> (类型, 说明)
+        self._meta = {}
+        # (指标名, 标签) -> 值
+        self._counters = {}
+        # (指标名, 标签) -> Histogram
+        self._histograms = {}
+        # 输出时调用的采集函数，返回 [(指标名, 类型, 说明, 标签dict, 值), ...]
+        self._collectors = []
+
+    def describe(self, name, metric_type, help_text):
+        """登记指标的类型和说明（未记录任何值时也会输出说明）"""
+        with self._lock:
+            self._meta[name] = (metric_type, help_text)
+
+    def inc(self, name, value=1, **labels):
+        """计数器加上 value"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """记录一次直方图观测值"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """记录代码块的耗时（秒）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def register_collector(self, collector):
+        """注册输出时调用的采集函数"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        """按 Prometheus 文本格式（0.0.4）输出所有指标"""
+        with self._lock:
+            meta = dict(self._meta)
+            counters = dict(self._counters)
+            histograms = {
+                key: (histogram.buckets, list(histogram.counts), histogram.sum, histogram.count)
+                for key, histogram in self._histograms.items()
+            }
+            collectors = list(self._collectors)
+
+        # 指标名 -> [输出行]
+        samples = {}
+        for (name, labels), value in sorted(counters.items()):
+            samples.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                bucket_labels = labels + (("le", _format_value(float(bound))),)
+                lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for collector in collectors:
+            for name, metric_type, help_text, labels, value in collector():
+                meta.setdefault(name, (metric_type, help_text))
+                samples.setdefault(name, []).append(
+                    f"{name}{_format_labels(tuple(sorted(labels.items())))} {_format_value(value)}"
+                )
+
+        output = []
+        for name in sorted(meta.keys() | samples.keys()):
+            metric_type, help_text = meta.get(name, ("untyped", ""))
+            output.append(f"# HELP {name} {help_text}")
+            output.append(f"# TYPE {name} {metric_type}")
+            output.extend(samples.get(name, ()))
+        return "\n".join(output) + "\n"
+
+
+_registry = MetricsRegistry()
+_registry.describe(STAGE_METRIC, "histogram", "各处理阶段的耗时（CSV解析、DevOps调用、事件存储）")
+
+
+def get_metrics():
+    """获取进程内共享的指标注册表"""
+    return _registry
+
+
+def observe_stage(stage):
+    """
+    记录一个处理阶段的耗时（with 语句）
+
+    Args:
+        stage (str): 阶段名，例如 csv_parse / devops_queue / event_store_append
+    """
+    return _registry.timer(STAGE_METRIC, stage=stage)
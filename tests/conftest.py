@@ -0,0 +1,26 @@
+"""
+测试共用的设备数据目录
+"""
+
+import csv
+
+import pytest
+
+IOS_FIELDNAMES = ['创建日期', '设备名称', '设备OS', '设备序列号', '借用者', '所属manager',
+                  '资产编号', '是否盘点', '设备状态', '列1']
+ASSETS = [str(18000000 + i) for i in range(5)]
+
+
+def write_ios_devices(devices_dir, assets=ASSETS):
+    """写入只有 iOS 设备表的数据目录，所有设备为可用"""
+    with open(devices_dir / 'ios_devices.csv', 'w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=IOS_FIELDNAMES)
+        writer.writeheader()
+        for i, asset_number in enumerate(assets):
+            writer.writerow({'设备名称': f'iPhone #{i}', '资产编号': asset_number, '设备状态': '可用'})
+
+
+@pytest.fixture
+def devices_dir(tmp_path):
+    write_ios_devices(tmp_path)
+    return tmp_path
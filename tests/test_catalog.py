@@ -0,0 +1,80 @@
+"""
+DeviceCatalog：缺失的设备表在每次查询时不重复警告；资产编号索引随表重新加载和状态写入更新
+"""
+
+import logging
+import os
+
+from src.device.catalog import DeviceCatalog
+from src.device.state_store import DeviceStateStore
+
+from .conftest import ASSETS, write_ios_devices
+
+
+def skip_warnings(caplog):
+    return [record.getMessage() for record in caplog.records
+            if record.levelno == logging.WARNING and record.getMessage().startswith("跳过")]
+
+
+def test_missing_table_is_warned_once_per_file_state(devices_dir, caplog):
+    catalog = DeviceCatalog(devices_dir)
+    with caplog.at_level(logging.DEBUG, logger="src.device.catalog"):
+        for _ in range(3):
+            device, device_type = catalog.find_asset(ASSETS[0])
+            assert device_type == 'ios'
+        assert len(skip_warnings(caplog)) == 3  # android、windows、other 各一次
+
+        caplog.clear()
+        android_csv = devices_dir / "android_devices.csv"
+        (devices_dir / "ios_devices.csv").rename(android_csv)
+        catalog.find_asset(ASSETS[0])
+        # ios 表消失是新的错误，再次警告
+        assert [message for message in skip_warnings(caplog) if "ios" in message] != []
+
+        caplog.clear()
+        android_csv.unlink()
+        write_ios_devices(devices_dir, ASSETS)
+        catalog.find_asset(ASSETS[0])
+        assert [message for message in skip_warnings(caplog) if "ios" in message] == []
+        assert any("android" in message for message in skip_warnings(caplog))
+
+
+def move_to_android(devices_dir, assets):
+    """把只含 assets 的设备表写成 android_devices.csv"""
+    subdir = devices_dir / 'android'
+    subdir.mkdir(exist_ok=True)
+    write_ios_devices(subdir, assets)
+    os.replace(subdir / 'ios_devices.csv', devices_dir / 'android_devices.csv')
+
+
+def test_asset_index_follows_reloaded_tables(devices_dir):
+    catalog = DeviceCatalog(devices_dir)
+    assert catalog.find_asset(ASSETS[0])[1] == 'ios'
+
+    # 资产从 iOS 表移到 Android 表
+    write_ios_devices(devices_dir, ASSETS[1:])
+    assert catalog.find_asset(ASSETS[0]) == (None, None)
+    move_to_android(devices_dir, ASSETS[:1])
+    device, device_type = catalog.find_asset(f' {ASSETS[0]} ')
+    assert (device['资产编号'], device_type) == (ASSETS[0], 'android')
+
+    # 同一资产出现在多张表时以设备类型顺序中靠前的表为准，删除该表后回退到其他表
+    write_ios_devices(devices_dir, ASSETS)
+    assert catalog.find_asset(ASSETS[0])[1] == 'android'
+    (devices_dir / 'android_devices.csv').unlink()
+    assert catalog.find_asset(ASSETS[0])[1] == 'ios'
+    assert catalog.find_asset(ASSETS[4])[0]['设备名称'] == 'iPhone #4'
+
+
+def test_asset_index_sees_status_writes(devices_dir):
+    catalog = DeviceCatalog(devices_dir, state_store=DeviceStateStore(devices_dir))
+    catalog.set_state('ios', ASSETS[2], '正在使用', 'alice')
+    device, _ = catalog.find_asset(ASSETS[2])
+    assert (device['设备状态'], device['借用者']) == ('正在使用', 'alice')
+
+    # 写回CSV后重新加载的表仍然通过索引找到同一行
+    catalog.compact_states()
+    other = DeviceCatalog(devices_dir)
+    for reader in (catalog, other):
+        device, device_type = reader.find_asset(ASSETS[2])
+        assert (device['设备状态'], device['借用者'], device_type) == ('正在使用', 'alice', 'ios')
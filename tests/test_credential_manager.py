@@ -0,0 +1,74 @@
+"""
+Azure DevOps credential manager: az subprocess calls are made once and cached
+"""
+
+import json
+import subprocess
+import time
+
+from src.az_info.credential_manager import AzureCredentialManager
+
+
+class FakeAz:
+    """Records az invocations; get-access-token fails until az login has run"""
+
+    def __init__(self, email='alice@example.com'):
+        self.calls = []
+        self.logged_in = False
+        self.email = email
+
+    def __call__(self, args, **kwargs):
+        command = args[1]
+        self.calls.append(command)
+        if command == 'login':
+            self.logged_in = True
+        elif command == 'account' and args[2] == 'get-access-token':
+            if not self.logged_in:
+                raise subprocess.CalledProcessError(1, args)
+            stdout = json.dumps({'accessToken': 'token', 'expires_on': int(time.time()) + 3600})
+            return subprocess.CompletedProcess(args, 0, stdout=stdout)
+        elif command == 'account' and args[2] == 'show':
+            if self.email is None:
+                raise subprocess.CalledProcessError(1, args)
+            return subprocess.CompletedProcess(args, 0, stdout=self.email + '\n')
+        return subprocess.CompletedProcess(args, 0, stdout='')
+
+
+def test_login_reuses_resolved_az_command(monkeypatch):
+    az = FakeAz()
+    monkeypatch.setattr(subprocess, 'run', az)
+    manager = AzureCredentialManager(client_factory=lambda personal_access_token: object())
+    try:
+        assert manager.get_token() == 'token'
+    finally:
+        manager.close()
+    assert az.calls.count('--version') == 1
+    assert az.calls.count('login') == 1
+
+
+def test_missing_email_is_cached(monkeypatch):
+    az = FakeAz(email=None)
+    monkeypatch.setattr(subprocess, 'run', az)
+    manager = AzureCredentialManager()
+    manager._az_cmd = 'az'
+    assert manager.get_user_email() is None
+    assert manager.get_user_email() is None
+    assert az.calls.count('account') == 1
+
+    manager.invalidate()
+    az.email = 'alice@example.com'
+    assert manager.get_user_email() == 'alice@example.com'
+
+
+def test_email_lookup_before_login_is_not_kept(monkeypatch):
+    az = FakeAz(email=None)
+    monkeypatch.setattr(subprocess, 'run', az)
+    manager = AzureCredentialManager()
+    manager._az_cmd = 'az'
+    try:
+        assert manager.get_user_email() is None
+        az.email = 'alice@example.com'
+        assert manager.get_token() == 'token'
+        assert manager.get_user_email() == 'alice@example.com'
+    finally:
+        manager.close()
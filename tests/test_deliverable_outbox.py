@@ -0,0 +1,139 @@
+"""
+DevOps deliverable outbox shared by several server processes
+"""
+
+import json
+import time
+
+from src.az_info.deliverable_outbox import DeliverableOutbox
+
+
+class FakeClient:
+    def __init__(self):
+        self.comments = []
+
+    def add_comment_to_deliverable(self, deliverable_id, comment_text):
+        self.comments.append((deliverable_id, comment_text))
+        return True
+
+
+def make_outbox(path, client, **kwargs):
+    outbox = DeliverableOutbox(path, client_provider=lambda: client, **kwargs)
+    # No background worker: the tests drain explicitly
+    outbox._ensure_worker = lambda: None
+    return outbox
+
+
+def pending_comments(outbox):
+    return [entry["comment"] for entry in outbox._pending.values()]
+
+
+def test_processes_only_deliver_their_own_comments(tmp_path):
+    path = tmp_path / "devops_outbox.log"
+    client_a, client_b = FakeClient(), FakeClient()
+    a = make_outbox(path, client_a)
+    b = make_outbox(path, client_b)
+    assert a.enqueue("borrow 1", 42) != b.enqueue("borrow 2", 42)
+
+    # A process starting while b is alive leaves b's comment to b
+    assert make_outbox(path, FakeClient()).pending_count() == 0
+
+    assert a.drain_once()
+    assert client_a.comments == [(42, "borrow 1")]
+    # a compacted the file after delivering; b's comment survives it
+    assert pending_comments(b) == ["borrow 2"]
+    assert b.drain_once()
+    assert client_b.comments == [(42, "borrow 2")]
+    assert make_outbox(path, FakeClient())._read_state()[0] == {}
+
+
+def test_comments_of_an_exited_process_are_claimed_once(tmp_path):
+    path = tmp_path / "devops_outbox.log"
+    client_a, client_c = FakeClient(), FakeClient()
+    a = make_outbox(path, client_a, lease_seconds=0.05)
+    a.enqueue("borrow 1", 42)
+    time.sleep(0.1)  # a stops renewing its lease, as if it had exited
+
+    c = make_outbox(path, client_c)
+    assert pending_comments(c) == ["borrow 1"]
+    # a is still running after all: it must notice the claim and not deliver
+    assert a.drain_once()
+    assert c.drain_once()
+    assert client_a.comments == []
+    assert client_c.comments == [(42, "borrow 1")]
+
+
+def test_entries_without_owner_are_claimed(tmp_path):
+    path = tmp_path / "devops_outbox.log"
+    path.write_text(json.dumps({"id": 1, "deliverable_id": 42, "comment": "borrow 1", "ts": 0.0}) + "\n",
+                    encoding="utf-8")
+    client = FakeClient()
+    outbox = make_outbox(path, client)
+    assert outbox.drain_once()
+    assert client.comments == [(42, "borrow 1")]
+
+
+class FailingClient:
+    def add_comment_to_deliverable(self, deliverable_id, comment_text):
+        return False
+
+
+def test_failed_delivery_reports_failure_once(tmp_path):
+    failures = []
+    outbox = make_outbox(tmp_path / "devops_outbox.log", FailingClient(),
+                         on_failure=lambda: failures.append(1))
+    outbox.enqueue("borrow 1", 42)
+    outbox.enqueue("borrow 2", 43)
+    assert not outbox.drain_once()
+    assert failures == [1]
+    assert pending_comments(outbox) == ["borrow 1", "borrow 2"]
+
+
+class FakeCredentialManager:
+    def __init__(self, client=None):
+        self.lookups = 0
+        self.calls = []
+        self.client = client or FakeClient()
+
+    def get_user_email(self):
+        self.lookups += 1
+        self.calls.append("email")
+        return "alice@example.com"
+
+    def get_client(self):
+        self.calls.append("client")
+        return self.client
+
+    def invalidate(self):
+        self.calls.append("invalidate")
+
+
+def test_queue_resolves_email_before_returning(tmp_path, monkeypatch):
+    from src.az_info import record_in_deliverable
+
+    credentials = FakeCredentialManager()
+    outbox = make_outbox(tmp_path / "devops_outbox.log", None)
+    outbox.client_provider = record_in_deliverable._outbox_client
+    monkeypatch.setattr(record_in_deliverable, "get_credential_manager", lambda: credentials)
+    monkeypatch.setattr(record_in_deliverable, "_outbox", outbox)
+    # The first call already uses the email, so a borrow and its return record the same borrower
+    assert record_in_deliverable.queue_in_deliverable("borrow 1") == (True, "alice@example.com")
+    assert outbox.drain_once()
+    assert credentials.lookups == 1
+    assert record_in_deliverable.queue_in_deliverable("return 1") == (True, "alice@example.com")
+    # Log in (via the client) before looking up the email, so a failed pre-login lookup is not cached
+    assert credentials.calls[:2] == ["client", "email"]
+
+
+def test_failed_outbox_delivery_drops_cached_credentials(tmp_path, monkeypatch):
+    from src.az_info import record_in_deliverable
+
+    credentials = FakeCredentialManager(FailingClient())
+    monkeypatch.setattr(record_in_deliverable, "get_credential_manager", lambda: credentials)
+    monkeypatch.setattr(record_in_deliverable, "get_outbox_path", lambda: tmp_path / "devops_outbox.log")
+    monkeypatch.setattr(record_in_deliverable, "_outbox", None)
+    outbox = record_in_deliverable.get_deliverable_outbox()
+    outbox._ensure_worker = lambda: None
+    record_in_deliverable.queue_in_deliverable("borrow 1")
+    assert not outbox.drain_once()
+    assert credentials.calls[-1] == "invalidate"
@@ -0,0 +1,62 @@
+"""
+list_devices 的列表缓存：借用/归还后只重新序列化被修改的设备
+"""
+
+import pytest
+
+from src.device.catalog import DeviceCatalog
+from src.device.device_store import CsvDeviceStore
+from src.device.record_store import RecordStore
+from src.device.state_store import DeviceStateStore
+from src.mcp_server2.device_listing import DeviceListingCache
+
+from .conftest import ASSETS, write_ios_devices
+
+
+def make_store(devices_dir, overlay):
+    state_store = DeviceStateStore(devices_dir) if overlay else None
+    return CsvDeviceStore(catalog=DeviceCatalog(devices_dir, state_store=state_store),
+                          record_store=RecordStore(devices_dir))
+
+
+def assets(listing):
+    return [entry.device['资产编号'] for entry in listing.entries]
+
+
+@pytest.mark.parametrize('overlay', [False, True])
+def test_status_change_reserializes_only_changed_row(devices_dir, overlay):
+    store = make_store(devices_dir, overlay)
+    cache = DeviceListingCache(lambda: store)
+    before = cache.get_listing('ios', 'all')
+    assert cache.get_listing('ios', 'all') is before
+    assert assets(cache.get_listing('ios', 'online')) == ASSETS
+
+    store.set_status('ios', ASSETS[1], '正在使用', 'alice')
+    after = cache.get_listing('ios', 'all')
+    assert [entry.device['设备状态'] for entry in after.entries] == ['可用', '正在使用', '可用', '可用', '可用']
+    unchanged = [i for i in range(len(ASSETS)) if i != 1]
+    if overlay:
+        # overlay 模式不重写CSV，其他设备的条目（及其JSON）被复用
+        assert all(after.entries[i] is before.entries[i] for i in unchanged)
+    assert '"正在使用"' in after.entries[1].json
+    assert assets(cache.get_listing('ios', 'online')) == [ASSETS[i] for i in unchanged]
+    assert assets(cache.get_listing('ios', 'offline')) == [ASSETS[1]]
+    assert cache.get_listing('ios', 'offline').stats['in_use'] == 1
+
+
+def test_other_process_write_is_seen(devices_dir):
+    store = make_store(devices_dir, overlay=True)
+    cache = DeviceListingCache(lambda: store)
+    assert len(cache.get_listing('ios', 'online').entries) == 5
+
+    make_store(devices_dir, overlay=True).set_status('ios', ASSETS[0], '正在使用', 'bob')
+    assert assets(cache.get_listing('ios', 'offline')) == [ASSETS[0]]
+
+
+def test_reloaded_table_is_rebuilt(devices_dir):
+    store = make_store(devices_dir, overlay=False)
+    cache = DeviceListingCache(lambda: store)
+    assert len(cache.get_listing('ios', 'all').entries) == 5
+
+    write_ios_devices(devices_dir, ASSETS[:2])
+    assert assets(cache.get_listing('ios', 'all')) == ASSETS[:2]
@@ -0,0 +1,111 @@
+"""
+内存事件存储：全局事件数/字节数上限下的淘汰、过期流的清理
+"""
+
+import json
+
+import anyio
+from mcp.types import JSONRPCMessage, JSONRPCNotification
+
+from src.mcp_server2.event_store import InMemoryEventStore, serialize_message
+
+
+def message(index):
+    return JSONRPCMessage(JSONRPCNotification(jsonrpc="2.0", method="notifications/message",
+                                              params={"level": "info", "data": f"事件 {index:03d}"}))
+
+
+async def store_messages(store, stream_id, start, count):
+    return [await store.store_event(stream_id, message(i)) for i in range(start, start + count)]
+
+
+async def replay(store, event_id):
+    replayed = []
+
+    async def collect(event):
+        replayed.append(json.loads(event.message.model_dump_json())["params"]["data"])
+
+    stream_id = await store.replay_events_after(event_id, collect)
+    return stream_id, replayed
+
+
+def stream_ids(store):
+    return [stream.stream_id for stream in store.streams.values()]
+
+
+def test_total_events_budget_evicts_least_recently_used_stream():
+    async def scenario():
+        store = InMemoryEventStore(max_total_events=10)
+        a = await store_messages(store, "a", 0, 4)
+        b = await store_messages(store, "b", 0, 4)
+        # 重放让 a 成为最近使用的流，超出上限时淘汰的是 b
+        assert (await replay(store, a[0]))[0] == "a"
+        c = await store_messages(store, "c", 0, 4)
+        return store, a, b, c
+
+    store, a, b, c = anyio.run(scenario)
+    assert store.stats() == {"streams": 2, "events": 8, "bytes": store.total_bytes,
+                             "evicted_streams": 1, "evicted_events": 0}
+    assert anyio.run(replay, store, b[0]) == (None, [])
+    assert anyio.run(replay, store, a[1]) == ("a", ["事件 002", "事件 003"])
+    assert anyio.run(replay, store, c[2]) == ("c", ["事件 003"])
+
+
+def test_single_stream_over_budget_drops_its_oldest_events():
+    store = InMemoryEventStore(max_total_events=5)
+    event_ids = anyio.run(store_messages, store, "a", 0, 8)
+    assert (store.total_events, store.evicted_events, store.evicted_streams) == (5, 3, 0)
+    # 被淘汰的事件之后无法续传，仍保留的事件可以
+    assert anyio.run(replay, store, event_ids[1]) == (None, [])
+    assert anyio.run(replay, store, event_ids[3]) == ("a", ["事件 004", "事件 005", "事件 006", "事件 007"])
+
+
+def test_total_bytes_budget():
+    size = len(serialize_message(message(0)))
+    store = InMemoryEventStore(max_total_bytes=size * 3)
+    anyio.run(store_messages, store, "a", 0, 2)
+    anyio.run(store_messages, store, "b", 0, 2)
+    assert stream_ids(store) == ["b"]
+    assert store.total_bytes == sum(stream.bytes for stream in store.streams.values()) == size * 2
+
+
+def test_recreated_stream_does_not_match_old_event_ids():
+    store = InMemoryEventStore(max_total_events=2)
+    old = anyio.run(store_messages, store, "a", 0, 2)
+    anyio.run(store_messages, store, "b", 0, 2)
+    anyio.run(store_messages, store, "a", 10, 2)
+    assert anyio.run(replay, store, old[0]) == (None, [])
+
+
+def test_sweep_removes_expired_streams():
+    store = InMemoryEventStore(ttl_seconds=60)
+    anyio.run(store_messages, store, "a", 0, 3)
+    anyio.run(store_messages, store, "b", 0, 3)
+    store.streams[store.current["a"]].last_used -= 120
+    assert store.sweep() == 1
+    assert stream_ids(store) == ["b"] and list(store.current) == ["b"]
+    assert (store.total_events, store.total_bytes) == (3, store.streams[store.current["b"]].bytes)
+    assert InMemoryEventStore(ttl_seconds=0).sweep() == 0
+
+
+def test_event_ids_cannot_be_guessed_from_other_streams():
+    store = InMemoryEventStore()
+    a = anyio.run(store_messages, store, "a", 0, 2)
+    b = anyio.run(store_messages, store, "b", 0, 2)
+    token_a, token_b = a[0].rsplit("-", 1)[0], b[0].rsplit("-", 1)[0]
+    assert token_a != token_b and len(token_a) == 16
+    # 按顺序编号的流ID不能用来重放其他会话的流
+    for guess in ("1-1", "2-1", "0-1"):
+        assert anyio.run(replay, store, guess) == (None, [])
+    assert anyio.run(replay, store, a[0]) == ("a", ["事件 001"])
+
+
+def test_streams_sharing_a_request_id_are_isolated():
+    async def scenario():
+        store = InMemoryEventStore()
+        # 两个会话的请求ID都是1：每个SSE流以 priming 事件开始
+        first = [await store.store_event(1, None)] + await store_messages(store, 1, 0, 2)
+        second = [await store.store_event(1, None)] + await store_messages(store, 1, 10, 2)
+        return await replay(store, first[0]), await replay(store, second[0])
+
+    assert anyio.run(scenario) == ((1, ["事件 000", "事件 001"]), (1, ["事件 010", "事件 011"]))
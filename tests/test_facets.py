@@ -0,0 +1,79 @@
+"""
+分面计数：增量更新（move/replace）后的汇总计数与从头统计的结果一致
+"""
+
+import itertools
+
+from src.device.catalog import DeviceCatalog
+from src.device.facets import FACET_DIMENSIONS, FacetIndex, facet_key
+from src.device.state_store import DeviceStateStore
+
+from .conftest import ASSETS
+
+ROWS = {
+    'windows': [
+        {'设备状态': '可用', '芯片架构': 'x64', '品牌': 'Dell', '所属manager': 'carol'},
+        {'设备状态': '正在使用', '芯片架构': 'ARM64', '品牌': 'Dell', '所属manager': 'carol'},
+        {'设备状态': '可用', '芯片架构': 'x64', '品牌': 'Lenovo', '所属manager': 'dave'},
+    ],
+    'android': [
+        {'设备状态': '可用', '品牌': 'Pixel', '所属manager': 'carol'},
+        {'设备状态': '维修中', '品牌': 'Pixel', '所属manager': ''},
+    ],
+}
+
+
+def assert_matches_recount(index, rows):
+    """每个汇总格子（任意维度组合）的计数都等于在设备行上直接统计的结果"""
+    keys = [facet_key(device_type, row) for device_type, table in rows.items() for row in table]
+    for key in set(keys):
+        for mask in itertools.product((True, False), repeat=len(FACET_DIMENSIONS)):
+            filters = {dimension: part for dimension, part, keep
+                       in zip(FACET_DIMENSIONS[1:], key[1:], mask[1:]) if keep}
+            device_type = key[0] if mask[0] else None
+            expected = sum(
+                1 for other in keys
+                if (device_type is None or other[0] == device_type)
+                and all(other[FACET_DIMENSIONS.index(dimension)] == value
+                        for dimension, value in filters.items())
+            )
+            assert index.count(device_type, **filters) == expected, (device_type, filters)
+
+
+def test_rollups_follow_move_and_replace():
+    rows = {device_type: [dict(row) for row in table] for device_type, table in ROWS.items()}
+    index = FacetIndex()
+    for device_type, table in rows.items():
+        index.replace(device_type, table)
+    assert_matches_recount(index, rows)
+
+    # 单台设备状态变化
+    old_key = facet_key('windows', rows['windows'][0])
+    rows['windows'][0]['设备状态'] = '正在使用'
+    index.move('windows', old_key, facet_key('windows', rows['windows'][0]))
+    assert_matches_recount(index, rows)
+    assert index.stats('windows', brand='dell') == {'total': 2, 'available': 0, 'in_use': 2, 'other': 0}
+
+    # 重新加载：旧组合全部减去，只剩新表的计数
+    rows['android'] = [{'设备状态': '可用', '品牌': 'Galaxy', '所属manager': 'erin'}]
+    index.replace('android', rows['android'])
+    assert_matches_recount(index, rows)
+    assert index.values('brand') == ['Dell', 'Galaxy', 'Lenovo']
+    assert index.count(brand='Pixel') == 0
+
+    del rows['android']
+    index.remove('android')
+    assert_matches_recount(index, rows)
+    assert index.values('manager', 'android') == []
+
+
+def test_catalog_counts_follow_state_changes(devices_dir):
+    catalog = DeviceCatalog(devices_dir, state_store=DeviceStateStore(devices_dir))
+    catalog.get_table('ios')
+    catalog.set_state('ios', ASSETS[0], '正在使用', 'alice')
+    catalog.set_states([('ios', ASSETS[1], '正在使用', 'bob'), ('ios', ASSETS[0], '可用', '')])
+    assert catalog.facets.stats('ios') == {'total': len(ASSETS), 'available': len(ASSETS) - 1,
+                                           'in_use': 1, 'other': 0}
+    # 写回CSV并重新加载后计数不变
+    catalog.compact_states()
+    assert catalog.facets.value_counts('status', 'ios') == {'可用': len(ASSETS) - 1, '正在使用': 1}
@@ -0,0 +1,143 @@
+"""
+磁盘事件存储：跨段和跨重启的重放、过期流的清理、请求ID相同的流互相隔离
+"""
+
+import json
+import os
+import time
+
+import anyio
+from mcp.types import JSONRPCMessage, JSONRPCNotification
+
+from src.mcp_server2.file_event_store import FileEventStore
+
+
+def message(index):
+    return JSONRPCMessage(JSONRPCNotification(jsonrpc="2.0", method="notifications/message",
+                                              params={"level": "info", "data": f"事件 {index}"}))
+
+
+def make_store(directory, **kwargs):
+    # 每段最多4个事件，保留足够多的段，便于测试跨段重放
+    options = {"segment_events": 4, "max_segments": 16}
+    options.update(kwargs)
+    return FileEventStore(directory, **options)
+
+
+def stream_dir(directory, event_id):
+    return directory / event_id.rpartition("-")[0]
+
+
+async def store_messages(store, stream_id, start, count):
+    return [await store.store_event(stream_id, message(i)) for i in range(start, start + count)]
+
+
+async def replay(store, event_id):
+    replayed = []
+
+    async def collect(event):
+        replayed.append((event.event_id, json.loads(event.message.model_dump_json())["params"]["data"]))
+
+    stream_id = await store.replay_events_after(event_id, collect)
+    return stream_id, replayed
+
+
+def test_replay_across_segments(tmp_path):
+    async def scenario():
+        store = make_store(tmp_path)
+        event_ids = await store_messages(store, "stream-1", 0, 10)
+        stream_id, replayed = await replay(store, event_ids[2])
+        store.close()
+        return event_ids, stream_id, replayed
+
+    event_ids, stream_id, replayed = anyio.run(scenario)
+    assert stream_id == "stream-1"
+    assert replayed == [(event_ids[i], f"事件 {i}") for i in range(3, 10)]
+    assert len(list(stream_dir(tmp_path, event_ids[0]).glob("*.log"))) == 3
+
+
+def test_replay_after_restart(tmp_path):
+    async def before_restart():
+        store = make_store(tmp_path)
+        event_ids = await store_messages(store, 42, 0, 6)
+        store.close()
+        return event_ids
+
+    async def after_restart(event_ids):
+        store = make_store(tmp_path)
+        # 重启后同一个请求ID属于新会话的新请求，写入新的流目录
+        new_ids = await store_messages(store, 42, 6, 3)
+        stream_id, replayed = await replay(store, event_ids[1])
+        store.close()
+        return new_ids, stream_id, replayed
+
+    event_ids = anyio.run(before_restart)
+    new_ids, stream_id, replayed = anyio.run(after_restart, event_ids)
+    assert stream_id == 42
+    assert replayed == [(event_ids[i], f"事件 {i}") for i in range(2, 6)]
+    assert stream_dir(tmp_path, new_ids[0]) != stream_dir(tmp_path, event_ids[0])
+
+
+def test_reopened_stream_repairs_torn_frame(tmp_path):
+    # 只保留一个打开的流：写入其他流后 stream-1 被关闭，下次写入时重新打开
+    store = make_store(tmp_path, max_open_streams=1)
+    event_ids = anyio.run(store_messages, store, "stream-1", 0, 6)
+    anyio.run(store_messages, store, "stream-2", 0, 1)
+    last_log = sorted(stream_dir(tmp_path, event_ids[0]).glob("*.log"))[-1]
+    with open(last_log, "ab") as file:
+        file.write(b"\x07\x00\x00")  # 崩溃时写了一半的帧头
+
+    new_ids = anyio.run(store_messages, store, "stream-1", 6, 1)
+    stream_id, replayed = anyio.run(replay, store, event_ids[3])
+    store.close()
+    assert stream_dir(tmp_path, new_ids[0]) == stream_dir(tmp_path, event_ids[0])
+    assert replayed == [(event_ids[4], "事件 4"), (event_ids[5], "事件 5"), (new_ids[0], "事件 6")]
+
+
+def test_streams_sharing_a_request_id_are_isolated(tmp_path):
+    async def scenario():
+        store = make_store(tmp_path)
+        # 两个会话的请求ID都是1：每个SSE流以 priming 事件开始
+        first = [await store.store_event(1, None)] + await store_messages(store, 1, 0, 2)
+        second = [await store.store_event(1, None)] + await store_messages(store, 1, 10, 2)
+        results = (await replay(store, first[0]), await replay(store, second[0]))
+        store.close()
+        return first, second, results
+
+    first, second, (replayed_first, replayed_second) = anyio.run(scenario)
+    assert replayed_first == (1, [(first[1], "事件 0"), (first[2], "事件 1")])
+    assert replayed_second == (1, [(second[1], "事件 10"), (second[2], "事件 11")])
+    assert stream_dir(tmp_path, first[0]) != stream_dir(tmp_path, second[0])
+    # 事件ID不能由请求ID推算
+    assert not {event_id.rpartition("-")[0] for event_id in first + second} & {"1", "0000000000000001"}
+
+
+def test_unknown_event_id(tmp_path):
+    async def scenario():
+        store = make_store(tmp_path)
+        await store_messages(store, "stream-1", 0, 2)
+        result = (await replay(store, "0000000000000000-1"), await replay(store, "not-an-id"),
+                  await replay(store, "../../etc/pas-1"))
+        store.close()
+        return result
+
+    assert anyio.run(scenario) == ((None, []), (None, []), (None, []))
+
+
+def test_purge_expired_streams(tmp_path):
+    async def scenario():
+        store = make_store(tmp_path, retention_seconds=3600)
+        old = await store_messages(store, "old", 0, 2)
+        active = await store_messages(store, "active", 0, 2)
+        store.close()
+        return store, stream_dir(tmp_path, old[0]), stream_dir(tmp_path, active[0])
+
+    store, old_dir, active_dir = anyio.run(scenario)
+    expired = time.time() - 7200
+    for entry in old_dir.iterdir():
+        os.utime(entry, (expired, expired))
+
+    assert store.purge_expired() == 1
+    assert not old_dir.exists()
+    assert active_dir.exists()
+    assert not list(tmp_path.glob("*.deleting"))
@@ -0,0 +1,116 @@
+"""
+/metrics：Prometheus 文本格式的计数器、直方图和抓取时读取的服务器状态
+"""
+
+import anyio
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Route
+
+from src.mcp_server2 import metrics
+from src.utils.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics, "_metrics", registry)
+    return registry
+
+
+def scrape():
+    async def get():
+        app = Starlette(routes=[Route("/metrics", metrics.metrics_endpoint, methods=["GET"])])
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get("/metrics")
+
+    return anyio.run(get)
+
+
+def sample_lines(text):
+    return [line for line in text.splitlines() if not line.startswith("#")]
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    registry.describe("latency_seconds", "histogram", "耗时")
+    for value in (0.0005, 0.003, 0.003, 42.0):
+        registry.observe("latency_seconds", value, tool="borrow_device")
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP latency_seconds 耗时", "# TYPE latency_seconds histogram"]
+    assert 'latency_seconds_bucket{tool="borrow_device",le="0.001"} 1' in lines
+    assert 'latency_seconds_bucket{tool="borrow_device",le="0.0025"} 1' in lines
+    assert 'latency_seconds_bucket{tool="borrow_device",le="0.005"} 3' in lines
+    assert 'latency_seconds_bucket{tool="borrow_device",le="30"} 3' in lines
+    assert 'latency_seconds_bucket{tool="borrow_device",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{tool="borrow_device"} 4' in lines
+    assert 'latency_seconds_sum{tool="borrow_device"} 42.0065' in lines
+
+
+def test_described_metrics_and_label_escaping(registry):
+    registry.describe("idle_total", "counter", "没有记录过的计数器")
+    registry.inc("calls_total", tool='say "hi"\n')
+    text = registry.render()
+    assert "# TYPE idle_total counter" in text
+    assert "# TYPE calls_total untyped" in text
+    assert sample_lines(text) == ['calls_total{tool="say \\"hi\\"\\n"} 1']
+
+
+def test_tracked_requests_and_errors(registry):
+    with metrics.track_request("tool", "borrow_device"):
+        pass
+    with metrics.track_request("tool", "borrow_device"):
+        metrics.mark_request_failed()
+    with pytest.raises(RuntimeError):
+        with metrics.track_request("tool", "return_device"):
+            raise RuntimeError("boom")
+    with metrics.track_request("tool", "no_such_tool"):
+        metrics.mark_unknown_request()
+
+    lines = sample_lines(registry.render())
+    assert 'mcp_tool_requests_total{tool="borrow_device"} 2' in lines
+    assert 'mcp_tool_errors_total{tool="borrow_device"} 1' in lines
+    assert 'mcp_tool_errors_total{tool="return_device"} 1' in lines
+    assert 'mcp_tool_requests_total{tool="unknown"} 1' in lines
+    assert not any("no_such_tool" in line for line in lines)
+    assert 'mcp_tool_duration_seconds_count{tool="borrow_device"} 2' in lines
+
+
+class Stats:
+    def __init__(self, **stats):
+        self.__dict__.update(stats)
+        self._stats = stats
+
+    def stats(self):
+        return self._stats
+
+
+def test_endpoint_reports_server_state(registry):
+    session_manager = Stats(_server_instances={"a": 1, "b": 2})
+    cache = Stats(entries=3, bytes=1024, hits=5, misses=2, evictions=0, invalidations=1)
+    pool = {"borrowed": 1, "waiting": 0}
+    executor = Stats(io=pool, process=pool, tools={"search_devices": {"borrowed": 2, "waiting": 4}})
+    lag = Stats(max_lag=0.25)
+    outbox = {"pending": 6, "deliveries": 2, "delivery_failures": 1, "delivery_seconds": 1.5}
+    # 磁盘事件存储没有 stats()
+    metrics.register_server_collectors(session_manager, object(), executor, cache, lag, lambda: outbox)
+    with metrics.track_request("prompt", "device_summary"):
+        pass
+
+    response = scrape()
+    assert response.status_code == 200
+    assert response.headers["content-type"] == metrics.CONTENT_TYPE
+    lines = sample_lines(response.text)
+    for expected in (
+        "mcp_active_sessions 2",
+        "mcp_event_loop_lag_max_seconds 0.25",
+        "mcp_response_cache_hits_total 5",
+        'mcp_executor_waiting{pool="io"} 0',
+        'mcp_tool_waiting{tool="search_devices"} 4',
+        "devops_outbox_pending 6",
+        "devops_delivery_seconds_total 1.5",
+        'mcp_prompt_requests_total{prompt="device_summary"} 1',
+    ):
+        assert expected in lines
+    assert not any(line.startswith("mcp_event_store_") for line in lines)
+    assert "# TYPE mcp_active_sessions gauge" in response.text
@@ -0,0 +1,84 @@
+"""
+设备名称模糊搜索：排序（完全相同 > 包含 > 相似）、规范化，以及候选截取不丢失完全匹配
+"""
+
+import random
+
+import pytest
+
+from src.device.catalog import DeviceCatalog
+from src.device.device_store import CsvDeviceStore
+from src.device.name_search import MIN_CANDIDATES, NameSearchIndex, _at_least, _bit_planes
+from src.device.record_store import RecordStore
+
+from .conftest import ASSETS
+
+
+def search(tables, text, limit=5, min_score=0.3):
+    index = NameSearchIndex()
+    for device_type, rows in tables.items():
+        index.replace(device_type, rows)
+    return [(device_type, tables[device_type][position]['设备名称'])
+            for _, device_type, position in index.search(text, list(tables), limit, min_score)]
+
+
+def test_exact_match_ranks_above_longer_names():
+    rows = [{'设备名称': name} for name in ('iPhone 12 Pro Max', 'iPhone 12 mini', 'iPhone 12', 'iPhone 13')]
+    assert search({'ios': rows}, 'iphone 12') == [
+        ('ios', 'iPhone 12'), ('ios', 'iPhone 12 mini'), ('ios', 'iPhone 12 Pro Max'), ('ios', 'iPhone 13'),
+    ]
+
+
+def test_full_width_and_chinese_text():
+    rows = [{'设备名称': '华为 Mate 60'}, {'设备名称': '小米 14'}, {'设备名称': 'Surface Pro'}]
+    assert search({'android': rows}, 'ＭＡＴＥ　６０')[0] == ('android', '华为 Mate 60')
+    assert search({'android': rows}, '华') == [('android', '华为 Mate 60')]
+
+
+def test_brand_matches_rank_below_name_matches():
+    rows = [{'设备名称': 'Galaxy S23', '品牌': 'Samsung'}, {'设备名称': 'Samsung Galaxy S22'}]
+    assert search({'android': rows}, 'samsung') == [('android', 'Samsung Galaxy S22'), ('android', 'Galaxy S23')]
+
+
+def test_ties_follow_device_type_and_file_order():
+    tables = {
+        'android': [{'设备名称': 'Test Phone'}],
+        'other': [{'设备名称': 'Test Phone'}, {'设备名称': 'Test Phone'}],
+    }
+    index = NameSearchIndex()
+    for device_type, rows in tables.items():
+        index.replace(device_type, rows)
+    assert [(device_type, position) for _, device_type, position in index.search('test phone', list(tables))] == [
+        ('android', 0), ('other', 0), ('other', 1),
+    ]
+
+
+def test_unrelated_names_are_filtered():
+    rows = [{'设备名称': 'Pixel 8'}, {'设备名称': 'ThinkPad X1'}]
+    assert search({'android': rows}, 'pixel') == [('android', 'Pixel 8')]
+    assert search({'android': rows}, 'zzz') == []
+
+
+def test_exact_match_survives_candidate_budget():
+    # 大量行包含查询的全部 n-gram，完全相同的行在文件末尾
+    rows = [{'设备名称': f'Surface Laptop {i}'} for i in range(MIN_CANDIDATES * 2)]
+    rows.append({'设备名称': 'Surface Laptop'})
+    assert search({'windows': rows}, 'surface laptop', limit=1) == [('windows', 'Surface Laptop')]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_bit_plane_threshold_matches_counting(seed):
+    rng = random.Random(seed)
+    bitsets = [rng.getrandbits(100) for _ in range(rng.randint(1, 9))]
+    planes = _bit_planes(bitsets)
+    for threshold in range(1, len(bitsets) + 2):
+        expected = sum(1 << row for row in range(100)
+                       if sum(bits >> row & 1 for bits in bitsets) >= threshold)
+        assert _at_least(planes, threshold) == expected
+
+
+def test_store_search_returns_rows_and_scores(devices_dir):
+    store = CsvDeviceStore(catalog=DeviceCatalog(devices_dir), record_store=RecordStore(devices_dir))
+    results = store.search_devices('iphone #3', device_type='ios', limit=2)
+    assert [(device_type, device['资产编号'], score) for device_type, device, score in results][0] == \
+        ('ios', ASSETS[3], 1.0)
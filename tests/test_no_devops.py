@@ -0,0 +1,86 @@
+"""
+--no-devops：借用/归还和 /metrics 抓取都不会导入 Azure DevOps SDK（在新的解释器中检查 sys.modules）
+"""
+
+import multiprocessing
+import os
+import sys
+
+from .conftest import ASSETS
+
+# 在这些包被导入时直接失败：即使环境中安装了 SDK，也能发现意外的导入
+BLOCKED_PACKAGES = ('azure', 'msrest', 'src.az_info')
+
+
+class _ImportBlocker:
+    @staticmethod
+    def find_spec(name, path=None, target=None):
+        if any(name == package or name.startswith(package + '.') for package in BLOCKED_PACKAGES):
+            raise ImportError(f"--no-devops 模式下导入了 {name}")
+        return None
+
+
+class FakeSession:
+    async def send_log_message(self, **kwargs):
+        pass
+
+
+class FakeContext:
+    def __init__(self):
+        self.session = FakeSession()
+        self.request_id = 1
+
+
+def _no_devops_worker(devices_dir, results):
+    # 失败时把异常放回队列，测试进程不必等到超时
+    try:
+        results.put(_run_without_devops(devices_dir))
+    except BaseException as e:
+        results.put(e)
+
+
+def _run_without_devops(devices_dir):
+    os.environ['DEVICE_DATA_DIR'] = devices_dir
+    os.environ['DEVICE_STATE_MODE'] = 'overlay'
+    sys.meta_path.insert(0, _ImportBlocker())
+
+    import anyio
+
+    from src.mcp_server2 import server
+    from src.mcp_server2.devops import close_outbox, configure_devops, outbox_stats
+    from src.utils.metrics import get_metrics
+
+    configure_devops(False)
+
+    async def run():
+        ctx = FakeContext()
+        borrow = {'asset_number': ASSETS[0], 'borrower': 'alice'}
+        bulk = {'asset_numbers': ASSETS[1:3], 'borrower': 'alice'}
+        content, structured = await server._handle_borrow_devices(bulk, ctx)
+        assert structured['failed'] == 0, content[0].text
+        return [
+            (await server._handle_borrow_device(borrow, ctx))[0].text,
+            (await server._handle_return_device(borrow, ctx))[0].text,
+        ]
+
+    texts = anyio.run(run)
+    assert outbox_stats() is None
+    close_outbox()
+    get_metrics().render()
+    imported = sorted(name for name in sys.modules if name.split('.')[0] in ('azure', 'msrest')
+                      or name.startswith('src.az_info'))
+    return texts, imported
+
+
+def test_no_devops_never_imports_azure_sdk(devices_dir):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    worker = context.Process(target=_no_devops_worker, args=(str(devices_dir), results))
+    worker.start()
+    result = results.get(timeout=120)
+    worker.join(timeout=60)
+    if isinstance(result, BaseException):
+        raise result
+    texts, imported = result
+    assert imported == []
+    assert all('❌' not in text for text in texts), texts
@@ -0,0 +1,55 @@
+"""
+工具调用中的日志通知缓冲
+"""
+
+import anyio
+import pytest
+
+from src.mcp_server2 import notifications
+from src.mcp_server2.notifications import buffered_notifications, send_log
+
+
+class FakeSession:
+    def __init__(self):
+        self.messages = []
+
+    async def send_log_message(self, **kwargs):
+        self.messages.append(kwargs)
+
+
+class FakeContext:
+    def __init__(self):
+        self.session = FakeSession()
+        self.request_id = 1
+
+
+@pytest.fixture(autouse=True)
+def window():
+    notifications.configure_notifications(0.05)
+    yield
+    notifications.configure_notifications(0.05)
+
+
+def test_logs_are_merged_and_flushed_on_exit():
+    ctx = FakeContext()
+
+    async def call():
+        async with buffered_notifications(ctx):
+            await send_log(ctx, "info", "第一条", "device")
+            await send_log(ctx, "info", "第二条", "device")
+
+    anyio.run(call)
+    assert [message["data"] for message in ctx.session.messages] == ["第一条\n第二条"]
+
+
+def test_handler_exception_is_not_wrapped():
+    ctx = FakeContext()
+
+    async def call():
+        async with buffered_notifications(ctx):
+            await send_log(ctx, "info", "开始", "device")
+            raise ValueError("资产编号无效")
+
+    with pytest.raises(ValueError, match="资产编号无效"):
+        anyio.run(call)
+    assert [message["data"] for message in ctx.session.messages] == ["开始"]
@@ -0,0 +1,102 @@
+"""
+设备组合查询：JSON 表达式解析，以及位图上的 与/或/非 求值与逐行判断的结果一致
+"""
+
+import pytest
+
+from src.device.catalog import DeviceCatalog
+from src.device.device_store import CsvDeviceStore, SqliteDeviceStore
+from src.device.query import QUERY_FIELDS, DeviceQuery, TableIndex, bit_positions, normalize_value
+from src.device.record_store import RecordStore
+from src.device.state_store import DeviceStateStore
+
+from .conftest import ASSETS
+
+BRANDS = ['Samsung', 'Google', ' samsung ', '']
+STATUSES = ['可用', '正在使用', '维修中']
+BORROWERS = ['', 'alice', 'Bob']
+
+# 行数超过64，位图跨越多个机器字
+ROWS = [
+    {'品牌': BRANDS[i % 4], '设备状态': STATUSES[i % 3], '借用者': BORROWERS[i % 5 % 3], '所属manager': 'carol'}
+    for i in range(70)
+]
+
+EXPRESSIONS = [
+    {},
+    {'brand': 'samsung'},
+    {'brand': ['Samsung', 'Google'], 'status': '可用'},
+    {'or': [{'brand': 'Google'}, {'borrower': 'bob'}]},
+    {'not': {'borrower': ''}},
+    {'and': [{'not': {'brand': ''}}, {'or': [{'status': '维修中'}, {'not': {'borrower': ['alice', 'bob']}}]}]},
+    {'device_type': 'android'},
+    {'device_type': 'ios', 'manager': 'Carol'},
+    {'brand': 'Apple'},
+]
+
+
+def matches(expression, device_type, row):
+    """逐行判断，作为位图求值的对照"""
+    result = True
+    for key, value in expression.items():
+        if key == 'and':
+            result &= all(matches(child, device_type, row) for child in value)
+        elif key == 'or':
+            result &= any(matches(child, device_type, row) for child in value)
+        elif key == 'not':
+            result &= not matches(value, device_type, row)
+        else:
+            values = [value] if isinstance(value, str) else value
+            actual = device_type if key == 'device_type' else normalize_value(row.get(QUERY_FIELDS[key]))
+            result &= actual in {normalize_value(v) for v in values}
+    return result
+
+
+@pytest.mark.parametrize('expression', EXPRESSIONS)
+def test_bitmap_evaluation_matches_row_scan(expression):
+    index = TableIndex('ios', ROWS)
+    query = DeviceQuery.parse(expression)
+    expected = [position for position, row in enumerate(ROWS) if matches(expression, 'ios', row)]
+    assert bit_positions(query.evaluate(index)) == expected
+    assert bit_positions(query.evaluate(index), limit=3) == expected[:3]
+    assert DeviceQuery.parse(query.to_dict()).to_dict() == query.to_dict()
+
+
+def test_updated_rows_are_reindexed():
+    rows = [dict(row) for row in ROWS]
+    index = TableIndex('ios', rows)
+    for position in (0, 65):
+        old_row = dict(rows[position])
+        rows[position]['借用者'] = 'dave'
+        index.update(position, old_row, rows[position])
+    query = DeviceQuery.where(borrower='Dave') | ~DeviceQuery.where(brand=['samsung', 'google', ''])
+    assert bit_positions(query.evaluate(index)) == [0, 65]
+
+
+@pytest.mark.parametrize('expression', [
+    [{'brand': 'Google'}],
+    {'and': []},
+    {'or': {'brand': 'Google'}},
+    {'not': 'Google'},
+    {'color': 'red'},
+    {'brand': []},
+    {'brand': 3},
+    {'brand': ['Google', None]},
+])
+def test_parse_rejects_malformed_expressions(expression):
+    with pytest.raises(ValueError):
+        DeviceQuery.parse(expression)
+
+
+@pytest.mark.parametrize('backend', ['csv', 'sqlite'])
+def test_store_query_sees_status_writes(devices_dir, backend):
+    store = CsvDeviceStore(catalog=DeviceCatalog(devices_dir, state_store=DeviceStateStore(devices_dir)),
+                           record_store=RecordStore(devices_dir))
+    if backend == 'sqlite':
+        sqlite_store = SqliteDeviceStore(devices_dir / 'devices.db')
+        sqlite_store.import_from(store)
+        store = sqlite_store
+    store.set_status('ios', ASSETS[3], '正在使用', 'alice')
+    query = DeviceQuery.parse({'and': [{'device_type': 'ios'}, {'not': {'status': '可用'}}]})
+    assert [device['资产编号'] for _, device in store.query_devices(query)] == [ASSETS[3]]
+    assert len(store.query_devices(DeviceQuery.where(borrower=''), 'ios')) == len(ASSETS) - 1
@@ -0,0 +1,88 @@
+"""
+借用/归还记录存储：压缩中途崩溃的恢复，以及与其他进程正在进行的压缩并发
+"""
+
+import multiprocessing
+import os
+import time
+from pathlib import Path
+
+from src.device.record_store import COMPACTING_SUFFIX, RecordStore
+
+
+def make_records(count, start=0):
+    return [{'创建日期': '01/01/2024', '借用者': 'alice', '设备': f'iPhone #{i}',
+             '资产编号': str(18000000 + i), '状态': '借用', '原因': ''}
+            for i in range(start, start + count)]
+
+
+def make_store(directory):
+    return RecordStore(directory, compact_threshold=10 ** 9)
+
+
+def test_recovers_compaction_interrupted_before_snapshot(tmp_path):
+    store = make_store(tmp_path)
+    store.append_many(make_records(3))
+    store.compact()
+    store.append_many(make_records(2, start=3))
+    # 模拟压缩时日志已改名、快照还没写入就崩溃
+    os.replace(store.journal_path, tmp_path / f"records.journal{COMPACTING_SUFFIX}3")
+
+    recovered = make_store(tmp_path)
+    assert [record['资产编号'] for record in recovered.all_records()] == \
+        [str(18000000 + i) for i in range(5)]
+    assert not list(tmp_path.glob(f"records.journal{COMPACTING_SUFFIX}*"))
+
+
+def _slow_compaction(directory, started):
+    store = make_store(Path(directory))
+    store.refresh()
+    write_snapshot = store._write_snapshot
+
+    def slow_write(path, records):
+        started.set()
+        time.sleep(0.5)
+        write_snapshot(path, records)
+
+    store._write_snapshot = slow_write
+    store.compact()
+
+
+def test_reader_waits_for_compaction_in_other_process(tmp_path):
+    store = make_store(tmp_path)
+    store.append_many(make_records(3))
+    store.compact()
+    store.append_many(make_records(2, start=3))
+
+    context = multiprocessing.get_context('spawn')
+    started = context.Event()
+    compactor = context.Process(target=_slow_compaction, args=(str(tmp_path), started))
+    compactor.start()
+    assert started.wait(timeout=60)
+
+    # 新进程启动时看到的 .compacting 文件属于正在进行的压缩，不能当成崩溃遗留去恢复
+    assert make_store(tmp_path).count() == 5
+    compactor.join(timeout=60)
+    assert compactor.exitcode == 0
+    assert make_store(tmp_path).count() == 5
+
+
+def test_read_since_restarts_after_compaction(tmp_path):
+    reader = make_store(tmp_path)
+    writer = make_store(tmp_path)
+    writer.append_many(make_records(3))
+    records, offset, epoch = reader.read_since(0)
+    assert len(records) == 3
+
+    # 压缩后新日志增长到超过旧偏移量，旧偏移量不能继续使用
+    writer.compact()
+    writer.append_many(make_records(5, start=3))
+    records, offset, epoch = reader.read_since(offset, epoch)
+    assert [record['资产编号'] for record in records] == [str(18000000 + i) for i in range(3, 8)]
+    assert reader.read_since(offset, epoch)[0] == []
+
+
+def test_query_strips_values(tmp_path):
+    store = make_store(tmp_path)
+    store.append_many(make_records(2))
+    assert len(store.query(asset_number=' 18000001 ', borrower='alice ')) == 1
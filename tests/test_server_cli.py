@@ -0,0 +1,14 @@
+"""
+服务器命令行参数校验
+"""
+
+from click.testing import CliRunner
+
+from src.mcp_server2.server import main
+
+
+def test_invalid_tool_concurrency_is_a_usage_error():
+    result = CliRunner().invoke(main, ["--tool-concurrency", "borrow_device"])
+    assert result.exit_code == 2
+    assert "--tool-concurrency" in result.output
+    assert "工具名=数量" in result.output
@@ -0,0 +1,83 @@
+"""
+SQLite 存储：从 CSV 导入（重新导入时替换全部数据），数据版本对其他连接（其他进程）的写入可见
+"""
+
+import pytest
+
+from src.device.catalog import DeviceCatalog
+from src.device.device_store import CsvDeviceStore, SqliteDeviceStore
+from src.device.record_store import RecordStore
+
+from .conftest import ASSETS, IOS_FIELDNAMES, write_ios_devices
+
+
+def csv_store(devices_dir):
+    return CsvDeviceStore(catalog=DeviceCatalog(devices_dir), record_store=RecordStore(devices_dir))
+
+
+def make_store(devices_dir):
+    store = SqliteDeviceStore(devices_dir / 'devices.db')
+    store.import_from(csv_store(devices_dir))
+    return store
+
+
+def test_import_copies_tables_and_records(devices_dir):
+    source = csv_store(devices_dir)
+    source.set_status('ios', ASSETS[1], '正在使用', 'alice')
+    source.append_records([{'创建日期': '01/01/2025', '借用者': 'alice', '设备': 'iPhone #1',
+                            '资产编号': ASSETS[1], '状态': '借用', '原因': '测试'}])
+    store = SqliteDeviceStore(devices_dir / 'devices.db')
+    assert store.import_from(source) == {'ios': len(ASSETS), 'records': 1}
+
+    # 列顺序、行顺序和所有列的取值与CSV一致
+    assert store.fieldnames('ios') == IOS_FIELDNAMES
+    assert store.get_devices('ios') == source.get_devices('ios')
+    assert store.all_records() == source.all_records()
+    device, device_type = store.find_asset(f' {ASSETS[1]} ')
+    assert (device['借用者'], device_type) == ('alice', 'ios')
+    assert [row['资产编号'] for _, row in store.find_devices(status='正在使用')] == [ASSETS[1]]
+    # 没有导入的类型与CSV文件缺失时一样
+    with pytest.raises(FileNotFoundError):
+        store.get_devices('android')
+
+
+def test_reimport_replaces_existing_data(devices_dir):
+    store = make_store(devices_dir)
+    store.set_status('ios', ASSETS[0], '正在使用', 'alice')
+    store.append_records([{'资产编号': ASSETS[0], '状态': '借用'}])
+
+    write_ios_devices(devices_dir, ASSETS[:2])
+    version = store.data_version()
+    assert store.import_from(csv_store(devices_dir)) == {'ios': 2, 'records': 0}
+    assert store.data_version() != version
+    assert [row['设备状态'] for row in store.get_devices('ios')] == ['可用', '可用']
+    assert store.all_records() == []
+    assert store.find_asset(ASSETS[4]) == (None, None)
+
+
+def test_versions_change_with_writes_from_other_connections(devices_dir):
+    store = make_store(devices_dir)
+    other = SqliteDeviceStore(devices_dir / 'devices.db')
+    devices, records = store.data_version(), store.records_version()
+
+    assert store.facets().count('ios', status='可用') == len(ASSETS)
+    other.set_status('ios', ASSETS[0], '正在使用', 'alice')
+    assert store.data_version() != devices
+    assert store.records_version() == records
+    # 版本变化后分面计数重建，读到其他连接的写入
+    assert store.facets().count('ios', status='可用') == len(ASSETS) - 1
+
+    devices = store.data_version()
+    other.append_records([{'创建日期': '01/01/2025', '借用者': 'alice', '资产编号': ASSETS[0], '状态': '借用'}])
+    assert store.records_version() != records
+    assert store.data_version() == devices
+
+
+def test_failed_write_keeps_version(devices_dir):
+    store = make_store(devices_dir)
+    version = store.data_version()
+    with pytest.raises(ValueError):
+        store.set_statuses([('ios', ASSETS[0], '正在使用', 'alice'), ('ios', 'missing', '正在使用', 'alice')])
+    assert store.data_version() == version
+    device, _ = store.find_asset(ASSETS[0])
+    assert device['设备状态'] == '可用'
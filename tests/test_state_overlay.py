@@ -0,0 +1,59 @@
+"""
+设备状态覆盖层（overlay 模式）的多实例一致性测试
+两个 DeviceCatalog 共用一个数据目录，模拟两个服务器进程
+"""
+
+from src.device.catalog import DeviceCatalog
+from src.device.state_store import DeviceStateStore
+
+from .conftest import ASSETS
+
+
+def make_catalog(devices_dir):
+    return DeviceCatalog(devices_dir, state_store=DeviceStateStore(devices_dir))
+
+
+def statuses(catalog):
+    return [row['设备状态'] for row in catalog.get_devices('ios')]
+
+
+def test_other_instance_sees_states_after_compaction(devices_dir):
+    a = make_catalog(devices_dir)
+    b = make_catalog(devices_dir)
+    a.set_state('ios', ASSETS[1], '正在使用', 'alice')
+    assert statuses(b) == statuses(a)
+
+    a.compact_states()
+    a.set_state('ios', ASSETS[1], '可用', '')
+    for asset_number in ASSETS[2:]:
+        a.set_state('ios', asset_number, '正在使用', 'bob')
+
+    assert statuses(a) == ['可用', '可用', '正在使用', '正在使用', '正在使用']
+    assert statuses(b) == statuses(a)
+
+
+def test_writes_after_other_instance_compacted_are_kept(devices_dir):
+    a = make_catalog(devices_dir)
+    b = make_catalog(devices_dir)
+    a.set_state('ios', ASSETS[0], '正在使用', 'alice')
+    b.set_state('ios', ASSETS[1], '正在使用', 'bob')
+
+    a.compact_states()
+    a.set_state('ios', ASSETS[2], '正在使用', 'alice')
+    a.set_state('ios', ASSETS[3], '正在使用', 'alice')
+    # b 仍持有压缩前的日志偏移，追加时不能截断 a 的新日志
+    b.set_state('ios', ASSETS[4], '正在使用', 'bob')
+
+    expected = ['正在使用'] * 5
+    assert statuses(b) == expected
+    assert statuses(a) == expected
+    assert statuses(make_catalog(devices_dir)) == expected
+
+
+def test_empty_batch_keeps_loaded_tables(devices_dir):
+    catalog = make_catalog(devices_dir)
+    catalog.set_state('ios', ASSETS[0], '正在使用', 'alice')
+    table = catalog.get_table('ios')
+    assert catalog.state_store.set_states({}) == {}
+    catalog.set_states([])
+    assert catalog.get_table('ios') is table
@@ -0,0 +1,229 @@
+"""
+借用/归还事务：多个进程（或多个设备目录实例）同时借用同一台设备时只有一个成功；进程在提交前崩溃后，启动时重放未完成的事务；
+写入出错的事务回滚后不再重放；批量借用/归还逐台报告结果，记录只追加一次
+"""
+
+import multiprocessing
+import os
+
+import pytest
+
+from src.device.catalog import DeviceCatalog
+from src.device.device_store import CsvDeviceStore
+from src.device.record_store import RecordStore
+from src.device.state_store import DeviceStateStore
+from src.device.transactions import DeviceTransactions, StatusConflictError
+
+from .conftest import ASSETS
+
+
+def make_transactions(devices_dir, overlay=True):
+    state_store = DeviceStateStore(devices_dir) if overlay else None
+    store = CsvDeviceStore(catalog=DeviceCatalog(devices_dir, state_store=state_store),
+                           record_store=RecordStore(devices_dir))
+    return DeviceTransactions(store=store, devices_dir=devices_dir)
+
+
+def borrow_records(devices_dir, asset_number):
+    return RecordStore(devices_dir).query(asset_number=asset_number, status='借用')
+
+
+def test_second_instance_cannot_borrow_after_compaction(devices_dir):
+    a = make_transactions(devices_dir)
+    b = make_transactions(devices_dir)
+    a.execute('借用', ASSETS[3], 'alice.chen')
+    b.store.find_asset(ASSETS[0])  # b 已读到压缩前的状态日志末尾
+
+    a.store.catalog.compact_states()
+    # 压缩后的新日志长过 b 记住的偏移量，且该偏移量不在帧边界上
+    a.execute('借用', ASSETS[1], 'alice')
+    a.execute('归还', ASSETS[1], 'alice')
+    a.execute('借用', ASSETS[0], 'alice')
+
+    with pytest.raises(StatusConflictError):
+        b.execute('借用', ASSETS[0], 'bob')
+    assert len(borrow_records(devices_dir, ASSETS[0])) == 1
+    b.execute('借用', ASSETS[1], 'bob')
+
+
+def _borrow_worker(devices_dir, state_mode, asset_number, borrower, start, results):
+    os.environ['DEVICE_DATA_DIR'] = devices_dir
+    os.environ['DEVICE_STATE_MODE'] = state_mode
+    from src.device.transactions import StatusConflictError, get_transactions
+
+    transactions = get_transactions()
+    transactions.store.find_asset(asset_number)
+    start.wait()
+    try:
+        transactions.execute('借用', asset_number, borrower)
+        results.put((borrower, True))
+    except StatusConflictError:
+        results.put((borrower, False))
+
+
+@pytest.mark.parametrize('state_mode', ['csv', 'overlay'])
+def test_concurrent_borrow_across_processes(devices_dir, state_mode):
+    context = multiprocessing.get_context('spawn')
+    start = context.Event()
+    results = context.Queue()
+    workers = [
+        context.Process(target=_borrow_worker,
+                        args=(str(devices_dir), state_mode, ASSETS[2], f'user{i}', start, results))
+        for i in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    start.set()
+    outcomes = [results.get(timeout=60) for _ in workers]
+    for worker in workers:
+        worker.join(timeout=60)
+
+    assert sum(success for _, success in outcomes) == 1
+    assert len(borrow_records(devices_dir, ASSETS[2])) == 1
+    overlay = state_mode == 'overlay'
+    device, _ = make_transactions(devices_dir, overlay).store.find_asset(ASSETS[2])
+    winner = next(borrower for borrower, success in outcomes if success)
+    assert (device['设备状态'], device['借用者']) == ('正在使用', winner)
+
+
+def _crash_worker(devices_dir, state_mode, asset_number, crash_point):
+    os.environ['DEVICE_DATA_DIR'] = devices_dir
+    os.environ['DEVICE_STATE_MODE'] = state_mode
+    from src.device.transactions import get_transactions
+
+    transactions = get_transactions()
+    if crash_point == 'after_begin':
+        # 意图已写入，两次写入都还没有发生
+        transactions._apply = lambda intent: os._exit(1)
+    else:
+        # 设备状态已更新，记录还没有追加
+        transactions.store.append_records = lambda *args: os._exit(1)
+    transactions.execute('借用', asset_number, 'alice')
+
+
+@pytest.mark.parametrize('state_mode', ['csv', 'overlay'])
+@pytest.mark.parametrize('crash_point', ['after_begin', 'after_status'])
+def test_recover_replays_transaction_interrupted_before_commit(devices_dir, state_mode, crash_point):
+    context = multiprocessing.get_context('spawn')
+    worker = context.Process(target=_crash_worker,
+                             args=(str(devices_dir), state_mode, ASSETS[4], crash_point))
+    worker.start()
+    worker.join(timeout=60)
+    assert worker.exitcode == 1
+
+    overlay = state_mode == 'overlay'
+    transactions = make_transactions(devices_dir, overlay)
+    assert len(transactions.intents.pending()) == 1
+    assert transactions.recover() == 1
+    assert transactions.intents.pending() == []
+    assert transactions.recover() == 0
+
+    device, _ = make_transactions(devices_dir, overlay).store.find_asset(ASSETS[4])
+    assert (device['设备状态'], device['借用者']) == ('正在使用', 'alice')
+    # 重放不会重复追加崩溃前已经写入的记录
+    assert len(borrow_records(devices_dir, ASSETS[4])) == 1
+    with pytest.raises(StatusConflictError):
+        transactions.execute('借用', ASSETS[4], 'bob')
+
+
+def assert_not_recorded(devices_dir, asset_number):
+    try:
+        assert borrow_records(devices_dir, asset_number) == []
+    except FileNotFoundError:
+        # 从未追加过任何记录
+        pass
+
+
+def _fail(*args):
+    raise OSError('磁盘已满')
+
+
+@pytest.mark.parametrize('state_mode', ['csv', 'overlay'])
+@pytest.mark.parametrize('failing_write', ['set_status', 'append_records'])
+def test_failed_write_is_rolled_back_and_not_replayed(devices_dir, state_mode, failing_write):
+    overlay = state_mode == 'overlay'
+    transactions = make_transactions(devices_dir, overlay)
+    setattr(transactions.store, failing_write, _fail)
+    with pytest.raises(OSError):
+        transactions.execute('借用', ASSETS[1], 'alice')
+
+    transactions = make_transactions(devices_dir, overlay)
+    assert transactions.intents.pending() == []
+    assert transactions.recover() == 0
+    device, _ = transactions.store.find_asset(ASSETS[1])
+    assert (device['设备状态'], device['借用者']) == ('可用', '')
+    assert_not_recorded(devices_dir, ASSETS[1])
+    # 回滚后设备可以正常借出
+    transactions.execute('借用', ASSETS[1], 'bob')
+    assert len(borrow_records(devices_dir, ASSETS[1])) == 1
+
+
+@pytest.mark.parametrize('state_mode', ['csv', 'overlay'])
+def test_failed_batch_is_rolled_back_and_not_replayed(devices_dir, state_mode):
+    overlay = state_mode == 'overlay'
+    transactions = make_transactions(devices_dir, overlay)
+    transactions.store.append_records = _fail
+    with pytest.raises(OSError):
+        transactions.execute_many('借用', ASSETS[:3], 'alice')
+
+    transactions = make_transactions(devices_dir, overlay)
+    assert transactions.intents.pending() == []
+    assert transactions.recover() == 0
+    for asset_number in ASSETS[:3]:
+        device, _ = transactions.store.find_asset(asset_number)
+        assert (device['设备状态'], device['借用者']) == ('可用', '')
+        assert_not_recorded(devices_dir, asset_number)
+
+
+def counting(transactions, name):
+    """统计存储方法的调用，返回每次调用的参数列表"""
+    calls = []
+    method = getattr(transactions.store, name)
+
+    def wrapper(items):
+        calls.append(list(items))
+        return method(items)
+
+    setattr(transactions.store, name, wrapper)
+    return calls
+
+
+@pytest.mark.parametrize('state_mode', ['csv', 'overlay'])
+def test_bulk_borrow_reports_each_item_and_appends_once(devices_dir, state_mode):
+    overlay = state_mode == 'overlay'
+    transactions = make_transactions(devices_dir, overlay)
+    transactions.execute('借用', ASSETS[2], 'bob')
+    appends = counting(transactions, 'append_records')
+    status_writes = counting(transactions, 'set_statuses')
+
+    results = transactions.execute_many('借用', [ASSETS[0], ASSETS[1], 'missing', ASSETS[0], ASSETS[2]], 'alice')
+    assert [(result['资产编号'], result['success']) for result in results] == [
+        (ASSETS[0], True), (ASSETS[1], True), ('missing', False), (ASSETS[2], False),
+    ]
+    assert results[2]['error'] == '未找到资产编号为 missing 的设备'
+    assert results[0]['record']['借用者'] == 'alice'
+    # 通过校验的设备：记录一次追加，设备状态一次提交
+    assert [[record['资产编号'] for record in call] for call in appends] == [[ASSETS[0], ASSETS[1]]]
+    assert len(status_writes) == 1
+    assert transactions.intents.pending() == []
+
+    results = transactions.execute_many('归还', ASSETS[:4], 'alice')
+    assert [result['success'] for result in results] == [True, True, True, False]
+    assert len(appends) == 2
+    for asset_number in ASSETS[:4]:
+        device, _ = make_transactions(devices_dir, overlay).store.find_asset(asset_number)
+        assert (device['设备状态'], device['借用者']) == ('可用', '')
+
+
+def test_bulk_borrow_cleans_input_and_reports_invalid_arguments(devices_dir, monkeypatch):
+    from src.device import records_reader
+
+    transactions = make_transactions(devices_dir)
+    monkeypatch.setattr(records_reader, 'get_transactions', lambda: transactions)
+    results = records_reader.borrow_devices([f' {ASSETS[0]} ', '', ASSETS[0], ASSETS[1]], ' alice ')
+    assert [(result['资产编号'], result['success']) for result in results] == [(ASSETS[0], True), (ASSETS[1], True)]
+    assert results[0]['record']['借用者'] == 'alice'
+
+    results = records_reader.return_devices(ASSETS[:2], '  ')
+    assert [result['success'] for result in results] == [False, False]
+    assert records_reader.borrow_devices([], 'alice') == []
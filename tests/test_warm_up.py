@@ -0,0 +1,26 @@
+"""
+启动预热：设备表、记录和名称搜索索引都在第一次请求之前建立
+"""
+
+from src.device.catalog import DeviceCatalog
+from src.device.device_store import CsvDeviceStore, SqliteDeviceStore
+from src.device.record_store import RecordStore
+
+from .conftest import ASSETS
+
+
+def test_csv_warm_up_builds_name_index(devices_dir):
+    store = CsvDeviceStore(catalog=DeviceCatalog(devices_dir), record_store=RecordStore(devices_dir))
+    summary = store.warm_up()
+    assert summary['devices'] == {'ios': len(ASSETS)}
+    assert 'ios' in store.catalog.name_index._tables
+    assert not store.catalog.name_index._pending
+
+
+def test_sqlite_warm_up_builds_name_index(devices_dir):
+    store = SqliteDeviceStore(devices_dir / 'devices.db')
+    store.import_from(CsvDeviceStore(catalog=DeviceCatalog(devices_dir), record_store=RecordStore(devices_dir)))
+    summary = store.warm_up()
+    assert summary['devices'] == {'ios': len(ASSETS)}
+    assert 'ios' in store._name_index._tables
+    assert not store._name_index._pending